@@ -6,6 +6,14 @@ import random
 from datetime import datetime, timezone, timedelta
 from typing import Dict, List, Optional, Any, Tuple
 import traceback   # used in log_to_discord
+import heapq
+import sqlite3
+import threading
+import re
+import unicodedata
+from collections import OrderedDict, deque
+import hashlib
+import bisect
 import aiohttp
 import io
 import textwrap
@@ -90,10 +98,60 @@ print("discord.ui dir:", dir(discord.ui))
 print("Has TextInput?", hasattr(discord.ui, 'TextInput'))
 from discord.ext import commands, tasks
 from typing import Optional
+from functools import lru_cache
+
+from combat import (
+    SWORD_SKILLS, skill_profile, resolve_duel_attack, resolve_strike,
+    resolve_monster_attack, roll_damage_over_time,
+)
 
 TOKEN = os.getenv('TOKEN')
 DATABASE_URL = os.getenv('DATABASE_URL')
 
+# Gem ledger: "sync" writes user_transactions in the same statement as the
+# balance change (durable); "async" buffers rows and bulk-copies them in the
+# background (a crash can lose up to one flush interval of history).
+LEDGER_MODE = os.getenv('LEDGER_MODE', 'sync').lower()
+LEDGER_FLUSH_MS = int(os.getenv('LEDGER_FLUSH_MS', '500'))
+LEDGER_BATCH_ROWS = int(os.getenv('LEDGER_BATCH_ROWS', '500'))
+LEDGER_QUEUE_SIZE = int(os.getenv('LEDGER_QUEUE_SIZE', '10000'))
+# A batch that keeps failing is split into single-row inserts after this many
+# attempts; rows that still fail are logged and dropped.
+LEDGER_MAX_RETRIES = int(os.getenv('LEDGER_MAX_RETRIES', '5'))
+
+# Connection pool. Everything runs on one event loop, so a handful of
+# connections is enough; raise DB_POOL_MAX_SIZE if pool waits show up in !!dbstats.
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', '2'))
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', '10'))
+DB_POOL_MAX_INACTIVE = float(os.getenv('DB_POOL_MAX_INACTIVE', '300'))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv('DB_STATEMENT_CACHE_SIZE', '256'))
+
+# Mining completion DMs are drained by a background outbox at this pace so a
+# large sweep doesn't trip Discord's DM rate limits.
+MINING_DM_INTERVAL = float(os.getenv('MINING_DM_INTERVAL', '1.0'))
+
+# Boss hits are applied in memory and written back in one statement per guild
+# at this interval, instead of locking the boss_config row on every attack.
+BOSS_FLUSH_SECONDS = float(os.getenv('BOSS_FLUSH_SECONDS', '1.0'))
+
+# Gem, arena and boss leaderboards are served from memory and kept current by
+# the write paths; each is rebuilt from Postgres after this many seconds so
+# writes made outside the bot (manual SQL) still converge.
+LEADERBOARD_REBUILD_SECONDS = float(os.getenv('LEADERBOARD_REBUILD_SECONDS', '3600'))
+
+# Users and members looked up for leaderboards, trades and announcements are
+# cached (misses included) for NAME_CACHE_TTL seconds, up to NAME_CACHE_SIZE
+# entries; uncached users are fetched at most NAME_FETCH_CONCURRENCY at a time.
+NAME_CACHE_SIZE = int(os.getenv('NAME_CACHE_SIZE', '5000'))
+NAME_CACHE_TTL = float(os.getenv('NAME_CACHE_TTL', '600'))
+NAME_FETCH_CONCURRENCY = int(os.getenv('NAME_FETCH_CONCURRENCY', '5'))
+
+# #bot-logs sink: lines below LOG_LEVEL stay in stdout only; the rest are
+# batched into one embed every LOG_FLUSH_SECONDS.
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FLUSH_SECONDS = float(os.getenv('LOG_FLUSH_SECONDS', '5'))
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '1000'))
+
 # Debug: Print ALL environment variables that might contain database info
 print("\n🔍 Searching for database environment variables...")
 for key, value in os.environ.items():
@@ -271,187 +329,187 @@ BOTS = [
 
 # ============================================================
 # EMOJIS HELPER FUNCTIONS 
+# Resolution tables are built once at import; CUSTOM_EMOJIS never changes at
+# runtime, so results are memoised per (name, type, awakened).
+
+# Exact name → emoji key mapping
+ITEM_EMOJI_EXACT = {
+    # Swords
+    "Zenith Sword": "zenith_sword",
+    "Abyssal Blade": "abyssal_blade",
+    "Dawn Breaker": "dawn_breaker",
+    "Bloodmoon Edge": "bloodmoon_edge",
+    "Shadowbane": "shadowbane",
+
+    # Bilari Set
+    "Bilari Helm": "bilari_helm",
+    "Bilari Suit": "bilari_armor",
+    "Bilari Gauntlets": "bilari_gloves",
+    "Bilari Boots": "bilari_boots",
+
+    # Cryo Set
+    "Cryo Helm": "cryo_helm",
+    "Cryo Suit": "cryo_armor",
+    "Cryo Gauntlets": "cryo_gloves",
+    "Cryo Boots": "cryo_boots",
+
+    # Bane Set
+    "Bane Helm": "bane_helm",
+    "Bane Suit": "bane_armor",
+    "Bane Gauntlets": "bane_gloves",
+    "Bane Boots": "bane_boots",
+
+    # Champion Set
+    "Champion Ring": "champ_ring",
+    "Champion Earring": "champ_earring",
+    "Champion Pendant": "champ_pen",
+
+    # Defender Set
+    "Defender Ring": "def_ring",
+    "Defender Earring": "def_earring",
+    "Defender Pendant": "def_pen",
+
+    # Angel Set
+    "Angel Ring": "wing_ring",
+    "Angel Earring": "harp_earring",
+    "Angel Pendant": "angel_pen",
+
+    # Pets
+    "Baby Fox": "baby_fox",
+    "Baby Tiger": "baby_tiger",
+    "Baby Purr": "baby_purr",
+
+    # Potions
+    "HP Potion": "hp_potion",
+    "Energy Potion": "energy_potion",
+}
+
+# Keyword rules, checked in order against the lower-cased name:
+# (keywords, emoji key, fallback if the key is missing)
+_WEAPON_EMOJI_RULES = (
+    (('zenith',), 'zenith_sword', '⚔️'),
+    (('abyssal',), 'abyssal_blade', '⚔️'),
+    (('dawn', 'breaker'), 'dawn_breaker', '⚔️'),
+    (('bloodmoon', 'edge'), 'bloodmoon_edge', '⚔️'),
+    (('shadowbane',), 'shadowbane', '⚔️'),
+)
+
+_PET_EMOJI_RULES = (
+    (('fox',), 'baby_fox', '🦊'),
+    (('tiger',), 'baby_tiger', '🐯'),
+    (('purr',), 'baby_purr', '😺'),
+)
+
+_MATERIAL_EMOJI_RULES = (
+    (('hp potion',), 'hp_potion', '🧪'),
+    (('energy potion',), 'energy_potion', '⚡'),
+    (('sword',), 'sword_enhancement_stone', '💎'),
+    (('armor',), 'armors_enhancement_stone', '💎'),
+    (('accessories',), 'acc_enhancement_stone', '💎'),
+)
+
+# Armor: set keyword picks the set, then the piece keyword picks the slot
+_ARMOR_SETS = (('bilari',), ('cryo',), ('bane',))
+_ARMOR_PIECES = (
+    (('helm', 'helmet'), 'helm'),
+    (('suit', 'armor', 'chest'), 'armor'),
+    (('gauntlet', 'glove'), 'gloves'),
+    (('boot',), 'boots'),
+)
+
+# Accessories: (set keywords, earring key, pendant key, ring key)
+_ACCESSORY_SETS = (
+    (('champion', 'champ'), 'champ_earring', 'champ_pen', 'champ_ring'),
+    (('defender', 'def'), 'def_earring', 'def_pen', 'def_ring'),
+    (('angel',), 'harp_earring', 'angel_pen', 'wing_ring'),
+)
+
+
+def _has_any(text: str, keywords) -> bool:
+    return any(k in text for k in keywords)
+
+
+def _match_emoji_rules(text: str, rules):
+    for keywords, key, fallback in rules:
+        if _has_any(text, keywords):
+            return CUSTOM_EMOJIS.get(key, fallback)
+    return None
+
+
+@lru_cache(maxsize=2048)
 def get_item_emoji(item_name: str, item_type: str, awakened: bool = False) -> str:
     """
     Return the appropriate custom emoji based on the exact item name.
     Uses a mapping of known item names to their emoji keys.
     """
-    # Exact name → emoji key mapping
-    EXACT_MAP = {
-        # Swords
-        "Zenith Sword": "zenith_sword",
-        "Abyssal Blade": "abyssal_blade",
-        "Dawn Breaker": "dawn_breaker",
-        "Bloodmoon Edge": "bloodmoon_edge",
-        "Shadowbane": "shadowbane",
-
-        # Bilari Set
-        "Bilari Helm": "bilari_helm",
-        "Bilari Suit": "bilari_armor",
-        "Bilari Gauntlets": "bilari_gloves",
-        "Bilari Boots": "bilari_boots",
-
-        # Cryo Set
-        "Cryo Helm": "cryo_helm",
-        "Cryo Suit": "cryo_armor",
-        "Cryo Gauntlets": "cryo_gloves",
-        "Cryo Boots": "cryo_boots",
-
-        # Bane Set
-        "Bane Helm": "bane_helm",
-        "Bane Suit": "bane_armor",
-        "Bane Gauntlets": "bane_gloves",
-        "Bane Boots": "bane_boots",
-
-        # Champion Set
-        "Champion Ring": "champ_ring",
-        "Champion Earring": "champ_earring",
-        "Champion Pendant": "champ_pen",
-
-        # Defender Set
-        "Defender Ring": "def_ring",
-        "Defender Earring": "def_earring",
-        "Defender Pendant": "def_pen",
-
-        # Angel Set
-        "Angel Ring": "wing_ring",
-        "Angel Earring": "harp_earring",
-        "Angel Pendant": "angel_pen",
-
-        # Pets
-        "Baby Fox": "baby_fox",
-        "Baby Tiger": "baby_tiger",
-        "Baby Purr": "baby_purr",
-
-        # Potions
-        "HP Potion": "hp_potion",
-        "Energy Potion": "energy_potion",
-    }
-
     # 1. Try exact match first
-    if item_name in EXACT_MAP:
-        key = EXACT_MAP[item_name]
+    key = ITEM_EMOJI_EXACT.get(item_name)
+    if key:
         emoji = CUSTOM_EMOJIS.get(key)
         if emoji:
             return emoji
         # If key exists but emoji missing, fall through to type‑based logic
 
-    # 2. Fallback to type‑based detection (for any items not in the exact map)
+    # 2. Fallback to keyword detection (for any items not in the exact map)
     item_lower = item_name.lower()
 
-    # Potions (already covered by exact map, but keep for safety)
     if 'hp potion' in item_lower:
         return CUSTOM_EMOJIS.get('hp_potion', '💚')
     if 'energy potion' in item_lower:
         return CUSTOM_EMOJIS.get('energy_potion', '⚡')
 
-    # Weapons
     if item_type == 'weapon':
-        if 'zenith' in item_lower:
-            return CUSTOM_EMOJIS.get('zenith_sword', '⚔️')
-        elif 'abyssal' in item_lower:
-            return CUSTOM_EMOJIS.get('abyssal_blade', '⚔️')
-        elif 'dawn' in item_lower or 'breaker' in item_lower:
-            return CUSTOM_EMOJIS.get('dawn_breaker', '⚔️')
-        elif 'bloodmoon' in item_lower or 'edge' in item_lower:
-            return CUSTOM_EMOJIS.get('bloodmoon_edge', '⚔️')
-        elif 'shadowbane' in item_lower:
-            return CUSTOM_EMOJIS.get('shadowbane', '⚔️')
-        return '⚔️'
-
-    # Armor – exact map already handled the known sets
+        return _match_emoji_rules(item_lower, _WEAPON_EMOJI_RULES) or '⚔️'
+
     elif item_type == 'armor':
-        # Try to guess by set name (in case of slight name variations)
-        if 'bilari' in item_lower:
-            if 'helm' in item_lower or 'helmet' in item_lower:
-                return CUSTOM_EMOJIS.get('bilari_helm', '🛡️')
-            elif 'suit' in item_lower or 'armor' in item_lower or 'chest' in item_lower:
-                return CUSTOM_EMOJIS.get('bilari_armor', '🛡️')
-            elif 'gauntlet' in item_lower or 'glove' in item_lower:
-                return CUSTOM_EMOJIS.get('bilari_gloves', '🛡️')
-            elif 'boot' in item_lower:
-                return CUSTOM_EMOJIS.get('bilari_boots', '🛡️')
-        elif 'cryo' in item_lower:
-            if 'helm' in item_lower or 'helmet' in item_lower:
-                return CUSTOM_EMOJIS.get('cryo_helm', '🛡️')
-            elif 'suit' in item_lower or 'armor' in item_lower or 'chest' in item_lower:
-                return CUSTOM_EMOJIS.get('cryo_armor', '🛡️')
-            elif 'gauntlet' in item_lower or 'glove' in item_lower:
-                return CUSTOM_EMOJIS.get('cryo_gloves', '🛡️')
-            elif 'boot' in item_lower:
-                return CUSTOM_EMOJIS.get('cryo_boots', '🛡️')
-        elif 'bane' in item_lower:
-            if 'helm' in item_lower or 'helmet' in item_lower:
-                return CUSTOM_EMOJIS.get('bane_helm', '🛡️')
-            elif 'suit' in item_lower or 'armor' in item_lower or 'chest' in item_lower:
-                return CUSTOM_EMOJIS.get('bane_armor', '🛡️')
-            elif 'gauntlet' in item_lower or 'glove' in item_lower:
-                return CUSTOM_EMOJIS.get('bane_gloves', '🛡️')
-            elif 'boot' in item_lower:
-                return CUSTOM_EMOJIS.get('bane_boots', '🛡️')
-        # Fallback generic armor emoji (can be replaced with a custom default)
+        for set_keywords in _ARMOR_SETS:
+            if _has_any(item_lower, set_keywords):
+                for piece_keywords, slot in _ARMOR_PIECES:
+                    if _has_any(item_lower, piece_keywords):
+                        return CUSTOM_EMOJIS.get(f"{set_keywords[0]}_{slot}", '🛡️')
+                break
         return CUSTOM_EMOJIS.get('bilari_armor', '🛡️')
 
-    # Accessories – exact map already handled the known sets
     elif item_type == 'accessory':
-        # Try to guess by set name
-        if 'champion' in item_lower or 'champ' in item_lower:
-            if 'earring' in item_lower:
-                return CUSTOM_EMOJIS.get('champ_earring', '💍')
-            elif 'pendant' in item_lower or 'pen' in item_lower:
-                return CUSTOM_EMOJIS.get('champ_pen', '💍')
-            else:
-                return CUSTOM_EMOJIS.get('champ_ring', '💍')
-        elif 'defender' in item_lower or 'def' in item_lower:
-            if 'earring' in item_lower:
-                return CUSTOM_EMOJIS.get('def_earring', '💍')
-            elif 'pendant' in item_lower or 'pen' in item_lower:
-                return CUSTOM_EMOJIS.get('def_pen', '💍')
-            else:
-                return CUSTOM_EMOJIS.get('def_ring', '💍')
-        elif 'angel' in item_lower:
-            if 'earring' in item_lower:
-                return CUSTOM_EMOJIS.get('harp_earring', '💍')
-            elif 'pendant' in item_lower or 'pen' in item_lower:
-                return CUSTOM_EMOJIS.get('angel_pen', '💍')
-            else:
-                return CUSTOM_EMOJIS.get('wing_ring', '💍')
-        # If still not matched, return a generic accessory emoji (optional)
+        for set_keywords, earring, pendant, ring in _ACCESSORY_SETS:
+            if _has_any(item_lower, set_keywords):
+                if 'earring' in item_lower:
+                    return CUSTOM_EMOJIS.get(earring, '💍')
+                elif 'pen' in item_lower:
+                    return CUSTOM_EMOJIS.get(pendant, '💍')
+                return CUSTOM_EMOJIS.get(ring, '💍')
+        # Generic accessory emoji ('earring' also contains 'ring')
         if 'ring' in item_lower:
             return '💍'
-        elif 'earring' in item_lower:
-            return '📿'
-        elif 'pendant' in item_lower or 'pen' in item_lower:
+        elif 'pen' in item_lower:
             return '🔮'
         return '💍'
 
-    # Pets
     elif item_type == 'pet':
-        if 'fox' in item_lower:
-            return CUSTOM_EMOJIS.get('baby_fox', '🦊')
-        elif 'tiger' in item_lower:
-            return CUSTOM_EMOJIS.get('baby_tiger', '🐯')
-        elif 'purr' in item_lower:
-            return CUSTOM_EMOJIS.get('baby_purr', '😺')
-        return '🐾'
+        return _match_emoji_rules(item_lower, _PET_EMOJI_RULES) or '🐾'
 
     # Default fallback
     return '📦'
 
+
+@lru_cache(maxsize=256)
 def get_pet_emoji(pet_name: str) -> str:
     """Return the custom emoji for a pet name, with fallback."""
     pet_lower = pet_name.lower()
-    if 'fox' in pet_lower:
-        return CUSTOM_EMOJIS.get('baby_fox', '🦊')
-    elif 'tiger' in pet_lower:
-        return CUSTOM_EMOJIS.get('baby_tiger', '🐯')
-    elif 'purr' in pet_lower:
-        return CUSTOM_EMOJIS.get('baby_purr', '😺')
+    emoji = _match_emoji_rules(pet_lower, _PET_EMOJI_RULES)
+    if emoji:
+        return emoji
     # For future exclusive pet
-    elif 'lilia' in pet_lower or 'maid' in pet_lower:
+    if 'lilia' in pet_lower or 'maid' in pet_lower:
         return '✨'
     return '🐾'
 
+
+@lru_cache(maxsize=256)
+def get_material_emoji(material_name: str, default: str = '📦') -> str:
+    """Return the emoji for a potion or enhancement stone by name."""
+    return _match_emoji_rules(material_name.lower(), _MATERIAL_EMOJI_RULES) or default
+
 # 🔽 INSERT THE NEW HELPER HERE 🔽
 async def get_equipped_title_bonuses(user_id: str) -> dict:
     """Return a dict of stat bonuses from the user's equipped title."""
@@ -503,48 +561,6 @@ async def debug_log(self, message: str):
 
 
 
-SWORD_SKILLS = {
-    "Zenith Sword": {
-        "name": "Zenith Slash",
-        "desc": "A radiant slash that channels celestial energy to empower your next strikes.",
-        "effect": "20% chance to increase your ATK by 50% for 2 turns after attacking.",
-        "base": 3.0,
-        "increment": 0.25,
-        "max_level": 20
-    },
-    "Abyssal Blade": {
-        "name": "Abyssal Strike",
-        "desc": "A shadowy thrust that weakens armor and leaves a lingering darkness.",
-        "effect": "30% chance to reduce target's DEF by 15% for 3 turns.",
-        "base": 3.0,
-        "increment": 0.28,
-        "max_level": 20
-    },
-    "Dawn Breaker": {
-        "name": "Dawn's Wrath",
-        "desc": "A fiery overhead smash that ignites the target, dealing burn damage over time.",
-        "effect": "25% chance to burn target for 20% of damage dealt over 3 turns.",
-        "base": 3.0,
-        "increment": 0.22,
-        "max_level": 20
-    },
-    "Bloodmoon Edge": {
-        "name": "Bloodmoon Rend",
-        "desc": "A ferocious rending slash that causes deep, bleeding wounds.",
-        "effect": "Increases bleed chance by 15% and bleed damage by 25% for this attack.",
-        "base": 3.0,
-        "increment": 0.30,
-        "max_level": 20
-    },
-    "Shadowbane": {
-        "name": "Shadowbane",
-        "desc": "A precision strike that targets vital points, greatly increasing critical potential.",
-        "effect": "Doubles crit chance and adds 50% crit damage for this attack.",
-        "base": 3.0,
-        "increment": 0.26,
-        "max_level": 20
-    }
-}
 
 
 # --- Create the bot instance ---
@@ -672,6 +688,7 @@ async def add_new_arena_titles(ctx):
                 6, crit_resist, crit_dmg_res, crit_damage,  # dmg_reduction_percent is at position 10
                 mining, boss, extra_att, extra_plunder,
                 crit_chance)
+    await catalog.refresh('titles')
     await ctx.send("✅ Arena titles added with proper Crit RES and Crit DMG RES stats.")
 
 
@@ -748,6 +765,7 @@ async def update_arena_titles(ctx):
                 dodge, bleed, burn,
                 mining, boss, extra_att, extra_plunder,
                 crit_chance)
+    await catalog.refresh('titles')
     await ctx.send("✅ Arena titles updated to new stats.")
 
 @bot.command(name='checktitle')
@@ -827,6 +845,7 @@ async def delete_title(ctx, *, title_name: str):
             "DELETE FROM user_titles WHERE user_id = $1 AND title_id = $2",
             user_id, title['title_id']
         )
+        stat_cache.invalidate(user_id)
 
     await ctx.send(f"✅ Title '{title_name}' removed from your collection.")
 
@@ -1023,6 +1042,7 @@ async def set_potion_price(ctx, potion_name: str, new_price: int):
         if result == "UPDATE 0":
             await ctx.send("❌ Potion not found.")
         else:
+            await catalog.refresh('shop_items')
             await ctx.send(f"✅ Price of **{potion_name}** set to {new_price} gems per unit (×10 = {new_price*10} gems for a batch).")
 
 
@@ -1044,6 +1064,7 @@ async def fix_boss_reaper(ctx):
                 emoji = '<:boss_reaper:1483707209090334820>',
                 description = 'Earned by being the top damage dealer in the server boss. Lasts 24 hours.';
         """)
+    await catalog.refresh('titles')
     await ctx.send("✅ Boss Reaper title updated with correct stats and expiration description.")
 
 @bot.command()
@@ -1107,7 +1128,8 @@ async def fixguild(ctx):
             UPDATE shop_items SET guild_id = $1 
             WHERE type IN ('role', 'color') AND guild_id IS NULL
         """, guild_id)
-        await ctx.send(f"✅ Updated {result.split()[1]} items with guild_id {guild_id}.")
+    await catalog.refresh('shop_items')
+    await ctx.send(f"✅ Updated {result.split()[1]} items with guild_id {guild_id}.")
 
 @bot.command()
 async def checkmember(ctx, member: discord.Member):
@@ -1161,7 +1183,8 @@ async def fixoldguild(ctx, purchase_id: int, guild_id: int):
             return
         item_id = row['item_id']
         await conn.execute("UPDATE shop_items SET guild_id = $1 WHERE item_id = $2", guild_id, item_id)
-        await ctx.send(f"✅ Updated item {item_id} with guild_id {guild_id}.")
+    await catalog.refresh('shop_items')
+    await ctx.send(f"✅ Updated item {item_id} with guild_id {guild_id}.")
 @bot.command()
 @commands.has_permissions(administrator=True)
 async def wipe_old_weapons(ctx):
@@ -1190,6 +1213,7 @@ async def wipe_old_weapons(ctx):
                OR generated_name ILIKE '%legendary%'
         """)
         count = result.split()[1]
+        stat_cache.clear()
         await ctx.send(f"✅ Deleted **{count}** old rarity weapons.")
 
 @bot.command(name='skill')
@@ -1283,40 +1307,407 @@ async def upgrade_skill(ctx):
 
 
 # LOG TO DISCORD--------------
+class DiscordLogSink:
+    """Batches #bot-logs lines into one embed per flush interval.
+
+    The channel is resolved once and cached, lines below LOG_LEVEL are never
+    queued, and a full queue drops lines (they are already in stdout).
+    """
+
+    LEVELS = {"DEBUG": 10, "INFO": 20, "WARN": 30, "WARNING": 30, "ERROR": 40}
+    CHANNEL_NAME = "bot-logs"
+    MAX_DESCRIPTION = 4000
+    MISS_RETRY_SECONDS = 60
+
+    def __init__(self, min_level: str, flush_interval: float, max_queue: int):
+        self.min_level = self.LEVELS.get(min_level.upper(), 20)
+        self.flush_interval = flush_interval
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self._bot = None
+        self._channel_id: Optional[int] = None
+        self._last_miss = 0.0
+        self._pending: list = []     # lines taken off the queue but not sent yet
+        self._busy = False
+        self._stopping = False
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def emit(self, bot, message: str, level: str, tb: Optional[str] = None):
+        if self.LEVELS.get(level, 20) < self.min_level:
+            return
+        self._bot = bot
+        try:
+            self.queue.put_nowait((level, datetime.now(timezone.utc), message, tb))
+        except asyncio.QueueFull:
+            self.dropped += 1
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def _resolve_channel(self):
+        if self._channel_id is not None:
+            channel = self._bot.get_channel(self._channel_id)
+            if channel:
+                return channel
+            self._channel_id = None
+        if time.monotonic() - self._last_miss < self.MISS_RETRY_SECONDS:
+            return None
+        for guild in self._bot.guilds:
+            channel = discord.utils.get(guild.text_channels, name=self.CHANNEL_NAME)
+            if channel:
+                self._channel_id = channel.id
+                return channel
+        self._last_miss = time.monotonic()
+        return None
+
+    def _drain(self) -> list:
+        lines = []
+        while not self.queue.empty():
+            lines.append(self.queue.get_nowait())
+        return lines
+
+    def _build_embeds(self, lines: list) -> List[discord.Embed]:
+        chunks, current = [], ""
+        for level, ts, message, tb in lines:
+            line = f"`{ts:%H:%M:%S}` **{level}** {message[:1500]}"
+            if tb:
+                line += f"\n```py\n{tb[-800:]}\n```"
+            if current and len(current) + len(line) + 1 > self.MAX_DESCRIPTION:
+                chunks.append(current)
+                current = ""
+            current = f"{current}\n{line}" if current else line
+        if current:
+            chunks.append(current)
+
+        worst = max(lines, key=lambda l: self.LEVELS.get(l[0], 20))[0]
+        color = discord.Color.green() if self.LEVELS.get(worst, 20) <= 20 else discord.Color.red()
+        footer = f"{len(lines)} lines"
+        if self.dropped:
+            footer += f" · {self.dropped} dropped"
+            self.dropped = 0
+        embeds = []
+        for chunk in chunks:
+            embed = discord.Embed(
+                title=f"📋 Quiz Log – {worst}",
+                description=chunk,
+                color=color,
+                timestamp=datetime.now(timezone.utc)
+            )
+            embed.set_footer(text=footer)
+            embeds.append(embed)
+        return embeds
+
+    async def _send(self, lines: list):
+        channel = self._resolve_channel()
+        if not channel:
+            return
+        try:
+            for embed in self._build_embeds(lines):
+                await channel.send(embed=embed)
+        except Exception as e:
+            print(f"⚠️ Failed to send log to Discord: {e}")  # still visible in Railway logs
+
+    async def _run(self):
+        while not self._stopping:
+            self._pending.append(await self.queue.get())
+            self._busy = True
+            # Let the rest of this burst pile up, then ship it in one go
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._pending.extend(self._drain())
+            await self._send(self._pending)
+            self._pending = []
+            self._busy = False
+
+    async def flush(self):
+        """Send everything pending or queued (used on shutdown)."""
+        self._stopping = True
+        self._wake.set()
+        if self._task and not self._task.done():
+            if self._busy:
+                # Mid-batch: let the worker send what it holds
+                await self._task
+            else:
+                # Idle in queue.get(); it holds nothing, so cancelling loses nothing
+                self._task.cancel()
+                try:
+                    await self._task
+                except asyncio.CancelledError:
+                    pass
+        lines = self._pending + self._drain()
+        self._pending = []
+        if lines and self._bot:
+            await self._send(lines)
+
+
+log_sink = DiscordLogSink(LOG_LEVEL, LOG_FLUSH_SECONDS, LOG_QUEUE_SIZE)
+
+
 async def log_to_discord(bot, message, level="INFO", error=None):
-    """ALWAYS prints to Railway logs. Best‑effort send to #bot-logs."""
+    """ALWAYS prints to Railway logs. Best‑effort, batched send to #bot-logs."""
     # --- ALWAYS PRINT TO RAILWAY LOGS (you can see this in Railway dashboard) ---
     print(f"[{level}] {message}")
+    tb = None
     if error:
         tb = ''.join(traceback.format_exception(type(error), error, error.__traceback__))
         print(f"TRACEBACK:\n{tb}")
 
-    # --- Best‑effort Discord send – NEVER RAISES ---
+    # --- Queued for the sink – NEVER RAISES, never waits on Discord ---
     try:
-        for guild in bot.guilds:
-            channel = discord.utils.get(guild.text_channels, name="bot-logs")
-            if channel:
-                embed = discord.Embed(
-                    title=f"📋 Quiz Log – {level}",
-                    description=message[:2000],
-                    color=discord.Color.green() if level == "INFO" else discord.Color.red(),
-                    timestamp=datetime.now(timezone.utc)
-                )
-                if error:
-                    embed.add_field(name="Traceback", value=f"```py\n{tb[-1000:]}\n```", inline=False)
-                await channel.send(embed=embed)
-                return
+        log_sink.emit(bot, str(message), level, tb)
     except Exception as e:
-        print(f"⚠️ Failed to send log to Discord: {e}")  # still visible in Railway logs
+        print(f"⚠️ Failed to queue log for Discord: {e}")
 
 # END LOG TO DC CODE-----------
 
 
 # === DATABASE SYSTEM (PostgreSQL ONLY) ===
+# ========== DATABASE METRICS ==========
+class LatencyHistogram:
+    """Fixed-bucket latency histogram in milliseconds."""
+
+    BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float('inf'))
+
+    def __init__(self):
+        self.counts = [0] * len(self.BUCKETS_MS)
+        self.count = 0
+        self.total_ms = 0.0
+
+    def observe(self, ms: float):
+        for i, bound in enumerate(self.BUCKETS_MS):
+            if ms <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.total_ms += ms
+
+    def percentile(self, pct: float) -> float:
+        """Upper bucket bound containing the given percentile."""
+        if not self.count:
+            return 0.0
+        target = self.count * pct / 100
+        running = 0
+        for bound, n in zip(self.BUCKETS_MS, self.counts):
+            running += n
+            if running >= target:
+                return bound
+        return self.BUCKETS_MS[-1]
+
+
+class DBMetrics:
+    """Pool-wait and query latency histograms keyed by call site."""
+
+    def __init__(self):
+        self.pool_wait: Dict[str, LatencyHistogram] = {}
+        self.query: Dict[str, LatencyHistogram] = {}
+
+    @staticmethod
+    def call_site(depth: int = 2) -> str:
+        frame = sys._getframe(depth)
+        return getattr(frame.f_code, 'co_qualname', frame.f_code.co_name)
+
+    def observe(self, table: Dict[str, LatencyHistogram], site: str, ms: float):
+        hist = table.get(site)
+        if hist is None:
+            hist = table[site] = LatencyHistogram()
+        hist.observe(ms)
+
+    def reset(self):
+        self.pool_wait.clear()
+        self.query.clear()
+
+
+db_metrics = DBMetrics()
+
+
+class InstrumentedConnection:
+    """Connection proxy that times queries against the acquiring call site."""
+
+    TIMED = ('fetch', 'fetchrow', 'fetchval', 'execute', 'executemany', 'copy_records_to_table')
+
+    def __init__(self, conn, site: str):
+        self._conn = conn
+        self._site = site
+
+    def __getattr__(self, name):
+        attr = getattr(self._conn, name)
+        if name not in self.TIMED:
+            return attr
+
+        async def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await attr(*args, **kwargs)
+            finally:
+                db_metrics.observe(db_metrics.query, self._site, (time.perf_counter() - started) * 1000)
+        return timed
+
+
+class _InstrumentedAcquire:
+    def __init__(self, pool, site: str):
+        self._ctx = pool.acquire()
+        self._site = site
+
+    async def __aenter__(self):
+        started = time.perf_counter()
+        conn = await self._ctx.__aenter__()
+        db_metrics.observe(db_metrics.pool_wait, self._site, (time.perf_counter() - started) * 1000)
+        return InstrumentedConnection(conn, self._site)
+
+    async def __aexit__(self, *exc):
+        return await self._ctx.__aexit__(*exc)
+
+
+class InstrumentedPool:
+    """asyncpg pool proxy recording pool-wait time per call site."""
+
+    def __init__(self, pool):
+        self._pool = pool
+
+    def acquire(self):
+        return _InstrumentedAcquire(self._pool, DBMetrics.call_site())
+
+    def __getattr__(self, name):
+        return getattr(self._pool, name)
+
+
+class LedgerWriter:
+    """Write-behind buffer for user_transactions, flushed with COPY."""
+
+    COLUMNS = ['user_id', 'timestamp', 'type', 'gems', 'reason', 'balance_after']
+    INSERT_SQL = '''
+        INSERT INTO user_transactions (user_id, timestamp, type, gems, reason, balance_after)
+        VALUES ($1, $2, $3, $4, $5, $6)
+    '''
+
+    def __init__(self, database, mode: str = LEDGER_MODE, flush_ms: int = LEDGER_FLUSH_MS,
+                 batch_rows: int = LEDGER_BATCH_ROWS, queue_size: int = LEDGER_QUEUE_SIZE,
+                 max_retries: int = LEDGER_MAX_RETRIES):
+        self.db = database
+        self.enabled = mode == 'async'
+        self.flush_interval = flush_ms / 1000
+        self.batch_rows = batch_rows
+        self.max_retries = max_retries
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._flush_now = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._retry: List[tuple] = []
+        self._failures = 0
+        self.dropped = 0
+        self._stopping = False
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self.enabled and (self._task is None or self._task.done()):
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+            print(f"📒 Ledger writer started (flush every {int(self.flush_interval * 1000)}ms / {self.batch_rows} rows)")
+
+    async def record(self, user_id: str, tx_type: str, gems: int, reason: str, balance_after: int, conn=None):
+        """Queue one transaction row without waiting.
+
+        If the queue is full the row is inserted on the caller's `conn`; a
+        caller without one gets the row dropped and counted rather than
+        taking a second pool connection under load.
+        """
+        row = (user_id, datetime.utcnow(), tx_type, gems, reason, balance_after)
+        try:
+            self._queue.put_nowait(row)
+        except asyncio.QueueFull:
+            if conn is not None:
+                await self._insert_rows(conn, [row])
+            else:
+                self.dropped += 1
+                print(f"❌ Ledger queue full, row dropped ({self.dropped} so far): {row}")
+            return
+        if self._queue.qsize() >= self.batch_rows:
+            self._flush_now.set()
+
+    async def _insert_rows(self, conn, rows: List[tuple]):
+        """Insert rows one at a time on `conn`; any row that fails is logged, counted and dropped."""
+        for row in rows:
+            try:
+                await conn.execute(self.INSERT_SQL, *row)
+            except Exception as e:
+                self.dropped += 1
+                print(f"❌ Ledger row dropped {row}: {e}")
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_now.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Copy everything queued so far into user_transactions."""
+        async with self._lock:
+            while self._retry or not self._queue.empty():
+                batch = self._retry
+                self._retry = []
+                while len(batch) < self.batch_rows and not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                try:
+                    async with self.db.pool.acquire() as conn:
+                        await conn.copy_records_to_table('user_transactions', records=batch, columns=self.COLUMNS)
+                    self._failures = 0
+                except asyncio.CancelledError:
+                    # The batch only lives here; keep it for the next flush
+                    self._retry = batch
+                    raise
+                except Exception as e:
+                    self._failures += 1
+                    print(f"❌ Ledger flush failed ({len(batch)} rows, attempt {self._failures}): {e}")
+                    # Bad data (e.g. an FK violation) fails the same way every time;
+                    # isolate the offending rows instead of retrying the batch forever.
+                    permanent = (asyncpg.exceptions.DataError, asyncpg.exceptions.IntegrityConstraintViolationError)
+                    if isinstance(e, permanent) or self._failures >= self.max_retries:
+                        self._failures = 0
+                        async with self.db.pool.acquire() as conn:
+                            await self._insert_rows(conn, batch)
+                        continue
+                    # Keep the rows for the next attempt
+                    self._retry = batch
+                    return
+
+    async def close(self):
+        """Let the background task finish its current flush, then flush whatever is left."""
+        if self._task:
+            self._stopping = True
+            self._flush_now.set()
+            await self._task
+            self._task = None
+        if self.enabled:
+            await self.flush()
+
+
 class DatabaseSystem:
+    # Connection strategies – try SSL first, then fallback to no SSL, and finally skip verification
+    STRATEGIES = [
+        ("Standard SSL (verify)", {'ssl': 'require', 'command_timeout': 30}),
+        ("SSL without verification", {'ssl': {'sslrootcert': None, 'sslmode': 'require'}, 'command_timeout': 30}),
+        ("No SSL", {'ssl': None, 'command_timeout': 30}),
+        ("No SSL, longer timeout", {'ssl': None, 'command_timeout': 60}),
+        ("No extra args", {}),
+    ]
+
     def __init__(self):
         self.pool = None
         self.using_database = False
+        self.ledger = LedgerWriter(self)
+        self._strategy = None
+
+    async def warm_pool(self):
+        """Open min_size connections up front so the first interactions don't pay for it."""
+        async def ping():
+            async with self.pool.acquire() as conn:
+                await conn.fetchval('SELECT 1')
+        await asyncio.gather(*(ping() for _ in range(DB_POOL_MIN_SIZE)))
+        print(f"🔥 Pool warmed: {self.pool.get_size()} connections (max {DB_POOL_MAX_SIZE})")
 
     async def smart_connect(self):
         """Connect to PostgreSQL with fallback strategies, including skipping SSL verification."""
@@ -1328,722 +1719,850 @@ class DatabaseSystem:
 
         print("\n🔌 Attempting database connection...")
 
-        # Connection strategies – try SSL first, then fallback to no SSL, and finally skip verification
-        connection_strategies = [
-            ("Standard SSL (verify)", {'ssl': 'require', 'command_timeout': 30}),
-            ("SSL without verification", {'ssl': {'sslrootcert': None, 'sslmode': 'require'}, 'command_timeout': 30}),
-            ("No SSL", {'ssl': None, 'command_timeout': 30}),
-            ("No SSL, longer timeout", {'ssl': None, 'command_timeout': 60}),
-            ("No extra args", {}),
-        ]
+        connection_strategies = list(self.STRATEGIES)
+
+        # Try the strategy that worked last time first (matters on reconnect)
+        if self._strategy is not None:
+            connection_strategies.insert(0, connection_strategies.pop(self._strategy))
 
         for strategy_name, strategy_args in connection_strategies:
             print(f"  Trying: {strategy_name}...")
             try:
-                self.pool = await asyncpg.create_pool(
+                raw_pool = await asyncpg.create_pool(
                     DATABASE_URL,
-                    min_size=1,
-                    max_size=5,
+                    min_size=DB_POOL_MIN_SIZE,
+                    max_size=DB_POOL_MAX_SIZE,
+                    max_inactive_connection_lifetime=DB_POOL_MAX_INACTIVE,
+                    statement_cache_size=DB_STATEMENT_CACHE_SIZE,
                     **strategy_args
                 )
+                self.pool = InstrumentedPool(raw_pool)
                 bot.db_pool = self.pool
 
                 async with self.pool.acquire() as conn:
                     result = await conn.fetchval('SELECT 1')
                     print(f"    ✅ Connection test: {result}")
+                    await self.run_migrations(conn)
 
+                await self.warm_pool()
+                self._strategy = [name for name, _ in self.STRATEGIES].index(strategy_name)
+                self.using_database = True
+                self.ledger.start()
+                print(f"🎉 Success with: {strategy_name}")
+                print("✅ Database connected and ready!")
+                return True
 
-                    # ========== CORE TABLES ==========
-                    await conn.execute('''
-                        CREATE TABLE IF NOT EXISTS user_gems (
-                            user_id TEXT PRIMARY KEY,
-                            gems INTEGER DEFAULT 0,
-                            total_earned INTEGER DEFAULT 0,
-                            daily_streak INTEGER DEFAULT 0,
-                            last_daily TIMESTAMP,
-                            created_at TIMESTAMP DEFAULT NOW(),
-                            updated_at TIMESTAMP DEFAULT NOW()
-                        )
-                    ''')
-
-                    await conn.execute('''
-                        CREATE TABLE IF NOT EXISTS user_transactions (
-                            id SERIAL PRIMARY KEY,
-                            user_id TEXT NOT NULL,
-                            timestamp TIMESTAMP DEFAULT NOW(),
-                            type VARCHAR(20),
-                            gems INTEGER,
-                            reason TEXT,
-                            balance_after INTEGER,
-                            FOREIGN KEY (user_id) REFERENCES user_gems(user_id) ON DELETE CASCADE
-                        )
-                    ''')
+            except Exception as e:
+                print(f"    ❌ Failed: {type(e).__name__}: {e}")
+                import traceback
+                traceback.print_exc()
+                if self.pool:
+                    await self.pool.close()
+                    self.pool = None
+                continue
 
-                    # ========== FORTUNE BAG TABLES ==========
-                    await conn.execute('''
-                        CREATE TABLE IF NOT EXISTS fortune_bags (
-                            message_id BIGINT PRIMARY KEY,
-                            channel_id BIGINT NOT NULL,
-                            remaining INTEGER NOT NULL,
-                            total INTEGER NOT NULL DEFAULT 1000,
-                            dropper_id BIGINT NOT NULL,
-                            active BOOLEAN NOT NULL DEFAULT TRUE
-                        )
-                    ''')
+        raise ConnectionError("All connection strategies failed. Could not connect to PostgreSQL.")
 
-                    await conn.execute('''
-                        CREATE TABLE IF NOT EXISTS fortune_bag_participants (
-                            message_id BIGINT REFERENCES fortune_bags(message_id) ON DELETE CASCADE,
-                            user_id BIGINT NOT NULL,
-                            earned INTEGER NOT NULL,
-                            PRIMARY KEY (message_id, user_id)
-                        )
-                    ''')
 
-                    # ========== SHOP SYSTEM TABLES ==========
-                    await conn.execute('''
-                        CREATE TABLE IF NOT EXISTS shop_items (
-                            item_id SERIAL PRIMARY KEY,
-                            name TEXT NOT NULL,
-                            description TEXT,
-                            price INTEGER NOT NULL CHECK (price > 0),
-                            type TEXT NOT NULL,
-                            role_id BIGINT,
-                            color_hex TEXT,
-                            guild_id BIGINT,
-                            image_url TEXT,
-                            created_at TIMESTAMP DEFAULT NOW(),
-                            updated_at TIMESTAMP DEFAULT NOW()
-                        )
-                    ''')
+    # ========== SCHEMA MIGRATIONS ==========
+    # Ordered (version, name, method) steps. Only steps newer than the highest
+    # row in schema_version run, so an up-to-date boot costs a single query.
+    # Append new steps at the end; never edit or renumber an applied one.
+    MIGRATIONS = [
+        (1, "baseline schema", "_migration_001_baseline"),
+        (2, "title crit columns", "_migration_002_title_crit_columns"),
+        (3, "inventory keyset indexes and counts", "_migration_003_inventory_pages"),
+        (4, "leaderboard indexes", "_migration_004_leaderboard_indexes"),
+    ]
+    MIGRATION_LOCK_ID = 7_310_001
 
-                    await conn.execute('''
-                        CREATE TABLE IF NOT EXISTS user_purchases (
-                            purchase_id SERIAL PRIMARY KEY,
-                            user_id TEXT NOT NULL,
-                            item_id INTEGER REFERENCES shop_items(item_id) ON DELETE CASCADE,
-                            price_paid INTEGER NOT NULL,
-                            purchased_at TIMESTAMP DEFAULT NOW(),
-                            expires_at TIMESTAMPTZ,
-                            used BOOLEAN DEFAULT FALSE
-                        )
-                    ''')
+    async def run_migrations(self, conn):
+        """Apply pending schema migrations in order."""
+        try:
+            current = await conn.fetchval('SELECT COALESCE(MAX(version), 0) FROM schema_version')
+        except asyncpg.exceptions.UndefinedTableError:
+            await conn.execute('''
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    applied_at TIMESTAMPTZ DEFAULT NOW()
+                )
+            ''')
+            current = 0
 
-                    await conn.execute('''
-                        CREATE TABLE IF NOT EXISTS shop_messages (
-                            guild_id BIGINT PRIMARY KEY,
-                            channel_id BIGINT NOT NULL,
-                            message_id BIGINT NOT NULL
-                        )
-                    ''')
+        pending = [m for m in self.MIGRATIONS if m[0] > current]
+        if not pending:
+            print(f"    ✅ Schema up to date (v{current})")
+            return
 
-                    await conn.execute('''
-                        CREATE TABLE IF NOT EXISTS carriage_bookings (
-                            booking_id SERIAL PRIMARY KEY,
-                            user_id TEXT NOT NULL,
-                            ign TEXT NOT NULL,
-                            ride_time TIMESTAMP NOT NULL,
-                            booked_at TIMESTAMP DEFAULT NOW(),
-                            purchase_id INTEGER REFERENCES user_purchases(purchase_id) ON DELETE CASCADE
-                        )
-                    ''')
+        for version, name, method in pending:
+            async with conn.transaction():
+                # Serialise concurrent boots; re-check once we hold the lock
+                await conn.execute('SELECT pg_advisory_xact_lock($1)', self.MIGRATION_LOCK_ID)
+                if await conn.fetchval('SELECT 1 FROM schema_version WHERE version = $1', version):
+                    continue
+                print(f"    🧱 Applying migration {version}: {name}")
+                await getattr(self, method)(conn)
+                await conn.execute('INSERT INTO schema_version (version, name) VALUES ($1, $2)', version, name)
+        print(f"    ✅ Schema migrated to v{pending[-1][0]}")
+
+    async def _migration_001_baseline(self, conn):
+        """Every table, column, seed and index the bot used to create on each boot."""
+        # ========== CORE TABLES ==========
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS user_gems (
+                user_id TEXT PRIMARY KEY,
+                gems INTEGER DEFAULT 0,
+                total_earned INTEGER DEFAULT 0,
+                daily_streak INTEGER DEFAULT 0,
+                last_daily TIMESTAMP,
+                created_at TIMESTAMP DEFAULT NOW(),
+                updated_at TIMESTAMP DEFAULT NOW()
+            )
+        ''')
+
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS user_transactions (
+                id SERIAL PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                timestamp TIMESTAMP DEFAULT NOW(),
+                type VARCHAR(20),
+                gems INTEGER,
+                reason TEXT,
+                balance_after INTEGER,
+                FOREIGN KEY (user_id) REFERENCES user_gems(user_id) ON DELETE CASCADE
+            )
+        ''')
+
+        # ========== FORTUNE BAG TABLES ==========
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS fortune_bags (
+                message_id BIGINT PRIMARY KEY,
+                channel_id BIGINT NOT NULL,
+                remaining INTEGER NOT NULL,
+                total INTEGER NOT NULL DEFAULT 1000,
+                dropper_id BIGINT NOT NULL,
+                active BOOLEAN NOT NULL DEFAULT TRUE
+            )
+        ''')
+
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS fortune_bag_participants (
+                message_id BIGINT REFERENCES fortune_bags(message_id) ON DELETE CASCADE,
+                user_id BIGINT NOT NULL,
+                earned INTEGER NOT NULL,
+                PRIMARY KEY (message_id, user_id)
+            )
+        ''')
+
+        # ========== SHOP SYSTEM TABLES ==========
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS shop_items (
+                item_id SERIAL PRIMARY KEY,
+                name TEXT NOT NULL,
+                description TEXT,
+                price INTEGER NOT NULL CHECK (price > 0),
+                type TEXT NOT NULL,
+                role_id BIGINT,
+                color_hex TEXT,
+                guild_id BIGINT,
+                image_url TEXT,
+                created_at TIMESTAMP DEFAULT NOW(),
+                updated_at TIMESTAMP DEFAULT NOW()
+            )
+        ''')
+
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS user_purchases (
+                purchase_id SERIAL PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                item_id INTEGER REFERENCES shop_items(item_id) ON DELETE CASCADE,
+                price_paid INTEGER NOT NULL,
+                purchased_at TIMESTAMP DEFAULT NOW(),
+                expires_at TIMESTAMPTZ,
+                used BOOLEAN DEFAULT FALSE
+            )
+        ''')
 
-                    # ========== WEAPON SYSTEM TABLES ==========
-                    await conn.execute('''
-                        CREATE TABLE IF NOT EXISTS weapon_types (
-                            type_id SERIAL PRIMARY KEY,
-                            name_base TEXT NOT NULL
-                        )
-                    ''')
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS shop_messages (
+                guild_id BIGINT PRIMARY KEY,
+                channel_id BIGINT NOT NULL,
+                message_id BIGINT NOT NULL
+            )
+        ''')
+
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS carriage_bookings (
+                booking_id SERIAL PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                ign TEXT NOT NULL,
+                ride_time TIMESTAMP NOT NULL,
+                booked_at TIMESTAMP DEFAULT NOW(),
+                purchase_id INTEGER REFERENCES user_purchases(purchase_id) ON DELETE CASCADE
+            )
+        ''')
 
-                    await conn.execute('''
-                        CREATE TABLE IF NOT EXISTS rarities (
-                            rarity_id SERIAL PRIMARY KEY,
-                            name TEXT NOT NULL UNIQUE,
-                            color INTEGER,
-                            display_order INTEGER DEFAULT 0
-                        )
-                    ''')
+        # ========== WEAPON SYSTEM TABLES ==========
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS weapon_types (
+                type_id SERIAL PRIMARY KEY,
+                name_base TEXT NOT NULL
+            )
+        ''')
+
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS rarities (
+                rarity_id SERIAL PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE,
+                color INTEGER,
+                display_order INTEGER DEFAULT 0
+            )
+        ''')
+
+        await conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS rarities_name_key ON rarities (name);')
+
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS weapon_variants (
+                variant_id SERIAL PRIMARY KEY,
+                type_id INTEGER NOT NULL REFERENCES weapon_types(type_id) ON DELETE CASCADE,
+                rarity_id INTEGER NOT NULL REFERENCES rarities(rarity_id) ON DELETE CASCADE,
+                min_attack INTEGER NOT NULL,
+                max_attack INTEGER NOT NULL,
+                image_url TEXT,
+                UNIQUE(type_id, rarity_id)
+            )
+        ''')
+
+        # ========== USER WEAPONS ==========
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS user_weapons (
+                id SERIAL PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                weapon_item_id INTEGER REFERENCES shop_items(item_id) ON DELETE CASCADE,
+                attack INTEGER NOT NULL,
+                purchase_id INTEGER REFERENCES user_purchases(purchase_id) ON DELETE SET NULL,
+                generated_name TEXT,
+                image_url TEXT,
+                variant_id INTEGER REFERENCES weapon_variants(variant_id) ON DELETE SET NULL,
+                description TEXT,
+                equipped BOOLEAN DEFAULT FALSE,
+                purchased_at TIMESTAMP DEFAULT NOW()
+            )
+        ''')
+
+        # ========== ARMOR SYSTEM TABLES ==========
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS armor_types (
+                armor_id SERIAL PRIMARY KEY,
+                name TEXT NOT NULL,
+                slot TEXT NOT NULL CHECK (slot IN ('helm', 'suit', 'gauntlets', 'boots')),
+                defense INTEGER NOT NULL DEFAULT 0,
+                rarity_id INTEGER REFERENCES rarities(rarity_id) ON DELETE SET NULL,
+                image_url TEXT,
+                description TEXT,
+                created_at TIMESTAMP DEFAULT NOW()
+            )
+        ''')
+
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS user_armor (
+                id SERIAL PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                armor_id INTEGER REFERENCES armor_types(armor_id) ON DELETE CASCADE,
+                defense INTEGER NOT NULL,
+                equipped BOOLEAN DEFAULT FALSE,
+                purchased_at TIMESTAMP DEFAULT NOW(),
+                FOREIGN KEY (user_id) REFERENCES user_gems(user_id) ON DELETE CASCADE
+            )
+        ''')
+
+        # ========== ACCESSORY SYSTEM TABLES ==========
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS accessory_types (
+                accessory_id SERIAL PRIMARY KEY,
+                name TEXT NOT NULL,
+                slot TEXT NOT NULL CHECK (slot IN ('ring', 'pendant', 'earring')),
+                bonus_stat TEXT NOT NULL CHECK (bonus_stat IN ('atk', 'def', 'hp', 'energy')),
+                bonus_value INTEGER NOT NULL DEFAULT 0,
+                rarity_id INTEGER REFERENCES rarities(rarity_id) ON DELETE SET NULL,
+                image_url TEXT,
+                description TEXT,
+                created_at TIMESTAMP DEFAULT NOW()
+            )
+        ''')
+
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS user_accessories (
+                id SERIAL PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                accessory_id INTEGER REFERENCES accessory_types(accessory_id) ON DELETE CASCADE,
+                bonus_value INTEGER NOT NULL,
+                equipped BOOLEAN DEFAULT FALSE,
+                slot TEXT NOT NULL CHECK (slot IN ('ring1', 'ring2', 'pendant', 'earring1', 'earring2')),
+                purchased_at TIMESTAMP DEFAULT NOW(),
+                FOREIGN KEY (user_id) REFERENCES user_gems(user_id) ON DELETE CASCADE,
+                UNIQUE(user_id, slot)
+            )
+        ''')
+
+        # ========== PET SYSTEM TABLES ==========
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS pet_types (
+                pet_id SERIAL PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE,
+                bonus_stat TEXT CHECK (bonus_stat IN ('atk', 'def', 'hp', 'energy')),
+                bonus_value INTEGER DEFAULT 0,
+                image_url TEXT,
+                description TEXT,
+                -- New columns for pet bonuses
+                atk_percent INT DEFAULT 0,
+                def_percent INT DEFAULT 0,
+                hp_percent INT DEFAULT 0,
+                dodge_percent INT DEFAULT 0,
+                bleed_flat INT DEFAULT 0,
+                burn_flat INT DEFAULT 0,
+                energy_bonus INT DEFAULT 0
+            )
+        ''')
+        await conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS pet_types_name_key ON pet_types (name);')
+
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS user_pets (
+                id SERIAL PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                pet_id INTEGER REFERENCES pet_types(pet_id) ON DELETE CASCADE,
+                equipped BOOLEAN DEFAULT FALSE,
+                purchased_at TIMESTAMP DEFAULT NOW(),
+                FOREIGN KEY (user_id) REFERENCES user_gems(user_id) ON DELETE CASCADE
+            )
+        ''')
+        # ========== PET BONUS COLUMNS (ensure they exist) ==========
+        # (These are safe even if already added by the CREATE TABLE)                   
+        await conn.execute('ALTER TABLE pet_types ADD COLUMN IF NOT EXISTS atk_percent INT DEFAULT 0;')
+        await conn.execute('ALTER TABLE pet_types ADD COLUMN IF NOT EXISTS def_percent INT DEFAULT 0;')
+        await conn.execute('ALTER TABLE pet_types ADD COLUMN IF NOT EXISTS hp_percent INT DEFAULT 0;')
+        await conn.execute('ALTER TABLE pet_types ADD COLUMN IF NOT EXISTS dodge_percent INT DEFAULT 0;')
+        await conn.execute('ALTER TABLE pet_types ADD COLUMN IF NOT EXISTS bleed_flat INT DEFAULT 0;')
+        await conn.execute('ALTER TABLE pet_types ADD COLUMN IF NOT EXISTS burn_flat INT DEFAULT 0;')
+        await conn.execute('ALTER TABLE pet_types ADD COLUMN IF NOT EXISTS energy_bonus INT DEFAULT 0;')
+
+        # ========== SEED PETS ==========
+        await conn.execute("""
+            INSERT INTO pet_types (name, atk_percent, def_percent, hp_percent, dodge_percent, bleed_flat, burn_flat, energy_bonus, description) VALUES
+            ('Baby Fox', 5, 15, 30, 8, 0, 0, 1, 'A cunning fox that boosts your stats and grants dodge chance.'),
+            ('Baby Tiger', 5, 15, 30, 0, 1000, 0, 1, 'A fierce tiger that enhances your bleed damage.'),
+            ('Baby Purr', 5, 15, 30, 0, 0, 1000, 1, 'A mystical cat that adds burn damage to your attacks.')
+            ON CONFLICT (name) DO NOTHING;
+        """)
+        # ========== TITLE SYSTEM TABLES ==========
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS titles (
+                title_id SERIAL PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE,
+                emoji TEXT,
+                description TEXT,
+                hp_percent INT DEFAULT 0,
+                def_percent INT DEFAULT 0,
+                atk_percent INT DEFAULT 0,
+                crit_chance INT DEFAULT 0,
+                dodge_percent INT DEFAULT 0,
+                dmg_reduction_percent INT DEFAULT 0,
+                bleed_flat INT DEFAULT 0,
+                burn_flat INT DEFAULT 0,
+                crit_dmg_res_percent INT DEFAULT 0,
+                mining_bonus_percent INT DEFAULT 0,
+                boss_damage_percent INT DEFAULT 0,
+                extra_boss_attempts INT DEFAULT 0,
+                extra_plunder_attempts INT DEFAULT 0
+            )
+        ''')
+
+        # Add columns if they don't exist (for existing tables)
+        await conn.execute('ALTER TABLE titles ADD COLUMN IF NOT EXISTS hp_percent INT DEFAULT 0;')
+        await conn.execute('ALTER TABLE titles ADD COLUMN IF NOT EXISTS def_percent INT DEFAULT 0;')
+        await conn.execute('ALTER TABLE titles ADD COLUMN IF NOT EXISTS atk_percent INT DEFAULT 0;')
+        await conn.execute('ALTER TABLE titles ADD COLUMN IF NOT EXISTS crit_chance INT DEFAULT 0;')
+        await conn.execute('ALTER TABLE titles ADD COLUMN IF NOT EXISTS dodge_percent INT DEFAULT 0;')
+        await conn.execute('ALTER TABLE titles ADD COLUMN IF NOT EXISTS dmg_reduction_percent INT DEFAULT 0;')
+        await conn.execute('ALTER TABLE titles ADD COLUMN IF NOT EXISTS bleed_flat INT DEFAULT 0;')
+        await conn.execute('ALTER TABLE titles ADD COLUMN IF NOT EXISTS burn_flat INT DEFAULT 0;')
+        await conn.execute('ALTER TABLE titles ADD COLUMN IF NOT EXISTS crit_dmg_res_percent INT DEFAULT 0;')
+        await conn.execute('ALTER TABLE titles ADD COLUMN IF NOT EXISTS mining_bonus_percent INT DEFAULT 0;')
+        await conn.execute('ALTER TABLE titles ADD COLUMN IF NOT EXISTS boss_damage_percent INT DEFAULT 0;')
+        await conn.execute('ALTER TABLE titles ADD COLUMN IF NOT EXISTS extra_boss_attempts INT DEFAULT 0;')
+        await conn.execute('ALTER TABLE titles ADD COLUMN IF NOT EXISTS extra_plunder_attempts INT DEFAULT 0;')
+
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS user_titles (
+                user_id TEXT NOT NULL REFERENCES user_gems(user_id) ON DELETE CASCADE,
+                title_id INTEGER NOT NULL REFERENCES titles(title_id) ON DELETE CASCADE,
+                equipped BOOLEAN DEFAULT FALSE,
+                obtained_at TIMESTAMP DEFAULT NOW(),
+                PRIMARY KEY (user_id, title_id)
+            )
+        ''')
+        # Ensure only one equipped title per user
+        await conn.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_user_titles_equipped
+            ON user_titles (user_id) WHERE equipped = TRUE;
+        ''')
+        await conn.execute('ALTER TABLE user_titles ADD COLUMN IF NOT EXISTS expires_at TIMESTAMPTZ;')
+        await conn.execute('CREATE INDEX IF NOT EXISTS idx_user_titles_expires ON user_titles (expires_at);')
+
+        # ========== ARENA SYSTEM TABLES ==========
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS arena_stats (
+                user_id TEXT PRIMARY KEY REFERENCES user_gems(user_id) ON DELETE CASCADE,
+                points INTEGER DEFAULT 1000,
+                wins INTEGER DEFAULT 0,
+                losses INTEGER DEFAULT 0,
+                last_match TIMESTAMP
+            )
+        ''')
 
-                    await conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS rarities_name_key ON rarities (name);')
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS arena_queue (
+                user_id TEXT PRIMARY KEY REFERENCES arena_stats(user_id) ON DELETE CASCADE,
+                queued_at TIMESTAMP DEFAULT NOW()
+            )
+        ''')
 
-                    await conn.execute('''
-                        CREATE TABLE IF NOT EXISTS weapon_variants (
-                            variant_id SERIAL PRIMARY KEY,
-                            type_id INTEGER NOT NULL REFERENCES weapon_types(type_id) ON DELETE CASCADE,
-                            rarity_id INTEGER NOT NULL REFERENCES rarities(rarity_id) ON DELETE CASCADE,
-                            min_attack INTEGER NOT NULL,
-                            max_attack INTEGER NOT NULL,
-                            image_url TEXT,
-                            UNIQUE(type_id, rarity_id)
-                        )
-                    ''')
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS arena_config (
+                guild_id BIGINT PRIMARY KEY,
+                channel_id BIGINT NOT NULL,
+                message_id BIGINT
+            )
+        ''')
+        # ========== ARENA RESET LOG ==========
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS arena_reset_log (
+                id INTEGER PRIMARY KEY DEFAULT 1,
+                last_reset TIMESTAMP NOT NULL DEFAULT NOW()
+            )
+        ''')
+        # Ensure there's always one row
+        await conn.execute('''
+            INSERT INTO arena_reset_log (id, last_reset) VALUES (1, NOW())
+            ON CONFLICT (id) DO NOTHING
+        ''')
+
+        # ========== PLAYER STATS ==========
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS player_stats (
+                user_id TEXT PRIMARY KEY REFERENCES user_gems(user_id) ON DELETE CASCADE,
+                hp INTEGER NOT NULL DEFAULT 1000,
+                max_hp INTEGER NOT NULL DEFAULT 1000,
+                energy INTEGER NOT NULL DEFAULT 3,
+                max_energy INTEGER NOT NULL DEFAULT 3,
+                last_energy_regen TIMESTAMP DEFAULT NOW(),
+                mining_start TIMESTAMP,
+                mining_message_id BIGINT,
+                mining_channel_id BIGINT,
+                pending_reward INTEGER DEFAULT 0,
+                stolen_gems INTEGER DEFAULT 0,
+                plunder_count INTEGER DEFAULT 0,
+                last_plunder_reset DATE DEFAULT CURRENT_DATE,
+                has_pickaxe BOOLEAN DEFAULT FALSE
+            )
+        ''')
+
+        # ========== MINING CONFIG ==========
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS mining_config (
+                guild_id BIGINT PRIMARY KEY,
+                channel_id BIGINT NOT NULL,
+                message_id BIGINT
+            )
+        ''')
+
+        # ========== ATTACK LOGS ==========
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS attack_logs (
+                id SERIAL PRIMARY KEY,
+                attacker_id TEXT NOT NULL,
+                defender_id TEXT NOT NULL,
+                timestamp TIMESTAMP DEFAULT NOW(),
+                damage INTEGER,
+                attacker_weapon TEXT,
+                defender_hp_left INTEGER
+            )
+        ''')
+
+        # ========== NEW SET BONUSES TABLE ==========
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS user_set_bonuses (
+                user_id TEXT NOT NULL,
+                set_name TEXT NOT NULL,
+                set_type TEXT NOT NULL CHECK (set_type IN ('armor', 'accessory')),
+                pieces_owned INTEGER DEFAULT 0,
+                pieces_equipped INTEGER DEFAULT 0,
+                bonus_active BOOLEAN DEFAULT FALSE,
+                activated_at TIMESTAMP,
+                PRIMARY KEY (user_id, set_name, set_type),
+                FOREIGN KEY (user_id) REFERENCES user_gems(user_id) ON DELETE CASCADE
+            )
+        ''')
+        # ========== TRADE SYSTEM TABLES ==========
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS active_trades (
+                trade_id SERIAL PRIMARY KEY,
+                initiator_id TEXT NOT NULL,
+                receiver_id TEXT NOT NULL,
+                channel_id BIGINT NOT NULL,
+                message_id BIGINT,
+                initiator_lock BOOLEAN DEFAULT FALSE,
+                receiver_lock BOOLEAN DEFAULT FALSE,
+                status TEXT DEFAULT 'pending'
+            )
+        ''')
 
-                    # ========== USER WEAPONS ==========
-                    await conn.execute('''
-                        CREATE TABLE IF NOT EXISTS user_weapons (
-                            id SERIAL PRIMARY KEY,
-                            user_id TEXT NOT NULL,
-                            weapon_item_id INTEGER REFERENCES shop_items(item_id) ON DELETE CASCADE,
-                            attack INTEGER NOT NULL,
-                            purchase_id INTEGER REFERENCES user_purchases(purchase_id) ON DELETE SET NULL,
-                            generated_name TEXT,
-                            image_url TEXT,
-                            variant_id INTEGER REFERENCES weapon_variants(variant_id) ON DELETE SET NULL,
-                            description TEXT,
-                            equipped BOOLEAN DEFAULT FALSE,
-                            purchased_at TIMESTAMP DEFAULT NOW()
-                        )
-                    ''')
 
-                    # ========== ARMOR SYSTEM TABLES ==========
-                    await conn.execute('''
-                        CREATE TABLE IF NOT EXISTS armor_types (
-                            armor_id SERIAL PRIMARY KEY,
-                            name TEXT NOT NULL,
-                            slot TEXT NOT NULL CHECK (slot IN ('helm', 'suit', 'gauntlets', 'boots')),
-                            defense INTEGER NOT NULL DEFAULT 0,
-                            rarity_id INTEGER REFERENCES rarities(rarity_id) ON DELETE SET NULL,
-                            image_url TEXT,
-                            description TEXT,
-                            created_at TIMESTAMP DEFAULT NOW()
-                        )
-                    ''')
+        await conn.execute("ALTER TABLE active_trades ALTER COLUMN message_id DROP NOT NULL;")
+        await conn.execute("ALTER TABLE active_trades ADD COLUMN IF NOT EXISTS created_at TIMESTAMP DEFAULT NOW();")
 
-                    await conn.execute('''
-                        CREATE TABLE IF NOT EXISTS user_armor (
-                            id SERIAL PRIMARY KEY,
-                            user_id TEXT NOT NULL,
-                            armor_id INTEGER REFERENCES armor_types(armor_id) ON DELETE CASCADE,
-                            defense INTEGER NOT NULL,
-                            equipped BOOLEAN DEFAULT FALSE,
-                            purchased_at TIMESTAMP DEFAULT NOW(),
-                            FOREIGN KEY (user_id) REFERENCES user_gems(user_id) ON DELETE CASCADE
-                        )
-                    ''')
 
-                    # ========== ACCESSORY SYSTEM TABLES ==========
-                    await conn.execute('''
-                        CREATE TABLE IF NOT EXISTS accessory_types (
-                            accessory_id SERIAL PRIMARY KEY,
-                            name TEXT NOT NULL,
-                            slot TEXT NOT NULL CHECK (slot IN ('ring', 'pendant', 'earring')),
-                            bonus_stat TEXT NOT NULL CHECK (bonus_stat IN ('atk', 'def', 'hp', 'energy')),
-                            bonus_value INTEGER NOT NULL DEFAULT 0,
-                            rarity_id INTEGER REFERENCES rarities(rarity_id) ON DELETE SET NULL,
-                            image_url TEXT,
-                            description TEXT,
-                            created_at TIMESTAMP DEFAULT NOW()
-                        )
-                    ''')
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS trade_items (
+                trade_id INTEGER REFERENCES active_trades(trade_id) ON DELETE CASCADE,
+                user_id TEXT NOT NULL,
+                item_type TEXT NOT NULL,
+                item_id INTEGER NOT NULL,
+                gems INTEGER DEFAULT 0,
+                quantity INTEGER DEFAULT 1
+            )
+        ''')
+        await conn.execute('ALTER TABLE trade_items ADD COLUMN IF NOT EXISTS quantity INTEGER DEFAULT 1;')
+
+
+        # ========== MATERIALS TABLE ==========
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS user_materials (
+                user_id TEXT NOT NULL,
+                material_id INTEGER NOT NULL,
+                quantity INTEGER DEFAULT 0,
+                PRIMARY KEY (user_id, material_id),
+                FOREIGN KEY (user_id) REFERENCES user_gems(user_id) ON DELETE CASCADE,
+                FOREIGN KEY (material_id) REFERENCES shop_items(item_id) ON DELETE CASCADE
+            )
+        ''')
+
+        # ========== ACTIVE EFFECTS TABLE ==========
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS active_effects (
+                effect_id SERIAL PRIMARY KEY,
+                target_id TEXT NOT NULL,
+                effect_type TEXT NOT NULL,
+                value INTEGER NOT NULL,
+                remaining_ticks INTEGER NOT NULL,
+                last_tick TIMESTAMP DEFAULT NOW(),
+                FOREIGN KEY (target_id) REFERENCES user_gems(user_id) ON DELETE CASCADE
+            )
+        ''')
+        # ========== ACTIVE BUFFS/DEBUFFS TABLE ==========
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS active_buffs (
+                buff_id SERIAL PRIMARY KEY,
+                target_id TEXT NOT NULL,
+                effect_type TEXT NOT NULL,
+                value FLOAT NOT NULL,
+                remaining_turns INTEGER NOT NULL,
+                FOREIGN KEY (target_id) REFERENCES user_gems(user_id) ON DELETE CASCADE
+            )
+        ''')
+        # ========== BOSS SYSTEM TABLES ==========
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS boss_config (
+                guild_id BIGINT PRIMARY KEY,
+                channel_id BIGINT NOT NULL,
+                message_id BIGINT,
+                boss_hp BIGINT NOT NULL,
+                max_hp BIGINT NOT NULL,
+                last_reset TIMESTAMPTZ
+            )
+        ''')
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS boss_attempts (
+                user_id TEXT NOT NULL,
+                reset_date DATE NOT NULL,
+                attempts_used INTEGER DEFAULT 0,
+                PRIMARY KEY (user_id, reset_date)
+            )
+        ''')
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS boss_damage (
+                user_id TEXT NOT NULL,
+                reset_date DATE NOT NULL,
+                total_damage BIGINT DEFAULT 0,
+                PRIMARY KEY (user_id, reset_date)
+            )
+        ''')
 
-                    await conn.execute('''
-                        CREATE TABLE IF NOT EXISTS user_accessories (
-                            id SERIAL PRIMARY KEY,
-                            user_id TEXT NOT NULL,
-                            accessory_id INTEGER REFERENCES accessory_types(accessory_id) ON DELETE CASCADE,
-                            bonus_value INTEGER NOT NULL,
-                            equipped BOOLEAN DEFAULT FALSE,
-                            slot TEXT NOT NULL CHECK (slot IN ('ring1', 'ring2', 'pendant', 'earring1', 'earring2')),
-                            purchased_at TIMESTAMP DEFAULT NOW(),
-                            FOREIGN KEY (user_id) REFERENCES user_gems(user_id) ON DELETE CASCADE,
-                            UNIQUE(user_id, slot)
-                        )
-                    ''')
 
-                    # ========== PET SYSTEM TABLES ==========
-                    await conn.execute('''
-                        CREATE TABLE IF NOT EXISTS pet_types (
-                            pet_id SERIAL PRIMARY KEY,
-                            name TEXT NOT NULL UNIQUE,
-                            bonus_stat TEXT CHECK (bonus_stat IN ('atk', 'def', 'hp', 'energy')),
-                            bonus_value INTEGER DEFAULT 0,
-                            image_url TEXT,
-                            description TEXT,
-                            -- New columns for pet bonuses
-                            atk_percent INT DEFAULT 0,
-                            def_percent INT DEFAULT 0,
-                            hp_percent INT DEFAULT 0,
-                            dodge_percent INT DEFAULT 0,
-                            bleed_flat INT DEFAULT 0,
-                            burn_flat INT DEFAULT 0,
-                            energy_bonus INT DEFAULT 0
-                        )
-                    ''')
-                    await conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS pet_types_name_key ON pet_types (name);')
+        # ========== ADD MISSING COLUMNS TO EXISTING TABLES ==========
+        # These ensure the schema is updated if tables already exist
 
-                    await conn.execute('''
-                        CREATE TABLE IF NOT EXISTS user_pets (
-                            id SERIAL PRIMARY KEY,
-                            user_id TEXT NOT NULL,
-                            pet_id INTEGER REFERENCES pet_types(pet_id) ON DELETE CASCADE,
-                            equipped BOOLEAN DEFAULT FALSE,
-                            purchased_at TIMESTAMP DEFAULT NOW(),
-                            FOREIGN KEY (user_id) REFERENCES user_gems(user_id) ON DELETE CASCADE
-                        )
-                    ''')
-                    # ========== PET BONUS COLUMNS (ensure they exist) ==========
-                    # (These are safe even if already added by the CREATE TABLE)                   
-                    await conn.execute('ALTER TABLE pet_types ADD COLUMN IF NOT EXISTS atk_percent INT DEFAULT 0;')
-                    await conn.execute('ALTER TABLE pet_types ADD COLUMN IF NOT EXISTS def_percent INT DEFAULT 0;')
-                    await conn.execute('ALTER TABLE pet_types ADD COLUMN IF NOT EXISTS hp_percent INT DEFAULT 0;')
-                    await conn.execute('ALTER TABLE pet_types ADD COLUMN IF NOT EXISTS dodge_percent INT DEFAULT 0;')
-                    await conn.execute('ALTER TABLE pet_types ADD COLUMN IF NOT EXISTS bleed_flat INT DEFAULT 0;')
-                    await conn.execute('ALTER TABLE pet_types ADD COLUMN IF NOT EXISTS burn_flat INT DEFAULT 0;')
-                    await conn.execute('ALTER TABLE pet_types ADD COLUMN IF NOT EXISTS energy_bonus INT DEFAULT 0;')
-
-                    # ========== SEED PETS ==========
-                    await conn.execute("""
-                        INSERT INTO pet_types (name, atk_percent, def_percent, hp_percent, dodge_percent, bleed_flat, burn_flat, energy_bonus, description) VALUES
-                        ('Baby Fox', 5, 15, 30, 8, 0, 0, 1, 'A cunning fox that boosts your stats and grants dodge chance.'),
-                        ('Baby Tiger', 5, 15, 30, 0, 1000, 0, 1, 'A fierce tiger that enhances your bleed damage.'),
-                        ('Baby Purr', 5, 15, 30, 0, 0, 1000, 1, 'A mystical cat that adds burn damage to your attacks.')
-                        ON CONFLICT (name) DO NOTHING;
-                    """)
-                    # ========== TITLE SYSTEM TABLES ==========
-                    await conn.execute('''
-                        CREATE TABLE IF NOT EXISTS titles (
-                            title_id SERIAL PRIMARY KEY,
-                            name TEXT NOT NULL UNIQUE,
-                            emoji TEXT,
-                            description TEXT,
-                            hp_percent INT DEFAULT 0,
-                            def_percent INT DEFAULT 0,
-                            atk_percent INT DEFAULT 0,
-                            crit_chance INT DEFAULT 0,
-                            dodge_percent INT DEFAULT 0,
-                            dmg_reduction_percent INT DEFAULT 0,
-                            bleed_flat INT DEFAULT 0,
-                            burn_flat INT DEFAULT 0,
-                            crit_dmg_res_percent INT DEFAULT 0,
-                            mining_bonus_percent INT DEFAULT 0,
-                            boss_damage_percent INT DEFAULT 0,
-                            extra_boss_attempts INT DEFAULT 0,
-                            extra_plunder_attempts INT DEFAULT 0
-                        )
-                    ''')
-
-                    # Add columns if they don't exist (for existing tables)
-                    await conn.execute('ALTER TABLE titles ADD COLUMN IF NOT EXISTS hp_percent INT DEFAULT 0;')
-                    await conn.execute('ALTER TABLE titles ADD COLUMN IF NOT EXISTS def_percent INT DEFAULT 0;')
-                    await conn.execute('ALTER TABLE titles ADD COLUMN IF NOT EXISTS atk_percent INT DEFAULT 0;')
-                    await conn.execute('ALTER TABLE titles ADD COLUMN IF NOT EXISTS crit_chance INT DEFAULT 0;')
-                    await conn.execute('ALTER TABLE titles ADD COLUMN IF NOT EXISTS dodge_percent INT DEFAULT 0;')
-                    await conn.execute('ALTER TABLE titles ADD COLUMN IF NOT EXISTS dmg_reduction_percent INT DEFAULT 0;')
-                    await conn.execute('ALTER TABLE titles ADD COLUMN IF NOT EXISTS bleed_flat INT DEFAULT 0;')
-                    await conn.execute('ALTER TABLE titles ADD COLUMN IF NOT EXISTS burn_flat INT DEFAULT 0;')
-                    await conn.execute('ALTER TABLE titles ADD COLUMN IF NOT EXISTS crit_dmg_res_percent INT DEFAULT 0;')
-                    await conn.execute('ALTER TABLE titles ADD COLUMN IF NOT EXISTS mining_bonus_percent INT DEFAULT 0;')
-                    await conn.execute('ALTER TABLE titles ADD COLUMN IF NOT EXISTS boss_damage_percent INT DEFAULT 0;')
-                    await conn.execute('ALTER TABLE titles ADD COLUMN IF NOT EXISTS extra_boss_attempts INT DEFAULT 0;')
-                    await conn.execute('ALTER TABLE titles ADD COLUMN IF NOT EXISTS extra_plunder_attempts INT DEFAULT 0;')
+        # User weapons
+        await conn.execute('ALTER TABLE user_weapons ADD COLUMN IF NOT EXISTS bleeding_chance FLOAT DEFAULT 0')
+        await conn.execute('ALTER TABLE user_weapons ADD COLUMN IF NOT EXISTS crit_chance FLOAT DEFAULT 0')
+        await conn.execute('ALTER TABLE user_weapons ADD COLUMN IF NOT EXISTS crit_damage FLOAT DEFAULT 0')
+        await conn.execute('ALTER TABLE user_weapons ADD COLUMN IF NOT EXISTS skill_level INTEGER DEFAULT 1')
 
-                    await conn.execute('''
-                        CREATE TABLE IF NOT EXISTS user_titles (
-                            user_id TEXT NOT NULL REFERENCES user_gems(user_id) ON DELETE CASCADE,
-                            title_id INTEGER NOT NULL REFERENCES titles(title_id) ON DELETE CASCADE,
-                            equipped BOOLEAN DEFAULT FALSE,
-                            obtained_at TIMESTAMP DEFAULT NOW(),
-                            PRIMARY KEY (user_id, title_id)
-                        )
-                    ''')
-                    # Ensure only one equipped title per user
-                    await conn.execute('''
-                        CREATE UNIQUE INDEX IF NOT EXISTS idx_user_titles_equipped
-                        ON user_titles (user_id) WHERE equipped = TRUE;
-                    ''')
-                    await conn.execute('ALTER TABLE user_titles ADD COLUMN IF NOT EXISTS expires_at TIMESTAMPTZ;')
-                    await conn.execute('CREATE INDEX IF NOT EXISTS idx_user_titles_expires ON user_titles (expires_at);')
+        # Armor types
+        await conn.execute('ALTER TABLE armor_types ADD COLUMN IF NOT EXISTS hp_bonus INTEGER DEFAULT 0')
+        await conn.execute('ALTER TABLE armor_types ADD COLUMN IF NOT EXISTS reflect_damage INTEGER DEFAULT 0')
+        await conn.execute('ALTER TABLE armor_types ADD COLUMN IF NOT EXISTS set_name TEXT')
 
-                    # ========== ARENA SYSTEM TABLES ==========
-                    await conn.execute('''
-                        CREATE TABLE IF NOT EXISTS arena_stats (
-                            user_id TEXT PRIMARY KEY REFERENCES user_gems(user_id) ON DELETE CASCADE,
-                            points INTEGER DEFAULT 1000,
-                            wins INTEGER DEFAULT 0,
-                            losses INTEGER DEFAULT 0,
-                            last_match TIMESTAMP
-                        )
-                    ''')
+        # User armor
+        await conn.execute('ALTER TABLE user_armor ADD COLUMN IF NOT EXISTS hp_bonus INTEGER DEFAULT 0')
+        await conn.execute('ALTER TABLE user_armor ADD COLUMN IF NOT EXISTS reflect_damage INTEGER DEFAULT 0')
+        await conn.execute('ALTER TABLE user_armor ADD COLUMN IF NOT EXISTS set_name TEXT')
+        await conn.execute('ALTER TABLE user_armor ADD COLUMN IF NOT EXISTS purchase_id INTEGER REFERENCES user_purchases(purchase_id) ON DELETE SET NULL')
 
-                    await conn.execute('''
-                        CREATE TABLE IF NOT EXISTS arena_queue (
-                            user_id TEXT PRIMARY KEY REFERENCES arena_stats(user_id) ON DELETE CASCADE,
-                            queued_at TIMESTAMP DEFAULT NOW()
-                        )
-                    ''')
+        # Accessory types
+        await conn.execute('ALTER TABLE accessory_types ADD COLUMN IF NOT EXISTS set_name TEXT')                   
+        await conn.execute('ALTER TABLE accessory_types ADD COLUMN IF NOT EXISTS slot_count INTEGER DEFAULT 1')
+        # Update slot constraint for accessory_types
+        await conn.execute("""
+            UPDATE accessory_types 
+            SET slot = 'ring' 
+            WHERE slot IN ('ring1', 'ring2')
+        """)
+        await conn.execute("""
+            UPDATE accessory_types 
+            SET slot = 'earring' 
+            WHERE slot IN ('earring1', 'earring2')
+        """)
+        await conn.execute("""
+            UPDATE accessory_types 
+            SET slot = 'pendant' 
+        WHERE slot = 'pendant'
+        """)  
+# 3. Add the new constraint
 
-                    await conn.execute('''
-                        CREATE TABLE IF NOT EXISTS arena_config (
-                            guild_id BIGINT PRIMARY KEY,
-                            channel_id BIGINT NOT NULL,
-                            message_id BIGINT
-                        )
-                    ''')
-                    # ========== ARENA RESET LOG ==========
-                    await conn.execute('''
-                        CREATE TABLE IF NOT EXISTS arena_reset_log (
-                            id INTEGER PRIMARY KEY DEFAULT 1,
-                            last_reset TIMESTAMP NOT NULL DEFAULT NOW()
-                        )
-                    ''')
-                    # Ensure there's always one row
-                    await conn.execute('''
-                        INSERT INTO arena_reset_log (id, last_reset) VALUES (1, NOW())
-                        ON CONFLICT (id) DO NOTHING
-                    ''')
-
-                    # ========== PLAYER STATS ==========
-                    await conn.execute('''
-                        CREATE TABLE IF NOT EXISTS player_stats (
-                            user_id TEXT PRIMARY KEY REFERENCES user_gems(user_id) ON DELETE CASCADE,
-                            hp INTEGER NOT NULL DEFAULT 1000,
-                            max_hp INTEGER NOT NULL DEFAULT 1000,
-                            energy INTEGER NOT NULL DEFAULT 3,
-                            max_energy INTEGER NOT NULL DEFAULT 3,
-                            last_energy_regen TIMESTAMP DEFAULT NOW(),
-                            mining_start TIMESTAMP,
-                            mining_message_id BIGINT,
-                            mining_channel_id BIGINT,
-                            pending_reward INTEGER DEFAULT 0,
-                            stolen_gems INTEGER DEFAULT 0,
-                            plunder_count INTEGER DEFAULT 0,
-                            last_plunder_reset DATE DEFAULT CURRENT_DATE,
-                            has_pickaxe BOOLEAN DEFAULT FALSE
-                        )
-                    ''')
-
-                    # ========== MINING CONFIG ==========
-                    await conn.execute('''
-                        CREATE TABLE IF NOT EXISTS mining_config (
-                            guild_id BIGINT PRIMARY KEY,
-                            channel_id BIGINT NOT NULL,
-                            message_id BIGINT
-                        )
-                    ''')
-
-                    # ========== ATTACK LOGS ==========
-                    await conn.execute('''
-                        CREATE TABLE IF NOT EXISTS attack_logs (
-                            id SERIAL PRIMARY KEY,
-                            attacker_id TEXT NOT NULL,
-                            defender_id TEXT NOT NULL,
-                            timestamp TIMESTAMP DEFAULT NOW(),
-                            damage INTEGER,
-                            attacker_weapon TEXT,
-                            defender_hp_left INTEGER
-                        )
-                    ''')
-
-                    # ========== NEW SET BONUSES TABLE ==========
-                    await conn.execute('''
-                        CREATE TABLE IF NOT EXISTS user_set_bonuses (
-                            user_id TEXT NOT NULL,
-                            set_name TEXT NOT NULL,
-                            set_type TEXT NOT NULL CHECK (set_type IN ('armor', 'accessory')),
-                            pieces_owned INTEGER DEFAULT 0,
-                            pieces_equipped INTEGER DEFAULT 0,
-                            bonus_active BOOLEAN DEFAULT FALSE,
-                            activated_at TIMESTAMP,
-                            PRIMARY KEY (user_id, set_name, set_type),
-                            FOREIGN KEY (user_id) REFERENCES user_gems(user_id) ON DELETE CASCADE
-                        )
-                    ''')
-                    # ========== TRADE SYSTEM TABLES ==========
-                    await conn.execute('''
-                        CREATE TABLE IF NOT EXISTS active_trades (
-                            trade_id SERIAL PRIMARY KEY,
-                            initiator_id TEXT NOT NULL,
-                            receiver_id TEXT NOT NULL,
-                            channel_id BIGINT NOT NULL,
-                            message_id BIGINT,
-                            initiator_lock BOOLEAN DEFAULT FALSE,
-                            receiver_lock BOOLEAN DEFAULT FALSE,
-                            status TEXT DEFAULT 'pending'
-                        )
-                    ''')
-
-
-                    await conn.execute("ALTER TABLE active_trades ALTER COLUMN message_id DROP NOT NULL;")
-                    await conn.execute("ALTER TABLE active_trades ADD COLUMN IF NOT EXISTS created_at TIMESTAMP DEFAULT NOW();")
-
-
-                    await conn.execute('''
-                        CREATE TABLE IF NOT EXISTS trade_items (
-                            trade_id INTEGER REFERENCES active_trades(trade_id) ON DELETE CASCADE,
-                            user_id TEXT NOT NULL,
-                            item_type TEXT NOT NULL,
-                            item_id INTEGER NOT NULL,
-                            gems INTEGER DEFAULT 0,
-                            quantity INTEGER DEFAULT 1
-                        )
-                    ''')
-                    await conn.execute('ALTER TABLE trade_items ADD COLUMN IF NOT EXISTS quantity INTEGER DEFAULT 1;')
-
-
-                    # ========== MATERIALS TABLE ==========
-                    await conn.execute('''
-                        CREATE TABLE IF NOT EXISTS user_materials (
-                            user_id TEXT NOT NULL,
-                            material_id INTEGER NOT NULL,
-                            quantity INTEGER DEFAULT 0,
-                            PRIMARY KEY (user_id, material_id),
-                            FOREIGN KEY (user_id) REFERENCES user_gems(user_id) ON DELETE CASCADE,
-                            FOREIGN KEY (material_id) REFERENCES shop_items(item_id) ON DELETE CASCADE
-                        )
-                    ''')
-
-                    # ========== ACTIVE EFFECTS TABLE ==========
-                    await conn.execute('''
-                        CREATE TABLE IF NOT EXISTS active_effects (
-                            effect_id SERIAL PRIMARY KEY,
-                            target_id TEXT NOT NULL,
-                            effect_type TEXT NOT NULL,
-                            value INTEGER NOT NULL,
-                            remaining_ticks INTEGER NOT NULL,
-                            last_tick TIMESTAMP DEFAULT NOW(),
-                            FOREIGN KEY (target_id) REFERENCES user_gems(user_id) ON DELETE CASCADE
-                        )
-                    ''')
-                    # ========== ACTIVE BUFFS/DEBUFFS TABLE ==========
-                    await conn.execute('''
-                        CREATE TABLE IF NOT EXISTS active_buffs (
-                            buff_id SERIAL PRIMARY KEY,
-                            target_id TEXT NOT NULL,
-                            effect_type TEXT NOT NULL,
-                            value FLOAT NOT NULL,
-                            remaining_turns INTEGER NOT NULL,
-                            FOREIGN KEY (target_id) REFERENCES user_gems(user_id) ON DELETE CASCADE
-                        )
-                    ''')
-                    # ========== BOSS SYSTEM TABLES ==========
-                    await conn.execute('''
-                        CREATE TABLE IF NOT EXISTS boss_config (
-                            guild_id BIGINT PRIMARY KEY,
-                            channel_id BIGINT NOT NULL,
-                            message_id BIGINT,
-                            boss_hp BIGINT NOT NULL,
-                            max_hp BIGINT NOT NULL,
-                            last_reset TIMESTAMPTZ
-                        )
-                    ''')
-                    await conn.execute('''
-                        CREATE TABLE IF NOT EXISTS boss_attempts (
-                            user_id TEXT NOT NULL,
-                            reset_date DATE NOT NULL,
-                            attempts_used INTEGER DEFAULT 0,
-                            PRIMARY KEY (user_id, reset_date)
-                        )
-                    ''')
-                    await conn.execute('''
-                        CREATE TABLE IF NOT EXISTS boss_damage (
-                            user_id TEXT NOT NULL,
-                            reset_date DATE NOT NULL,
-                            total_damage BIGINT DEFAULT 0,
-                            PRIMARY KEY (user_id, reset_date)
-                        )
-                    ''')
-
-
-                    # ========== ADD MISSING COLUMNS TO EXISTING TABLES ==========
-                    # These ensure the schema is updated if tables already exist
-
-                    # User weapons
-                    await conn.execute('ALTER TABLE user_weapons ADD COLUMN IF NOT EXISTS bleeding_chance FLOAT DEFAULT 0')
-                    await conn.execute('ALTER TABLE user_weapons ADD COLUMN IF NOT EXISTS crit_chance FLOAT DEFAULT 0')
-                    await conn.execute('ALTER TABLE user_weapons ADD COLUMN IF NOT EXISTS crit_damage FLOAT DEFAULT 0')
-                    await conn.execute('ALTER TABLE user_weapons ADD COLUMN IF NOT EXISTS skill_level INTEGER DEFAULT 1')
-
-                    # Armor types
-                    await conn.execute('ALTER TABLE armor_types ADD COLUMN IF NOT EXISTS hp_bonus INTEGER DEFAULT 0')
-                    await conn.execute('ALTER TABLE armor_types ADD COLUMN IF NOT EXISTS reflect_damage INTEGER DEFAULT 0')
-                    await conn.execute('ALTER TABLE armor_types ADD COLUMN IF NOT EXISTS set_name TEXT')
-
-                    # User armor
-                    await conn.execute('ALTER TABLE user_armor ADD COLUMN IF NOT EXISTS hp_bonus INTEGER DEFAULT 0')
-                    await conn.execute('ALTER TABLE user_armor ADD COLUMN IF NOT EXISTS reflect_damage INTEGER DEFAULT 0')
-                    await conn.execute('ALTER TABLE user_armor ADD COLUMN IF NOT EXISTS set_name TEXT')
-                    await conn.execute('ALTER TABLE user_armor ADD COLUMN IF NOT EXISTS purchase_id INTEGER REFERENCES user_purchases(purchase_id) ON DELETE SET NULL')
-
-                    # Accessory types
-                    await conn.execute('ALTER TABLE accessory_types ADD COLUMN IF NOT EXISTS set_name TEXT')                   
-                    await conn.execute('ALTER TABLE accessory_types ADD COLUMN IF NOT EXISTS slot_count INTEGER DEFAULT 1')
-                    # Update slot constraint for accessory_types
-                    await conn.execute("""
-                        UPDATE accessory_types 
-                        SET slot = 'ring' 
-                        WHERE slot IN ('ring1', 'ring2')
-                    """)
-                    await conn.execute("""
-                        UPDATE accessory_types 
-                        SET slot = 'earring' 
-                        WHERE slot IN ('earring1', 'earring2')
-                    """)
-                    await conn.execute("""
-                        UPDATE accessory_types 
-                        SET slot = 'pendant' 
-                    WHERE slot = 'pendant'
-                    """)  
-# 3. Add the new constraint
-
-                    # Update bonus_stat constraint for accessory_types
-                    await conn.execute('ALTER TABLE accessory_types DROP CONSTRAINT IF EXISTS accessory_types_bonus_stat_check')
-                    await conn.execute('''
-                        ALTER TABLE accessory_types ADD CONSTRAINT accessory_types_bonus_stat_check 
-                        CHECK (bonus_stat IN ('atk', 'def', 'hp', 'energy', 'crit', 'bleed'))
-                    ''')
-
-                    # User accessories
-                    await conn.execute('ALTER TABLE user_accessories ADD COLUMN IF NOT EXISTS set_name TEXT')
-                    await conn.execute('ALTER TABLE user_accessories ADD COLUMN IF NOT EXISTS purchase_id INTEGER REFERENCES user_purchases(purchase_id) ON DELETE SET NULL')
-                    # Modify user_accessories to allow NULL slot and enforce unique equipped slots
-                    await conn.execute('ALTER TABLE user_accessories ALTER COLUMN slot DROP NOT NULL;')
-                    await conn.execute('ALTER TABLE user_accessories DROP CONSTRAINT IF EXISTS user_accessories_user_id_slot_key;')
-                    await conn.execute('''
-                        CREATE UNIQUE INDEX IF NOT EXISTS idx_user_accessories_equipped_slot 
-                        ON user_accessories (user_id, slot) WHERE equipped = TRUE;
-                    ''')
-
-                    # Player stats
-                    await conn.execute('ALTER TABLE player_stats ADD COLUMN IF NOT EXISTS defense INTEGER DEFAULT 0')
-                    await conn.execute('ALTER TABLE player_stats ADD COLUMN IF NOT EXISTS crit_chance FLOAT DEFAULT 0')
-                    await conn.execute('ALTER TABLE player_stats ADD COLUMN IF NOT EXISTS crit_damage FLOAT DEFAULT 0')
-                    await conn.execute('ALTER TABLE player_stats ADD COLUMN IF NOT EXISTS defense_bonus INTEGER DEFAULT 0')
-                    await conn.execute('ALTER TABLE player_stats ADD COLUMN IF NOT EXISTS reflect_bonus INTEGER DEFAULT 0')
-                    await conn.execute('ALTER TABLE player_stats ADD COLUMN IF NOT EXISTS hp_bonus INTEGER DEFAULT 0')
-                    await conn.execute('ALTER TABLE player_stats ADD COLUMN IF NOT EXISTS atk_bonus INTEGER DEFAULT 0')
-                    await conn.execute('ALTER TABLE player_stats ADD COLUMN IF NOT EXISTS bleed_damage FLOAT DEFAULT 0')
-                    await conn.execute('ALTER TABLE player_stats ADD COLUMN IF NOT EXISTS respawn_at TIMESTAMPTZ')
-                    # Boss system
-                    await conn.execute('ALTER TABLE boss_config ADD COLUMN IF NOT EXISTS boss_image_url TEXT')
-                    await conn.execute('ALTER TABLE boss_config ADD COLUMN IF NOT EXISTS announce_channel_id BIGINT')
-                    # Upgrade system columns
-                    await conn.execute('ALTER TABLE user_weapons ADD COLUMN IF NOT EXISTS upgrade_level INTEGER DEFAULT 0')
-                    await conn.execute('ALTER TABLE user_armor ADD COLUMN IF NOT EXISTS upgrade_level INTEGER DEFAULT 0')
-                    await conn.execute('ALTER TABLE user_accessories ADD COLUMN IF NOT EXISTS upgrade_level INTEGER DEFAULT 0')
-
-                    
-
-                    await conn.execute('ALTER TABLE player_stats ADD COLUMN IF NOT EXISTS stolen_sword_stones INTEGER DEFAULT 0')
-                    await conn.execute('ALTER TABLE player_stats ADD COLUMN IF NOT EXISTS stolen_armor_stones INTEGER DEFAULT 0')
-                    await conn.execute('ALTER TABLE player_stats ADD COLUMN IF NOT EXISTS stolen_acc_stones INTEGER DEFAULT 0')
-
-                    # Update armor_types slot constraint to include new slots
-                    await conn.execute('ALTER TABLE armor_types DROP CONSTRAINT IF EXISTS armor_types_slot_check')
-                    await conn.execute('''
-                        ALTER TABLE armor_types ADD CONSTRAINT armor_types_slot_check 
-                        CHECK (slot IN ('helm', 'suit', 'gauntlets', 'boots'))
-                    ''')
-
-                    # ========== SEED DATA ==========
-                    # Seed rarities
-                    await conn.execute('''
-                        INSERT INTO rarities (name, color, display_order) VALUES
-                        ('Common', 0xFFFFFF, 1),
-                        ('Uncommon', 0x00FF00, 2),
-                        ('Rare', 0x0000FF, 3),
-                        ('Epic', 0x800080, 4),
-                        ('Legendary', 0xFFD700, 5)
-                        ON CONFLICT (name) DO UPDATE SET color = EXCLUDED.color
-                    ''')
-
-                    # Seed weapon types
-                    for name in ('Sword', 'Axe', 'Dagger'):
-                        await conn.execute("""
-                            INSERT INTO weapon_types (name_base)
-                            SELECT $1
-                            WHERE NOT EXISTS (SELECT 1 FROM weapon_types WHERE name_base = $1)
-                        """, name)
-                    # Seed potions (if not already present)
-                    await conn.execute("""
-                        INSERT INTO shop_items (name, description, price, type)
-                        SELECT 'HP Potion', 'Restores 50% of your max HP.', 50, 'potion'
-                        WHERE NOT EXISTS (SELECT 1 FROM shop_items WHERE name = 'HP Potion');
-                    """)
-                    await conn.execute("""
-                        INSERT INTO shop_items (name, description, price, type)
-                        SELECT 'Energy Potion', 'Restores 1 energy.', 30, 'potion'
-                        WHERE NOT EXISTS (SELECT 1 FROM shop_items WHERE name = 'Energy Potion');
-                    """)
-                    # ========== SHOP ITEMS FOR PETS ==========
-                    # First, drop any existing constraint (safe)
-                    await conn.execute("ALTER TABLE shop_items DROP CONSTRAINT IF EXISTS shop_items_type_check;")
-
-                    # Delete any rows that are not in the final allowed type list (including any stray rows)
-                    await conn.execute("""
-                        DELETE FROM shop_items
-                        WHERE type NOT IN ('role', 'color', 'weapon', 'random_weapon_box',
-                                           'random_gear_box', 'random_accessories_box', 'pickaxe', 'material', 'potion', 'random_pet_box')
-                    """)
-
-                    # Insert the Pet Box (if not already present)
-                    await conn.execute("""
-                        INSERT INTO shop_items (name, description, price, type)
-                        SELECT 'Pet Box', 'Contains a random pet! Open to receive one of: Baby Fox, Baby Tiger, or Baby Purr.', 5000, 'random_pet_box'
-                        WHERE NOT EXISTS (SELECT 1 FROM shop_items WHERE name = 'Pet Box');
-                    """)
+        # Update bonus_stat constraint for accessory_types
+        await conn.execute('ALTER TABLE accessory_types DROP CONSTRAINT IF EXISTS accessory_types_bonus_stat_check')
+        await conn.execute('''
+            ALTER TABLE accessory_types ADD CONSTRAINT accessory_types_bonus_stat_check 
+            CHECK (bonus_stat IN ('atk', 'def', 'hp', 'energy', 'crit', 'bleed'))
+        ''')
+
+        # User accessories
+        await conn.execute('ALTER TABLE user_accessories ADD COLUMN IF NOT EXISTS set_name TEXT')
+        await conn.execute('ALTER TABLE user_accessories ADD COLUMN IF NOT EXISTS purchase_id INTEGER REFERENCES user_purchases(purchase_id) ON DELETE SET NULL')
+        # Modify user_accessories to allow NULL slot and enforce unique equipped slots
+        await conn.execute('ALTER TABLE user_accessories ALTER COLUMN slot DROP NOT NULL;')
+        await conn.execute('ALTER TABLE user_accessories DROP CONSTRAINT IF EXISTS user_accessories_user_id_slot_key;')
+        await conn.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_user_accessories_equipped_slot 
+            ON user_accessories (user_id, slot) WHERE equipped = TRUE;
+        ''')
+
+        # Player stats
+        await conn.execute('ALTER TABLE player_stats ADD COLUMN IF NOT EXISTS defense INTEGER DEFAULT 0')
+        await conn.execute('ALTER TABLE player_stats ADD COLUMN IF NOT EXISTS crit_chance FLOAT DEFAULT 0')
+        await conn.execute('ALTER TABLE player_stats ADD COLUMN IF NOT EXISTS crit_damage FLOAT DEFAULT 0')
+        await conn.execute('ALTER TABLE player_stats ADD COLUMN IF NOT EXISTS defense_bonus INTEGER DEFAULT 0')
+        await conn.execute('ALTER TABLE player_stats ADD COLUMN IF NOT EXISTS reflect_bonus INTEGER DEFAULT 0')
+        await conn.execute('ALTER TABLE player_stats ADD COLUMN IF NOT EXISTS hp_bonus INTEGER DEFAULT 0')
+        await conn.execute('ALTER TABLE player_stats ADD COLUMN IF NOT EXISTS atk_bonus INTEGER DEFAULT 0')
+        await conn.execute('ALTER TABLE player_stats ADD COLUMN IF NOT EXISTS bleed_damage FLOAT DEFAULT 0')
+        await conn.execute('ALTER TABLE player_stats ADD COLUMN IF NOT EXISTS respawn_at TIMESTAMPTZ')
+        # Boss system
+        await conn.execute('ALTER TABLE boss_config ADD COLUMN IF NOT EXISTS boss_image_url TEXT')
+        await conn.execute('ALTER TABLE boss_config ADD COLUMN IF NOT EXISTS announce_channel_id BIGINT')
+        # Upgrade system columns
+        await conn.execute('ALTER TABLE user_weapons ADD COLUMN IF NOT EXISTS upgrade_level INTEGER DEFAULT 0')
+        await conn.execute('ALTER TABLE user_armor ADD COLUMN IF NOT EXISTS upgrade_level INTEGER DEFAULT 0')
+        await conn.execute('ALTER TABLE user_accessories ADD COLUMN IF NOT EXISTS upgrade_level INTEGER DEFAULT 0')
+
+
+
+        await conn.execute('ALTER TABLE player_stats ADD COLUMN IF NOT EXISTS stolen_sword_stones INTEGER DEFAULT 0')
+        await conn.execute('ALTER TABLE player_stats ADD COLUMN IF NOT EXISTS stolen_armor_stones INTEGER DEFAULT 0')
+        await conn.execute('ALTER TABLE player_stats ADD COLUMN IF NOT EXISTS stolen_acc_stones INTEGER DEFAULT 0')
+
+        # Update armor_types slot constraint to include new slots
+        await conn.execute('ALTER TABLE armor_types DROP CONSTRAINT IF EXISTS armor_types_slot_check')
+        await conn.execute('''
+            ALTER TABLE armor_types ADD CONSTRAINT armor_types_slot_check 
+            CHECK (slot IN ('helm', 'suit', 'gauntlets', 'boots'))
+        ''')
+
+        # ========== SEED DATA ==========
+        # Seed rarities
+        await conn.execute('''
+            INSERT INTO rarities (name, color, display_order) VALUES
+            ('Common', 0xFFFFFF, 1),
+            ('Uncommon', 0x00FF00, 2),
+            ('Rare', 0x0000FF, 3),
+            ('Epic', 0x800080, 4),
+            ('Legendary', 0xFFD700, 5)
+            ON CONFLICT (name) DO UPDATE SET color = EXCLUDED.color
+        ''')
+
+        # Seed weapon types
+        for name in ('Sword', 'Axe', 'Dagger'):
+            await conn.execute("""
+                INSERT INTO weapon_types (name_base)
+                SELECT $1
+                WHERE NOT EXISTS (SELECT 1 FROM weapon_types WHERE name_base = $1)
+            """, name)
+        # Seed potions (if not already present)
+        await conn.execute("""
+            INSERT INTO shop_items (name, description, price, type)
+            SELECT 'HP Potion', 'Restores 50% of your max HP.', 50, 'potion'
+            WHERE NOT EXISTS (SELECT 1 FROM shop_items WHERE name = 'HP Potion');
+        """)
+        await conn.execute("""
+            INSERT INTO shop_items (name, description, price, type)
+            SELECT 'Energy Potion', 'Restores 1 energy.', 30, 'potion'
+            WHERE NOT EXISTS (SELECT 1 FROM shop_items WHERE name = 'Energy Potion');
+        """)
+        # ========== SHOP ITEMS FOR PETS ==========
+        # First, drop any existing constraint (safe)
+        await conn.execute("ALTER TABLE shop_items DROP CONSTRAINT IF EXISTS shop_items_type_check;")
 
-                    # Re‑add the constraint with the updated type list
-                    await conn.execute("""
-                        ALTER TABLE shop_items ADD CONSTRAINT shop_items_type_check
-                        CHECK (type IN ('role', 'color', 'weapon', 'random_weapon_box',
-                                        'random_gear_box', 'random_accessories_box', 'pickaxe', 'material', 'potion', 'random_pet_box'));
-                    """)
+        # Delete any rows that are not in the final allowed type list (including any stray rows)
+        await conn.execute("""
+            DELETE FROM shop_items
+            WHERE type NOT IN ('role', 'color', 'weapon', 'random_weapon_box',
+                               'random_gear_box', 'random_accessories_box', 'pickaxe', 'material', 'potion', 'random_pet_box')
+        """)
 
-                    # 🔽 ADD TITLES SEED HERE 🔽
-                    await conn.execute("""
-                        INSERT INTO titles (name, emoji, description,
-                                            boss_damage_percent, extra_boss_attempts,
-                                            hp_percent, def_percent, atk_percent,
-                                            crit_chance, dodge_percent, dmg_reduction_percent,
-                                            crit_dmg_res_percent, mining_bonus_percent,
-                                            bleed_flat, burn_flat)
-                        VALUES
-                        ('Boss Reaper', '<:boss_reaper:1483707209090334820>', 'Earned by being the top 1 damage dealer in the server boss.',
-                         5, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0),
-                        ('Administrator', '<:administrator:1470082908151742536>', 'Exclusive title for Server Administrators.',
-                         100, 100, 100, 100, 100, 100, 100, 100, 100, 100, 5000, 5000)
-                        ON CONFLICT (name) DO NOTHING;
-                    """)
-                    # 🔼 END TITLES SEED
-
-                    # ========== CREATE INDEXES ==========
-                    await conn.execute('CREATE INDEX IF NOT EXISTS idx_user_purchases_user ON user_purchases(user_id)')
-                    await conn.execute('CREATE INDEX IF NOT EXISTS idx_user_weapons_user ON user_weapons(user_id)')
-                    await conn.execute('CREATE INDEX IF NOT EXISTS idx_user_weapons_equipped ON user_weapons(user_id, equipped)')
-                    await conn.execute('CREATE INDEX IF NOT EXISTS idx_user_armor_user ON user_armor(user_id)')
-                    await conn.execute('CREATE INDEX IF NOT EXISTS idx_user_armor_equipped ON user_armor(user_id, equipped)')
-                    await conn.execute('CREATE INDEX IF NOT EXISTS idx_user_armor_set ON user_armor(user_id, set_name)')
-                    await conn.execute('CREATE INDEX IF NOT EXISTS idx_user_armor_equipped_set ON user_armor(user_id, equipped, set_name)')
-                    await conn.execute('CREATE INDEX IF NOT EXISTS idx_user_accessories_user ON user_accessories(user_id)')
-                    await conn.execute('CREATE INDEX IF NOT EXISTS idx_user_accessories_equipped ON user_accessories(user_id, equipped, slot)')
-                    await conn.execute('CREATE INDEX IF NOT EXISTS idx_user_accessories_set ON user_accessories(user_id, set_name)')
-                    await conn.execute('CREATE INDEX IF NOT EXISTS idx_user_accessories_equipped_set ON user_accessories(user_id, equipped, set_name)')
-                    await conn.execute('CREATE INDEX IF NOT EXISTS idx_user_pets_user ON user_pets(user_id)')
-                    await conn.execute('CREATE INDEX IF NOT EXISTS idx_fortune_bags_active ON fortune_bags(active)')
-                    await conn.execute('CREATE INDEX IF NOT EXISTS idx_participants_message_id ON fortune_bag_participants(message_id)')
-                    await conn.execute('CREATE INDEX IF NOT EXISTS idx_user_set_bonuses_user ON user_set_bonuses(user_id)')
-                    await conn.execute('CREATE INDEX IF NOT EXISTS idx_user_set_bonuses_active ON user_set_bonuses(user_id, bonus_active)')
-                    await conn.execute('CREATE INDEX IF NOT EXISTS idx_user_weapons_effects ON user_weapons(user_id, equipped) WHERE equipped = TRUE')
-                    await conn.execute('CREATE INDEX IF NOT EXISTS idx_user_pets_user ON user_pets(user_id)')
-                    await conn.execute('CREATE INDEX IF NOT EXISTS idx_user_pets_equipped ON user_pets(user_id, equipped)')
+        # Insert the Pet Box (if not already present)
+        await conn.execute("""
+            INSERT INTO shop_items (name, description, price, type)
+            SELECT 'Pet Box', 'Contains a random pet! Open to receive one of: Baby Fox, Baby Tiger, or Baby Purr.', 5000, 'random_pet_box'
+            WHERE NOT EXISTS (SELECT 1 FROM shop_items WHERE name = 'Pet Box');
+        """)
 
-                self.using_database = True
-                print(f"🎉 Success with: {strategy_name}")
-                print("✅ Database connected and ready!")
-                return True
+        # Re‑add the constraint with the updated type list
+        await conn.execute("""
+            ALTER TABLE shop_items ADD CONSTRAINT shop_items_type_check
+            CHECK (type IN ('role', 'color', 'weapon', 'random_weapon_box',
+                            'random_gear_box', 'random_accessories_box', 'pickaxe', 'material', 'potion', 'random_pet_box'));
+        """)
 
-            except Exception as e:
-                print(f"    ❌ Failed: {type(e).__name__}: {e}")
-                import traceback
-                traceback.print_exc()
-                if self.pool:
-                    await self.pool.close()
-                    self.pool = None
-                continue
+        # 🔽 ADD TITLES SEED HERE 🔽
+        await conn.execute("""
+            INSERT INTO titles (name, emoji, description,
+                                boss_damage_percent, extra_boss_attempts,
+                                hp_percent, def_percent, atk_percent,
+                                crit_chance, dodge_percent, dmg_reduction_percent,
+                                crit_dmg_res_percent, mining_bonus_percent,
+                                bleed_flat, burn_flat)
+            VALUES
+            ('Boss Reaper', '<:boss_reaper:1483707209090334820>', 'Earned by being the top 1 damage dealer in the server boss.',
+             5, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0),
+            ('Administrator', '<:administrator:1470082908151742536>', 'Exclusive title for Server Administrators.',
+             100, 100, 100, 100, 100, 100, 100, 100, 100, 100, 5000, 5000)
+            ON CONFLICT (name) DO NOTHING;
+        """)
+        # 🔼 END TITLES SEED
+
+        # ========== CREATE INDEXES ==========
+        await conn.execute('CREATE INDEX IF NOT EXISTS idx_user_purchases_user ON user_purchases(user_id)')
+        await conn.execute('CREATE INDEX IF NOT EXISTS idx_user_weapons_user ON user_weapons(user_id)')
+        await conn.execute('CREATE INDEX IF NOT EXISTS idx_user_weapons_equipped ON user_weapons(user_id, equipped)')
+        await conn.execute('CREATE INDEX IF NOT EXISTS idx_user_armor_user ON user_armor(user_id)')
+        await conn.execute('CREATE INDEX IF NOT EXISTS idx_user_armor_equipped ON user_armor(user_id, equipped)')
+        await conn.execute('CREATE INDEX IF NOT EXISTS idx_user_armor_set ON user_armor(user_id, set_name)')
+        await conn.execute('CREATE INDEX IF NOT EXISTS idx_user_armor_equipped_set ON user_armor(user_id, equipped, set_name)')
+        await conn.execute('CREATE INDEX IF NOT EXISTS idx_user_accessories_user ON user_accessories(user_id)')
+        await conn.execute('CREATE INDEX IF NOT EXISTS idx_user_accessories_equipped ON user_accessories(user_id, equipped, slot)')
+        await conn.execute('CREATE INDEX IF NOT EXISTS idx_user_accessories_set ON user_accessories(user_id, set_name)')
+        await conn.execute('CREATE INDEX IF NOT EXISTS idx_user_accessories_equipped_set ON user_accessories(user_id, equipped, set_name)')
+        await conn.execute('CREATE INDEX IF NOT EXISTS idx_user_pets_user ON user_pets(user_id)')
+        await conn.execute('CREATE INDEX IF NOT EXISTS idx_fortune_bags_active ON fortune_bags(active)')
+        await conn.execute('CREATE INDEX IF NOT EXISTS idx_participants_message_id ON fortune_bag_participants(message_id)')
+        await conn.execute('CREATE INDEX IF NOT EXISTS idx_user_set_bonuses_user ON user_set_bonuses(user_id)')
+        await conn.execute('CREATE INDEX IF NOT EXISTS idx_user_set_bonuses_active ON user_set_bonuses(user_id, bonus_active)')
+        await conn.execute('CREATE INDEX IF NOT EXISTS idx_user_weapons_effects ON user_weapons(user_id, equipped) WHERE equipped = TRUE')
+        await conn.execute('CREATE INDEX IF NOT EXISTS idx_user_pets_user ON user_pets(user_id)')
+        await conn.execute('CREATE INDEX IF NOT EXISTS idx_user_pets_equipped ON user_pets(user_id, equipped)')
+
+    async def _migration_002_title_crit_columns(self, conn):
+        """Title columns previously only added by admin commands; the stat engine reads them."""
+        await conn.execute('ALTER TABLE titles ADD COLUMN IF NOT EXISTS crit_damage INT DEFAULT 0;')
+        await conn.execute('ALTER TABLE titles ADD COLUMN IF NOT EXISTS crit_resist_percent INT DEFAULT 0;')
+
+    async def _migration_003_inventory_pages(self, conn):
+        """Keyset indexes for inventory pages and a trigger-maintained per-user item count."""
+        for table in ('user_weapons', 'user_armor', 'user_accessories'):
+            # Row-value keyset comparisons need non-null sort keys
+            await conn.execute(f"UPDATE {table} SET equipped = FALSE WHERE equipped IS NULL")
+            await conn.execute(f"UPDATE {table} SET purchased_at = 'epoch' WHERE purchased_at IS NULL")
+            await conn.execute(f"ALTER TABLE {table} ALTER COLUMN equipped SET NOT NULL")
+            await conn.execute(f"ALTER TABLE {table} ALTER COLUMN purchased_at SET NOT NULL")
+            await conn.execute(f"""
+                CREATE INDEX IF NOT EXISTS idx_{table}_inventory_page
+                ON {table} (user_id, equipped DESC, purchased_at DESC, id DESC)
+            """)
 
-        raise ConnectionError("All connection strategies failed. Could not connect to PostgreSQL.")
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS user_inventory_counts (
+                user_id TEXT PRIMARY KEY,
+                weapons INTEGER NOT NULL DEFAULT 0,
+                armor INTEGER NOT NULL DEFAULT 0,
+                accessories INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        await conn.execute('''
+            CREATE OR REPLACE FUNCTION bump_inventory_count(uid TEXT, tbl TEXT, delta INT) RETURNS void AS $$
+            BEGIN
+                INSERT INTO user_inventory_counts (user_id, weapons, armor, accessories)
+                VALUES (uid,
+                        CASE WHEN tbl = 'user_weapons' THEN delta ELSE 0 END,
+                        CASE WHEN tbl = 'user_armor' THEN delta ELSE 0 END,
+                        CASE WHEN tbl = 'user_accessories' THEN delta ELSE 0 END)
+                ON CONFLICT (user_id) DO UPDATE
+                SET weapons = user_inventory_counts.weapons + EXCLUDED.weapons,
+                    armor = user_inventory_counts.armor + EXCLUDED.armor,
+                    accessories = user_inventory_counts.accessories + EXCLUDED.accessories;
+            END
+            $$ LANGUAGE plpgsql;
+
+            CREATE OR REPLACE FUNCTION inventory_count_trigger() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                    PERFORM bump_inventory_count(NEW.user_id, TG_TABLE_NAME, 1);
+                END IF;
+                IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                    PERFORM bump_inventory_count(OLD.user_id, TG_TABLE_NAME, -1);
+                END IF;
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql;
+        ''')
+        for table in ('user_weapons', 'user_armor', 'user_accessories'):
+            await conn.execute(f"DROP TRIGGER IF EXISTS trg_{table}_inventory_count ON {table}")
+            await conn.execute(f"""
+                CREATE TRIGGER trg_{table}_inventory_count
+                AFTER INSERT OR DELETE OR UPDATE OF user_id ON {table}
+                FOR EACH ROW EXECUTE FUNCTION inventory_count_trigger()
+            """)
 
+        # Backfill from the current tables
+        await conn.execute('''
+            INSERT INTO user_inventory_counts (user_id, weapons, armor, accessories)
+            SELECT user_id, SUM(w)::int, SUM(a)::int, SUM(c)::int
+            FROM (
+                SELECT user_id, 1 AS w, 0 AS a, 0 AS c FROM user_weapons
+                UNION ALL SELECT user_id, 0, 1, 0 FROM user_armor
+                UNION ALL SELECT user_id, 0, 0, 1 FROM user_accessories
+            ) items
+            GROUP BY user_id
+            ON CONFLICT (user_id) DO UPDATE
+            SET weapons = EXCLUDED.weapons, armor = EXCLUDED.armor, accessories = EXCLUDED.accessories
+        ''')
+
+    async def _migration_004_leaderboard_indexes(self, conn):
+        """Ordered indexes for leaderboard rebuilds, reset payouts and the SQL fallbacks."""
+        await conn.execute('CREATE INDEX IF NOT EXISTS idx_boss_damage_rank ON boss_damage (reset_date, total_damage DESC);')
+        await conn.execute('CREATE INDEX IF NOT EXISTS idx_arena_stats_points ON arena_stats (points DESC);')
+        await conn.execute('CREATE INDEX IF NOT EXISTS idx_user_gems_gems ON user_gems (gems DESC);')
 
     async def add_gems(self, user_id: str, gems: int, reason: str = ""):
         """Add gems to a user"""
@@ -2052,52 +2571,103 @@ class DatabaseSystem:
             
         try:
             async with self.pool.acquire() as conn:
-                async with conn.transaction():
-                    # Check if user exists
-                    row = await conn.fetchrow(
-                        'SELECT gems FROM user_gems WHERE user_id = $1',
-                        user_id
+                # Upsert balance and record transaction in one statement
+                new_balance = await conn.fetchval('''
+                    WITH credited AS (
+                        INSERT INTO user_gems (user_id, gems, total_earned)
+                        VALUES ($1, $2, $2)
+                        ON CONFLICT (user_id) DO UPDATE
+                        SET gems = user_gems.gems + EXCLUDED.gems,
+                            total_earned = user_gems.total_earned + EXCLUDED.total_earned,
+                            updated_at = NOW()
+                        RETURNING user_id, gems
+                    ), tx AS (
+                        INSERT INTO user_transactions (user_id, type, gems, reason, balance_after)
+                        SELECT user_id, 'reward', $2, $3, gems FROM credited WHERE $4
                     )
+                    SELECT gems FROM credited
+                ''', user_id, gems, reason, not self.ledger.enabled)
+                if self.ledger.enabled:
+                    await self.ledger.record(user_id, 'reward', gems, reason, new_balance, conn=conn)
+                leaderboards.gems.set(user_id, new_balance)
 
-                    if row:
-                        # Update existing user
-                        await conn.execute('''
-                            UPDATE user_gems 
-                            SET gems = gems + $2,
-                                total_earned = total_earned + $2,
-                                updated_at = NOW()
-                            WHERE user_id = $1
-                            RETURNING gems
-                        ''', user_id, gems)
-                        
-                        # Get new balance
-                        new_row = await conn.fetchrow(
-                            'SELECT gems FROM user_gems WHERE user_id = $1',
-                            user_id
-                        )
-                        new_balance = new_row['gems']
-                    else:
-                        # Create new user
-                        await conn.execute('''
-                            INSERT INTO user_gems (user_id, gems, total_earned)
-                            VALUES ($1, $2, $2)
-                            RETURNING gems
-                        ''', user_id, gems)
-                        new_balance = gems
+                print(f"✅ [DB] Added {gems} gems to {user_id} (Balance: {new_balance}) Reason: {reason}")
+                return {"gems": gems, "balance": new_balance}
 
-                    # Record transaction
-                    await conn.execute('''
-                        INSERT INTO user_transactions (user_id, type, gems, reason, balance_after)
-                        VALUES ($1, 'reward', $2, $3, $4)
-                    ''', user_id, gems, reason, new_balance)
+        except Exception as e:
+            print(f"❌ Database error in add_gems: {e}")
+            raise
+
+    ADD_GEMS_BULK_SQL = '''
+        WITH entries AS (
+            SELECT * FROM unnest($1::text[], $2::int[], $3::text[]) AS e(user_id, gems, reason)
+        ), totals AS (
+            SELECT user_id, SUM(gems)::int AS gems
+            FROM entries GROUP BY user_id
+        ), credited AS (
+            INSERT INTO user_gems (user_id, gems, total_earned)
+            SELECT user_id, gems, gems FROM totals
+            ON CONFLICT (user_id) DO UPDATE
+            SET gems = user_gems.gems + EXCLUDED.gems,
+                total_earned = user_gems.total_earned + EXCLUDED.total_earned,
+                updated_at = NOW()
+            RETURNING user_id, gems
+        ), tx AS (
+            INSERT INTO user_transactions (user_id, type, gems, reason, balance_after)
+            SELECT e.user_id, 'reward', e.gems, e.reason, c.gems
+            FROM entries e JOIN credited c ON c.user_id = e.user_id
+            WHERE $4
+        )
+        SELECT c.user_id, t.gems, c.gems AS balance
+        FROM credited c JOIN totals t ON t.user_id = c.user_id
+    '''
+
+    async def add_gems_bulk(self, entries, conn=None):
+        """Add gems to many users in one statement.
+
+        `entries` is a list of (user_id, gems, reason). Returns
+        {user_id: {"gems": total_added, "balance": new_balance}}.
+        Pass `conn` to run inside the caller's transaction; the async-ledger
+        rows and leaderboard updates are then left to the caller, who passes
+        the result to `after_gems_bulk` once the transaction has committed.
+        """
+        if not self.using_database:
+            raise RuntimeError("Database not connected")
+        if not entries:
+            return {}
+
+        try:
+            user_ids = [str(e[0]) for e in entries]
+            amounts = [int(e[1]) for e in entries]
+            reasons = [e[2] if len(e) > 2 else "" for e in entries]
+
+            if conn is not None:
+                rows = await conn.fetch(self.ADD_GEMS_BULK_SQL, user_ids, amounts, reasons, not self.ledger.enabled)
+            else:
+                async with self.pool.acquire() as pooled:
+                    rows = await pooled.fetch(self.ADD_GEMS_BULK_SQL, user_ids, amounts, reasons, not self.ledger.enabled)
 
-                    print(f"✅ [DB] Added {gems} gems to {user_id} (Balance: {new_balance}) Reason: {reason}")
-                    return {"gems": gems, "balance": new_balance}
+            result = {row['user_id']: {"gems": row['gems'], "balance": row['balance']} for row in rows}
+            if conn is None:
+                await self.after_gems_bulk(entries, result)
+
+            print(f"✅ [DB] Bulk added gems to {len(rows)} users ({len(entries)} entries)")
+            return result
 
         except Exception as e:
-            print(f"❌ Database error in add_gems: {e}")
+            print(f"❌ Database error in add_gems_bulk: {e}")
             raise
 
+    async def after_gems_bulk(self, entries, result):
+        """Async-ledger rows and leaderboard updates for a committed add_gems_bulk."""
+        if self.ledger.enabled:
+            for e in entries:
+                uid = str(e[0])
+                await self.ledger.record(uid, 'reward', int(e[1]), e[2] if len(e) > 2 else "",
+                                         result.get(uid, {}).get("balance"))
+        for uid, credited in result.items():
+            leaderboards.gems.set(uid, credited["balance"])
+
     async def get_balance(self, user_id: str):
         """Get user balance"""
         if not self.using_database:
@@ -2225,65 +2795,57 @@ class DatabaseSystem:
             
         try:
             async with self.pool.acquire() as conn:
-                async with conn.transaction():
-                    # Get current streak and last daily
-                    row = await conn.fetchrow(
-                        'SELECT daily_streak, last_daily FROM user_gems WHERE user_id = $1',
-                        user_id
-                    )
-
-                    now = datetime.now(timezone.utc)
-                    postgres_now = now.replace(tzinfo=None)  # Remove timezone for PostgreSQL
-
-                    # Calculate new streak
-                    if not row or not row['last_daily']:
-                        new_streak = 1
-                    else:
-                        last_claim = row['last_daily']
-                        if last_claim.tzinfo is None:
-                            last_claim = last_claim.replace(tzinfo=timezone.utc)
-                        days_diff = (now - last_claim).days
-
-                        if days_diff == 1:
-                            new_streak = (row['daily_streak'] or 0) + 1
-                        elif days_diff > 1:
-                            new_streak = 1
-                        else:
-                            new_streak = row['daily_streak'] or 0
+                now = datetime.now(timezone.utc)
+                postgres_now = now.replace(tzinfo=None)  # Remove timezone for PostgreSQL
 
-                    # Base gems (1-100) + streak bonus (up to 100% extra)
-                    base_gems = random.randint(1, 100)
-                    streak_bonus = min(new_streak * 0.1, 1.0)
-                    bonus_gems = int(base_gems * streak_bonus)
-                    total_gems = base_gems + bonus_gems
+                # Base gems (1-100); streak bonus adds up to 100% extra
+                base_gems = random.randint(1, 100)
 
-                    # Update user with new daily claim
-                    await conn.execute('''
+                # Streak, payout, balance update and transaction in one statement
+                row = await conn.fetchrow('''
+                    WITH prev AS (
+                        SELECT daily_streak, last_daily
+                        FROM user_gems WHERE user_id = $1
+                        FOR UPDATE
+                    ), streak AS (
+                        SELECT CASE
+                                   WHEN p.last_daily IS NULL THEN 1
+                                   WHEN $3::timestamp - p.last_daily >= INTERVAL '2 days' THEN 1
+                                   WHEN $3::timestamp - p.last_daily >= INTERVAL '1 day' THEN COALESCE(p.daily_streak, 0) + 1
+                                   ELSE COALESCE(p.daily_streak, 0)
+                               END AS days
+                        FROM (SELECT 1) one
+                        LEFT JOIN prev p ON TRUE
+                    ), reward AS (
+                        SELECT days, $2::int + FLOOR($2::int * LEAST(days * 0.1, 1.0))::int AS gems
+                        FROM streak
+                    ), credited AS (
                         INSERT INTO user_gems (user_id, gems, total_earned, daily_streak, last_daily)
-                        VALUES ($1, $2, $2, $3, $4)
-                        ON CONFLICT (user_id) DO UPDATE 
-                        SET gems = user_gems.gems + $2,
-                            total_earned = user_gems.total_earned + $2,
-                            daily_streak = $3,
-                            last_daily = $4,
+                        SELECT $1, gems, gems, days, $3 FROM reward
+                        ON CONFLICT (user_id) DO UPDATE
+                        SET gems = user_gems.gems + EXCLUDED.gems,
+                            total_earned = user_gems.total_earned + EXCLUDED.total_earned,
+                            daily_streak = EXCLUDED.daily_streak,
+                            last_daily = EXCLUDED.last_daily,
                             updated_at = NOW()
-                        RETURNING gems
-                    ''', user_id, total_gems, new_streak, postgres_now)  # Use postgres_now
-
-                    # Get new balance
-                    new_row = await conn.fetchrow(
-                        'SELECT gems FROM user_gems WHERE user_id = $1',
-                        user_id
-                    )
-                    new_balance = new_row['gems']
-
-                    # Record transaction
-                    await conn.execute('''
+                        RETURNING user_id, gems
+                    ), tx AS (
                         INSERT INTO user_transactions (user_id, type, gems, reason, balance_after)
-                        VALUES ($1, 'daily', $2, $3, $4)
-                    ''', user_id, total_gems, f"🎁 Daily Reward (Streak: {new_streak} days)", new_balance)
+                        SELECT c.user_id, 'daily', r.gems,
+                               '🎁 Daily Reward (Streak: ' || r.days || ' days)', c.gems
+                        FROM credited c, reward r
+                        WHERE $4
+                    )
+                    SELECT r.gems, r.days, c.gems AS balance
+                    FROM credited c, reward r
+                ''', user_id, base_gems, postgres_now, not self.ledger.enabled)
+                if self.ledger.enabled:
+                    await self.ledger.record(user_id, 'daily', row['gems'],
+                                             f"🎁 Daily Reward (Streak: {row['days']} days)", row['balance'],
+                                             conn=conn)
+                leaderboards.gems.set(user_id, row['balance'])
 
-                    return {"gems": total_gems, "streak": new_streak, "balance": new_balance}
+                return {"gems": row['gems'], "streak": row['days'], "balance": row['balance']}
 
         except Exception as e:
             print(f"❌ Database error in claim_daily: {e}")
@@ -2323,39 +2885,26 @@ class DatabaseSystem:
             
         try:
             async with self.pool.acquire() as conn:
-                async with conn.transaction():
-                    # Check if user has enough gems
-                    row = await conn.fetchrow(
-                        'SELECT gems FROM user_gems WHERE user_id = $1',
-                        user_id
-                    )
-
-                    if not row or row['gems'] < gems:
-                        return False  # Not enough gems
-
-                    # Deduct gems
-                    await conn.execute('''
-                        UPDATE user_gems 
+                # Conditional debit: no row comes back if the balance is too low
+                new_balance = await conn.fetchval('''
+                    WITH debited AS (
+                        UPDATE user_gems
                         SET gems = gems - $2,
                             updated_at = NOW()
-                        WHERE user_id = $1
-                        RETURNING gems
-                    ''', user_id, gems)
-
-                    # Get new balance
-                    new_row = await conn.fetchrow(
-                        'SELECT gems FROM user_gems WHERE user_id = $1',
-                        user_id
-                    )
-                    new_balance = new_row['gems']
-
-                    # Record transaction
-                    await conn.execute('''
+                        WHERE user_id = $1 AND gems >= $2
+                        RETURNING user_id, gems
+                    ), tx AS (
                         INSERT INTO user_transactions (user_id, type, gems, reason, balance_after)
-                        VALUES ($1, 'purchase', $2, $3, $4)
-                    ''', user_id, -gems, reason, new_balance)
+                        SELECT user_id, 'purchase', -$2::int, $3, gems FROM debited WHERE $4
+                    )
+                    SELECT gems FROM debited
+                ''', user_id, gems, reason, not self.ledger.enabled)
+                if new_balance is not None:
+                    if self.ledger.enabled:
+                        await self.ledger.record(user_id, 'purchase', -gems, reason, new_balance, conn=conn)
+                    leaderboards.gems.set(user_id, new_balance)
 
-                    return True
+                return new_balance is not None
 
         except Exception as e:
             print(f"❌ Database error in deduct_gems: {e}")
@@ -2406,6 +2955,11 @@ class DatabaseSystem:
     async def close(self):
         """Close database connection pool"""
         if self.pool:
+            # Flush buffered ledger rows before the pool goes away
+            try:
+                await self.ledger.close()
+            except Exception as e:
+                print(f"❌ Ledger flush on close failed: {e}")
             await self.pool.close()
             self.using_database = False
             print("✅ Database connection pool closed")
@@ -2413,6 +2967,30 @@ class DatabaseSystem:
 # CREATE DATABASE INSTANCE
 db = DatabaseSystem()
 
+
+@bot.command(name='dbstats')
+@commands.has_permissions(administrator=True)
+async def db_stats(ctx, reset: str = None):
+    """Admin only: pool wait / query latency by call site. `!!dbstats reset` clears them."""
+    if reset == 'reset':
+        db_metrics.reset()
+        await ctx.send("✅ Database metrics cleared.")
+        return
+
+    def top_lines(table):
+        rows = sorted(table.items(), key=lambda kv: kv[1].total_ms, reverse=True)[:10]
+        return "\n".join(
+            f"`{site[:40]}` n={h.count} p50≤{h.percentile(50):g} p95≤{h.percentile(95):g} p99≤{h.percentile(99):g}ms"
+            for site, h in rows
+        ) or "No data yet."
+
+    embed = discord.Embed(title="🗄️ Database Metrics", color=discord.Color.blurple())
+    if db.pool:
+        embed.description = f"Pool: {db.pool.get_size()} open, {db.pool.get_idle_size()} idle, max {DB_POOL_MAX_SIZE}"
+    embed.add_field(name="⏳ Pool wait (top 10 by total time)", value=top_lines(db_metrics.pool_wait)[:1024], inline=False)
+    embed.add_field(name="⚡ Query time (top 10 by total time)", value=top_lines(db_metrics.query)[:1024], inline=False)
+    await ctx.send(embed=embed)
+
 # --- 2. Store user selections ---
 user_selections = {}
 
@@ -2429,6 +3007,14 @@ class CurrencySystem:
         """Add gems to user in PostgreSQL"""
         return await self.db.add_gems(user_id, gems, reason)
     
+    async def add_gems_bulk(self, entries, conn=None):
+        """Add gems to many users at once: [(user_id, gems, reason), ...]"""
+        return await self.db.add_gems_bulk(entries, conn=conn)
+    
+    async def after_gems_bulk(self, entries, result):
+        """Finish an add_gems_bulk that ran inside a caller's transaction, after it commits"""
+        return await self.db.after_gems_bulk(entries, result)
+    
     async def deduct_gems(self, user_id: str, gems: int, reason: str = ""):
         """Deduct gems from user in PostgreSQL"""
         return await self.db.deduct_gems(user_id, gems, reason)
@@ -2446,8 +3032,8 @@ class CurrencySystem:
         return await self.db.claim_daily(user_id)
     
     async def get_leaderboard(self, limit: int = 10):
-        """Get gems leaderboard from PostgreSQL"""
-        return await self.db.get_leaderboard(limit)
+        """Get gems leaderboard from the in-memory board"""
+        return [{"user_id": user_id, "gems": gems} for user_id, gems, _ in await leaderboards.gems.top(limit)]
     
     async def get_transactions(self, user_id: str, limit: int = 10):
         """Get user's recent transactions"""
@@ -2456,71 +3042,455 @@ class CurrencySystem:
 # === CREATE SHARED CURRENCY SYSTEM INSTANCE ===
 currency_system = CurrencySystem(db)
 
+
+# ========== CATALOG CACHE ==========
+class CatalogCache:
+    """Process-wide copy of the static catalog tables.
+
+    Loaded at startup and reloaded per table whenever an admin command
+    changes it. A lookup that misses reloads its table (at most once per
+    MISS_RELOAD_INTERVAL) so rows added by other paths still show up.
+    """
+
+    TABLES = {
+        'shop_items': 'item_id',
+        'titles': 'title_id',
+        'pet_types': 'pet_id',
+        'armor_types': 'armor_id',
+        'accessory_types': 'accessory_id',
+    }
+    MISS_RELOAD_INTERVAL = 30.0
+
+    def __init__(self):
+        self._by_id = {table: {} for table in self.TABLES}
+        self._by_name = {table: {} for table in self.TABLES}
+        self._loaded_at = {table: 0.0 for table in self.TABLES}
+        self._lock = asyncio.Lock()
+
+    async def refresh(self, *tables):
+        """Reload the given tables (all of them if none are named)."""
+        tables = tables or tuple(self.TABLES)
+        async with self._lock:
+            async with bot.db_pool.acquire() as conn:
+                for table in tables:
+                    key = self.TABLES[table]
+                    rows = await conn.fetch(f"SELECT * FROM {table} ORDER BY {key}")
+                    by_name = {}
+                    for row in rows:
+                        by_name.setdefault(row['name'], row)
+                    self._by_id[table] = {row[key]: row for row in rows}
+                    self._by_name[table] = by_name
+                    self._loaded_at[table] = time.monotonic()
+        print(f"📚 Catalog refreshed: {', '.join(tables)}")
+
+    async def _lookup(self, index, table, key):
+        row = index[table].get(key)
+        if row is None and time.monotonic() - self._loaded_at[table] > self.MISS_RELOAD_INTERVAL:
+            await self.refresh(table)
+            row = index[table].get(key)
+        return row
+
+    async def get(self, table: str, item_id: int):
+        """Catalog row by primary key, or None."""
+        return await self._lookup(self._by_id, table, item_id)
+
+    async def by_name(self, table: str, name: str):
+        """Catalog row by name, or None (lowest id wins on duplicate names)."""
+        return await self._lookup(self._by_name, table, name)
+
+    async def id_of(self, table: str, name: str):
+        row = await self.by_name(table, name)
+        return row[self.TABLES[table]] if row else None
+
+    async def item_id(self, name: str):
+        return await self.id_of('shop_items', name)
+
+    async def item(self, item_id: int):
+        return await self.get('shop_items', item_id)
+
+    async def title_id(self, name: str):
+        return await self.id_of('titles', name)
+
+
+catalog = CatalogCache()
+
+
+# ========== LEADERBOARDS ==========
+class Leaderboard:
+    """One ranking held in memory, kept current by the paths that change it.
+
+    Entries live in a list of (-score, user_id) keys kept sorted with bisect,
+    plus a score per user, so top-N pages are a slice and any user's rank is
+    a binary search. Postgres stays the source of truth: `loader` fills the
+    board on first use and again every LEADERBOARD_REBUILD_SECONDS.
+
+    `set` takes an absolute score (from write paths that return the new value);
+    sets that land while a rebuild is in flight are replayed on top of it.
+    `add` takes a delta and is dropped until the board is loaded, so its
+    loader must include anything not yet persisted.
+    """
+
+    def __init__(self, name: str, loader):
+        self.name = name
+        self._loader = loader          # async () -> [(user_id, score, info), ...]
+        self._keys: List[Tuple[int, str]] = []
+        self._scores: Dict[str, int] = {}
+        self._info: Dict[str, dict] = {}
+        self._loaded_at: Optional[float] = None
+        self._replay: Optional[list] = None
+        self._lock = asyncio.Lock()
+
+    def _stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > LEADERBOARD_REBUILD_SECONDS
+
+    def _put(self, user_id: str, score: int, info: Optional[dict]):
+        old = self._scores.get(user_id)
+        if old is not None:
+            del self._keys[bisect.bisect_left(self._keys, (-old, user_id))]
+        self._scores[user_id] = score
+        bisect.insort(self._keys, (-score, user_id))
+        if info:
+            self._info[user_id] = info
+
+    def set(self, user_id: str, score: int, **info):
+        user_id = str(user_id)
+        if self._replay is not None:
+            self._replay.append((user_id, score, info))
+        if self._loaded_at is not None:
+            self._put(user_id, score, info)
+
+    def add(self, user_id: str, delta: int):
+        user_id = str(user_id)
+        if self._loaded_at is not None:
+            self._put(user_id, self._scores.get(user_id, 0) + delta, None)
+
+    def invalidate(self):
+        """Drop the board after a bulk change; the next read rebuilds it."""
+        self._loaded_at = None
+
+    async def _ensure(self):
+        if not self._stale():
+            return
+        async with self._lock:
+            if not self._stale():
+                return
+            self._replay = []
+            try:
+                rows = await self._loader()
+            except Exception:
+                self._replay = None
+                raise
+            self._scores = {str(user_id): score for user_id, score, _ in rows}
+            self._info = {str(user_id): info for user_id, _, info in rows if info}
+            self._keys = sorted((-score, user_id) for user_id, score in self._scores.items())
+            replay, self._replay = self._replay, None
+            self._loaded_at = time.monotonic()
+            for user_id, score, info in replay:
+                self._put(user_id, score, info)
+            print(f"🏆 Leaderboard rebuilt: {self.name} ({len(self._keys)} entries)")
+
+    async def top(self, limit: int = 10) -> List[Tuple[str, int, dict]]:
+        """The first `limit` entries as (user_id, score, info), best first."""
+        await self._ensure()
+        return [(user_id, -neg, self._info.get(user_id, {})) for neg, user_id in self._keys[:limit]]
+
+    async def rank(self, user_id: str) -> Optional[Tuple[int, int]]:
+        """(1-based rank, score) for a user, or None if they aren't on the board."""
+        await self._ensure()
+        user_id = str(user_id)
+        score = self._scores.get(user_id)
+        if score is None:
+            return None
+        return bisect.bisect_left(self._keys, (-score, user_id)) + 1, score
+
+
+class LeaderboardRegistry:
+    """The gem and arena boards plus one boss damage board per reset date."""
+
+    def __init__(self):
+        self.gems = Leaderboard('gems', self._load_gems)
+        self.arena = Leaderboard('arena', self._load_arena)
+        self._boss: Dict[date, Leaderboard] = {}
+
+    def boss(self, reset_date: date) -> Leaderboard:
+        board = self._boss.get(reset_date)
+        if board is None:
+            board = self._boss[reset_date] = Leaderboard(
+                f'boss {reset_date}', lambda: boss_ledger.damage_totals(reset_date)
+            )
+        return board
+
+    def drop_boss(self, reset_date: date):
+        self._boss.pop(reset_date, None)
+
+    async def _load_gems(self):
+        async with bot.db_pool.acquire() as conn:
+            rows = await conn.fetch("SELECT user_id, gems FROM user_gems")
+        return [(row['user_id'], row['gems'], None) for row in rows]
+
+    async def _load_arena(self):
+        async with bot.db_pool.acquire() as conn:
+            rows = await conn.fetch("SELECT user_id, points, wins, losses FROM arena_stats")
+        return [(row['user_id'], row['points'], {'wins': row['wins'], 'losses': row['losses']}) for row in rows]
+
+
+leaderboards = LeaderboardRegistry()
+
+
+# ========== NAME RESOLVER ==========
+class NameResolver:
+    """Batched user/member lookups for anything that renders lists of players.
+
+    Discord's own cache answers first. Members missing from a guild's cache
+    are requested in one gateway `query_members` call per 100 ids, and users
+    still unknown are fetched over HTTP with bounded concurrency. Results sit
+    in an LRU with a TTL, and concurrent lookups of the same id share one
+    in-flight request. "Not found" is cached only when Discord said so (a
+    NotFound, or an id absent from a successful query_members reply); errors
+    and cancellations leave the cache untouched so the next render retries.
+    """
+
+    QUERY_CHUNK = 100  # gateway limit for query_members(user_ids=...)
+
+    def __init__(self, maxsize: int, ttl: float, concurrency: int):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._cache: OrderedDict = OrderedDict()     # (guild_id or 0, user_id) -> (obj, expires)
+        self._inflight: Dict[Tuple[int, int], asyncio.Future] = {}
+        self._fetch_slots = asyncio.Semaphore(concurrency)
+
+    @staticmethod
+    def fallback(user_id) -> str:
+        return f"User {str(user_id)[:6]}"
+
+    def _cached(self, key):
+        entry = self._cache.get(key)
+        if entry is None:
+            return False, None
+        if entry[1] < time.monotonic():
+            del self._cache[key]
+            return False, None
+        self._cache.move_to_end(key)
+        return True, entry[0]
+
+    def _store(self, key, obj):
+        self._cache[key] = (obj, time.monotonic() + self.ttl)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+
+    async def resolve(self, user_ids, guild: Optional[discord.Guild] = None) -> Dict[int, Optional[discord.abc.User]]:
+        """Map each id to a Member (when `guild` is given and they're in it), a User, or None."""
+        ids = list(dict.fromkeys(int(uid) for uid in user_ids))
+        result = await self._resolve(ids, guild)
+        if guild is not None:
+            strays = [uid for uid in ids if result.get(uid) is None]
+            if strays:
+                result.update(await self._resolve(strays, None))
+        return result
+
+    async def user(self, user_id, guild: Optional[discord.Guild] = None) -> Optional[discord.abc.User]:
+        return (await self.resolve([user_id], guild)).get(int(user_id))
+
+    async def names(self, user_ids, guild: Optional[discord.Guild] = None) -> Dict[int, str]:
+        """Display names by id, with a placeholder for users that can't be found."""
+        found = await self.resolve(user_ids, guild)
+        return {uid: obj.display_name if obj else self.fallback(uid) for uid, obj in found.items()}
+
+    async def _resolve(self, ids: List[int], guild: Optional[discord.Guild]) -> Dict[int, Any]:
+        guild_id = guild.id if guild else 0
+        result, waiting, todo = {}, {}, []
+        for uid in ids:
+            local = guild.get_member(uid) if guild else bot.get_user(uid)
+            if local is not None:
+                result[uid] = local
+                continue
+            key = (guild_id, uid)
+            hit, obj = self._cached(key)
+            if hit:
+                result[uid] = obj
+            elif key in self._inflight:
+                waiting[uid] = self._inflight[key]
+            else:
+                self._inflight[key] = asyncio.get_running_loop().create_future()
+                todo.append(uid)
+
+        if todo:
+            fetched, absent = {}, set()
+            try:
+                fetched, absent = await (self._query_members(guild, todo) if guild else self._fetch_users(todo))
+            finally:
+                # Settle every future we own, even on error or cancellation, so waiters never hang
+                for uid in todo:
+                    obj = fetched.get(uid)
+                    if obj is not None or uid in absent:
+                        self._store((guild_id, uid), obj)
+                    future = self._inflight.pop((guild_id, uid))
+                    if not future.done():
+                        future.set_result(obj)
+                    result[uid] = obj
+
+        for uid, future in waiting.items():
+            result[uid] = await asyncio.shield(future)
+        return result
+
+    async def _query_members(self, guild: discord.Guild, ids: List[int]) -> Tuple[Dict[int, discord.Member], set]:
+        """(members found, ids a successful reply showed aren't in the guild)."""
+        found, absent = {}, set()
+        for start in range(0, len(ids), self.QUERY_CHUNK):
+            chunk = ids[start:start + self.QUERY_CHUNK]
+            try:
+                members = await guild.query_members(user_ids=chunk, limit=len(chunk), cache=True)
+            except Exception as e:
+                print(f"⚠️ query_members failed in {guild.id}: {e}")
+                continue
+            found.update((member.id, member) for member in members)
+            absent.update(uid for uid in chunk if uid not in found)
+        return found, absent
+
+    async def _fetch_users(self, ids: List[int]) -> Tuple[Dict[int, discord.User], set]:
+        """(users fetched, ids Discord answered NotFound for); other errors are neither."""
+        found, absent = {}, set()
+
+        async def fetch(uid):
+            async with self._fetch_slots:
+                try:
+                    found[uid] = await bot.fetch_user(uid)
+                except discord.NotFound:
+                    absent.add(uid)
+                except (discord.HTTPException, asyncio.TimeoutError) as e:
+                    print(f"⚠️ fetch_user {uid} failed: {e}")
+
+        await asyncio.gather(*(fetch(uid) for uid in ids))
+        return found, absent
+
+
+name_resolver = NameResolver(NAME_CACHE_SIZE, NAME_CACHE_TTL, NAME_FETCH_CONCURRENCY)
+
 # --- 2. Store user selections ---
 user_selections = {}
 
 
 # FORTUNE BAG SYSTEM CLASS
 class FortuneBag:
+    """A gem bag whose claims are arbitrated in memory and written in batches.
+
+    Bags live in a single process (bot.active_bags), so the in-memory
+    remaining/participants are authoritative; the database is updated by
+    flush() with one statement per batch of claims.
+    """
+
+    FLUSH_DELAY = 1.0  # seconds; claims inside this window share one write
+
     def __init__(self, message_id: int, channel_id: int, dropper_id: int,
-                 remaining: int = 1000, total: int = 1000, active: bool = True):
+                 remaining: int = 1000, total: int = 1000, active: bool = True,
+                 participants: Optional[Dict[int, int]] = None):
         self.message_id = message_id
         self.channel_id = channel_id
         self.dropper_id = dropper_id
         self.remaining = remaining
         self.total = total
         self.active = active
+        self.participants: Dict[int, int] = dict(participants or {})
+        self._pending: Dict[int, int] = {}
+        self._batch_done: Optional[asyncio.Future] = None
+        self._flush_lock = asyncio.Lock()
 
     async def award(self, bot: commands.Bot, user_id: int) -> int:
-        async with bot.db_pool.acquire() as conn:
-            async with conn.transaction():
-                row = await conn.fetchrow(
-                    "SELECT remaining FROM fortune_bags WHERE message_id = $1 FOR UPDATE",
-                    self.message_id
-                )
-                if not row or row['remaining'] <= 0:
-                    return 0
-
-                # Check if user already claimed from this bag
-                existing = await conn.fetchval(
-                    "SELECT 1 FROM fortune_bag_participants WHERE message_id = $1 AND user_id = $2",
-                    self.message_id, user_id
-                )
-                if existing:
-                    return -1
-
+        """Claim from the bag without touching the database.
 
-                amount = random.randint(1, min(100, row['remaining']))
-                new_remaining = row['remaining'] - amount
+        Returns the gems won, 0 if the bag is empty, -1 if the user already claimed.
+        """
+        if not self.active or self.remaining <= 0:
+            return 0
+        if user_id in self.participants:
+            return -1
 
-                await conn.execute(
-                    "UPDATE fortune_bags SET remaining = $1 WHERE message_id = $2",
-                    new_remaining, self.message_id
-                )
+        amount = random.randint(1, min(100, self.remaining))
+        self.remaining -= amount
+        self.participants[user_id] = amount
+        self._pending[user_id] = amount
+        if self.remaining <= 0:
+            self.active = False
 
-                await conn.execute("""
-                    INSERT INTO fortune_bag_participants (message_id, user_id, earned)
-                    VALUES ($1, $2, $3)
-                    ON CONFLICT (message_id, user_id)
-                    DO UPDATE SET earned = fortune_bag_participants.earned + $3
-                """, self.message_id, user_id, amount)
+        self._schedule_flush(bot)
+        return amount
 
-                self.remaining = new_remaining
-                if new_remaining <= 0:
-                    self.active = False
-                    await conn.execute(
-                        "UPDATE fortune_bags SET active = FALSE WHERE message_id = $1",
-                        self.message_id
-                    )
+    def pending_write(self) -> Optional[asyncio.Future]:
+        """Future resolving to {user_id: new_balance} once the current batch is written."""
+        return self._batch_done
 
-        # 🔥 ADD THIS – give real gems to user's permanent balance
-        await currency_system.add_gems(
-            user_id=str(user_id),          # convert to string – your table uses TEXT
-            gems=amount,
-            reason="🎁 Fortune Bag"
-        )
+    def _schedule_flush(self, bot: commands.Bot):
+        if self._batch_done is None:
+            self._batch_done = asyncio.get_running_loop().create_future()
+            delay = self.FLUSH_DELAY if self.active else 0
+            asyncio.create_task(self._flush_later(bot, delay))
 
-        return amount
+    async def _flush_later(self, bot: commands.Bot, delay: float):
+        await asyncio.sleep(delay)
+        done, self._batch_done = self._batch_done, None
+        try:
+            balances = await self.flush(bot)
+            done.set_result(balances)
+        except Exception as e:
+            print(f"❌ Fortune bag {self.message_id} flush failed: {e}")
+            traceback.print_exc()
+            done.set_result({})
+            # Claims were put back by flush(); try again later
+            if self._pending:
+                self._schedule_flush(bot)
+
+    async def flush(self, bot: commands.Bot) -> Dict[int, int]:
+        """Write pending claims, the bag state and the gem credits in one statement."""
+        async with self._flush_lock:
+            if not self._pending:
+                return {}
+            batch, self._pending = self._pending, {}
+            user_ids = list(batch)
+            earned = [batch[uid] for uid in user_ids]
+            try:
+                async with bot.db_pool.acquire() as conn:
+                    rows = await conn.fetch("""
+                        WITH claims AS (
+                            SELECT * FROM unnest($2::bigint[], $3::int[]) AS c(user_id, earned)
+                        ), bag AS (
+                            UPDATE fortune_bags SET remaining = $4, active = $5
+                            WHERE message_id = $1
+                        ), joined AS (
+                            INSERT INTO fortune_bag_participants (message_id, user_id, earned)
+                            SELECT $1, user_id, earned FROM claims
+                            ON CONFLICT (message_id, user_id)
+                            DO UPDATE SET earned = fortune_bag_participants.earned + EXCLUDED.earned
+                        ), credited AS (
+                            INSERT INTO user_gems (user_id, gems, total_earned)
+                            SELECT user_id::text, earned, earned FROM claims
+                            ON CONFLICT (user_id) DO UPDATE
+                            SET gems = user_gems.gems + EXCLUDED.gems,
+                                total_earned = user_gems.total_earned + EXCLUDED.total_earned,
+                                updated_at = NOW()
+                            RETURNING user_id, gems
+                        ), tx AS (
+                            INSERT INTO user_transactions (user_id, type, gems, reason, balance_after)
+                            SELECT c.user_id, 'reward', cl.earned, '🎁 Fortune Bag', c.gems
+                            FROM credited c JOIN claims cl ON cl.user_id::text = c.user_id
+                            WHERE $6
+                        )
+                        SELECT user_id, gems FROM credited
+                    """, self.message_id, user_ids, earned, self.remaining, self.active,
+                        not db.ledger.enabled)
+            except Exception:
+                # Put the claims back so the next flush retries them
+                for uid, amount in batch.items():
+                    self._pending[uid] = self._pending.get(uid, 0) + amount
+                raise
+
+        balances = {int(row['user_id']): row['gems'] for row in rows}
+        for uid, gems in balances.items():
+            leaderboards.gems.set(str(uid), gems)
+        if db.ledger.enabled:
+            for uid, amount in batch.items():
+                await db.ledger.record(str(uid), 'reward', amount, '🎁 Fortune Bag', balances.get(uid))
+        return balances
 
 async def post_leaderboard(bag: FortuneBag, channel: discord.TextChannel, bot: commands.Bot):
     async with bot.db_pool.acquire() as conn:
@@ -2536,14 +3506,15 @@ async def post_leaderboard(bag: FortuneBag, channel: discord.TextChannel, bot: c
         color=discord.Color.green()
     )
 
+    users = await name_resolver.resolve([row['user_id'] for row in rows], channel.guild)
     for idx, row in enumerate(rows, start=1):
-        user = bot.get_user(row['user_id']) or await bot.fetch_user(row['user_id'])
+        user = users.get(row['user_id'])
         embed.add_field(
-            name=f"{idx}. {user.display_name}",
+            name=f"{idx}. {user.display_name if user else name_resolver.fallback(row['user_id'])}",
             value=f"{row['earned']} gems",
             inline=False
         )
-        if idx == 1:
+        if idx == 1 and user:
             embed.set_thumbnail(url=user.display_avatar.url)
 
     await channel.send(embed=embed)
@@ -2721,6 +3692,205 @@ async def reply_message(
 
 ## QUIZ SYSTEM-----------
 
+# Typo tolerance for quiz answers, in edits. 0 keeps the "correct spelling
+# only" rule; fuzzy matching never applies to short or numeric answers.
+QUIZ_FUZZY_EDITS = int(os.getenv('QUIZ_FUZZY_EDITS', '0'))
+QUIZ_FUZZY_MIN_LENGTH = 5
+
+_ANSWER_APOSTROPHES = re.compile(r"['’`´]")
+_ANSWER_PUNCTUATION = re.compile(r"[^\w\s]+|_")
+
+
+def normalize_answer(text: str) -> str:
+    """Canonical form for comparing answers: NFKC, casefolded, punctuation as spaces."""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = _ANSWER_APOSTROPHES.sub("", text)
+    return " ".join(_ANSWER_PUNCTUATION.sub(" ", text).split())
+
+
+def _deletions(word: str, depth: int) -> set:
+    """Every string reachable from `word` by deleting up to `depth` characters."""
+    out = {word}
+    frontier = {word}
+    for _ in range(depth):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        out |= frontier
+    return out
+
+
+def _within_edits(a: str, b: str, limit: int) -> bool:
+    """Levenshtein distance <= limit, computed on a band of width 2*limit+1."""
+    if abs(len(a) - len(b)) > limit:
+        return False
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i] + [limit + 1] * len(b)
+        for j in range(max(1, i - limit), min(len(b), i + limit) + 1):
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ca != b[j - 1]),
+            )
+        if min(current) > limit:
+            return False
+        previous = current
+    return previous[-1] <= limit
+
+
+class CompiledAnswers:
+    """Normalised accepted answers for one question, built once per quiz load.
+
+    Exact matches are a frozenset lookup. With fuzzy matching on, every answer's
+    deletion neighbourhood is indexed up front, so a typo costs a few dict
+    probes plus one banded distance check instead of a scan of all answers.
+    """
+
+    __slots__ = ("exact", "max_length", "max_edits", "_neighbours")
+
+    def __init__(self, answers: List[str], max_edits: int = 0):
+        self.exact = frozenset(normalize_answer(a) for a in answers)
+        self.max_edits = max_edits
+        self.max_length = max((len(a) for a in self.exact), default=0) + max_edits
+        self._neighbours: Dict[str, frozenset] = {}
+        if max_edits <= 0:
+            return
+        index: Dict[str, set] = {}
+        for answer in self.exact:
+            if len(answer) < QUIZ_FUZZY_MIN_LENGTH or not any(c.isalpha() for c in answer):
+                continue
+            for variant in _deletions(answer, max_edits):
+                index.setdefault(variant, set()).add(answer)
+        self._neighbours = {k: frozenset(v) for k, v in index.items()}
+
+    def matches(self, normalized: str) -> bool:
+        if normalized in self.exact:
+            return True
+        if not self._neighbours or len(normalized) > self.max_length:
+            return False
+        for variant in _deletions(normalized, self.max_edits):
+            for answer in self._neighbours.get(variant, ()):
+                if _within_edits(normalized, answer, self.max_edits):
+                    return True
+        return False
+
+
+def compile_questions(questions: List[Dict]) -> List[Dict]:
+    """Attach a CompiledAnswers matcher to each question dict (in place)."""
+    for q in questions:
+        q['matcher'] = CompiledAnswers(q['a'], QUIZ_FUZZY_EDITS)
+    return questions
+
+
+# Question bank: quiz_questions.json is the editable source; it is indexed
+# into a SQLite file on first use and re-indexed whenever the JSON changes.
+_BOT_DIR = os.path.dirname(os.path.abspath(__file__))
+QUIZ_QUESTIONS_PATH = os.getenv('QUIZ_QUESTIONS_PATH', os.path.join(_BOT_DIR, 'quiz_questions.json'))
+QUIZ_BANK_PATH = os.getenv('QUIZ_BANK_PATH', os.path.join(_BOT_DIR, 'quiz_questions.sqlite3'))
+QUIZ_RECENT_QUIZZES = int(os.getenv('QUIZ_RECENT_QUIZZES', '3'))
+
+
+class QuestionBank:
+    """SQLite-backed quiz questions indexed by category and difficulty (points).
+
+    Sampling reads only ids from the index and then the chosen rows, so the
+    bank is never held in memory. Questions used by the last few quizzes are
+    kept in an integer bitmap and skipped while enough fresh ones remain.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        CREATE TABLE IF NOT EXISTS questions (
+            id INTEGER PRIMARY KEY,
+            cat TEXT NOT NULL,
+            pts INTEGER NOT NULL,
+            time INTEGER NOT NULL,
+            q TEXT NOT NULL,
+            a TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_questions_cat_pts ON questions (cat, pts);
+        CREATE INDEX IF NOT EXISTS idx_questions_pts ON questions (pts);
+    """
+
+    def __init__(self, source_path: str, db_path: str, recent_quizzes: int):
+        self.source_path = source_path
+        self.db_path = db_path
+        self._recent: deque = deque(maxlen=max(recent_quizzes, 1))
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path)
+        conn.executescript(self.SCHEMA)
+        return conn
+
+    def _fingerprint(self) -> str:
+        st = os.stat(self.source_path)
+        return f"{st.st_mtime_ns}:{st.st_size}"
+
+    def _refresh(self, conn: sqlite3.Connection):
+        """Re-index the JSON source if it changed since the last build (hot reload)."""
+        fingerprint = self._fingerprint()
+        row = conn.execute("SELECT value FROM meta WHERE key = 'source'").fetchone()
+        if row and row[0] == fingerprint:
+            return
+        with open(self.source_path, encoding='utf-8') as f:
+            questions = json.load(f)
+        with conn:
+            conn.execute("DELETE FROM questions")
+            conn.executemany(
+                "INSERT INTO questions (cat, pts, time, q, a) VALUES (?, ?, ?, ?, ?)",
+                [(q['cat'], q['pts'], q['time'], q['q'], json.dumps(q['a'], ensure_ascii=False)) for q in questions]
+            )
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('source', ?)", (fingerprint,))
+        # Row ids were reassigned, so the recent bitmap no longer applies
+        self._recent.clear()
+        print(f"📚 Indexed {len(questions)} quiz questions from {os.path.basename(self.source_path)}")
+
+    def sample(self, count: int, category: Optional[str] = None, difficulty: Optional[int] = None) -> List[Dict]:
+        """Pick `count` random questions, avoiding ones used in recent quizzes."""
+        with self._lock:
+            conn = self._connect()
+            try:
+                self._refresh(conn)
+                where, params = [], []
+                if category is not None:
+                    where.append("cat = ?")
+                    params.append(category)
+                if difficulty is not None:
+                    where.append("pts = ?")
+                    params.append(difficulty)
+                sql = "SELECT id FROM questions" + (" WHERE " + " AND ".join(where) if where else "")
+                ids = [r[0] for r in conn.execute(sql, params)]
+
+                used = 0
+                for mask in self._recent:
+                    used |= mask
+                fresh = [i for i in ids if not (used >> i) & 1]
+                if len(fresh) >= count:
+                    chosen = random.sample(fresh, count)
+                else:
+                    stale = [i for i in ids if (used >> i) & 1]
+                    chosen = fresh + random.sample(stale, min(count - len(fresh), len(stale)))
+                    random.shuffle(chosen)
+
+                mask = 0
+                for i in chosen:
+                    mask |= 1 << i
+                self._recent.append(mask)
+
+                marks = ",".join("?" * len(chosen))
+                rows = conn.execute(
+                    f"SELECT id, cat, pts, time, q, a FROM questions WHERE id IN ({marks})", chosen
+                ).fetchall() if chosen else []
+            finally:
+                conn.close()
+
+        by_id = {r[0]: r for r in rows}
+        return [
+            {"id": r[0], "cat": r[1], "pts": r[2], "time": r[3], "q": r[4], "a": json.loads(r[5])}
+            for r in (by_id[i] for i in chosen)
+        ]
+
+
 class QuizSystem:
     def __init__(self, bot):
         self.bot = bot
@@ -2749,159 +3919,8 @@ class QuizSystem:
     # QUESTION LOADING
     # ------------------------------------------------------------
     def load_questions(self):
-        """Load a large pool of categorized quiz questions."""
-        self.all_questions = [
-            # 🎨 Arts & Literature
-            {"cat": "🎨 Arts & Literature", "q": "Who painted the Mona Lisa?", "a": ["leonardo da vinci", "da vinci", "leonardo"], "pts": 300, "time": 30},
-            {"cat": "🎨 Arts & Literature", "q": "Who wrote 'Romeo and Juliet'?", "a": ["shakespeare", "william shakespeare"], "pts": 300, "time": 30},
-            {"cat": "🎨 Arts & Literature", "q": "Who painted The Starry Night?", "a": ["van gogh", "vincent van gogh"], "pts": 300, "time": 30},
-            {"cat": "🎨 Arts & Literature", "q": "What is the best‑selling book series of all time?", "a": ["harry potter"], "pts": 300, "time": 30},
-            {"cat": "🎨 Arts & Literature", "q": "Who sculpted David?", "a": ["michelangelo"], "pts": 300, "time": 30},
-
-            # 🏛️ History
-            {"cat": "🏛️ History", "q": "In which year did the Titanic sink?", "a": ["1912"], "pts": 300, "time": 30},
-            {"cat": "🏛️ History", "q": "Who was the first US president?", "a": ["washington", "george washington"], "pts": 300, "time": 30},
-            {"cat": "🏛️ History", "q": "When did World War II end?", "a": ["1945"], "pts": 300, "time": 30},
-            {"cat": "🏛️ History", "q": "Who was the first man on the moon?", "a": ["armstrong", "neil armstrong"], "pts": 300, "time": 30},
-            {"cat": "🏛️ History", "q": "What year did the Berlin Wall fall?", "a": ["1989"], "pts": 300, "time": 30},
-
-            # 🎵 Entertainment
-            {"cat": "🎵 Entertainment", "q": "Which band performed 'Bohemian Rhapsody'?", "a": ["queen"], "pts": 300, "time": 30},
-            {"cat": "🎵 Entertainment", "q": "What is the highest‑grossing film of all time?", "a": ["avatar"], "pts": 300, "time": 30},
-            {"cat": "🎵 Entertainment", "q": "Who created Mickey Mouse?", "a": ["disney", "walt disney"], "pts": 300, "time": 30},
-            {"cat": "🎵 Entertainment", "q": "What year was the first iPhone released?", "a": ["2007"], "pts": 300, "time": 30},
-            {"cat": "🎵 Entertainment", "q": "What is the name of the protagonist in 'The Legend of Zelda'?", "a": ["link"], "pts": 300, "time": 30},
-
-            # 🏅 Sports
-            {"cat": "🏅 Sports", "q": "How many players are on a soccer team?", "a": ["11"], "pts": 200, "time": 30},
-            {"cat": "🏅 Sports", "q": "What country won the FIFA World Cup in 2018?", "a": ["france"], "pts": 300, "time": 30},
-            {"cat": "🏅 Sports", "q": "What is the diameter of a basketball hoop in inches?", "a": ["18"], "pts": 400, "time": 30},
-            {"cat": "🏅 Sports", "q": "Who has won the most Olympic gold medals?", "a": ["phelps", "michael phelps"], "pts": 300, "time": 30},
-            {"cat": "🏅 Sports", "q": "What sport is played at Wimbledon?", "a": ["tennis"], "pts": 200, "time": 30},
-
-            # 🍔 Food & Drink
-            {"cat": "🍔 Food & Drink", "q": "What is the main ingredient in guacamole?", "a": ["avocado"], "pts": 200, "time": 30},
-            {"cat": "🍔 Food & Drink", "q": "Which country is famous for croissants?", "a": ["france"], "pts": 200, "time": 30},
-            {"cat": "🍔 Food & Drink", "q": "What type of pasta is shaped like small rice grains?", "a": ["orzo"], "pts": 400, "time": 30},
-            {"cat": "🍔 Food & Drink", "q": "What is the national drink of Japan?", "a": ["sake"], "pts": 300, "time": 30},
-            {"cat": "🍔 Food & Drink", "q": "What fruit is dried to make prunes?", "a": ["plum", "plums"], "pts": 300, "time": 30},
-
-            # 📘 ENGLISH – Professional Precision
-            {"cat": "📘 Advanced English", "q": "Correct the sentence: The data suggests that the results is inaccurate.", "a": ["are"], "pts": 200, "time": 30},
-            {"cat": "📘 English", "q": "Provide the synonym of 'parsimonious'.", "a": ["stingy", "frugal"], "pts": 200, "time": 30},
-            {"cat": "📘 English", "q": "Provide the antonym of 'transient'.", "a": ["permanent", "lasting"], "pts": 200, "time": 30},
-            {"cat": "📘 English", "q": "What rhetorical device is used in: 'Time is a thief'?", "a": ["metaphor"], "pts": 200, "time": 30},
-            {"cat": "📘 English", "q": "Give the correct form: Neither the officers nor the chief ___ present.", "a": ["was"], "pts": 200, "time": 30},
-            {"cat": "📘 English", "q": "Complete the idiom: 'Bite the ___' (meaning to endure something unpleasant).", "a": ["bullet"], "pts": 400, "time": 60},
-            {"cat": "📘 English", "q": "What is the correct past participle of the verb 'to ring' (as in a bell)?", "a": ["rung"], "pts": 400, "time": 60},
-            {"cat": "📘 English", "q": "In the sentence 'She would have gone if she had known', which tense is 'would have gone'?", "a": ["conditional perfect", "past conditional"], "pts": 500, "time": 60},
-            {"cat": "📘 English", "q": "What is the term for a verb that functions as a noun (e.g., 'swimming' in 'Swimming is fun')?", "a": ["gerund"], "pts": 400, "time": 60},
-            {"cat": "📘 English", "q": "Complete the idiom: 'Spill the ___' (to reveal secret information).", "a": ["beans"], "pts": 400, "time": 60},
-            {"cat": "📘 English", "q": "Which type of conditional is used in: 'If I had seen him, I would have told him'?", "a": ["third conditional", "type 3 conditional"], "pts": 500, "time": 60},
-            {"cat": "📘 English", "q": "What is the meaning of the phrasal verb 'to put up with'?", "a": ["tolerate", "endure"], "pts": 400, "time": 60},
-            {"cat": "📘 English", "q": "What is the term for two or more words that share the same spelling but have different meanings and origins (e.g., 'bank' – financial institution / river bank)?", "a": ["homograph"], "pts": 400, "time": 60},
-            {"cat": "📘 English", "q": "Complete the idiom: '___ the bullet' (to face a difficult situation bravely).", "a": ["bite"], "pts": 400, "time": 60},
-            {"cat": "📘 English", "q": "Which tense is used to describe an action that will be completed before a specific time in the future (e.g., 'By next week, I will have finished the project')?", "a": ["future perfect"], "pts": 500, "time": 60},
-            {"cat": "📘 English", "q": "What is the correct form: 'Neither the students nor the teacher ___ aware of the change.'", "a": ["is"], "pts": 500, "time": 60},
-            {"cat": "📘 English", "q": "What is the meaning of the idiom 'to let the cat out of the bag'?", "a": ["reveal a secret"], "pts": 400, "time": 60},
-            {"cat": "📘 English", "q": "In grammar, what is a 'dangling modifier'?", "a": ["a word or phrase that modifies a word not clearly stated in the sentence"], "pts": 500, "time": 60},
-            {"cat": "📘 English", "q": "Complete the idiom: '___ the icing on the cake' (something extra that makes a good thing even better).", "a": ["it's", "that's", "that is"], "pts": 400, "time": 60},
-            {"cat": "📘 English", "q": "What is the correct plural of 'phenomenon'?", "a": ["phenomena"], "pts": 400, "time": 60},
-            {"cat": "📘 English", "q": "Which tense is used in: 'She has been working here for five years'?", "a": ["present perfect continuous", "present perfect progressive"], "pts": 500, "time": 60},
-            {"cat": "📘 English", "q": "What is the meaning of the idiom 'to burn the midnight oil'?", "a": ["work late into the night"], "pts": 400, "time": 60},
-            {"cat": "📘 English", "q": "Correct the sentence: 'Each of the students have submitted their assignment.' What should replace 'have'?", "a": ["has"], "pts": 500, "time": 60},
-            {"cat": "📘 English", "q": "What is the term for a word that is formed by combining two or more words, like 'brunch' (breakfast + lunch)?", "a": ["portmanteau", "blend"], "pts": 500, "time": 60},
-            {"cat": "📘 English", "q": "Complete the idiom: '___ the benefit of the doubt' (to believe someone despite lack of proof).", "a": ["give"], "pts": 400, "time": 60},
-
-            # 🔤 WORD ANALOGY
-            {"cat": "🔤 Word Analogy", "q": "Complete the analogy: Ephemeral is to Permanent as Mutable is to ___.", "a": ["immutable"], "pts": 200, "time": 30},
-            {"cat": "🔤 Word Analogy", "q": "Complete the analogy: Prologue is to Epilogue as Prelude is to ___.", "a": ["postlude"], "pts": 200, "time": 30},
-            {"cat": "🔤 Word Analogy", "q": "Complete the analogy: Catalyst is to Acceleration as Inhibitor is to ___.", "a": ["slowdown", "deceleration"], "pts": 200, "time": 30},
-            {"cat": "🔤 Word Analogy", "q": "Complete the analogy: Architect is to Blueprint as Composer is to ___.", "a": ["score", "music score"], "pts": 200, "time": 30},
-            {"cat": "🔤 Word Analogy", "q": "Complete the analogy: Veneer is to Surface as Core is to ___.", "a": ["center", "centre"], "pts": 200, "time": 30},
-
-            # 🧠 LOGICAL REASONING
-            {"cat": "🧠 Logical Reasoning", "q": "All analysts are critical thinkers. Some critical thinkers are researchers. What can be logically inferred about analysts and researchers?", "a": ["some analysts may be researchers", "analysts may be researchers"], "pts": 200, "time": 60},
-            {"cat": "🧠 Logical Reasoning", "q": "If every efficient worker is punctual and some punctual workers are managers, what is a possible conclusion about efficient workers?", "a": ["some efficient workers may be managers", "efficient workers may be managers"], "pts": 200, "time": 60},
-            {"cat": "🧠 Logical Reasoning", "q": "If some metals are conductive and all conductive materials transmit electricity, what can be concluded about some metals?", "a": ["some metals transmit electricity"], "pts": 200, "time": 60},
-            {"cat": "🧠 Logical Reasoning", "q": "A is older than B. B is older than C. D is younger than C. Who is the youngest?", "a": ["d"], "pts": 200, "time": 30},
-            {"cat": "🧠 Logical Reasoning", "q": "In a certain code, 'APPLE' is written as 'ZKKOV'. How is 'BANANA' written in that code?", "a": ["yzmzmz"], "pts": 400, "time": 60},
-            {"cat": "🧠 Logical Reasoning", "q": "If the day after tomorrow is Sunday, what day was it yesterday?", "a": ["thursday"], "pts": 300, "time": 60},
-            {"cat": "🧠 Logical Reasoning", "q": "A man is looking at a portrait. He says, 'Brothers and sisters have I none, but that man's father is my father's son.' Who is in the portrait?", "a": ["his son", "son"], "pts": 400, "time": 60},
-            {"cat": "🧠 Logical Reasoning", "q": "A rooster lays an egg on top of a barn. Which way does it roll?", "a": ["roosters dont lay eggs", "roosters don't lay eggs", "it doesn't roll"], "pts": 300, "time": 60},
-            {"cat": "🧠 Logical Reasoning", "q": "I have two coins that add up to 30 cents, and one of them is not a nickel. What are the two coins?", "a": ["quarter and nickel", "a quarter and a nickel"], "pts": 400, "time": 60},
-            {"cat": "🧠 Logical Reasoning", "q": "A farmer has 17 cows. All but 9 die. How many are left?", "a": ["9"], "pts": 200, "time": 60},
-            {"cat": "🧠 Logical Reasoning", "q": "What number comes next in the sequence: 2, 3, 5, 9, 17, ?", "a": ["33"], "pts": 300, "time": 60},
-            {"cat": "🧠 Logical Reasoning", "q": "If you write all numbers from 1 to 100, how many times do you write the digit 9?", "a": ["20"], "pts": 400, "time": 60},
-            {"cat": "🧠 Logical Reasoning", "q": "A bat and a ball cost $1.10. The bat costs $1 more than the ball. How much does the ball cost (in cents)?", "a": ["5", "5 cents", ".05"], "pts": 300, "time": 60},
-            {"cat": "🧠 Logical Reasoning", "q": "In a race, you pass the person in second place. What place are you in now?", "a": ["second", "2nd"], "pts": 200, "time": 60},
-            {"cat": "🧠 Logical Reasoning", "q": "If it takes 5 machines 5 minutes to make 5 widgets, how long would it take 100 machines to make 100 widgets (in minutes)?", "a": ["5"], "pts": 300, "time": 60},
-            {"cat": "🧠 Logical Reasoning", "q": "What is the smallest positive integer that is divisible by all numbers from 1 to 10?", "a": ["2520"], "pts": 400, "time": 60},
-            {"cat": "🧠 Logical Reasoning", "q": "A doctor gives you three pills and tells you to take one every half hour. How long (in hours) will they last?", "a": ["1", "one", "1 hour"], "pts": 300, "time": 60},
-            {"cat": "🧠 Logical Reasoning", "q": "A snail falls into a 30‑foot well. Each day it climbs 3 feet, but each night it slips back 2 feet. How many days to get out?", "a": ["28"], "pts": 400, "time": 60},
-            {"cat": "🧠 Logical Reasoning", "q": "What is the next letter in the sequence: J, F, M, A, M, J, ?", "a": ["j"], "pts": 300, "time": 60},
-            {"cat": "🧠 Logical Reasoning", "q": "If a brick weighs 3 pounds plus half a brick, how much does a brick weigh (in pounds)?", "a": ["6"], "pts": 300, "time": 60},
-            {"cat": "🧠 Logical Reasoning", "q": "What is the missing number in the sequence: 1, 11, 21, 1211, 111221, ?", "a": ["312211"], "pts": 400, "time": 60},
-            {"cat": "🧠 Logical Reasoning", "q": "A plane crashes on the border of the US and Canada. Where are the survivors buried?", "a": ["survivors are not buried", "they are not buried", "nowhere"], "pts": 300, "time": 60},
-            {"cat": "🧠 Logical Reasoning", "q": "How many months have 28 days?", "a": ["12", "all", "all 12"], "pts": 200, "time": 60},
-            {"cat": "🧠 Logical Reasoning", "q": "Tom is taller than Jerry. Jerry is taller than Spike. Spike is taller than Butch. Who is the shortest?", "a": ["butch"], "pts": 200, "time": 60},
-
-            # 🔢 NUMERICAL REASONING
-            {"cat": "🔢 Numerical Reasoning", "q": "Solve: 5x + 3 = 2x + 24.", "a": ["7"], "pts": 200, "time": 60},
-            {"cat": "🔢 Numerical Reasoning", "q": "A price was increased by 25% to 250. What was the original price?", "a": ["200"], "pts": 200, "time": 30},
-            {"cat": "🔢 Numerical Reasoning", "q": "If the ratio of men to women is 3:5 and there are 40 people, how many are men?", "a": ["15"], "pts": 200, "time": 60},
-            {"cat": "🔢 Numerical Reasoning", "q": "Find the next number: 2, 5, 11, 23, 47, ___.", "a": ["95"], "pts": 200, "time": 60},
-            {"cat": "🔢 Numerical Reasoning", "q": "If a train travels 180 km in 3 hours, how far will it travel in 5 hours at the same speed?", "a": ["300"], "pts": 200, "time": 60},
-            {"cat": "🔢 Numerical Reasoning", "q": "If a car travels at 60 km/h, how many kilometers will it travel in 2 hours 15 minutes?", "a": ["135"], "pts": 400, "time": 60},
-            {"cat": "🔢 Numerical Reasoning", "q": "A train covers a distance of 300 km in 4 hours. What is its speed in km/h?", "a": ["75"], "pts": 400, "time": 60},
-            {"cat": "🔢 Numerical Reasoning", "q": "If a worker earns $15 per hour, how much will he earn in 6 hours 30 minutes?", "a": ["97.5", "$97.50", "97.50"], "pts": 400, "time": 60},
-            {"cat": "🔢 Numerical Reasoning", "q": "A recipe requires 2 cups of flour for 12 cookies. How many cups are needed for 30 cookies?", "a": ["5"], "pts": 400, "time": 60},
-            {"cat": "🔢 Numerical Reasoning", "q": "If a shirt originally costs $40 and is on sale for 25% off, what is the sale price?", "a": ["30", "$30"], "pts": 400, "time": 60},
-            {"cat": "🔢 Numerical Reasoning", "q": "A tank can be filled by a pipe in 3 hours. How much of the tank is filled in 1 hour 15 minutes? (Express as a fraction)", "a": ["5/12", "5/12 of the tank"], "pts": 500, "time": 60},
-            {"cat": "🔢 Numerical Reasoning", "q": "The sum of two numbers is 30 and their difference is 10. Find the larger number.", "a": ["20"], "pts": 400, "time": 60},
-            {"cat": "🔢 Numerical Reasoning", "q": "If 5 apples cost $2.50, how much do 8 apples cost?", "a": ["4", "$4", "4.00"], "pts": 400, "time": 60},
-            {"cat": "🔢 Numerical Reasoning", "q": "A rectangle has length 12 cm and width 8 cm. What is its area? (Include units, e.g., 96 cm²)", "a": ["96", "96 cm²", "96 cm2"], "pts": 400, "time": 60},
-            {"cat": "🔢 Numerical Reasoning", "q": "A pizza is cut into 8 slices. If 3 slices are eaten, what fraction remains?", "a": ["5/8"], "pts": 400, "time": 60},
-            {"cat": "🔢 Numerical Reasoning", "q": "If a car uses 8 liters of fuel for 100 km, how many liters are needed for 350 km?", "a": ["28"], "pts": 400, "time": 60},
-            {"cat": "🔢 Numerical Reasoning", "q": "A student scored 85, 90, and 78 on three tests. What is the average score? (Round to one decimal)", "a": ["84.3", "84.33"], "pts": 400, "time": 60},
-            {"cat": "🔢 Numerical Reasoning", "q": "How many minutes are there in 2.5 hours?", "a": ["150"], "pts": 400, "time": 60},
-            {"cat": "🔢 Numerical Reasoning", "q": "If a number is increased by 20% and becomes 60, what was the original number?", "a": ["50"], "pts": 400, "time": 60},
-            {"cat": "🔢 Numerical Reasoning", "q": "A bag contains 3 red, 4 blue, and 5 green marbles. What is the probability of picking a blue marble? (Express as a fraction)", "a": ["1/3", "4/12"], "pts": 400, "time": 60},
-            {"cat": "🔢 Numerical Reasoning", "q": "If it takes 4 workers 6 days to complete a job, how many days would 3 workers take? (Assume same work rate)", "a": ["8"], "pts": 500, "time": 60},
-            {"cat": "🔢 Numerical Reasoning", "q": "A store offers a 15% discount on a $200 item. How much is the discount in dollars?", "a": ["30", "$30"], "pts": 400, "time": 60},
-            {"cat": "🔢 Numerical Reasoning", "q": "If the ratio of boys to girls is 3:2 and there are 25 students, how many boys are there?", "a": ["15"], "pts": 400, "time": 60},
-            {"cat": "🔢 Numerical Reasoning", "q": "A square has a perimeter of 36 cm. What is its area? (Include units)", "a": ["81", "81 cm²", "81 cm2"], "pts": 400, "time": 60},
-            {"cat": "🔢 Numerical Reasoning", "q": "If a phone costs $500 after a 20% discount, what was the original price?", "a": ["625", "$625"], "pts": 500, "time": 60},
-
-            # 🧩 ABSTRACT & PATTERN ANALYSIS
-            {"cat": "🧩 Abstract Reasoning", "q": "Find the next letter sequence: B, E, I, N, T, ___.", "a": ["a"], "pts": 200, "time": 60},
-            {"cat": "🧩 Abstract Reasoning", "q": "Find the missing number: 1, 1, 2, 6, 24, 120, ___.", "a": ["720"], "pts": 200, "time": 60},
-            {"cat": "🧩 Abstract Reasoning", "q": "If TABLE = 40 (sum of letter positions), what is CHAIR?", "a": ["35"], "pts": 200, "time": 60},
-            {"cat": "🧩 Abstract Reasoning", "q": "Find the next number: 4, 9, 19, 39, 79, ___.", "a": ["159"], "pts": 200, "time": 60},
-            {"cat": "🧩 Abstract Reasoning", "q": "If RED = 27 and BLUE = 40 (sum of letters), what is GREEN?", "a": ["49"], "pts": 200, "time": 60},
-
-            # 🔬 Science – University Level & Trendy (20 questions, 60 seconds each)
-            {"cat": "🔬 Science", "q": "What is the name of the gene‑editing technology that uses a protein called Cas9?", "a": ["crispr", "crispr-cas9", "crispr/cas9"], "pts": 500, "time": 60},
-            {"cat": "🔬 Science", "q": "In quantum mechanics, what term describes the phenomenon where particles become correlated and instantaneously affect each other regardless of distance?", "a": ["entanglement", "quantum entanglement"], "pts": 500, "time": 60},
-            {"cat": "🔬 Science", "q": "What is the name of the hypothetical particle that is its own antiparticle and is a candidate for dark matter?", "a": ["majorana fermion", "majorana particle"], "pts": 500, "time": 60},
-            {"cat": "🔬 Science", "q": "Which neurotransmitter is primarily involved in reward, motivation, and motor control, and is often discussed in addiction studies?", "a": ["dopamine"], "pts": 400, "time": 60},
-            {"cat": "🔬 Science", "q": "What is the name of the process by which cells engulf and digest large particles or microorganisms?", "a": ["phagocytosis"], "pts": 400, "time": 60},
-            {"cat": "🔬 Science", "q": "In particle physics, what force is mediated by the Higgs boson?", "a": ["mass", "the higgs field gives mass", "it gives mass to particles"], "pts": 500, "time": 60},
-            {"cat": "🔬 Science", "q": "What is the name of the largest known protein complex that performs oxidative phosphorylation in mitochondria?", "a": ["atp synthase", "complex v"], "pts": 500, "time": 60},
-            {"cat": "🔬 Science", "q": "Which technique, widely used in structural biology, involves firing X‑rays at crystallized proteins to determine their 3D structure?", "a": ["x-ray crystallography"], "pts": 500, "time": 60},
-            {"cat": "🔬 Science", "q": "What is the name of the theory proposing that consciousness arises from integrated information in the brain, quantified by Φ (phi)?", "a": ["integrated information theory", "iit"], "pts": 500, "time": 60},
-            {"cat": "🔬 Science", "q": "Which element is used as the primary fuel in most nuclear fission reactors?", "a": ["uranium", "u-235", "uranium-235"], "pts": 400, "time": 60},
-            {"cat": "🔬 Science", "q": "What is the term for the maximum distance at which a telescope can resolve two point sources as separate?", "a": ["angular resolution", "diffraction limit"], "pts": 400, "time": 60},
-            {"cat": "🔬 Science", "q": "Which 2023 Nobel Prize in Physics topic involved attosecond pulses of light to study electron dynamics?", "a": ["attosecond physics", "attosecond pulses"], "pts": 500, "time": 60},
-            {"cat": "🔬 Science", "q": "In chemistry, what is the name of the effect where a molecule's reactivity is influenced by the spatial arrangement of its atoms?", "a": ["steric effect", "steric hindrance"], "pts": 400, "time": 60},
-            {"cat": "🔬 Science", "q": "What is the name of the protein that bacteria use as an adaptive immune system, leading to the CRISPR technology?", "a": ["cas9", "crispr-associated protein 9"], "pts": 500, "time": 60},
-            {"cat": "🔬 Science", "q": "Which space telescope, launched in 2021, observes in the infrared and is the successor to Hubble?", "a": ["james webb", "james webb space telescope", "jwst"], "pts": 400, "time": 60},
-            {"cat": "🔬 Science", "q": "What is the name of the geological epoch defined by human impact on Earth's ecosystems, often proposed to have started in the mid‑20th century?", "a": ["anthropocene"], "pts": 400, "time": 60},
-            {"cat": "🔬 Science", "q": "In genetics, what does 'CRISPR' stand for?", "a": ["clustered regularly interspaced short palindromic repeats"], "pts": 500, "time": 60},
-            {"cat": "🔬 Science", "q": "What is the name of the first quantum computer developed by Google that claimed quantum supremacy in 2019?", "a": ["sycamore"], "pts": 500, "time": 60},
-            {"cat": "🔬 Science", "q": "Which enzyme is responsible for unzipping DNA during replication?", "a": ["helicase"], "pts": 400, "time": 60},
-            {"cat": "🔬 Science", "q": "What is the term for the minimum energy required to remove an electron from an atom in its ground state?", "a": ["ionization energy", "ionisation energy"], "pts": 400, "time": 60},
-        ]
+        """Attach the on-disk question bank; nothing is read until a quiz starts."""
+        self.bank = QuestionBank(QUIZ_QUESTIONS_PATH, QUIZ_BANK_PATH, QUIZ_RECENT_QUIZZES)
 
     # ------------------------------------------------------------
     # POINTS & UTILITIES
@@ -2945,10 +3964,9 @@ class QuizSystem:
             self._ending = False
 
             # --- RANDOMLY SELECT 20 QUESTIONS FROM THE POOL ---
-            pool = self.all_questions
-            num_questions = min(20, len(pool))
-            self.quiz_questions = random.sample(pool, num_questions)
-            # No need to shuffle again; sample already randomizes
+            questions = await asyncio.to_thread(self.bank.sample, 20)
+            self.quiz_questions = compile_questions(questions)
+            num_questions = len(self.quiz_questions)
 
             await log_to_discord(self.bot, f"📚 Selected {num_questions} random questions", "INFO")
 
@@ -3110,7 +4128,7 @@ class QuizSystem:
                     break
 
                 embed.color = embed_color
-                await self.question_message.edit(embed=embed)
+                edit_scheduler.submit(self.question_message, embed=embed)
 
             except Exception as e:
                 await log_to_discord(self.bot, "⚠️ Countdown error (non‑fatal)", "WARN", e)
@@ -3164,9 +4182,8 @@ class QuizSystem:
                 await log_to_discord(self.bot, "[PA] → already answered correctly", "DEBUG")
                 return False
 
-            user_ans = answer_text.lower().strip()
-            correct_answers = [a.lower() for a in q['a']]
-            is_correct = user_ans in correct_answers
+            user_ans = normalize_answer(answer_text)
+            is_correct = q['matcher'].matches(user_ans)
             await log_to_discord(self.bot, f"[PA] answer='{user_ans}', correct={is_correct}", "DEBUG")
 
             points = 0
@@ -3229,6 +4246,7 @@ class QuizSystem:
             # --- DELETE THE QUESTION MESSAGE ---
             if self.question_message:
                 try:
+                    edit_scheduler.discard(self.question_message)
                     await self.question_message.delete()
                     await log_to_discord(self.bot, f"🗑️ Deleted question message for Q{self.current_question+1}", "INFO")
                 except Exception as e:
@@ -3386,6 +4404,7 @@ class QuizSystem:
         # Determine the number of questions for perfect accuracy check
         total_questions = len(self.quiz_questions)
 
+        payouts = []
         for rank, (uid, data) in enumerate(sorted_participants, 1):
             # Skip participants with zero score
             if data["score"] <= 0:
@@ -3393,40 +4412,46 @@ class QuizSystem:
                 rewards[uid] = {"gems": 0, "rank": rank, "result": None}
                 continue
 
-            try:
-                base = self.PARTICIPATION_BASE
-                if rank == 1:
-                    base += 500
-                elif rank == 2:
-                    base += 250
-                elif rank == 3:
-                    base += 125
-                elif rank <= 10:
-                    base += 75
-
-                base += (data["score"] // 100) * 10          # score bonus
-                base += self.calculate_speed_bonus(uid)      # speed bonus
-
-                # Perfect accuracy bonus (all questions correct)
-                if data["correct_answers"] == total_questions:
-                    base += 250
-                    reason = f"🎯 Perfect Accuracy! ({data['correct_answers']}/{total_questions} correct, Rank #{rank})"
-                else:
-                    reason = f"🏆 Quiz Rewards ({data['score']} pts, Rank #{rank})"
+            base = self.PARTICIPATION_BASE
+            if rank == 1:
+                base += 500
+            elif rank == 2:
+                base += 250
+            elif rank == 3:
+                base += 125
+            elif rank <= 10:
+                base += 75
+
+            base += (data["score"] // 100) * 10          # score bonus
+            base += self.calculate_speed_bonus(uid)      # speed bonus
+
+            # Perfect accuracy bonus (all questions correct)
+            if data["correct_answers"] == total_questions:
+                base += 250
+                reason = f"🎯 Perfect Accuracy! ({data['correct_answers']}/{total_questions} correct, Rank #{rank})"
+            else:
+                reason = f"🏆 Quiz Rewards ({data['score']} pts, Rank #{rank})"
+
+            payouts.append((uid, data, base, rank, reason))
 
-                result = await self.currency.add_gems(uid, base, reason)
-                rewards[uid] = {"gems": base, "rank": rank, "result": result}
+        # Settle every payout in a single statement
+        try:
+            results = await self.currency.add_gems_bulk([(uid, base, reason) for uid, _, base, _, reason in payouts])
+        except Exception as e:
+            await log_to_discord(self.bot, f"❌ Failed to add quiz gems to {len(payouts)} users", "ERROR", e)
+            for uid, _, _, rank, _ in payouts:
+                rewards[uid] = {"gems": 0, "rank": rank, "error": str(e)}
+            payouts = []
 
-                await log_to_discord(self.bot, f"✅ +{base} gems to {data['name']} (Rank #{rank})", "INFO")
+        for uid, data, base, rank, _ in payouts:
+            rewards[uid] = {"gems": base, "rank": rank, "result": results.get(uid)}
 
-                try:
-                    await self.log_reward(uid, data['name'], base, rank)
-                except Exception as e:
-                    await log_to_discord(self.bot, f"⚠️ log_reward failed for {uid}", "WARN", e)
+            await log_to_discord(self.bot, f"✅ +{base} gems to {data['name']} (Rank #{rank})", "INFO")
 
+            try:
+                await self.log_reward(uid, data['name'], base, rank)
             except Exception as e:
-                await log_to_discord(self.bot, f"❌ Failed to add gems to {uid}", "ERROR", e)
-                rewards[uid] = {"gems": 0, "rank": rank, "error": str(e)}
+                await log_to_discord(self.bot, f"⚠️ log_reward failed for {uid}", "WARN", e)
 
         await log_to_discord(self.bot, f"✅ Reward distribution complete. Total entries: {len(rewards)}", "INFO")
         return rewards
@@ -3473,6 +4498,7 @@ class QuizSystem:
         # Delete the current question message if it exists
         if self.question_message:
             try:
+                edit_scheduler.discard(self.question_message)
                 await self.question_message.delete()
             except Exception as e:
                 await log_to_discord(self.bot, f"Could not delete question message: {e}", "WARN")
@@ -3909,6 +4935,7 @@ async def quiz_stop(ctx):
         # Delete the current question message if it exists
         if hasattr(quiz_system, 'question_message') and quiz_system.question_message:
             try:
+                edit_scheduler.discard(quiz_system.question_message)
                 await quiz_system.question_message.delete()
             except:
                 pass
@@ -3998,12 +5025,9 @@ async def currency_leaderboard(ctx):
         embed.description = "No data yet! Join a quiz to earn gems!"
     else:
         entries = []
+        names = await name_resolver.names([user["user_id"] for user in leaderboard], ctx.guild)
         for i, user in enumerate(leaderboard, 1):
-            try:
-                user_obj = await bot.fetch_user(int(user["user_id"]))
-                username = user_obj.display_name
-            except:
-                username = f"User {user['user_id'][:8]}"
+            username = names[int(user["user_id"])]
             
             medals = ["🥇", "🥈", "🥉", "4️⃣", "5️⃣", "6️⃣", "7️⃣", "8️⃣", "9️⃣", "🔟"]
             medal = medals[i-1] if i <= len(medals) else f"{i}."
@@ -4011,6 +5035,9 @@ async def currency_leaderboard(ctx):
             entries.append(f"{medal} **{username}** - 💎 {user['gems']:,}")
         
         embed.description = "\n".join(entries)
+        mine = await leaderboards.gems.rank(str(ctx.author.id))
+        if mine and mine[0] > len(leaderboard):
+            embed.set_footer(text=f"Your rank: #{mine[0]} with {mine[1]:,} gems")
     
     await ctx.send(embed=embed)
 
@@ -4044,9 +5071,9 @@ async def daily_reward(ctx):
     # --- Award potions ---
     hp_potion_id = None
     energy_potion_id = None
+    hp_potion_id = await catalog.item_id('HP Potion')
+    energy_potion_id = await catalog.item_id('Energy Potion')
     async with bot.db_pool.acquire() as conn:
-        hp_potion_id = await conn.fetchval("SELECT item_id FROM shop_items WHERE name = 'HP Potion'")
-        energy_potion_id = await conn.fetchval("SELECT item_id FROM shop_items WHERE name = 'Energy Potion'")
 
         if hp_potion_id:
             await conn.execute("""
@@ -4345,7 +5372,7 @@ async def on_message(message):
         try:
             channel = bot.get_channel(pending['channel_id'])
             if channel:
-                trade_msg = await channel.fetch_message(pending['message_id'])
+                trade_msg = edit_scheduler.message(channel, pending['message_id'])
                 await update_trade_embed(trade_msg, pending['trade_id'])
         except Exception as e:
             print(f"Error updating trade message: {e}")
@@ -4388,7 +5415,7 @@ async def on_message(message):
         try:
             channel = bot.get_channel(pending['channel_id'])
             if channel:
-                trade_msg = await channel.fetch_message(pending['message_id'])
+                trade_msg = edit_scheduler.message(channel, pending['message_id'])
                 await update_trade_embed(trade_msg, pending['trade_id'])
         except Exception as e:
             print(f"Error updating trade message: {e}")
@@ -4466,70 +5493,273 @@ async def fortune_bag_to(ctx, channel: discord.TextChannel):
     await ctx.send(f"✅ Fortune bag sent to {channel.mention}!", delete_after=5)
 
 
-# END------
+# END------
+
+#   FOR BLEED AND BURN
+
+# One statement per tick: damage every active effect, decrement or delete it,
+# and start the respawn timer for anyone it killed.
+EFFECT_TICK_SQL = """
+    WITH expiring AS (
+        DELETE FROM active_effects
+        WHERE remaining_ticks <= 1
+        RETURNING target_id, CASE WHEN remaining_ticks = 1 THEN value ELSE 0 END AS value
+    ),
+    ongoing AS (
+        UPDATE active_effects
+        SET remaining_ticks = remaining_ticks - 1, last_tick = NOW()
+        WHERE remaining_ticks > 1
+        RETURNING target_id, value, remaining_ticks
+    ),
+    dmg AS (
+        SELECT target_id, SUM(value) AS total
+        FROM (SELECT target_id, value FROM expiring
+              UNION ALL
+              SELECT target_id, value FROM ongoing) t
+        GROUP BY target_id
+    ),
+    hit AS (
+        UPDATE player_stats ps
+        SET hp = GREATEST(ps.hp - dmg.total, 0),
+            respawn_at = CASE
+                WHEN ps.hp - dmg.total <= 0 AND ps.respawn_at IS NULL THEN NOW() + INTERVAL '2 hours'
+                ELSE ps.respawn_at
+            END
+        FROM dmg
+        WHERE ps.user_id = dmg.target_id
+    )
+    SELECT COALESCE(MAX(remaining_ticks), 0) FROM ongoing
+"""
+
+
+class EffectScheduler:
+    """Runs bleed/burn ticks only while effects exist.
+
+    A heap of effect expiry times decides whether the tick loop is awake; the
+    active_effects table stays the source of truth so effects survive restarts.
+    """
+
+    TICK_SECONDS = 1
+
+    def __init__(self):
+        self._expiries: List[float] = []
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def schedule(self, ticks: int):
+        """Register a freshly inserted effect lasting `ticks` ticks."""
+        heapq.heappush(self._expiries, time.monotonic() + ticks * self.TICK_SECONDS)
+        self._wake.set()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    async def _resume(self):
+        """Pick up effects persisted before a restart."""
+        async with bot.db_pool.acquire() as conn:
+            remaining = await conn.fetchval("SELECT COALESCE(MAX(remaining_ticks), 0) FROM active_effects")
+        if remaining > 0:
+            self.schedule(remaining)
+
+    async def _run(self):
+        await bot.wait_until_ready()
+        while bot.db_pool is None:
+            await asyncio.sleep(1)
+        try:
+            await self._resume()
+        except Exception as e:
+            print(f"❌ EffectScheduler resume error: {e}")
+
+        while True:
+            if not self._expiries:
+                self._wake.clear()
+                await self._wake.wait()
+
+            started = time.monotonic()
+            await self._tick()
+            await asyncio.sleep(max(0, self.TICK_SECONDS - (time.monotonic() - started)))
+
+    async def _tick(self):
+        try:
+            async with bot.db_pool.acquire() as conn:
+                remaining = await conn.fetchval(EFFECT_TICK_SQL)
+            now = time.monotonic()
+            while self._expiries and self._expiries[0] <= now:
+                heapq.heappop(self._expiries)
+            # Resync with the table: it may hold effects we did not schedule
+            if remaining == 0:
+                self._expiries.clear()
+            elif not self._expiries:
+                self.schedule(remaining)
+        except Exception as e:
+            print(f"❌ process_effects error: {e}")
+            traceback.print_exc()
+
+            # If the pool is closed, try to reconnect
+            if bot.db_pool and bot.db_pool._closed:
+                print("🔄 Database pool closed – attempting to reconnect...")
+                try:
+                    await db.smart_connect()   # this reassigns bot.db_pool internally
+                except Exception as re:
+                    print(f"❌ Reconnection failed: {re}")
+
 
-#   FOR BLEED AND BURN
+effect_scheduler = EffectScheduler()
 
-@tasks.loop(seconds=1)
-async def process_effects():
-    try:
-        async with bot.db_pool.acquire() as conn:
-            # Apply damage from active effects (bleed/burn)
-            await conn.execute("""
-                UPDATE player_stats
-                SET hp = GREATEST(hp - value, 0)
-                FROM active_effects
-                WHERE player_stats.user_id = active_effects.target_id
-                  AND active_effects.remaining_ticks > 0
-            """)
-            # Decrement ticks
-            await conn.execute("""
-                UPDATE active_effects
-                SET remaining_ticks = remaining_ticks - 1
-                WHERE remaining_ticks > 0
-            """)
-            # Delete expired effects
-            await conn.execute("DELETE FROM active_effects WHERE remaining_ticks <= 0")
+class MessageEditScheduler:
+    """Coalesces live-embed edits per message under a per-channel budget.
 
-            # Set respawn timer for players who just died
-            await conn.execute("""
-                UPDATE player_stats
-                SET respawn_at = NOW() + INTERVAL '2 hours'
-                WHERE hp <= 0 AND respawn_at IS NULL
-            """)
-    except Exception as e:
-        print(f"❌ process_effects error: {e}")
-        traceback.print_exc()
+    Only the newest state of each message is kept while it waits, so a burst
+    of updates costs one request. Each channel drains through its own worker
+    that stays within Discord's edit rate limit instead of dropping updates.
+    """
 
-        # If the pool is closed, try to reconnect
-        if bot.db_pool and bot.db_pool._closed:
-            print("🔄 Database pool closed – attempting to reconnect...")
+    EDITS_PER_WINDOW = 5
+    WINDOW_SECONDS = 5.0
+    MAX_CACHED_MESSAGES = 512
+
+    def __init__(self):
+        self._messages: OrderedDict = OrderedDict()
+        self._pending: Dict[int, OrderedDict] = {}
+        self._sent: Dict[int, deque] = {}
+        self._workers: Dict[int, asyncio.Task] = {}
+
+    def remember(self, message):
+        """Keep a Message (or PartialMessage) around so edits never refetch it."""
+        self._messages[message.id] = message
+        self._messages.move_to_end(message.id)
+        while len(self._messages) > self.MAX_CACHED_MESSAGES:
+            self._messages.popitem(last=False)
+        return message
+
+    def message(self, channel, message_id: int):
+        """Return the cached message, or a partial one that can be edited without a fetch."""
+        cached = self._messages.get(message_id)
+        if cached is not None:
+            return cached
+        return self.remember(channel.get_partial_message(message_id))
+
+    def submit(self, message, on_missing=None, **kwargs) -> asyncio.Future:
+        """Queue an edit; the future resolves to True once this state (or a newer one) is applied."""
+        self.remember(message)
+        future = asyncio.get_running_loop().create_future()
+        channel_id = message.channel.id
+        queue = self._pending.setdefault(channel_id, OrderedDict())
+        entry = queue.get(message.id)
+        if entry is None:
+            entry = queue[message.id] = {'message': message, 'kwargs': {}, 'waiters': [], 'on_missing': None}
+        entry['message'] = message
+        entry['kwargs'].update(kwargs)
+        entry['waiters'].append(future)
+        if on_missing is not None:
+            entry['on_missing'] = on_missing
+
+        worker = self._workers.get(channel_id)
+        if worker is None or worker.done():
+            self._workers[channel_id] = asyncio.create_task(self._drain(channel_id))
+        return future
+
+    def discard(self, message):
+        """Forget a message that is about to be deleted, dropping any queued edit."""
+        self._messages.pop(message.id, None)
+        queue = self._pending.get(message.channel.id)
+        entry = queue.pop(message.id, None) if queue else None
+        if entry:
+            self._resolve(entry, False)
+
+    async def flush(self):
+        """Apply every queued edit (used on shutdown)."""
+        workers = [w for w in self._workers.values() if not w.done()]
+        if workers:
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    @staticmethod
+    def _resolve(entry: dict, result: bool):
+        for waiter in entry['waiters']:
+            if not waiter.done():
+                waiter.set_result(result)
+
+    async def _wait_for_budget(self, channel_id: int):
+        sent = self._sent.setdefault(channel_id, deque())
+        while True:
+            now = time.monotonic()
+            while sent and now - sent[0] >= self.WINDOW_SECONDS:
+                sent.popleft()
+            if len(sent) < self.EDITS_PER_WINDOW:
+                sent.append(now)
+                return
+            await asyncio.sleep(self.WINDOW_SECONDS - (now - sent[0]))
+
+    async def _drain(self, channel_id: int):
+        queue = self._pending.get(channel_id)
+        while queue:
+            await self._wait_for_budget(channel_id)
+            if not queue:
+                break
+            # Oldest message first; everything submitted for it so far goes in one edit
+            _, entry = queue.popitem(last=False)
+            message = entry['message']
             try:
-                await db.smart_connect()   # this reassigns bot.db_pool internally
-            except Exception as re:
-                print(f"❌ Reconnection failed: {re}")
+                edited = await message.edit(**entry['kwargs'])
+                if edited is not None:
+                    self.remember(edited)
+                self._resolve(entry, True)
+            except discord.NotFound:
+                self._messages.pop(message.id, None)
+                self._resolve(entry, False)
+                if entry['on_missing']:
+                    try:
+                        await entry['on_missing']()
+                    except Exception as e:
+                        print(f"❌ Edit scheduler cleanup error: {e}")
+            except discord.HTTPException as e:
+                print(f"❌ Failed to edit message {message.id}: {e}")
+                self._resolve(entry, False)
+            except Exception as e:
+                print(f"❌ Edit scheduler error: {e}")
+                traceback.print_exc()
+                self._resolve(entry, False)
+        self._pending.pop(channel_id, None)
+        self._workers.pop(channel_id, None)
+
+
+edit_scheduler = MessageEditScheduler()
 
 @tasks.loop(minutes=1)
 async def respawn_task():
     """Respawn dead players with full HP and energy."""
     try:
         async with bot.db_pool.acquire() as conn:
+            # Start the respawn timer for anyone killed without one
+            await conn.execute("""
+                UPDATE player_stats
+                SET respawn_at = NOW() + INTERVAL '2 hours'
+                WHERE hp <= 0 AND respawn_at IS NULL
+            """)
             # Get all users whose respawn time has passed
             dead_users = await conn.fetch("""
                 SELECT user_id FROM player_stats
                 WHERE respawn_at IS NOT NULL AND respawn_at <= NOW() AT TIME ZONE 'UTC'
             """)
-        for dead in dead_users:
-            user_id = dead['user_id']
-            # Get dynamic stats (includes pet bonuses)
-            stats = await get_player_stats(user_id)
+        if dead_users:
+            # Get dynamic stats (includes pet bonuses) for everyone at once
+            all_stats = await get_player_stats_many([d['user_id'] for d in dead_users])
+            user_ids = list(all_stats)
             # Update to full HP and full energy (dynamic max)
             async with bot.db_pool.acquire() as conn2:
                 await conn2.execute("""
-                    UPDATE player_stats
-                    SET hp = $1, energy = $2, respawn_at = NULL
-                    WHERE user_id = $3
-                """, stats['max_hp'], stats['max_energy'], user_id)
+                    UPDATE player_stats ps
+                    SET hp = v.hp, energy = v.energy, respawn_at = NULL
+                    FROM unnest($1::text[], $2::int[], $3::int[]) AS v(user_id, hp, energy)
+                    WHERE ps.user_id = v.user_id
+                """, user_ids,
+                    [all_stats[uid]['max_hp'] for uid in user_ids],
+                    [all_stats[uid]['max_energy'] for uid in user_ids])
         print("respawn_task tick")
     except Exception as e:
         print(f"❌ respawn_task error: {e}")
@@ -4549,6 +5779,8 @@ async def remove_expired_titles():
                 DELETE FROM user_titles
                 WHERE expires_at IS NOT NULL AND expires_at <= NOW() AT TIME ZONE 'UTC'
             """)
+            if result != "DELETE 0":
+                stat_cache.clear()
             print("🧹 Removed expired titles.")
     except Exception as e:
         print(f"❌ remove_expired_titles error: {e}")
@@ -4598,13 +5830,21 @@ async def load_active_bags():
         rows = await conn.fetch(
             "SELECT message_id, channel_id, remaining, total, dropper_id FROM fortune_bags WHERE active = TRUE"
         )
+        participant_rows = await conn.fetch(
+            "SELECT message_id, user_id, earned FROM fortune_bag_participants WHERE message_id = ANY($1::bigint[])",
+            [row['message_id'] for row in rows]
+        )
+    participants = {}
+    for p in participant_rows:
+        participants.setdefault(p['message_id'], {})[p['user_id']] = p['earned']
     for row in rows:
         bag = FortuneBag(
             message_id=row['message_id'],
             channel_id=row['channel_id'],
             dropper_id=row['dropper_id'],
             remaining=row['remaining'],
-            total=row['total']
+            total=row['total'],
+            participants=participants.get(row['message_id'])
         )
         bot.active_bags[bag.message_id] = bag
 
@@ -4641,6 +5881,11 @@ async def setup_hook():
         print("✅ setup_hook: cogs added (no DB)")
         return
 
+    try:
+        await catalog.refresh()
+    except Exception as e:
+        print(f"⚠️ Catalog preload failed, will load lazily: {e}")
+
     # 2. Add cogs first (they don't need guilds)
     await bot.add_cog(Shop(bot))
     await bot.add_cog(CullingGame(bot, currency_system))
@@ -4648,7 +5893,7 @@ async def setup_hook():
 
     # 3. Start global background tasks (they don't need guilds either)
     clean_old_trades.start()
-    process_effects.start()
+    effect_scheduler.start()
     respawn_task.start()
     boss_reset_task.start()
     remove_expired_titles.start()
@@ -4658,6 +5903,38 @@ async def setup_hook():
 
 bot.setup_hook = setup_hook
 
+_discord_close = bot.close
+
+async def close_bot():
+    """Flush buffered database writes and close the pool on shutdown."""
+    # Each step gets its own try so one failure can't keep the pool open
+    for bag in list(bot.active_bags.values()):
+        try:
+            await bag.flush(bot)
+        except Exception as e:
+            print(f"❌ Bag flush failed: {e}")
+    try:
+        await edit_scheduler.flush()
+    except Exception as e:
+        print(f"❌ Edit scheduler flush failed: {e}")
+    try:
+        await boss_ledger.flush()
+    except Exception as e:
+        print(f"❌ Boss ledger flush failed: {e}")
+    try:
+        await log_sink.flush()
+    except Exception as e:
+        print(f"❌ Log sink flush failed: {e}")
+    # No effect ticks once the pool is going away
+    effect_scheduler.stop()
+    try:
+        await db.close()
+    except Exception as e:
+        print(f"❌ Database close failed: {e}")
+    await _discord_close()
+
+bot.close = close_bot
+
 # END ------
 
 # FORTUNE BAG HANDLER
@@ -4680,6 +5957,8 @@ async def handle_open_bag(interaction: discord.Interaction):
         return
 
     awarded = await bag.award(bot, interaction.user.id)
+    emptied = awarded > 0 and bag.remaining <= 0
+    pending = bag.pending_write()
 
     # --- CASE 1: Bag empty ---
     if awarded == 0:
@@ -4701,31 +5980,42 @@ async def handle_open_bag(interaction: discord.Interaction):
         return
 
     # --- CASE 3: Success ---
-    # Get user's updated gem balance
-    balance = await currency_system.get_balance(str(interaction.user.id))
-    
+    # Answer straight away; the claim is written with the next batch
+    remaining = bag.remaining
+    await interaction.response.send_message(
+        f"You opened the bag and found **{awarded} Gems**!\n"
+        f"{remaining} Gems remain in the bag",
+        ephemeral=True
+    )
+
     # Add ❤️ reaction to the bag message
     try:
         await interaction.message.add_reaction("❤️")
     except:
         pass
 
-    # If bag became empty, disable button and post leaderboard
-    if bag.remaining <= 0:
+    # Show the new balance once the batch containing this claim is written
+    if pending is not None:
+        balances = await pending
+        new_balance = balances.get(interaction.user.id)
+        if new_balance is not None:
+            try:
+                await interaction.edit_original_response(
+                    content=f"You opened the bag and found **{awarded} Gems**!\n"
+                            f"**New balance:** {new_balance} gems\n"
+                            f"{remaining} Gems remain in the bag"
+                )
+            except discord.HTTPException:
+                pass
+
+    # If this claim emptied the bag, disable button and post leaderboard
+    if emptied:
         view = discord.ui.View.from_message(interaction.message)
         for child in view.children:
             child.disabled = True
         await interaction.message.edit(view=view)
         await post_leaderboard(bag, interaction.channel, bot)
 
-    # Send ephemeral success message
-    await interaction.response.send_message(
-        f"You opened the bag and found **{awarded} Gems**!\n"
-        f"**New balance:** {balance['gems']} gems\n"
-        f"{bag.remaining} Gems remain in the bag",
-        ephemeral=True
-    )
-
     # Auto‑delete after 10 seconds
     await asyncio.sleep(10)
     await interaction.delete_original_response()
@@ -4756,6 +6046,140 @@ async def on_command_error(ctx, error):
 
 # ========== INVENTORY CLASSES ==========
 
+# Inventory categories are paged with keyset cursors on
+# (equipped DESC, purchased_at DESC, id DESC), matching the
+# idx_<table>_inventory_page indexes, so a page costs O(page) however large
+# the collection is. Item counts come from user_inventory_counts, which
+# triggers keep up to date.
+INVENTORY_PAGE_SIZE = 20
+_CURSOR_EPOCH = datetime(1970, 1, 1)
+
+INVENTORY_CATEGORIES = {
+    'weapon': {
+        'alias': 'uw',
+        'count': 'weapons',
+        'select': """
+            SELECT uw.id, COALESCE(si.name, uw.generated_name) as name,
+                   uw.attack, uw.equipped, uw.description,
+                   uw.bleeding_chance, uw.crit_chance, uw.crit_damage,
+                   COALESCE(si.image_url, uw.image_url) as image_url,
+                   r.color as rarity_color,
+                   uw.upgrade_level, uw.purchased_at
+            FROM user_weapons uw
+            LEFT JOIN shop_items si ON uw.weapon_item_id = si.item_id
+            LEFT JOIN weapon_variants v ON uw.variant_id = v.variant_id
+            LEFT JOIN rarities r ON v.rarity_id = r.rarity_id
+            WHERE uw.user_id = $1
+        """,
+    },
+    'armor': {
+        'alias': 'ua',
+        'count': 'armor',
+        'select': """
+            SELECT ua.id, at.name, ua.defense, ua.equipped, at.slot,
+                   ua.hp_bonus, ua.reflect_damage, at.set_name,
+                   at.image_url, at.description, r.color as rarity_color,
+                   ua.upgrade_level, ua.purchased_at
+            FROM user_armor ua
+            JOIN armor_types at ON ua.armor_id = at.armor_id
+            LEFT JOIN rarities r ON at.rarity_id = r.rarity_id
+            WHERE ua.user_id = $1
+        """,
+    },
+    'accessory': {
+        'alias': 'ua',
+        'count': 'accessories',
+        'select': """
+            SELECT ua.id, at.name, ua.bonus_value, at.bonus_stat,
+                   ua.equipped, ua.slot, at.set_name,
+                   at.image_url, at.description, r.color as rarity_color,
+                   ua.upgrade_level, ua.purchased_at
+            FROM user_accessories ua
+            JOIN accessory_types at ON ua.accessory_id = at.accessory_id
+            LEFT JOIN rarities r ON at.rarity_id = r.rarity_id
+            WHERE ua.user_id = $1
+        """,
+    },
+}
+
+
+def encode_inventory_cursor(item: dict) -> str:
+    """Compact, underscore-free cursor for a custom_id: equipped.micros.id"""
+    micros = (item['purchased_at'].replace(tzinfo=None) - _CURSOR_EPOCH) // timedelta(microseconds=1)
+    return f"{int(bool(item['equipped']))}.{micros}.{item['id']}"
+
+
+def decode_inventory_cursor(cursor: str):
+    equipped, micros, item_id = cursor.split('.')
+    return equipped == '1', _CURSOR_EPOCH + timedelta(microseconds=int(micros)), int(item_id)
+
+
+async def fetch_inventory_page(user_id: str, item_type: str, after: str = None, before: str = None):
+    """One page of a gear category.
+
+    Returns (items, prev_cursor, next_cursor); a cursor is None when there
+    is no page in that direction.
+    """
+    spec = INVENTORY_CATEGORIES[item_type]
+    a = spec['alias']
+    key = f"({a}.equipped, {a}.purchased_at, {a}.id)"
+    limit = INVENTORY_PAGE_SIZE + 1
+    async with bot.db_pool.acquire() as conn:
+        if before:
+            rows = await conn.fetch(
+                spec['select'] + f" AND {key} > ($2, $3, $4)"
+                f" ORDER BY {a}.equipped, {a}.purchased_at, {a}.id LIMIT $5",
+                user_id, *decode_inventory_cursor(before), limit
+            )
+        elif after:
+            rows = await conn.fetch(
+                spec['select'] + f" AND {key} < ($2, $3, $4)"
+                f" ORDER BY {a}.equipped DESC, {a}.purchased_at DESC, {a}.id DESC LIMIT $5",
+                user_id, *decode_inventory_cursor(after), limit
+            )
+        else:
+            rows = await conn.fetch(
+                spec['select'] +
+                f" ORDER BY {a}.equipped DESC, {a}.purchased_at DESC, {a}.id DESC LIMIT $2",
+                user_id, limit
+            )
+
+    items = [dict(r) for r in rows[:INVENTORY_PAGE_SIZE]]
+    more = len(rows) > INVENTORY_PAGE_SIZE
+    if before:
+        items.reverse()
+        has_prev, has_next = more, True
+    else:
+        has_prev, has_next = bool(after), more
+    if not items:
+        return [], None, None
+    prev_cursor = encode_inventory_cursor(items[0]) if has_prev else None
+    next_cursor = encode_inventory_cursor(items[-1]) if has_next else None
+    return items, prev_cursor, next_cursor
+
+
+async def load_inventory_summary(user_id: str) -> dict:
+    """Counts, materials and gems for the inventory overview (no gear rows)."""
+    async with bot.db_pool.acquire() as conn:
+        counts = await conn.fetchrow(
+            "SELECT weapons, armor, accessories FROM user_inventory_counts WHERE user_id = $1",
+            user_id
+        )
+        materials = await conn.fetch("""
+            SELECT um.material_id, si.name, um.quantity, si.description
+            FROM user_materials um
+            JOIN shop_items si ON um.material_id = si.item_id
+            WHERE um.user_id = $1 AND um.quantity > 0
+            ORDER BY si.name
+        """, user_id)
+    balance = await currency_system.get_balance(user_id)
+    return {
+        'counts': dict(counts) if counts else {'weapons': 0, 'armor': 0, 'accessories': 0},
+        'materials': [dict(m) for m in materials],
+        'gems': balance['gems']
+    }
+
+
 class InventoryItemButton(discord.ui.Button):
     def __init__(self, item_data, item_type, row=None, awakened=False):
         self.item_data = item_data
@@ -4788,7 +6212,13 @@ class InventoryItemButton(discord.ui.Button):
                     pass
 
 class CategoryView(discord.ui.View):
-    def __init__(self, user_id, items, item_type, parent_view, page=0):
+    """One page of an inventory category.
+
+    Gear categories pass a single keyset page plus its (prev, next) cursors;
+    pets and consumables still pass the whole (small) list and are sliced here.
+    """
+
+    def __init__(self, user_id, items, item_type, parent_view, page=0, cursors=None):
         super().__init__(timeout=60)
         self.user_id = user_id
         self.items = items
@@ -4796,12 +6226,20 @@ class CategoryView(discord.ui.View):
         self.parent = parent_view
         self.cog = parent_view.cog
         self.page = page
-        self.items_per_page = 20
-        self.max_page = (len(items) - 1) // self.items_per_page
+        self.items_per_page = INVENTORY_PAGE_SIZE
 
-        start = self.page * self.items_per_page
-        end = min(start + self.items_per_page, len(items))
-        page_items = items[start:end]
+        if cursors is not None:
+            page_items = items
+            prev_cursor, next_cursor = cursors
+            prev_id = f"category_prev_{item_type}_{self.page}_{prev_cursor}" if prev_cursor else None
+            next_id = f"category_next_{item_type}_{self.page}_{next_cursor}" if next_cursor else None
+        else:
+            max_page = (len(items) - 1) // self.items_per_page
+            start = self.page * self.items_per_page
+            end = min(start + self.items_per_page, len(items))
+            page_items = items[start:end]
+            prev_id = f"category_prev_{item_type}_{self.page}" if self.page > 0 else None
+            next_id = f"category_next_{item_type}_{self.page}" if self.page < max_page else None
 
         if item_type == 'material' or item_type == 'mixed':
             for i, item in enumerate(page_items):
@@ -4812,20 +6250,8 @@ class CategoryView(discord.ui.View):
                     label = item['name']
                     custom_id = f"inv_title_{item['id']}"
                 else:
-                    # Material button – using your exact logic (no fallback)
-                    name_lower = item['name'].lower()
-                    if 'hp potion' in name_lower:
-                        emoji = CUSTOM_EMOJIS.get('hp_potion')
-                    elif 'energy potion' in name_lower:
-                        emoji = CUSTOM_EMOJIS.get('energy_potion')
-                    elif 'sword' in name_lower:
-                        emoji = CUSTOM_EMOJIS.get('sword_enhancement_stone')
-                    elif 'armor' in name_lower:
-                        emoji = CUSTOM_EMOJIS.get('armors_enhancement_stone')
-                    elif 'accessories' in name_lower:
-                        emoji = CUSTOM_EMOJIS.get('acc_enhancement_stone')
-                    else:
-                        emoji = '📦'
+                    # Material button
+                    emoji = get_material_emoji(item['name'])
                     label = f"x{item['quantity']}"
                     custom_id = f"inv_material_{item['material_id']}"
 
@@ -4844,21 +6270,20 @@ class CategoryView(discord.ui.View):
                 self.add_item(InventoryItemButton(item, item_type, row=row, awakened=item.get('awakened', False)))
 
         # Pagination buttons
-        if self.max_page > 0:
-            if self.page > 0:
-                self.add_item(discord.ui.Button(
-                    label="◀",
-                    style=discord.ButtonStyle.secondary,
-                    custom_id=f"category_prev_{item_type}_{self.page}",
-                    row=4
-                ))
-            if self.page < self.max_page:
-                self.add_item(discord.ui.Button(
-                    label="▶",
-                    style=discord.ButtonStyle.secondary,
-                    custom_id=f"category_next_{item_type}_{self.page}",
-                    row=4
-                ))
+        if prev_id:
+            self.add_item(discord.ui.Button(
+                label="◀",
+                style=discord.ButtonStyle.secondary,
+                custom_id=prev_id,
+                row=4
+            ))
+        if next_id:
+            self.add_item(discord.ui.Button(
+                label="▶",
+                style=discord.ButtonStyle.secondary,
+                custom_id=next_id,
+                row=4
+            ))
 
         # Always add back button
         self.add_item(discord.ui.Button(
@@ -4933,9 +6358,10 @@ class InventoryView(discord.ui.View):
         if user:
             embed.set_thumbnail(url=user.display_avatar.url)
 
-        embed.add_field(name="⚔️ Weapons", value=str(len(self.inventory['weapons'])), inline=True)
-        embed.add_field(name="🛡️ Armor", value=str(len(self.inventory['armor'])), inline=True)
-        embed.add_field(name="📿 Accessories", value=str(len(self.inventory['accessories'])), inline=True)
+        counts = self.inventory['counts']
+        embed.add_field(name="⚔️ Weapons", value=str(counts['weapons']), inline=True)
+        embed.add_field(name="🛡️ Armor", value=str(counts['armor']), inline=True)
+        embed.add_field(name="📿 Accessories", value=str(counts['accessories']), inline=True)
         embed.add_field(name=f"{energy_emoji} Consumables", value=str(len(self.inventory.get('materials', []))), inline=True)
 
         print(f"   embed title: {embed.title}")
@@ -4943,127 +6369,63 @@ class InventoryView(discord.ui.View):
 
     async def refresh_inventory(self, interaction):
         """Refresh inventory data after equip/unequip"""
-        user_id = str(self.user_id)
-        async with self.cog.bot.db_pool.acquire() as conn:
-            weapons = await conn.fetch("""
-                SELECT uw.id, COALESCE(si.name, uw.generated_name) as name,
-                       uw.attack, uw.equipped, uw.description,
-                       uw.bleeding_chance, uw.crit_chance, uw.crit_damage,
-                       COALESCE(si.image_url, uw.image_url) as image_url,
-                       r.color as rarity_color,
-                       uw.upgrade_level
-                FROM user_weapons uw
-                LEFT JOIN shop_items si ON uw.weapon_item_id = si.item_id
-                LEFT JOIN weapon_variants v ON uw.variant_id = v.variant_id
-                LEFT JOIN rarities r ON v.rarity_id = r.rarity_id
-                WHERE uw.user_id = $1
-                ORDER BY uw.equipped DESC, uw.purchased_at DESC
-            """, user_id)
-
-            armor = await conn.fetch("""
-                SELECT ua.id, at.name, ua.defense, ua.equipped, at.slot,
-                       ua.hp_bonus, ua.reflect_damage, at.set_name,
-                       at.image_url, at.description, r.color as rarity_color,
-                       ua.upgrade_level
-                FROM user_armor ua
-                JOIN armor_types at ON ua.armor_id = at.armor_id
-                LEFT JOIN rarities r ON at.rarity_id = r.rarity_id
-                WHERE ua.user_id = $1
-                ORDER BY ua.equipped DESC, ua.purchased_at DESC
-            """, user_id)
-
-            accessories = await conn.fetch("""
-                SELECT ua.id, at.name, ua.bonus_value, at.bonus_stat,
-                       ua.equipped, ua.slot, at.set_name,
-                       at.image_url, at.description, r.color as rarity_color,
-                       ua.upgrade_level
-                FROM user_accessories ua
-                JOIN accessory_types at ON ua.accessory_id = at.accessory_id
-                LEFT JOIN rarities r ON at.rarity_id = r.rarity_id
-                WHERE ua.user_id = $1
-                ORDER BY ua.equipped DESC, ua.purchased_at DESC
-            """, user_id)
-
-            materials = await conn.fetch("""
-                SELECT um.material_id, si.name, um.quantity, si.description
-                FROM user_materials um
-                JOIN shop_items si ON um.material_id = si.item_id
-                WHERE um.user_id = $1 AND um.quantity > 0
-                ORDER BY si.name
-            """, user_id)
-
-        balance = await currency_system.get_balance(user_id)
-
-        self.inventory = {
-            'weapons': [dict(w) for w in weapons],
-            'armor': [dict(a) for a in armor],
-            'accessories': [dict(a) for a in accessories],
-            'materials': [dict(m) for m in materials],
-            'gems': balance['gems']
-        }
+        self.inventory = await load_inventory_summary(str(self.user_id))
 
         await interaction.edit_original_response(embed=self.create_main_embed(), view=self)
 
     
 
-    async def show_weapons(self, interaction: discord.Interaction):
+    CATEGORY_EMBEDS = {
+        'weapon': ("🗡️ **Weapons**", discord.Color.red(), "You have no weapons!"),
+        'armor': ("🛡️ **Armor**", discord.Color.blue(), "You have no armor!"),
+        'accessory': ("📿 **Accessories**", discord.Color.green(), "You have no accessories!"),
+    }
+
+    async def show_gear_category(self, interaction: discord.Interaction, item_type: str,
+                                 page: int = 0, after: str = None, before: str = None):
+        """Render one keyset page of weapons, armor or accessories."""
         try:
             if interaction.user.id != int(self.user_id):
                 await interaction.followup.send("Not your inventory!", ephemeral=True)
                 return
-            if not self.inventory['weapons']:
-                await interaction.followup.send("You have no weapons!", ephemeral=True)
-                return
-            embed = discord.Embed(title="🗡️ **Weapons**", color=discord.Color.red())
-            view = CategoryView(self.user_id, self.inventory['weapons'], 'weapon', self)
-            await interaction.edit_original_response(embed=embed, view=view) 
+            title, color, empty_msg = self.CATEGORY_EMBEDS[item_type]
+            total = self.inventory['counts'][INVENTORY_CATEGORIES[item_type]['count']]
+            items, prev_cursor, next_cursor = await fetch_inventory_page(self.user_id, item_type, after, before)
+            if not items:
+                if page == 0:
+                    await interaction.followup.send(empty_msg, ephemeral=True)
+                    return
+                # The page emptied under us (items traded or deleted) – start over
+                page = 0
+                items, prev_cursor, next_cursor = await fetch_inventory_page(self.user_id, item_type)
+                if not items:
+                    await interaction.followup.send(empty_msg, ephemeral=True)
+                    return
+            embed = discord.Embed(title=title, color=color)
+            total_pages = max(1, (total - 1) // INVENTORY_PAGE_SIZE + 1)
+            if total_pages > 1:
+                embed.set_footer(text=f"Page {page+1}/{total_pages}")
+            view = CategoryView(self.user_id, items, item_type, self, page=page,
+                                cursors=(prev_cursor, next_cursor))
+            await interaction.edit_original_response(embed=embed, view=view)
         except Exception as e:
-            print(f"Error in show_weapons: {e}")
+            print(f"Error in show_gear_category ({item_type}): {e}")
             traceback.print_exc()
             try:
                 await interaction.followup.send("An error occurred.", ephemeral=True)
             except:
                 pass
 
+    async def show_weapons(self, interaction: discord.Interaction):
+        await self.show_gear_category(interaction, 'weapon')
+
     async def show_armor(self, interaction: discord.Interaction):
-        try:
-            if interaction.user.id != int(self.user_id):
-                await interaction.followup.send("Not your inventory!", ephemeral=True)
-                return
-            if not self.inventory['armor']:
-                await interaction.followup.send("You have no armor!", ephemeral=True)
-                return
-            embed = discord.Embed(title="🛡️ **Armor**", color=discord.Color.blue())
-            view = CategoryView(self.user_id, self.inventory['armor'], 'armor', self)
-            await interaction.edit_original_response(embed=embed, view=view) 
-        except Exception as e:
-            print(f"Error in show_armor: {e}")
-            traceback.print_exc()
-            try:
-                await interaction.followup.send("An error occurred.", ephemeral=True)
-            except:
-                pass
+        await self.show_gear_category(interaction, 'armor')
 
     async def show_accessories(self, interaction: discord.Interaction):
-        try:
-            if interaction.user.id != int(self.user_id):
-                await interaction.followup.send("Not your inventory!", ephemeral=True)
-                return
-            if not self.inventory['accessories']:
-                await interaction.followup.send("You have no accessories!", ephemeral=True)
-                return
-            embed = discord.Embed(title="📿 **Accessories**", color=discord.Color.green())
-            view = CategoryView(self.user_id, self.inventory['accessories'], 'accessory', self)            
-            await interaction.edit_original_response(embed=embed, view=view) 
-        except Exception as e:
-            print(f"Error in show_accessories: {e}")
-            traceback.print_exc()
-            try:
-                await interaction.followup.send("An error occurred.", ephemeral=True)
-            except:
-                pass
+        await self.show_gear_category(interaction, 'accessory')
 
-    async def show_pets(self, interaction: discord.Interaction):
+    async def show_pets(self, interaction: discord.Interaction, page: int = 0):
         try:
             if interaction.user.id != int(self.user_id):
                 await interaction.followup.send("Not your inventory!", ephemeral=True)
@@ -5089,7 +6451,7 @@ class InventoryView(discord.ui.View):
             pet_list = [dict(pet) for pet in pets]
             # Create CategoryView with item_type='pet'
             embed = discord.Embed(title=f"{paw_emoji} **Pets**", color=discord.Color.purple())
-            view = CategoryView(self.user_id, pet_list, 'pet', self)
+            view = CategoryView(self.user_id, pet_list, 'pet', self, page=page)
             await interaction.edit_original_response(embed=embed, view=view)
         except Exception as e:
             print(f"Error in show_pets: {e}")
@@ -5097,7 +6459,7 @@ class InventoryView(discord.ui.View):
             await interaction.followup.send("An error occurred.", ephemeral=True)
 
 
-    async def show_materials(self, interaction: discord.Interaction):
+    async def show_materials(self, interaction: discord.Interaction, page: int = 0):
         try:
             if interaction.user.id != int(self.user_id):
                 await interaction.followup.send("Not your inventory!", ephemeral=True)
@@ -5139,7 +6501,7 @@ class InventoryView(discord.ui.View):
             # Use your custom energy emoji in the title
             energy_emoji = CUSTOM_EMOJIS.get('energy_potion', '🧪')
             embed = discord.Embed(title=f"{energy_emoji} **Consumables & Titles**", color=discord.Color.light_grey())
-            view = CategoryView(self.user_id, combined, 'mixed', self)
+            view = CategoryView(self.user_id, combined, 'mixed', self, page=page)
             await interaction.edit_original_response(embed=embed, view=view)
         except Exception as e:
             print(f"Error in show_materials: {e}")
@@ -5174,12 +6536,11 @@ async def update_trade_embed(message: discord.Message, trade_id: int):
     async with bot.db_pool.acquire() as conn:
         trade = await conn.fetchrow("SELECT * FROM active_trades WHERE trade_id = $1", trade_id)
         if not trade:
-            await message.edit(content="Trade not found.", view=None)
+            edit_scheduler.submit(message, content="Trade not found.", view=None)
             return
         items = await conn.fetch("SELECT * FROM trade_items WHERE trade_id = $1", trade_id)
 
-    initiator = bot.get_user(int(trade['initiator_id'])) or await bot.fetch_user(int(trade['initiator_id']))
-    receiver = bot.get_user(int(trade['receiver_id'])) or await bot.fetch_user(int(trade['receiver_id']))
+    names = await name_resolver.names([trade['initiator_id'], trade['receiver_id']], message.guild)
 
     initiator_offers = []
     receiver_offers = []
@@ -5198,19 +6559,19 @@ async def update_trade_embed(message: discord.Message, trade_id: int):
 
     embed = discord.Embed(title="🔄 Trade Session", color=discord.Color.blue())
     embed.add_field(
-        name=f"📦 {initiator.display_name} offers:",
+        name=f"📦 {names[int(trade['initiator_id'])]} offers:",
         value="\n".join(initiator_offers) if initiator_offers else "Nothing yet",
         inline=True
     )
     embed.add_field(
-        name=f"📦 {receiver.display_name} offers:",
+        name=f"📦 {names[int(trade['receiver_id'])]} offers:",
         value="\n".join(receiver_offers) if receiver_offers else "Nothing yet",
         inline=True
     )
     status = f"Initiator locked: {'✅' if trade['initiator_lock'] else '❌'}\nReceiver locked: {'✅' if trade['receiver_lock'] else '❌'}"
     embed.add_field(name="Status", value=status, inline=False)
 
-    await message.edit(embed=embed)
+    edit_scheduler.submit(message, embed=embed)
 
 
 async def get_item_name(item_type: str, item_id: int) -> str:
@@ -5285,19 +6646,7 @@ async def get_trade_item_display(item_type: str, item_id: int, quantity: int = 1
                 SELECT name FROM shop_items WHERE item_id = $1
             """, item_id)
             if row:
-                name_lower = row['name'].lower()
-                if 'hp potion' in name_lower:
-                    emoji = CUSTOM_EMOJIS.get('hp_potion', '🧪')
-                elif 'energy potion' in name_lower:
-                    emoji = CUSTOM_EMOJIS.get('energy_potion', '⚡')
-                elif 'sword' in name_lower:
-                    emoji = CUSTOM_EMOJIS.get('sword_enhancement_stone', '💎')
-                elif 'armor' in name_lower:
-                    emoji = CUSTOM_EMOJIS.get('armors_enhancement_stone', '💎')
-                elif 'accessories' in name_lower:
-                    emoji = CUSTOM_EMOJIS.get('acc_enhancement_stone', '💎')
-                else:
-                    emoji = '📦'
+                emoji = get_material_emoji(row['name'])
                 return f"{emoji} **{row['name']}** x{quantity}"
         elif item_type == 'pet':
             row = await conn.fetchrow("""
@@ -5364,7 +6713,7 @@ class TradeView(discord.ui.View):
         async with bot.db_pool.acquire() as conn:
             await conn.execute("UPDATE active_trades SET status = 'cancelled' WHERE trade_id = $1", self.trade_id)
             await conn.execute("DELETE FROM trade_items WHERE trade_id = $1", self.trade_id)
-        await interaction.message.edit(content="🚫 Trade cancelled.", embed=None, view=None)
+        await edit_scheduler.submit(interaction.message, content="🚫 Trade cancelled.", embed=None, view=None)
         self.stop()
 
     async def execute_trade(self, interaction: discord.Interaction):
@@ -5401,8 +6750,11 @@ class TradeView(discord.ui.View):
                             await conn.execute(f"UPDATE {table_map[it['item_type']]} SET user_id = $1 WHERE id = $2", new_owner, it['item_id'])
                 await conn.execute("UPDATE active_trades SET status = 'completed' WHERE trade_id = $1", self.trade_id)
                 await conn.execute("DELETE FROM trade_items WHERE trade_id = $1", self.trade_id)
+        # Traded gear may have been equipped
+        stat_cache.invalidate(self.initiator_id)
+        stat_cache.invalidate(self.receiver_id)
 
-        await interaction.message.edit(content="✅ Trade completed successfully!", embed=None, view=None)
+        await edit_scheduler.submit(interaction.message, content="✅ Trade completed successfully!", embed=None, view=None)
         self.stop()
 
 class CategorySelectView(discord.ui.View):
@@ -5680,199 +7032,114 @@ class ProfileView(discord.ui.View):
         embed = await build_profile_embed(self.user_id, interaction.user)
         await interaction.edit_original_response(embed=embed, view=self)
 
-async def build_profile_embed(user_id: str, member: discord.Member):
-    """Build the profile embed (used by both myprofile and refresh button)."""
-    BASE_HP = 1000
-    BASE_DEF = 500
-
-    async with bot.db_pool.acquire() as conn:
-        player = await conn.fetchrow("SELECT hp, max_hp, energy, max_energy FROM player_stats WHERE user_id = $1", user_id)
-        if not player:
-            await conn.execute("INSERT INTO player_stats (user_id, hp, max_hp, energy, max_energy) VALUES ($1, $2, $2, 3, 3) ON CONFLICT DO NOTHING", user_id, BASE_HP)
-            player = {'hp': BASE_HP, 'max_hp': BASE_HP, 'energy': 3, 'max_energy': 3}
-
-        weapon = await conn.fetchrow("""
-            SELECT uw.id, COALESCE(si.name, uw.generated_name) as name,
-                   uw.attack, uw.bleeding_chance, uw.crit_chance, uw.crit_damage,
-                   COALESCE(si.image_url, uw.image_url) as image_url
-            FROM user_weapons uw
-            LEFT JOIN shop_items si ON uw.weapon_item_id = si.item_id
-            WHERE uw.user_id = $1 AND uw.equipped = TRUE
-            LIMIT 1
-        """, user_id)
-
-        armor_pieces = await conn.fetch("""
-            SELECT at.name, ua.defense, at.slot, ua.reflect_damage,
-                   ua.hp_bonus, at.set_name, ua.equipped, at.image_url
-            FROM user_armor ua
-            JOIN armor_types at ON ua.armor_id = at.armor_id
-            WHERE ua.user_id = $1 AND ua.equipped = TRUE
-        """, user_id)
-        armor_dict = {a['slot']: a for a in armor_pieces}
-
-        accessories = await conn.fetch("""
-            SELECT ua.id, at.name, ua.bonus_value, at.bonus_stat,
-                   ua.slot, at.set_name, at.image_url
-            FROM user_accessories ua
-            JOIN accessory_types at ON ua.accessory_id = at.accessory_id
-            WHERE ua.user_id = $1 AND ua.equipped = TRUE
-        """, user_id)
-        acc_dict = {a['slot']: a for a in accessories}
-
-        # Fetch equipped pet (if any)
-        pet = await conn.fetchrow("""
-            SELECT pt.name
-            FROM user_pets up
-            JOIN pet_types pt ON up.pet_id = pt.pet_id
-            WHERE up.user_id = $1 AND up.equipped = TRUE
-        """, user_id)
-
-    # ===== TITLE BONUSES (fetch early for emoji) =====
-    title_bonuses = await get_equipped_title_bonuses(user_id)
-    title_emoji = title_bonuses['emoji'] if title_bonuses else None
-    boss_dmg_percent = title_bonuses['boss_damage_percent'] if title_bonuses else 0
-
-    # --- Flat stats from gear ---
-    total_atk = 0
-    total_def = BASE_DEF
-    total_crit_chance = 0.0
-    total_crit_damage = 0.0
-    total_bleed_chance = 0.0
-    total_bleed_damage = 0.0
-    total_reflect = 0
-    hp_from_gear = BASE_HP
-
-    if weapon:
-        total_atk += weapon['attack']
-        total_bleed_chance += weapon['bleeding_chance'] or 0
-        total_crit_chance += weapon['crit_chance'] or 0
-        total_crit_damage += weapon['crit_damage'] or 0
-
-    for armor in armor_pieces:
-        total_def += armor['defense']
-        total_reflect += armor['reflect_damage'] or 0
-        hp_from_gear += armor['hp_bonus'] or 0
-
-    for acc in accessories:
-        stat = acc['bonus_stat']
-        val = acc['bonus_value']
-        if stat == 'atk':
-            total_atk += val
-        elif stat == 'def':
-            total_def += val
-        elif stat == 'hp':
-            hp_from_gear += val
-        elif stat == 'crit':
-            total_crit_chance += val
-        elif stat == 'bleed':
-            total_bleed_damage += val
-
-    # --- Multipliers from sets ---
-    atk_mult = 1.0
-    def_mult = 1.0
-    hp_mult = 1.0
-    reflect_add = 0
-    crit_chance_add = 0
-    crit_damage_add = 0
+# Names of the equipped gear and pet for the profile's gear grid; stats come from the stat engine
+PROFILE_GEAR_SQL = """
+    SELECT w.weapon, ar.armor, ac.accessories, p.pet
+    FROM (SELECT $1::text AS user_id) u
+    LEFT JOIN LATERAL (
+        SELECT COALESCE(si.name, uw.generated_name) AS weapon
+        FROM user_weapons uw
+        LEFT JOIN shop_items si ON uw.weapon_item_id = si.item_id
+        WHERE uw.user_id = u.user_id AND uw.equipped = TRUE
+        LIMIT 1
+    ) w ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT json_object_agg(at.slot, at.name) AS armor
+        FROM user_armor ua
+        JOIN armor_types at ON ua.armor_id = at.armor_id
+        WHERE ua.user_id = u.user_id AND ua.equipped = TRUE
+    ) ar ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT json_object_agg(ua.slot, at.name) AS accessories
+        FROM user_accessories ua
+        JOIN accessory_types at ON ua.accessory_id = at.accessory_id
+        WHERE ua.user_id = u.user_id AND ua.equipped = TRUE
+    ) ac ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT pt.name AS pet
+        FROM user_pets up
+        JOIN pet_types pt ON up.pet_id = pt.pet_id
+        WHERE up.user_id = u.user_id AND up.equipped = TRUE
+        LIMIT 1
+    ) p ON TRUE
+"""
+
+
+def _json_or(value, default):
+    return json.loads(value) if value is not None else default
+
+
+def format_profile_gears(row) -> str:
+    """The profile's 3-row gear grid from a PROFILE_GEAR_SQL row."""
+    armor = _json_or(row['armor'], {})
+    accessories = _json_or(row['accessories'], {})
+
+    def slot_emoji(kind, name):
+        return get_item_emoji(name, kind) if name else "*none*"
+
+    pet_emoji = get_pet_emoji(row['pet']) if row['pet'] else "🐾"
+    row1 = (
+        f"{slot_emoji('armor', armor.get('helm'))} "
+        f"{slot_emoji('armor', armor.get('suit'))} "
+        f"{slot_emoji('weapon', row['weapon'])}"
+    )
+    row2 = (
+        f"{slot_emoji('armor', armor.get('gauntlets'))} "
+        f"{slot_emoji('armor', armor.get('boots'))} "
+        f"{pet_emoji}"
+    )
+    row3 = " ".join(
+        slot_emoji('accessory', accessories.get(slot))
+        for slot in ('ring1', 'earring1', 'pendant', 'earring2', 'ring2')
+    )
+    return f"{row1}\n{row2}\n{row3}"
+
+
+def format_profile_stats(stats: dict) -> str:
+    """STATS field text; the numbers are exactly what combat uses."""
+    lines = [
+        f"**ATK:** {stats['atk']}",
+        f"**Crit Chance:** {stats['crit_chance']:.1f}%",
+        f"**Crit Damage:** {stats['crit_damage']:.1f}%",
+        f"**Bleed Chance:** {stats['bleed_chance']:.1f}%",
+        f"**Bleed Damage:** {stats['bleed_damage']:.1f}%",
+        f"**Reflect Damage:** {stats['reflect']}%",
+    ]
+    if stats['dodge'] > 0:
+        lines.append(f"**Dodge:** {stats['dodge']}%")
+    if stats['dmg_reduction']:
+        lines.append(f"**DMG RED:** +{stats['dmg_reduction']}%")
+    if stats['crit_resist']:
+        lines.append(f"**Crit RES:** +{stats['crit_resist']}%")
+    if stats['crit_dmg_res']:
+        lines.append(f"**Crit DMG RES:** +{stats['crit_dmg_res']}%")
+    if stats['boss_damage_percent']:
+        lines.append(f"**Boss DMG:** +{stats['boss_damage_percent']}%")
+    return "\n".join(lines)
 
-    # Armor set
-    armor_sets = {}
-    for armor in armor_pieces:
-        if armor['set_name']:
-            armor_sets[armor['set_name']] = armor_sets.get(armor['set_name'], 0) + 1
-    for set_name, count in armor_sets.items():
-        if count >= 4:
-            sname = set_name.lower()
-            if sname in ('bilari', 'cryo', 'bane'):
-                crit_chance_add += 10
-                crit_damage_add += 25
-                def_mult *= 1.15
-                reflect_add += 20
-                hp_mult *= 1.20
 
-    # Accessory set
-    accessory_sets = {}
-    for acc in accessories:
-        if acc['set_name']:
-            accessory_sets[acc['set_name']] = accessory_sets.get(acc['set_name'], 0) + 1
-    for set_name, count in accessory_sets.items():
-        if count >= 5:
-            sname = set_name.lower()
-            if sname == 'champion':
-                atk_mult *= 1.20
-                def_mult *= 1.15
-                hp_mult *= 1.15
-            elif sname == 'defender':
-                def_mult *= 1.20
-                reflect_add += 10
-                hp_mult *= 1.15
-            elif sname == 'angel':
-                crit_chance_add += 15
-                total_bleed_damage += 20
-                hp_mult *= 1.15
+async def build_profile_embed(user_id: str, member: discord.Member):
+    """Build the profile embed (used by both myprofile and refresh button).
 
-    # Apply set multipliers
-    total_atk = int(total_atk * atk_mult)
-    total_def = int(total_def * def_mult)
-    max_hp_after_sets = int(hp_from_gear * hp_mult)
-    total_reflect += reflect_add
-    total_crit_chance += crit_chance_add
-    total_crit_damage += crit_damage_add
+    Stats come from get_player_stats (the same numbers combat uses); the
+    gear grid comes from profile_cache until the user's loadout version changes.
+    """
+    stats = await get_player_stats(user_id)
 
-    # --- Pet bonuses ---
-    pet_energy_bonus = 0
-    pet_dodge = 0
-    pet_hp_mult = 1.0
-    pet_atk_mult = 1.0
-    pet_def_mult = 1.0
-    if pet:
+    gears_text = profile_cache.get(user_id)
+    if gears_text is None:
+        generation = profile_cache.generation(user_id)
         async with bot.db_pool.acquire() as conn:
-            pet_stats = await conn.fetchrow("""
-                SELECT atk_percent, def_percent, hp_percent,
-                       dodge_percent, bleed_flat, burn_flat, energy_bonus
-                FROM pet_types WHERE name = $1
-            """, pet['name'])
-        if pet_stats:
-            pet_atk_mult = 1 + pet_stats['atk_percent'] / 100
-            pet_def_mult = 1 + pet_stats['def_percent'] / 100
-            pet_hp_mult = 1 + pet_stats['hp_percent'] / 100
-            pet_energy_bonus = pet_stats['energy_bonus']
-            pet_dodge = pet_stats['dodge_percent']
-
-    # Apply pet multipliers
-    total_atk = int(total_atk * pet_atk_mult)
-    total_def = int(total_def * pet_def_mult)
-    max_hp_after_pet = int(max_hp_after_sets * pet_hp_mult)
-
-    # ========== TITLE BONUSES ==========
-    title_hp_mult = 1.0
-    if title_bonuses:
-        # ATK% and DEF% multipliers
-        total_atk = int(total_atk * (1 + title_bonuses['atk_percent'] / 100))
-        total_def = int(total_def * (1 + title_bonuses['def_percent'] / 100))
-        # HP% multiplier
-        title_hp_mult = 1 + title_bonuses['hp_percent'] / 100
-        # Additive stats
-        total_crit_chance += title_bonuses['crit_chance']
-        total_crit_damage += title_bonuses.get('crit_damage', 0)
-        pet_dodge += title_bonuses['dodge_percent']  # add title dodge to display
-        # Store other bonuses for display
-        boss_dmg_percent = title_bonuses['boss_damage_percent']
-
-    # Final max HP after title multiplier
-    max_hp = int(max_hp_after_pet * title_hp_mult)
-
-    current_hp = player['hp']
-    if current_hp > max_hp:
-        current_hp = max_hp
-
-    max_energy = player['max_energy'] + pet_energy_bonus
-    current_energy = player['energy']
-    if current_energy > max_energy:
-        current_energy = max_energy
+            gears_text = format_profile_gears(await conn.fetchrow(PROFILE_GEAR_SQL, user_id))
+        profile_cache.put(user_id, gears_text, generation)
+
+    max_hp = stats['max_hp']
+    current_hp = stats['hp']
+    max_energy = stats['max_energy']
+    current_energy = stats['energy']
 
     # ===== BUILD EMBED =====
-    title_suffix = f" {title_emoji}" if title_emoji else ""
+    title_suffix = f" {stats['equipped_title'][1]}" if stats['equipped_title'] else ""
     embed = discord.Embed(
         title=f"**{member.display_name}'s Profile**{title_suffix}",
         color=discord.Color.gold()
@@ -5887,66 +7154,15 @@ async def build_profile_embed(user_id: str, member: discord.Member):
 
     def_bar = "🟦" * 10
 
-    vitals_text = (
-        f"{hp_bar} `{current_hp}/{max_hp} HP`\n"
-        f"{def_bar} `{total_def} DEF`\n"
-        f"{energy_bar} `{current_energy}/{max_energy} Energy`"
-    )
-    embed.description = vitals_text
-
-    stats_lines = [
-        f"**ATK:** {total_atk}",
-        f"**Crit Chance:** {total_crit_chance:.1f}%",
-        f"**Crit Damage:** {total_crit_damage:.1f}%",
-        f"**Bleed Chance:** {total_bleed_chance:.1f}%",
-        f"**Bleed Damage:** {total_bleed_damage:.1f}%",
-        f"**Reflect Damage:** {total_reflect}%",
-    ]
-    if pet_dodge > 0:
-        stats_lines.append(f"**Dodge:** {pet_dodge}%")
-
-    # Title-specific stats
-    if title_bonuses:       
-        if title_bonuses.get('dmg_reduction_percent'):
-            stats_lines.append(f"**DMG RED:** +{title_bonuses['dmg_reduction_percent']}%")
-        if title_bonuses.get('crit_resist_percent'):
-            stats_lines.append(f"**Crit RES:** +{title_bonuses['crit_resist_percent']}%")
-        if title_bonuses.get('crit_dmg_res_percent'):
-            stats_lines.append(f"**Crit DMG RES:** +{title_bonuses['crit_dmg_res_percent']}%")        
-        if boss_dmg_percent:
-            stats_lines.append(f"**Boss DMG:** +{boss_dmg_percent}%")
-    embed.add_field(name="**STATS**", value="\n".join(stats_lines), inline=False)
-
-    def slot_emoji(slot, item=None):
-        if item:
-            if slot == 'weapon':
-                return get_item_emoji(item['name'], 'weapon')
-            elif slot in ('helm', 'suit', 'gauntlets', 'boots'):
-                return get_item_emoji(item['name'], 'armor')
-            else:
-                return get_item_emoji(item['name'], 'accessory')
-        return "*none*"
-
-    pet_emoji = get_pet_emoji(pet['name']) if pet else "🐾"
-
-    row1 = (
-        f"{slot_emoji('helm', armor_dict.get('helm'))} "
-        f"{slot_emoji('suit', armor_dict.get('suit'))} "
-        f"{slot_emoji('weapon', weapon)}"
-    )
-    row2 = (
-        f"{slot_emoji('gauntlets', armor_dict.get('gauntlets'))} "
-        f"{slot_emoji('boots', armor_dict.get('boots'))} "
-        f"{pet_emoji}"
-    )
-    row3 = (
-        f"{slot_emoji('ring1', acc_dict.get('ring1'))} "
-        f"{slot_emoji('earring1', acc_dict.get('earring1'))} "
-        f"{slot_emoji('pendant', acc_dict.get('pendant'))} "
-        f"{slot_emoji('earring2', acc_dict.get('earring2'))} "
-        f"{slot_emoji('ring2', acc_dict.get('ring2'))}"
+    vitals_text = (
+        f"{hp_bar} `{current_hp}/{max_hp} HP`\n"
+        f"{def_bar} `{stats['def']} DEF`\n"
+        f"{energy_bar} `{current_energy}/{max_energy} Energy`"
     )
-    embed.add_field(name="**Equipped Gears**", value=f"{row1}\n{row2}\n{row3}", inline=False)
+    embed.description = vitals_text
+
+    embed.add_field(name="**STATS**", value=format_profile_stats(stats), inline=False)
+    embed.add_field(name="**Equipped Gears**", value=gears_text, inline=False)
 
     return embed
 
@@ -6232,7 +7448,7 @@ class Shop(commands.Cog):
 
         async with self.bot.db_pool.acquire() as conn:
             # Get stone item_id
-            stone_item = await conn.fetchrow("SELECT item_id FROM shop_items WHERE name = $1", stone_name)
+            stone_item = await catalog.by_name('shop_items', stone_name)
             if not stone_item:
                 await interaction.followup.send("❌ Enhancement stone not found. Contact admin.", ephemeral=True)
                 return
@@ -6288,7 +7504,7 @@ class Shop(commands.Cog):
 
         async with self.bot.db_pool.acquire() as conn:
             # Get stone item_id
-            stone_item = await conn.fetchrow("SELECT item_id FROM shop_items WHERE name = $1", stone_name)
+            stone_item = await catalog.by_name('shop_items', stone_name)
             if not stone_item:
                 embed = discord.Embed(
                     title="❌ Error",
@@ -6390,6 +7606,8 @@ class Shop(commands.Cog):
                     new_stat = round(current_stat * multiplier)
                     await conn.execute(f"UPDATE {table} SET bonus_value = $1 WHERE id = $2", new_stat, item_id)
 
+                stat_cache.invalidate(user_id)
+
                 embed = discord.Embed(
                     title="✅ Upgrade Successful",
                     description=f"Your item is now **+{current_level+1}**!",
@@ -6541,21 +7759,21 @@ class Shop(commands.Cog):
 
         # ===== PAGINATION BUTTONS =====   <-- INSERT HERE
         elif custom_id.startswith("category_prev_"):
-            # Format: category_prev_{item_type}_{current_page}
-            parts = custom_id.split('_')
+            # Format: category_prev_{item_type}_{current_page}[_{cursor}]
+            parts = custom_id.split('_', 4)
             if len(parts) >= 4:
                 item_type = parts[2]
                 current_page = int(parts[3])
-                new_page = current_page - 1
-                await self.handle_category_page(interaction, item_type, new_page)
+                cursor = parts[4] if len(parts) > 4 else None
+                await self.handle_category_page(interaction, item_type, max(0, current_page - 1), before=cursor)
 
         elif custom_id.startswith("category_next_"):
-            parts = custom_id.split('_')
+            parts = custom_id.split('_', 4)
             if len(parts) >= 4:
                 item_type = parts[2]
                 current_page = int(parts[3])
-                new_page = current_page + 1
-                await self.handle_category_page(interaction, item_type, new_page)
+                cursor = parts[4] if len(parts) > 4 else None
+                await self.handle_category_page(interaction, item_type, current_page + 1, after=cursor)
 
 
         elif custom_id.startswith("item_back_"):
@@ -6566,117 +7784,28 @@ class Shop(commands.Cog):
                 await self.handle_back_to_category(interaction, item_type)
 
     # HELPER METHODS
-    async def handle_category_page(self, interaction: discord.Interaction, item_type: str, page: int):
-        """Fetch items and show the category page."""
+    async def handle_category_page(self, interaction: discord.Interaction, item_type: str, page: int,
+                                   after: str = None, before: str = None):
+        """Show another page of a category; gear pages follow the keyset cursor."""
         try:
+            await interaction.response.defer()
             user_id = str(interaction.user.id)
-
-            # Fetch items of the requested type
-            async with self.bot.db_pool.acquire() as conn:
-                if item_type == 'weapon':
-                    items = await conn.fetch("""
-                        SELECT uw.id, COALESCE(si.name, uw.generated_name) as name,
-                               uw.attack, uw.equipped, uw.description,
-                               uw.bleeding_chance, uw.crit_chance, uw.crit_damage,
-                               COALESCE(si.image_url, uw.image_url) as image_url,
-                               r.color as rarity_color
-                        FROM user_weapons uw
-                        LEFT JOIN shop_items si ON uw.weapon_item_id = si.item_id
-                        LEFT JOIN weapon_variants v ON uw.variant_id = v.variant_id
-                        LEFT JOIN rarities r ON v.rarity_id = r.rarity_id
-                        WHERE uw.user_id = $1
-                        ORDER BY uw.equipped DESC, uw.purchased_at DESC
-                    """, user_id)
-                    embed_title = "🗡️ **Weapons**"
-                    embed_color = discord.Color.red()
-                elif item_type == 'armor':
-                    items = await conn.fetch("""
-                        SELECT ua.id, at.name, ua.defense, ua.equipped, at.slot,
-                               ua.hp_bonus, ua.reflect_damage, at.set_name,
-                               at.image_url, at.description, r.color as rarity_color
-                        FROM user_armor ua
-                        JOIN armor_types at ON ua.armor_id = at.armor_id
-                        LEFT JOIN rarities r ON at.rarity_id = r.rarity_id
-                        WHERE ua.user_id = $1
-                        ORDER BY ua.equipped DESC, ua.purchased_at DESC
-                    """, user_id)
-                    embed_title = "🛡️ **Armor**"
-                    embed_color = discord.Color.blue()
-                else:  # accessory
-                    items = await conn.fetch("""
-                        SELECT ua.id, at.name, ua.bonus_value, at.bonus_stat,
-                               ua.equipped, ua.slot, at.set_name,
-                               at.image_url, at.description, r.color as rarity_color
-                        FROM user_accessories ua
-                        JOIN accessory_types at ON ua.accessory_id = at.accessory_id
-                        LEFT JOIN rarities r ON at.rarity_id = r.rarity_id
-                        WHERE ua.user_id = $1
-                        ORDER BY ua.equipped DESC, ua.purchased_at DESC
-                    """, user_id)
-                    embed_title = "📿 **Accessories**"
-                    embed_color = discord.Color.green()
-
-            items_list = [dict(item) for item in items]
-
-            # Need a parent InventoryView – fetch full inventory data
-            async with self.bot.db_pool.acquire() as conn:
-                weapons_full = await conn.fetch("""
-                    SELECT uw.id, COALESCE(si.name, uw.generated_name) as name,
-                           uw.attack, uw.equipped, uw.description,
-                           uw.bleeding_chance, uw.crit_chance, uw.crit_damage,
-                           COALESCE(si.image_url, uw.image_url) as image_url,
-                           r.color as rarity_color
-                    FROM user_weapons uw
-                    LEFT JOIN shop_items si ON uw.weapon_item_id = si.item_id
-                    LEFT JOIN weapon_variants v ON uw.variant_id = v.variant_id
-                    LEFT JOIN rarities r ON v.rarity_id = r.rarity_id
-                    WHERE uw.user_id = $1
-                    ORDER BY uw.equipped DESC, uw.purchased_at DESC
-                """, user_id)
-                armor_full = await conn.fetch("""
-                    SELECT ua.id, at.name, ua.defense, ua.equipped, at.slot,
-                           ua.hp_bonus, ua.reflect_damage, at.set_name,
-                           at.image_url, at.description, r.color as rarity_color
-                    FROM user_armor ua
-                    JOIN armor_types at ON ua.armor_id = at.armor_id
-                    LEFT JOIN rarities r ON at.rarity_id = r.rarity_id
-                    WHERE ua.user_id = $1
-                    ORDER BY ua.equipped DESC, ua.purchased_at DESC
-                """, user_id)
-                accessories_full = await conn.fetch("""
-                    SELECT ua.id, at.name, ua.bonus_value, at.bonus_stat,
-                           ua.equipped, ua.slot, at.set_name,
-                           at.image_url, at.description, r.color as rarity_color
-                    FROM user_accessories ua
-                    JOIN accessory_types at ON ua.accessory_id = at.accessory_id
-                    LEFT JOIN rarities r ON at.rarity_id = r.rarity_id
-                    WHERE ua.user_id = $1
-                    ORDER BY ua.equipped DESC, ua.purchased_at DESC
-                """, user_id)
-
-            balance = await currency_system.get_balance(user_id)
-            inventory_data = {
-                'weapons': [dict(w) for w in weapons_full],
-                'armor': [dict(a) for a in armor_full],
-                'accessories': [dict(a) for a in accessories_full],
-                'gems': balance['gems']
-            }
+            inventory_data = await load_inventory_summary(user_id)
             parent_view = InventoryView(user_id, inventory_data, self)
 
-            # Create the category view for the requested page
-            category_view = CategoryView(user_id, items_list, item_type, parent_view, page=page)
-
-            # Create embed with page info
-            embed = discord.Embed(title=embed_title, color=embed_color)
-            total_pages = (len(items_list) - 1) // 20 + 1
-            embed.set_footer(text=f"Page {page+1}/{total_pages}")
-
-            await interaction.response.edit_message(embed=embed, view=category_view)
+            if item_type in INVENTORY_CATEGORIES:
+                if not (after or before):
+                    page = 0
+                await parent_view.show_gear_category(interaction, item_type, page, after, before)
+            elif item_type == 'pet':
+                await parent_view.show_pets(interaction, page)
+            else:
+                await parent_view.show_materials(interaction, page)
 
         except Exception as e:
             print(f"Error in handle_category_page: {e}")
             traceback.print_exc()
-            await interaction.response.send_message("An error occurred.", ephemeral=True)
+            await interaction.followup.send("An error occurred.", ephemeral=True)
    
 
 
@@ -6687,64 +7816,7 @@ class Shop(commands.Cog):
             user_id = str(interaction.user.id)
             print(f"   user_id: {user_id}, action: {action}")
 
-            # Fetch fresh inventory data
-            async with self.bot.db_pool.acquire() as conn:
-                weapons = await conn.fetch("""
-                    SELECT uw.id, COALESCE(si.name, uw.generated_name) as name,
-                           uw.attack, uw.equipped, uw.description,
-                           uw.bleeding_chance, uw.crit_chance, uw.crit_damage,
-                           COALESCE(si.image_url, uw.image_url) as image_url,
-                           r.color as rarity_color,
-                           uw.upgrade_level
-                    FROM user_weapons uw
-                    LEFT JOIN shop_items si ON uw.weapon_item_id = si.item_id
-                    LEFT JOIN weapon_variants v ON uw.variant_id = v.variant_id
-                    LEFT JOIN rarities r ON v.rarity_id = r.rarity_id
-                    WHERE uw.user_id = $1
-                    ORDER BY uw.equipped DESC, uw.purchased_at DESC
-                """, user_id)
-
-                armor = await conn.fetch("""
-                    SELECT ua.id, at.name, ua.defense, ua.equipped, at.slot,
-                           ua.hp_bonus, ua.reflect_damage, at.set_name,
-                           at.image_url, at.description, r.color as rarity_color,
-                           ua.upgrade_level
-                    FROM user_armor ua
-                    JOIN armor_types at ON ua.armor_id = at.armor_id
-                    LEFT JOIN rarities r ON at.rarity_id = r.rarity_id
-                    WHERE ua.user_id = $1
-                    ORDER BY ua.equipped DESC, ua.purchased_at DESC
-                """, user_id)
-
-                accessories = await conn.fetch("""
-                    SELECT ua.id, at.name, ua.bonus_value, at.bonus_stat,
-                           ua.equipped, ua.slot, at.set_name,
-                           at.image_url, at.description, r.color as rarity_color,
-                           ua.upgrade_level
-                    FROM user_accessories ua
-                    JOIN accessory_types at ON ua.accessory_id = at.accessory_id
-                    LEFT JOIN rarities r ON at.rarity_id = r.rarity_id
-                    WHERE ua.user_id = $1
-                    ORDER BY ua.equipped DESC, ua.purchased_at DESC
-                """, user_id)
-
-                materials = await conn.fetch("""
-                    SELECT um.material_id, si.name, um.quantity, si.description
-                    FROM user_materials um
-                    JOIN shop_items si ON um.material_id = si.item_id
-                    WHERE um.user_id = $1 AND um.quantity > 0
-                    ORDER BY si.name
-                """, user_id)
-
-            balance = await currency_system.get_balance(user_id)
-        
-            inventory_data = {
-                'weapons': [dict(w) for w in weapons],
-                'armor': [dict(a) for a in armor],
-                'accessories': [dict(a) for a in accessories],
-                'materials': [dict(m) for m in materials],  
-                'gems': balance['gems']
-            }
+            inventory_data = await load_inventory_summary(user_id)
 
             # Create a temporary inventory view
             temp_view = InventoryView(user_id, inventory_data, self)
@@ -7203,6 +8275,8 @@ class Shop(commands.Cog):
                         WHERE up.id = $1
                     """, item_id)
 
+            stat_cache.invalidate(user_id)
+
             # For non-title items, get emoji via helper and send confirmation
             if item_type != 'title':
                 item_emoji = get_item_emoji(item, item_type)
@@ -7212,75 +8286,7 @@ class Shop(commands.Cog):
             if item_type in ('armor', 'accessory'):
                 await self.update_player_hp_after_equip(user_id)
 
-            # Refresh inventory data (including materials and titles for consumables view)
-            async with self.bot.db_pool.acquire() as conn:
-                weapons = await conn.fetch("""
-                    SELECT uw.id, COALESCE(si.name, uw.generated_name) as name,
-                           uw.attack, uw.equipped, uw.description,
-                           uw.bleeding_chance, uw.crit_chance, uw.crit_damage,
-                           COALESCE(si.image_url, uw.image_url) as image_url,
-                           r.color as rarity_color
-                    FROM user_weapons uw
-                    LEFT JOIN shop_items si ON uw.weapon_item_id = si.item_id
-                    LEFT JOIN weapon_variants v ON uw.variant_id = v.variant_id
-                    LEFT JOIN rarities r ON v.rarity_id = r.rarity_id
-                    WHERE uw.user_id = $1
-                    ORDER BY uw.equipped DESC, uw.purchased_at DESC
-                """, user_id)
-
-                armor = await conn.fetch("""
-                    SELECT ua.id, at.name, ua.defense, ua.equipped, at.slot,
-                           ua.hp_bonus, ua.reflect_damage, at.set_name,
-                           at.image_url, at.description, r.color as rarity_color
-                    FROM user_armor ua
-                    JOIN armor_types at ON ua.armor_id = at.armor_id
-                    LEFT JOIN rarities r ON at.rarity_id = r.rarity_id
-                    WHERE ua.user_id = $1
-                    ORDER BY ua.equipped DESC, ua.purchased_at DESC
-                """, user_id)
-
-                accessories = await conn.fetch("""
-                    SELECT ua.id, at.name, ua.bonus_value, at.bonus_stat,
-                           ua.equipped, ua.slot, at.set_name,
-                           at.image_url, at.description, r.color as rarity_color
-                    FROM user_accessories ua
-                    JOIN accessory_types at ON ua.accessory_id = at.accessory_id
-                    LEFT JOIN rarities r ON at.rarity_id = r.rarity_id
-                    WHERE ua.user_id = $1
-                    ORDER BY ua.equipped DESC, ua.purchased_at DESC
-                """, user_id)
-
-                materials = await conn.fetch("""
-                    SELECT um.material_id, si.name, um.quantity, si.description
-                    FROM user_materials um
-                    JOIN shop_items si ON um.material_id = si.item_id
-                    WHERE um.user_id = $1 AND um.quantity > 0
-                    ORDER BY si.name
-                """, user_id)
-
-                # Fetch titles for the combined consumables view
-                titles = await conn.fetch("""
-                    SELECT t.title_id as id, t.name, t.emoji, ut.equipped,
-                           t.hp_percent, t.def_percent, t.atk_percent,
-                           t.crit_chance, t.dodge_percent, t.dmg_reduction_percent,
-                           t.bleed_flat, t.burn_flat, t.crit_dmg_res_percent,
-                           t.mining_bonus_percent, t.boss_damage_percent,
-                           t.extra_boss_attempts, t.extra_plunder_attempts
-                    FROM titles t
-                    JOIN user_titles ut ON t.title_id = ut.title_id
-                    WHERE ut.user_id = $1
-                    ORDER BY ut.equipped DESC, t.name
-                """, user_id)
-
-            balance = await currency_system.get_balance(user_id)
-
-            inventory_data = {
-                'weapons': [dict(w) for w in weapons],
-                'armor': [dict(a) for a in armor],
-                'accessories': [dict(a) for a in accessories],
-                'materials': [dict(m) for m in materials],
-                'gems': balance['gems']
-            }
+            inventory_data = await load_inventory_summary(user_id)
 
             temp_inventory_view = InventoryView(user_id, inventory_data, self)
 
@@ -7368,81 +8374,15 @@ class Shop(commands.Cog):
                         WHERE up.id = $1
                     """, item_id)
 
+            stat_cache.invalidate(user_id)
+
             # For non-title items, get emoji via helper
             if item_type != 'title':
                 item_emoji = get_item_emoji(item, item_type)
         
             await interaction.followup.send(f"**Unequipped** {item_emoji}", ephemeral=True)
         
-            # Refresh inventory data (including materials and titles)
-            async with self.bot.db_pool.acquire() as conn:
-                weapons = await conn.fetch("""
-                    SELECT uw.id, COALESCE(si.name, uw.generated_name) as name,
-                           uw.attack, uw.equipped, uw.description,
-                           uw.bleeding_chance, uw.crit_chance, uw.crit_damage,
-                           COALESCE(si.image_url, uw.image_url) as image_url,
-                           r.color as rarity_color
-                    FROM user_weapons uw
-                    LEFT JOIN shop_items si ON uw.weapon_item_id = si.item_id
-                    LEFT JOIN weapon_variants v ON uw.variant_id = v.variant_id
-                    LEFT JOIN rarities r ON v.rarity_id = r.rarity_id
-                    WHERE uw.user_id = $1
-                    ORDER BY uw.equipped DESC, uw.purchased_at DESC
-                """, user_id)
-
-                armor = await conn.fetch("""
-                    SELECT ua.id, at.name, ua.defense, ua.equipped, at.slot,
-                           ua.hp_bonus, ua.reflect_damage, at.set_name,
-                           at.image_url, at.description, r.color as rarity_color
-                    FROM user_armor ua
-                    JOIN armor_types at ON ua.armor_id = at.armor_id
-                    LEFT JOIN rarities r ON at.rarity_id = r.rarity_id
-                    WHERE ua.user_id = $1
-                    ORDER BY ua.equipped DESC, ua.purchased_at DESC
-                """, user_id)
-
-                accessories = await conn.fetch("""
-                    SELECT ua.id, at.name, ua.bonus_value, at.bonus_stat,
-                           ua.equipped, ua.slot, at.set_name,
-                           at.image_url, at.description, r.color as rarity_color
-                    FROM user_accessories ua
-                    JOIN accessory_types at ON ua.accessory_id = at.accessory_id
-                    LEFT JOIN rarities r ON at.rarity_id = r.rarity_id
-                    WHERE ua.user_id = $1
-                    ORDER BY ua.equipped DESC, ua.purchased_at DESC
-                """, user_id)
-
-                materials = await conn.fetch("""
-                    SELECT um.material_id, si.name, um.quantity, si.description
-                    FROM user_materials um
-                    JOIN shop_items si ON um.material_id = si.item_id
-                    WHERE um.user_id = $1 AND um.quantity > 0
-                    ORDER BY si.name
-                """, user_id)
-
-                # Fetch titles for the combined consumables view
-                titles = await conn.fetch("""
-                    SELECT t.title_id as id, t.name, t.emoji, ut.equipped,
-                           t.hp_percent, t.def_percent, t.atk_percent,
-                           t.crit_chance, t.dodge_percent, t.dmg_reduction_percent,
-                           t.bleed_flat, t.burn_flat, t.crit_dmg_res_percent,
-                           t.mining_bonus_percent, t.boss_damage_percent,
-                           t.extra_boss_attempts, t.extra_plunder_attempts
-                    FROM titles t
-                    JOIN user_titles ut ON t.title_id = ut.title_id
-                    WHERE ut.user_id = $1
-                    ORDER BY ut.equipped DESC, t.name
-                """, user_id)
-
-            balance = await currency_system.get_balance(user_id)
-
-            inventory_data = {
-                'weapons': [dict(w) for w in weapons],
-                'armor': [dict(a) for a in armor],
-                'accessories': [dict(a) for a in accessories],
-                'materials': [dict(m) for m in materials],
-                'gems': balance['gems']
-            }
+            inventory_data = await load_inventory_summary(user_id)
 
             # Create temporary inventory view
             temp_inventory_view = InventoryView(user_id, inventory_data, self)
@@ -7555,20 +8495,7 @@ class Shop(commands.Cog):
             await interaction.followup.send("Material not found.", ephemeral=True)
             return
 
-        # Determine emoji based on name – use a single variable 'emoji'
-        name_lower = material['name'].lower()
-        if 'hp potion' in name_lower:
-            emoji = CUSTOM_EMOJIS.get('hp_potion', '🧪')
-        elif 'energy potion' in name_lower:
-            emoji = CUSTOM_EMOJIS.get('energy_potion', '⚡')
-        elif 'sword' in name_lower:
-            emoji = CUSTOM_EMOJIS.get('sword_enhancement_stone', '💎')
-        elif 'armor' in name_lower:
-            emoji = CUSTOM_EMOJIS.get('armors_enhancement_stone', '💎')
-        elif 'accessories' in name_lower:
-            emoji = CUSTOM_EMOJIS.get('acc_enhancement_stone', '💎')
-        else:
-            emoji = '📦'
+        emoji = get_material_emoji(material['name'])
 
         embed = discord.Embed(
             title=f"{emoji} **{material['name']}**",
@@ -7684,64 +8611,7 @@ class Shop(commands.Cog):
         user_id = str(interaction.user.id)
         await interaction.response.defer(ephemeral=True)
 
-        # Fetch fresh inventory data
-        async with self.bot.db_pool.acquire() as conn:
-            weapons = await conn.fetch("""
-                SELECT uw.id, COALESCE(si.name, uw.generated_name) as name,
-                       uw.attack, uw.equipped, uw.description,
-                       uw.bleeding_chance, uw.crit_chance, uw.crit_damage,
-                       COALESCE(si.image_url, uw.image_url) as image_url,
-                       r.color as rarity_color,
-                       uw.upgrade_level
-                FROM user_weapons uw
-                LEFT JOIN shop_items si ON uw.weapon_item_id = si.item_id
-                LEFT JOIN weapon_variants v ON uw.variant_id = v.variant_id
-                LEFT JOIN rarities r ON v.rarity_id = r.rarity_id
-                WHERE uw.user_id = $1
-                ORDER BY uw.equipped DESC, uw.purchased_at DESC
-            """, user_id)
-
-            armor = await conn.fetch("""
-                SELECT ua.id, at.name, ua.defense, ua.equipped, at.slot,
-                       ua.hp_bonus, ua.reflect_damage, at.set_name,
-                       at.image_url, at.description, r.color as rarity_color,
-                       ua.upgrade_level
-                FROM user_armor ua
-                JOIN armor_types at ON ua.armor_id = at.armor_id
-                LEFT JOIN rarities r ON at.rarity_id = r.rarity_id
-                WHERE ua.user_id = $1
-                ORDER BY ua.equipped DESC, ua.purchased_at DESC
-            """, user_id)
-
-            accessories = await conn.fetch("""
-                SELECT ua.id, at.name, ua.bonus_value, at.bonus_stat,
-                       ua.equipped, ua.slot, at.set_name,
-                       at.image_url, at.description, r.color as rarity_color,
-                       ua.upgrade_level
-                FROM user_accessories ua
-                JOIN accessory_types at ON ua.accessory_id = at.accessory_id
-                LEFT JOIN rarities r ON at.rarity_id = r.rarity_id
-                WHERE ua.user_id = $1
-                ORDER BY ua.equipped DESC, ua.purchased_at DESC
-            """, user_id)
-
-            materials = await conn.fetch("""
-                SELECT um.material_id, si.name, um.quantity, si.description
-                FROM user_materials um
-                JOIN shop_items si ON um.material_id = si.item_id
-                WHERE um.user_id = $1 AND um.quantity > 0
-                ORDER BY si.name
-            """, user_id)
-
-        balance = await currency_system.get_balance(user_id)
-
-        inventory_data = {
-            'weapons': [dict(w) for w in weapons],
-            'armor': [dict(a) for a in armor],
-            'accessories': [dict(a) for a in accessories],
-            'materials': [dict(m) for m in materials],
-            'gems': balance['gems']
-        }
+        inventory_data = await load_inventory_summary(user_id)
 
         # Create a temporary view and show the appropriate category
         temp_view = InventoryView(user_id, inventory_data, self)
@@ -7789,6 +8659,7 @@ class Shop(commands.Cog):
                         INSERT INTO shop_items (name, description, price, type)
                         VALUES ($1, $2, $3, $4)
                     """, name, desc, price, typ)
+        await catalog.refresh('shop_items')
         await ctx.send("✅ Enhancement stones have been added to the shop database.")
 
     @commands.command(name='givestones')
@@ -8230,11 +9101,7 @@ class Shop(commands.Cog):
     async def purchase_item(self, interaction: discord.Interaction, item_id: int):
         await interaction.response.defer(ephemeral=True)
 
-        async with self.bot.db_pool.acquire() as conn:
-            item = await conn.fetchrow(
-                "SELECT * FROM shop_items WHERE item_id = $1",
-                item_id
-            )
+        item = await catalog.item(item_id)
         if not item:
             await interaction.followup.send("❌ This item no longer exists.", ephemeral=True)
             return
@@ -8787,11 +9654,10 @@ class Shop(commands.Cog):
         await interaction.response.defer(ephemeral=True)
         user_id = str(interaction.user.id)
 
-        async with self.bot.db_pool.acquire() as conn:
-            potion = await conn.fetchrow("SELECT name, price FROM shop_items WHERE item_id = $1", item_id)
-            if not potion:
-                await interaction.followup.send("❌ Potion not found.", ephemeral=True)
-                return
+        potion = await catalog.item(item_id)
+        if not potion:
+            await interaction.followup.send("❌ Potion not found.", ephemeral=True)
+            return
 
         total_cost = potion['price'] * batch_size
 
@@ -9075,6 +9941,7 @@ class Shop(commands.Cog):
                 VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
             """, name, description, price, item_type, role_id, color_hex, ctx.guild.id, image_url)
 
+        await catalog.refresh('shop_items')
         await ctx.send(f"✅ Added **{name}** ({item_type}) for **{price} gems**.")
 
     @shop_admin.command(name='addweapon')
@@ -9088,6 +9955,7 @@ class Shop(commands.Cog):
                 INSERT INTO shop_items (name, description, price, type, role_id, color_hex, guild_id, image_url)
                 VALUES ($1, $2, $3, 'weapon', NULL, NULL, $4, $5)
             """, name, description, price, ctx.guild.id, image_url)
+        await catalog.refresh('shop_items')
         await ctx.send(f"✅ Added weapon **{name}** for **{price} gems**.")
 
     @shop_admin.command(name='addweaponbox')
@@ -9098,6 +9966,7 @@ class Shop(commands.Cog):
                 INSERT INTO shop_items (name, description, price, type, guild_id)
                 VALUES ($1, $2, $3, 'random_weapon_box', $4)
             """, name, description, price, ctx.guild.id)
+        await catalog.refresh('shop_items')
         await ctx.send(f"✅ Added random weapon box **{name}** for **{price} gems**.")
 
     @shop_admin.command(name='addarmorbox')
@@ -9108,6 +9977,7 @@ class Shop(commands.Cog):
                 INSERT INTO shop_items (name, description, price, type, guild_id)
                 VALUES ($1, $2, $3, 'random_gear_box', $4)
             """, name, description, price, ctx.guild.id)
+        await catalog.refresh('shop_items')
         await ctx.send(f"✅ Added random armor box **{name}** for **{price} gems**.")
 
     @shop_admin.command(name='addaccessorybox')
@@ -9118,6 +9988,7 @@ class Shop(commands.Cog):
                 INSERT INTO shop_items (name, description, price, type, guild_id)
                 VALUES ($1, $2, $3, 'random_accessories_box', $4)
             """, name, description, price, ctx.guild.id)
+        await catalog.refresh('shop_items')
         await ctx.send(f"✅ Added random accessory box **{name}** for **{price} gems**.")
 
     @shop_admin.command(name='addpickaxe')
@@ -9128,6 +9999,7 @@ class Shop(commands.Cog):
                 INSERT INTO shop_items (name, description, price, type, guild_id)
                 VALUES ($1, $2, $3, 'pickaxe', $4)
             """, name, description, price, ctx.guild.id)
+        await catalog.refresh('shop_items')
         await ctx.send(f"✅ Added pickaxe **{name}** for **{price} gems**.")
 
     @shop_admin.command(name='remove')
@@ -9138,6 +10010,7 @@ class Shop(commands.Cog):
         if result == "DELETE 0":
             await ctx.send(f"❌ Item #{item_id} not found.")
         else:
+            await catalog.refresh('shop_items')
             await ctx.send(f"✅ Removed item #{item_id}.")
 
     @shop_admin.command(name='edit')
@@ -9160,6 +10033,7 @@ class Shop(commands.Cog):
                     return
             else:
                 await conn.execute("UPDATE shop_items SET description = $1 WHERE item_id = $2", value, item_id)
+        await catalog.refresh('shop_items')
         await ctx.send(f"✅ Updated `{field}` of item #{item_id}.")
 
     # -------------------------------------------------------------------------
@@ -9204,6 +10078,7 @@ class Shop(commands.Cog):
                 await ctx.send("⏰ Deletion cancelled.")
                 return
             await conn.execute("DELETE FROM user_weapons WHERE id = $1", weapon_id)
+            stat_cache.invalidate(user_id)
             await ctx.send(f"✅ Weapon **{weapon['name']}** deleted.")
 
 
@@ -9242,6 +10117,7 @@ class Shop(commands.Cog):
                 await ctx.send(f"❌ Weapon with ID `{weapon_id}` not found.")
                 return
             await conn.execute("DELETE FROM user_weapons WHERE id = $1", weapon_id)
+            stat_cache.invalidate(row['user_id'])
             if row['purchase_id']:
                 await conn.execute("UPDATE user_purchases SET used = TRUE WHERE purchase_id = $1", row['purchase_id'])
         user = self.bot.get_user(int(row['user_id']))
@@ -9327,66 +10203,76 @@ class Shop(commands.Cog):
             await ctx.send(msg)
             return
 
-        async with self.bot.db_pool.acquire() as conn:
-            weapons = await conn.fetch("""
-                SELECT uw.id, COALESCE(si.name, uw.generated_name) as name,
-                       uw.attack, uw.equipped, uw.description,
-                       COALESCE(si.image_url, uw.image_url) as image_url,
-                       r.color as rarity_color,
-                       uw.upgrade_level
-                FROM user_weapons uw
-                LEFT JOIN shop_items si ON uw.weapon_item_id = si.item_id
-                LEFT JOIN weapon_variants v ON uw.variant_id = v.variant_id
-                LEFT JOIN rarities r ON v.rarity_id = r.rarity_id
-                WHERE uw.user_id = $1
-                ORDER BY uw.equipped DESC, uw.purchased_at DESC
-            """, user_id)
+        inventory_data = await load_inventory_summary(user_id)
 
-            armor = await conn.fetch("""
-                SELECT ua.id, at.name, ua.defense, ua.equipped, at.slot,
-                       at.image_url, at.description, r.color as rarity_color,
-                       ua.upgrade_level
-                FROM user_armor ua
-                JOIN armor_types at ON ua.armor_id = at.armor_id
-                LEFT JOIN rarities r ON at.rarity_id = r.rarity_id
-                WHERE ua.user_id = $1
-                ORDER BY ua.equipped DESC, ua.purchased_at DESC
-            """, user_id)
+        view = InventoryView(user_id, inventory_data, self)
+        await ctx.send(embed=view.create_main_embed(), view=view)
 
-            accessories = await conn.fetch("""
-                SELECT ua.id, at.name, ua.bonus_value, at.bonus_stat,
-                       ua.equipped, ua.slot, at.image_url, at.description,
-                       r.color as rarity_color,
-                       ua.upgrade_level
-                FROM user_accessories ua
-                JOIN accessory_types at ON ua.accessory_id = at.accessory_id
-                LEFT JOIN rarities r ON at.rarity_id = r.rarity_id
-                WHERE ua.user_id = $1
-                ORDER BY ua.equipped DESC, ua.purchased_at DESC
-            """, user_id)
 
-            materials = await conn.fetch("""
-                SELECT um.material_id, si.name, um.quantity, si.description
-                FROM user_materials um
-                JOIN shop_items si ON um.material_id = si.item_id
-                WHERE um.user_id = $1 AND um.quantity > 0
-                ORDER BY si.name
-            """, user_id)
-        balance = await currency_system.get_balance(user_id)
 
-        inventory_data = {
-            'weapons': [dict(w) for w in weapons],
-            'armor': [dict(a) for a in armor],
-            'accessories': [dict(a) for a in accessories],
-            'materials': [dict(m) for m in materials],
-            'gems': balance['gems']
-        }
 
-        view = InventoryView(user_id, inventory_data, self)
-        await ctx.send(embed=view.create_main_embed(), view=view)
 
+# ========== MINING YIELD MODEL ==========
+# A 12h session is 72 ten-minute intervals. Each interval has a 20% chance to
+# drop 1-3 stones of one random type, so a single type gets 1, 2 or 3 stones
+# with probability 1/45 each and nothing otherwise. The per-type total over a
+# full session is the 72-fold convolution of that, tabulated once here; each
+# session draws its totals from the table using a hash of (user_id,
+# mining_start), so every caller sees the same numbers for the same session.
+# The three types are drawn independently (the real draws are very slightly
+# anti-correlated; the difference is negligible at these rates).
+
+MINING_INTERVALS = 72
+MINING_STONE_KEYS = ('sword', 'armor', 'acc')
+
+
+def _build_stone_cdf(intervals: int):
+    step = [1 - 0.2 / 3] + [0.2 / 9] * 3
+    dist = [1.0]
+    for _ in range(intervals):
+        nxt = [0.0] * (len(dist) + 3)
+        for total, p in enumerate(dist):
+            if p:
+                for qty, q in enumerate(step):
+                    nxt[total + qty] += p * q
+        dist = nxt
+    cdf, acc = [], 0.0
+    for p in dist:
+        acc += p
+        cdf.append(acc)
+    cdf[-1] = 1.0
+    return cdf
+
+
+_STONE_CDF = _build_stone_cdf(MINING_INTERVALS)
 
 
+def _session_uniforms(user_id, mining_start):
+    """Three stable floats in [0, 1) for one mining session."""
+    if getattr(mining_start, 'tzinfo', None) is not None:
+        mining_start = mining_start.replace(tzinfo=None)
+    key = f"{user_id}:{mining_start.isoformat() if mining_start else ''}".encode()
+    digest = hashlib.blake2b(key, digest_size=24).digest()
+    return [int.from_bytes(digest[i:i + 8], 'big') / 2 ** 64 for i in (0, 8, 16)]
+
+
+def mining_stone_yield(user_id, mining_start, minutes: int) -> dict:
+    """Stones earned by a session after `minutes`, before theft.
+
+    The full-session totals are fixed per session; partial sessions get the
+    elapsed share of them, so yields only grow while mining continues.
+    """
+    intervals = max(0, min(int(minutes), 720)) // 10
+    result = {}
+    for key, u in zip(MINING_STONE_KEYS, _session_uniforms(user_id, mining_start)):
+        full = bisect.bisect_right(_STONE_CDF, u)
+        result[key] = full * intervals // MINING_INTERVALS
+    return result
+
+
+def mining_stone_yields(sessions) -> list:
+    """Vector form: [(user_id, mining_start, minutes), ...] -> [yield dict, ...]"""
+    return [mining_stone_yield(uid, start, minutes) for uid, start, minutes in sessions]
 
 
 # CULLING GAME 
@@ -9397,12 +10283,15 @@ class CullingGame(commands.Cog):
         self.currency = currency_system
         self.mining_channel = None
         self.mining_message = None
+        self.dm_outbox = asyncio.Queue()
+        self._dm_task = None
 
 
     async def cog_load(self):
         """Start background tasks after the cog is loaded."""
         self.energy_regen.start()
         self.check_max_mining.start()
+        self._dm_task = asyncio.create_task(self.drain_dm_outbox())
 
 
     async def load_mining_messages(self, guild_id: int):
@@ -9438,32 +10327,18 @@ class CullingGame(commands.Cog):
     def cog_unload(self):
         self.energy_regen.cancel()
         self.check_max_mining.cancel()
+        if self._dm_task:
+            self._dm_task.cancel()
 
 # ------------------------------------------------------------------
     # Energy Regen Task
     # ------------------------------------------------------------------
     @tasks.loop(hours=1)
     async def energy_regen(self):
+        """Sweep regen for everyone in one statement; reads also regenerate lazily."""
         try:
             async with self.bot.db_pool.acquire() as conn:
-                alive = await conn.fetch("SELECT user_id FROM player_stats WHERE hp > 0")
-            now = datetime.utcnow()
-            for player in alive:
-                user_id = player['user_id']
-                stats = await get_player_stats(user_id)
-                if stats['energy'] < stats['max_energy']:
-                    async with self.bot.db_pool.acquire() as conn2:
-                        last = await conn2.fetchval("SELECT last_energy_regen FROM player_stats WHERE user_id = $1", user_id)
-                    if last.tzinfo is not None:
-                        last = last.replace(tzinfo=None)
-                    if (now - last) >= timedelta(hours=1):
-                        new_energy = stats['energy'] + 1
-                        async with self.bot.db_pool.acquire() as conn3:
-                            await conn3.execute("""
-                                UPDATE player_stats
-                                SET energy = $1, last_energy_regen = $2
-                                WHERE user_id = $3
-                            """, new_energy, now, user_id)
+                await conn.execute(energy_regen_sql())
             print("energy_regen tick")
         except Exception as e:
             print(f"❌ energy_regen error: {e}")
@@ -9476,87 +10351,103 @@ class CullingGame(commands.Cog):
             await asyncio.sleep(1)
 
 
+    STONE_KEYS = (('Sword Enhancement Stone', 'sword'),
+                  ('Armor Enhancement Stone', 'armor'),
+                  ('Accessories Enhancement Stone', 'acc'))
+
     @tasks.loop(minutes=30)
     async def check_max_mining(self):
-        async with self.bot.db_pool.acquire() as conn:
-            miners = await conn.fetch("""
-                SELECT user_id, mining_start, stolen_gems,
-                       stolen_sword_stones, stolen_armor_stones, stolen_acc_stones
-                FROM player_stats 
-                WHERE mining_start IS NOT NULL
-            """)
-            now = datetime.utcnow()
-            for miner in miners:
-                user_id = miner['user_id']
-                start = miner['mining_start']
-                if start.tzinfo is not None:
-                    start = start.replace(tzinfo=None)
-                minutes_mined = int((now - start).total_seconds() / 60)
-                if minutes_mined >= 720:
-                    # Gems
-                    gems_earned = (minutes_mined * 5) // 6
-                    gems_earned = min(gems_earned, 600)
-                    stolen_gems = miner['stolen_gems'] or 0
-                    net_gems = max(0, gems_earned - stolen_gems)
-
-                    # Stones earned (total)
-                    total_stones = self.generate_stones_for_minutes(720)  # full 12h
-                    stolen_sword = miner['stolen_sword_stones'] or 0
-                    stolen_armor = miner['stolen_armor_stones'] or 0
-                    stolen_acc   = miner['stolen_acc_stones'] or 0
-
-                    net_sword = max(0, total_stones['sword'] - stolen_sword)
-                    net_armor = max(0, total_stones['armor'] - stolen_armor)
-                    net_acc   = max(0, total_stones['acc'] - stolen_acc)
-
-                    # Award gems
-                    if net_gems > 0:
-                        await self.currency.add_gems(user_id, net_gems, "Mining completed (12h max)")
-
-                    # Award stones (only net stones)
-                    stone_ids = {}
-                    for name, key in [('Sword Enhancement Stone','sword'), ('Armor Enhancement Stone','armor'), ('Accessories Enhancement Stone','acc')]:
-                        sid = await conn.fetchval("SELECT item_id FROM shop_items WHERE name = $1", name)
-                        stone_ids[key] = sid
-
-                    if net_sword > 0 and stone_ids['sword']:
-                        await conn.execute("""
-                            INSERT INTO user_materials (user_id, material_id, quantity)
-                            VALUES ($1, $2, $3)
-                            ON CONFLICT (user_id, material_id) DO UPDATE
-                            SET quantity = user_materials.quantity + $3
-                        """, user_id, stone_ids['sword'], net_sword)
-                    if net_armor > 0 and stone_ids['armor']:
-                        await conn.execute("""
-                            INSERT INTO user_materials (user_id, material_id, quantity)
-                            VALUES ($1, $2, $3)
-                            ON CONFLICT (user_id, material_id) DO UPDATE
-                            SET quantity = user_materials.quantity + $3
-                        """, user_id, stone_ids['armor'], net_armor)
-                    if net_acc > 0 and stone_ids['acc']:
+        """Settle every miner past 12 hours in one transaction, then queue their DMs."""
+        cutoff = datetime.utcnow() - timedelta(minutes=720)
+        try:
+            async with self.bot.db_pool.acquire() as conn:
+                async with conn.transaction():
+                    # Claim and reset in one statement; RETURNING hands back the pre-reset values.
+                    miners = await conn.fetch("""
+                        WITH done AS (
+                            SELECT user_id, mining_start, stolen_gems,
+                                   stolen_sword_stones, stolen_armor_stones, stolen_acc_stones
+                            FROM player_stats
+                            WHERE mining_start IS NOT NULL AND mining_start <= $1
+                            FOR UPDATE
+                        )
+                        UPDATE player_stats ps
+                        SET mining_start = NULL, stolen_gems = 0,
+                            stolen_sword_stones = 0, stolen_armor_stones = 0, stolen_acc_stones = 0
+                        FROM done
+                        WHERE ps.user_id = done.user_id
+                        RETURNING done.*
+                    """, cutoff)
+                    if not miners:
+                        return
+
+                    stone_ids = {key: await catalog.item_id(name) for name, key in self.STONE_KEYS}
+
+                    now = datetime.utcnow()
+                    starts = [
+                        m['mining_start'].replace(tzinfo=None) if m['mining_start'].tzinfo is not None else m['mining_start']
+                        for m in miners
+                    ]
+                    # Full 12h yields for the whole sweep in one call
+                    yields = mining_stone_yields(
+                        [(m['user_id'], start, 720) for m, start in zip(miners, starts)]
+                    )
+                    gem_entries = []
+                    mat_users, mat_ids, mat_qty = [], [], []
+                    outbox = []
+                    for miner, start, total_stones in zip(miners, starts, yields):
+                        user_id = miner['user_id']
+                        minutes_mined = int((now - start).total_seconds() / 60)
+
+                        gems_earned = min((minutes_mined * 5) // 6, 600)
+                        stolen_gems = miner['stolen_gems'] or 0
+                        net_gems = max(0, gems_earned - stolen_gems)
+
+                        stolen = {
+                            'sword': miner['stolen_sword_stones'] or 0,
+                            'armor': miner['stolen_armor_stones'] or 0,
+                            'acc': miner['stolen_acc_stones'] or 0,
+                        }
+                        net = {k: max(0, total_stones[k] - stolen[k]) for k in stolen}
+
+                        if net_gems > 0:
+                            gem_entries.append((user_id, net_gems, "Mining completed (12h max)"))
+                        for key, qty in net.items():
+                            if qty > 0 and stone_ids[key]:
+                                mat_users.append(user_id)
+                                mat_ids.append(stone_ids[key])
+                                mat_qty.append(qty)
+                        outbox.append((int(user_id), net_gems, stolen_gems, net, stolen))
+
+                    # Gems first: user_materials has a foreign key on user_gems.
+                    credited = await self.currency.add_gems_bulk(gem_entries, conn=conn)
+                    if mat_users:
                         await conn.execute("""
                             INSERT INTO user_materials (user_id, material_id, quantity)
-                            VALUES ($1, $2, $3)
+                            SELECT * FROM unnest($1::text[], $2::int[], $3::int[])
                             ON CONFLICT (user_id, material_id) DO UPDATE
-                            SET quantity = user_materials.quantity + $3
-                        """, user_id, stone_ids['acc'], net_acc)
+                            SET quantity = user_materials.quantity + EXCLUDED.quantity
+                        """, mat_users, mat_ids, mat_qty)
+
+            # Committed: only now record the ledger rows and move the gem board
+            await self.currency.after_gems_bulk(gem_entries, credited)
+            for item in outbox:
+                self.dm_outbox.put_nowait(item)
+            print(f"⛏️ Settled {len(miners)} completed miners, {len(outbox)} DMs queued")
+        except Exception as e:
+            print(f"❌ check_max_mining error: {e}")
+            traceback.print_exc()
 
-                    # Reset mining
-                    await conn.execute("""
-                        UPDATE player_stats 
-                        SET mining_start = NULL, stolen_gems = 0,
-                            stolen_sword_stones = 0, stolen_armor_stones = 0, stolen_acc_stones = 0
-                        WHERE user_id = $1
-                    """, user_id)
-
-                    # DM the user – PASS TOTAL STONES, NOT NET
-                    await self.send_mining_complete_dm(
-                        int(user_id),
-                        net_gems,
-                        stolen_gems,
-                        {'sword': net_sword, 'armor': net_armor, 'acc': net_acc},
-                        {'sword': stolen_sword, 'armor': stolen_armor, 'acc': stolen_acc}
-                    )
+    async def drain_dm_outbox(self):
+        """Send queued mining DMs one at a time, spaced by MINING_DM_INTERVAL."""
+        await self.bot.wait_until_ready()
+        while True:
+            args = await self.dm_outbox.get()
+            try:
+                await self.send_mining_complete_dm(*args)
+            except Exception as e:
+                print(f"❌ Mining DM outbox error: {e}")
+            await asyncio.sleep(MINING_DM_INTERVAL)
 
 
     @check_max_mining.before_loop
@@ -9566,21 +10457,12 @@ class CullingGame(commands.Cog):
             await asyncio.sleep(1)
 
 
-    def generate_stones_for_minutes(self, minutes: int) -> dict:
+    def generate_stones_for_minutes(self, minutes: int, user_id, mining_start) -> dict:
         """
         Returns dict with keys 'sword', 'armor', 'acc' and total stones earned
-        for the given minutes (as if no theft occurred).
+        for the given minutes of this session (as if no theft occurred).
         """
-        stone_names = ['Sword Enhancement Stone', 'Armor Enhancement Stone', 'Accessories Enhancement Stone']
-        stone_keys = ['sword', 'armor', 'acc']
-        total = {key: 0 for key in stone_keys}
-        intervals = minutes // 10
-        for _ in range(intervals):
-            if random.random() < 0.2:
-                idx = random.randint(0, 2)
-                qty = random.randint(1, 3)
-                total[stone_keys[idx]] += qty
-        return total
+        return mining_stone_yield(user_id, mining_start, minutes)
 
 
 
@@ -9799,7 +10681,7 @@ class CullingGame(commands.Cog):
             net_gems = max(0, gems_earned - stolen_gems)
 
             # Stones earned total (no theft applied yet)
-            total_stones = self.generate_stones_for_minutes(minutes_mined)
+            total_stones = self.generate_stones_for_minutes(minutes_mined, user_id, start)
 
             # Stolen stones per type
             stolen_sword = row['stolen_sword_stones'] or 0
@@ -9815,10 +10697,7 @@ class CullingGame(commands.Cog):
                 await self.currency.add_gems(user_id, net_gems, "Mining reward")
 
             # Award stones – fetch item IDs once
-            stone_ids = {}
-            for name, key in [('Sword Enhancement Stone','sword'), ('Armor Enhancement Stone','armor'), ('Accessories Enhancement Stone','acc')]:
-                sid = await conn.fetchval("SELECT item_id FROM shop_items WHERE name = $1", name)
-                stone_ids[key] = sid
+            stone_ids = {key: await catalog.item_id(name) for name, key in self.STONE_KEYS}
 
             stone_drops_final = {}  # for result message
             if net_sword > 0 and stone_ids['sword']:
@@ -9895,6 +10774,7 @@ class CullingGame(commands.Cog):
         async with self.bot.db_pool.acquire() as conn:
             # Attacker energy & daily limits
             today = datetime.utcnow().date()
+            await conn.execute(energy_regen_sql("p.user_id = $1::text"), attacker_id)
             stats = await conn.fetchrow("""
                 SELECT energy, plunder_count, last_plunder_reset
                 FROM player_stats WHERE user_id = $1
@@ -9940,7 +10820,7 @@ class CullingGame(commands.Cog):
                     gems_steal = 1
 
             # Stones available (per type)
-            total_stones = self.generate_stones_for_minutes(minutes_mined)
+            total_stones = self.generate_stones_for_minutes(minutes_mined, defender_id, start)
             stolen_sword = defender['stolen_sword_stones'] or 0
             stolen_armor = defender['stolen_armor_stones'] or 0
             stolen_acc   = defender['stolen_acc_stones'] or 0
@@ -9981,10 +10861,7 @@ class CullingGame(commands.Cog):
                 await self.currency.add_gems(attacker_id, gems_steal, f"Plundered from <@{defender_id}>")
 
             # --- Give stolen stones to attacker ---
-            stone_ids = {}
-            for name, key in [('Sword Enhancement Stone','sword'), ('Armor Enhancement Stone','armor'), ('Accessories Enhancement Stone','acc')]:
-                sid = await conn.fetchval("SELECT item_id FROM shop_items WHERE name = $1", name)
-                stone_ids[key] = sid
+            stone_ids = {key: await catalog.item_id(name) for name, key in self.STONE_KEYS}
 
             for key, qty in stone_steals.items():
                 if qty > 0 and stone_ids[key]:
@@ -9996,10 +10873,11 @@ class CullingGame(commands.Cog):
                     """, attacker_id, stone_ids[key], qty)
 
             # --- Deduct energy and increment plunder count ---
-            await conn.execute("""
-                UPDATE player_stats
-                SET energy = energy - 1, plunder_count = plunder_count + 1
-                WHERE user_id = $1
+            await conn.execute(f"""
+                UPDATE player_stats p
+                SET energy = p.energy - 1, plunder_count = p.plunder_count + 1,
+                    last_energy_regen = {energy_spend_clock_sql("p")}
+                WHERE p.user_id = $1
             """, attacker_id)
 
         # --- Notifications ---
@@ -10213,7 +11091,214 @@ async def format_gear_grid(user_id: str) -> str:
     return f"{line1}\n{line2}\n{line3}"
 
 
-#    ATTACKVIEW----------
+#    ATTACKVIEW----------
+
+def energy_cap_sql(alias: str = "p") -> str:
+    """SQL expression for a player's energy cap: max_energy plus the equipped pet's energy_bonus."""
+    return f"""({alias}.max_energy + COALESCE((
+        SELECT pt.energy_bonus
+        FROM user_pets up
+        JOIN pet_types pt ON up.pet_id = pt.pet_id
+        WHERE up.user_id = {alias}.user_id AND up.equipped = TRUE
+        LIMIT 1
+    ), 0))"""
+
+def energy_spend_clock_sql(alias: str = "p", spent: str = "1") -> str:
+    """last_energy_regen for an UPDATE that spends `spent` energy.
+
+    Spending from the cap starts a fresh hour; below the cap the partial hour is kept.
+    """
+    return f"""CASE
+        WHEN {spent} > 0 AND {alias}.energy >= {energy_cap_sql(alias)} THEN NOW() AT TIME ZONE 'UTC'
+        ELSE {alias}.last_energy_regen
+    END"""
+
+# One statement per duel turn: HP/energy deltas (so bleed ticks or potions
+# landing in between are not overwritten), new effects, buff bookkeeping.
+# The turn only applies if, on the locked rows, both players are alive and each
+# can pay their energy; otherwise nothing is written and no rows come back.
+DUEL_CHECKPOINT_SQL = f"""
+    WITH d AS (
+        SELECT * FROM unnest($1::text[], $2::int[], $3::int[]) AS d(user_id, damage, spent)
+    ), locked AS (
+        SELECT user_id, hp, energy FROM player_stats
+        WHERE user_id = ANY($1::text[])
+        FOR UPDATE
+    ), guard AS (
+        SELECT COUNT(*) = cardinality($1::text[]) AND COALESCE(bool_and(l.hp > 0 AND l.energy >= d.spent), FALSE) AS ok
+        FROM locked l JOIN d ON d.user_id = l.user_id
+    ), vitals AS (
+        UPDATE player_stats p
+        SET hp = GREATEST(p.hp - d.damage, 0),
+            energy = p.energy - d.spent,
+            last_energy_regen = {energy_spend_clock_sql("p", "d.spent")},
+            respawn_at = CASE
+                WHEN d.damage > 0 AND p.hp - d.damage <= 0 AND p.respawn_at IS NULL
+                THEN NOW() + INTERVAL '2 hours'
+                ELSE p.respawn_at
+            END
+        FROM d, guard
+        WHERE p.user_id = d.user_id AND guard.ok
+        RETURNING p.user_id, p.hp, p.energy, p.respawn_at
+    ), effects AS (
+        INSERT INTO active_effects (target_id, effect_type, value, remaining_ticks)
+        SELECT e.* FROM unnest($4::text[], $5::text[], $6::int[], $7::int[]) AS e, guard
+        WHERE guard.ok
+    ), expired AS (
+        DELETE FROM active_buffs
+        WHERE target_id = ANY($1::text[]) AND remaining_turns <= 1 AND (SELECT ok FROM guard)
+    ), ticked AS (
+        UPDATE active_buffs SET remaining_turns = remaining_turns - 1
+        WHERE target_id = ANY($1::text[]) AND remaining_turns > 1 AND (SELECT ok FROM guard)
+        RETURNING buff_id, target_id, effect_type, value
+    ), buffs AS (
+        INSERT INTO active_buffs (target_id, effect_type, value, remaining_turns)
+        SELECT b.* FROM unnest($8::text[], $9::text[], $10::float8[], $11::int[]) AS b, guard
+        WHERE guard.ok
+        RETURNING buff_id, target_id, effect_type, value
+    )
+    SELECT v.user_id, v.hp, v.energy, v.respawn_at, bf.buff_types, bf.buff_values
+    FROM vitals v
+    LEFT JOIN LATERAL (
+        SELECT array_agg(x.effect_type ORDER BY x.buff_id) AS buff_types,
+               array_agg(x.value ORDER BY x.buff_id) AS buff_values
+        FROM (SELECT * FROM ticked UNION ALL SELECT * FROM buffs) x
+        WHERE x.target_id = v.user_id
+    ) bf ON TRUE
+"""
+
+DUEL_WEAPONS_SQL = """
+    SELECT DISTINCT ON (uw.user_id) uw.user_id, COALESCE(si.name, uw.generated_name) AS name, uw.skill_level
+    FROM user_weapons uw
+    LEFT JOIN shop_items si ON uw.weapon_item_id = si.item_id
+    WHERE uw.user_id = ANY($1::text[]) AND uw.equipped = TRUE
+    ORDER BY uw.user_id, uw.id
+"""
+
+
+def respawn_wait_text(respawn_at) -> Optional[str]:
+    """'1h 5m' / '12m' until respawn, or None if it has already passed."""
+    if respawn_at.tzinfo is None:
+        respawn_at = respawn_at.replace(tzinfo=timezone.utc)
+    remaining = (respawn_at - datetime.now(timezone.utc)).total_seconds()
+    if remaining <= 0:
+        return None
+    hours = int(remaining // 3600)
+    minutes = int((remaining % 3600) // 60)
+    return f"{hours}h {minutes}m" if hours > 0 else f"{minutes}m"
+
+
+class DuelTurn:
+    """Changes produced by one duel turn, written back by DuelSession.checkpoint."""
+
+    def __init__(self):
+        self.damage: Dict[str, int] = {}
+        self.spent: Dict[str, int] = {}
+        self.effects: List[Tuple[str, str, int, int]] = []
+        self.buffs: List[Tuple[str, str, float, int]] = []
+
+    def hit(self, user_id: str, amount: int):
+        self.damage[user_id] = self.damage.get(user_id, 0) + amount
+
+    def spend(self, user_id: str, amount: int = 1):
+        self.spent[user_id] = self.spent.get(user_id, 0) + amount
+
+    def effect(self, target_id: str, effect_type: str, value: int, ticks: int = 3):
+        self.effects.append((target_id, effect_type, value, ticks))
+
+    def buff(self, target_id: str, effect_type: str, value: float, turns: int):
+        self.buffs.append((target_id, effect_type, value, turns))
+
+
+class DuelSession:
+    """Both combatants of an AttackView duel, loaded once and kept in memory.
+
+    Turns are resolved against this state; each turn is persisted with one
+    DUEL_CHECKPOINT_SQL round trip whose RETURNING row refreshes HP/energy and buffs.
+    """
+
+    def __init__(self, user_ids: List[str]):
+        self.user_ids = list(user_ids)
+        self.lock = asyncio.Lock()
+        self.loadouts: Dict[str, dict] = {}
+        self.vitals: Dict[str, dict] = {}
+        self.buffs: Dict[str, list] = {}
+        self.weapons: Dict[str, Optional[dict]] = {}
+        self.gear: Dict[str, str] = {}
+
+    async def load(self):
+        async with bot.db_pool.acquire() as conn:
+            rows = await conn.fetch(PLAYER_STATS_MANY_FULL_SQL, self.user_ids)
+            weapons = await conn.fetch(DUEL_WEAPONS_SQL, self.user_ids)
+        self.buffs = {uid: [] for uid in self.user_ids}
+        for row in rows:
+            uid = row['user_id']
+            self.loadouts[uid] = compute_loadout_stats(row)
+            self.vitals[uid] = {
+                'hp': row['hp'], 'energy': row['energy'],
+                'max_energy': row['max_energy'], 'respawn_at': row['respawn_at'],
+            }
+            self._set_buffs(row)
+        self.weapons = {uid: None for uid in self.user_ids}
+        for w in weapons:
+            self.weapons[w['user_id']] = dict(w)
+        for uid in self.user_ids:
+            self.gear[uid] = await format_gear_grid(uid)
+        return self
+
+    def stats(self, user_id: str) -> dict:
+        """Same shape as get_player_stats, computed from session state."""
+        live = dict(self.vitals[user_id])
+        live['buff_types'] = [b[0] for b in self.buffs[user_id]]
+        live['buff_values'] = [b[1] for b in self.buffs[user_id]]
+        return compute_player_stats(live, self.loadouts[user_id])
+
+    def set_vitals(self, user_id: str, **values):
+        if user_id in self.vitals:
+            self.vitals[user_id].update(values)
+
+    def _set_buffs(self, row):
+        """Replace a player's buffs with the buff_types/buff_values arrays of a stats row."""
+        self.buffs[row['user_id']] = list(zip(row['buff_types'] or [], row['buff_values'] or []))
+
+    async def reload_vitals(self):
+        """Re-read HP/energy (with regen applied) and buffs; plunder, boss fights, DoT
+        ticks, potions and other duels all change them outside this one."""
+        async with bot.db_pool.acquire() as conn:
+            rows = await conn.fetch(PLAYER_STATS_MANY_LIVE_SQL, self.user_ids)
+        for row in rows:
+            self.set_vitals(row['user_id'], hp=row['hp'], energy=row['energy'],
+                            max_energy=row['max_energy'], respawn_at=row['respawn_at'])
+            self._set_buffs(row)
+
+    async def checkpoint(self, turn: DuelTurn) -> bool:
+        """Persist one turn in a single statement; the buffs it leaves behind come back with it.
+
+        Returns False (nothing written) if either player died or the energy was
+        spent elsewhere since the turn was resolved.
+        """
+        effects = list(zip(*turn.effects)) or [(), (), (), ()]
+        # New buffs tick once on the turn they are applied, like existing ones
+        new_buffs = [(t, e, v, n - 1) for t, e, v, n in turn.buffs if n > 1]
+        buffs = list(zip(*new_buffs)) or [(), (), (), ()]
+        async with bot.db_pool.acquire() as conn:
+            rows = await conn.fetch(
+                DUEL_CHECKPOINT_SQL,
+                self.user_ids,
+                [turn.damage.get(uid, 0) for uid in self.user_ids],
+                [turn.spent.get(uid, 0) for uid in self.user_ids],
+                *map(list, effects),
+                *map(list, buffs),
+            )
+        if not rows:
+            await self.reload_vitals()
+            return False
+        for row in rows:
+            self.set_vitals(row['user_id'], hp=row['hp'], energy=row['energy'], respawn_at=row['respawn_at'])
+            self._set_buffs(row)
+        if turn.effects:
+            effect_scheduler.schedule(max(t[3] for t in turn.effects))
+        return True
 
 class AttackView(discord.ui.View):
     def __init__(self, attacker_id: str, defender_id: str, channel_id: int, message_id: int):
@@ -10222,10 +11307,24 @@ class AttackView(discord.ui.View):
         self.defender_id = defender_id   # original opponent
         self.channel_id = channel_id
         self.message_id = message_id
+        self.session: Optional[DuelSession] = None
+        self._session_lock = asyncio.Lock()
 
     async def interaction_check(self, interaction: discord.Interaction) -> bool:
         return str(interaction.user.id) in (self.attacker_id, self.defender_id)
 
+    async def get_session(self) -> DuelSession:
+        """Load both combatants on first use; later turns reuse the same state."""
+        async with self._session_lock:
+            if self.session is None:
+                self.session = await DuelSession([self.attacker_id, self.defender_id]).load()
+        return self.session
+
+    async def refresh_message(self, action_text: str):
+        channel = bot.get_channel(self.channel_id)
+        new_embed = await self.build_duel_embed(action_text)
+        edit_scheduler.submit(edit_scheduler.message(channel, self.message_id), embed=new_embed, view=self)
+
     @discord.ui.button(label="Attack", style=discord.ButtonStyle.danger)
     async def attack_button(self, interaction: discord.Interaction, button: discord.ui.Button):
         try:
@@ -10243,203 +11342,92 @@ class AttackView(discord.ui.View):
                 attacker_user = interaction.user
                 defender_user = bot.get_user(int(self.attacker_id)) or await bot.fetch_user(int(self.attacker_id))
 
-            # Fetch fresh stats
-            a_stats = await get_player_stats(current_attacker_id)
-            d_stats = await get_player_stats(current_defender_id)
-
-            # --- Attacker dead check ---
-            if a_stats['hp'] <= 0:
-                async with bot.db_pool.acquire() as conn:
-                    db_respawn = await conn.fetchval("SELECT respawn_at FROM player_stats WHERE user_id = $1", current_attacker_id)
-                if db_respawn:
-                    if db_respawn.tzinfo is None:
-                        db_respawn = db_respawn.replace(tzinfo=timezone.utc)
-                    now = datetime.now(timezone.utc)
-                    remaining = db_respawn - now
-                    if remaining.total_seconds() <= 0:
-                        msg = "You are dead and cannot attack! (respawn time already passed)"
+            session = await self.get_session()
+            async with session.lock:
+                # Loadouts stay cached; HP and energy are re-read every press
+                await session.reload_vitals()
+                a_stats = session.stats(current_attacker_id)
+                d_stats = session.stats(current_defender_id)
+
+                # --- Attacker dead check ---
+                if a_stats['hp'] <= 0:
+                    if a_stats['respawn_at']:
+                        time_str = respawn_wait_text(a_stats['respawn_at'])
+                        if time_str is None:
+                            msg = "You are dead and cannot attack! (respawn time already passed)"
+                        else:
+                            msg = f"You are dead and cannot attack! Revives in {time_str}."
                     else:
-                        hours = int(remaining.total_seconds() // 3600)
-                        minutes = int((remaining.total_seconds() % 3600) // 60)
-                        time_str = f"{hours}h {minutes}m" if hours > 0 else f"{minutes}m"
-                        msg = f"You are dead and cannot attack! Revives in {time_str}."
-                else:
-                    msg = "You are dead and cannot attack! (no respawn time set)"
-                await interaction.followup.send(msg, ephemeral=True)
-                return
+                        msg = "You are dead and cannot attack! (no respawn time set)"
+                    await interaction.followup.send(msg, ephemeral=True)
+                    return
 
-            # --- Defender dead check ---
-            if d_stats['hp'] <= 0:
-                async with bot.db_pool.acquire() as conn:
-                    db_respawn = await conn.fetchval("SELECT respawn_at FROM player_stats WHERE user_id = $1", current_defender_id)
-                if db_respawn:
-                    if db_respawn.tzinfo is None:
-                        db_respawn = db_respawn.replace(tzinfo=timezone.utc)
-                    now = datetime.now(timezone.utc)
-                    remaining = db_respawn - now
-                    if remaining.total_seconds() <= 0:
-                        msg = "Target is already dead! (respawn time already passed)"
+                # --- Defender dead check ---
+                if d_stats['hp'] <= 0:
+                    if d_stats['respawn_at']:
+                        time_str = respawn_wait_text(d_stats['respawn_at'])
+                        if time_str is None:
+                            msg = "Target is already dead! (respawn time already passed)"
+                        else:
+                            msg = f"Target is already dead! Revives in {time_str}."
                     else:
-                        hours = int(remaining.total_seconds() // 3600)
-                        minutes = int((remaining.total_seconds() % 3600) // 60)
-                        time_str = f"{hours}h {minutes}m" if hours > 0 else f"{minutes}m"
-                        msg = f"Target is already dead! Revives in {time_str}."
-                else:
-                    msg = "Target is already dead!"
-                await interaction.followup.send(msg, ephemeral=True)
-                return
-
-            # --- Energy check ---
-            if a_stats['energy'] < 1:
-                await interaction.followup.send("Not enough energy!", ephemeral=True)
-                return
-
-            # --- Get equipped weapon ---
-            async with bot.db_pool.acquire() as conn:
-                weapon = await conn.fetchrow("""
-                    SELECT uw.id, COALESCE(si.name, uw.generated_name) as name, uw.skill_level
-                    FROM user_weapons uw
-                    LEFT JOIN shop_items si ON uw.weapon_item_id = si.item_id
-                    WHERE uw.user_id = $1 AND uw.equipped = TRUE
-                    LIMIT 1
-                """, current_attacker_id)
-
-            if not weapon:
-                await interaction.followup.send("You don't have a weapon equipped!", ephemeral=True)
-                return
-
-            wname = weapon['name']
-            if wname not in SWORD_SKILLS:
-                await interaction.followup.send("Your weapon has no skill!", ephemeral=True)
-                return
+                        msg = "Target is already dead!"
+                    await interaction.followup.send(msg, ephemeral=True)
+                    return
 
-            skill = SWORD_SKILLS[wname]
-            level = weapon['skill_level']
-            multiplier = skill['base'] + (level - 1) * skill['increment']
-
-            # --- Skill-specific modifiers ---
-            crit_mult = 1.0
-            crit_damage_bonus = 0
-            bleed_chance_bonus = 0
-            bleed_damage_mult = 1.0
-
-            if skill['name'] == "Bloodmoon Rend":
-                bleed_chance_bonus = 15
-                bleed_damage_mult = 1.25
-            elif skill['name'] == "Shadowbane":
-                crit_mult = 2.0
-                crit_damage_bonus = 50
-
-            effective_crit_chance = a_stats['crit_chance'] * crit_mult
-            effective_crit_damage = a_stats['crit_damage'] + crit_damage_bonus
-            effective_bleed_chance = a_stats['bleed_chance'] + bleed_chance_bonus
-
-            # --- Dodge check ---
-            dodged = False
-            if random.random() < d_stats['dodge'] / 100:
-                dodged = True
-
-            # --- Damage calculation ---
-            if not dodged:
-                base_damage = a_stats['atk'] * multiplier
-                damage = int(max(base_damage - d_stats['def'] * 0.5, a_stats['atk'] * 0.2))
-
-                is_crit = random.random() < effective_crit_chance / 100
-                if is_crit:
-                    damage = int(damage * (1 + effective_crit_damage / 100))
+                # --- Energy check ---
+                if a_stats['energy'] < 1:
+                    await interaction.followup.send("Not enough energy!", ephemeral=True)
+                    return
 
-                # Apply damage to defender
-                new_defender_hp = max(0, d_stats['hp'] - damage)
-                await update_player_hp(current_defender_id, new_defender_hp)
-                if new_defender_hp == 0:
-                    async with bot.db_pool.acquire() as conn:
-                        await conn.execute("""
-                            UPDATE player_stats
-                            SET respawn_at = NOW() + INTERVAL '2 hours'
-                            WHERE user_id = $1 AND respawn_at IS NULL
-                        """, current_defender_id)
-
-                # Reflect damage
-                reflect_damage = 0
-                if d_stats['reflect'] > 0:
-                    reflect_damage = int(damage * d_stats['reflect'] / 100)
-                    if reflect_damage > 0:
-                        new_attacker_hp = max(0, a_stats['hp'] - reflect_damage)
-                        await update_player_hp(current_attacker_id, new_attacker_hp)
-                        if new_attacker_hp == 0:
-                            async with bot.db_pool.acquire() as conn:
-                                await conn.execute("""
-                                    UPDATE player_stats
-                                    SET respawn_at = NOW() + INTERVAL '2 hours'
-                                    WHERE user_id = $1 AND respawn_at IS NULL
-                                """, current_attacker_id)
-
-                # Bleed
-                bleed_applied = False
-                bleed_tick = 0
-                if random.random() < effective_bleed_chance / 100:
-                    bleed_tick = int(a_stats['atk'] * (a_stats['bleed_damage'] * bleed_damage_mult / 100)) + a_stats.get('bleed_flat_bonus', 0)
-                    if bleed_tick > 0:
-                        bleed_applied = True
-                        async with bot.db_pool.acquire() as conn:
-                            await conn.execute("""
-                                INSERT INTO active_effects (target_id, effect_type, value, remaining_ticks)
-                                VALUES ($1, 'bleed', $2, 3)
-                            """, current_defender_id, bleed_tick)
-
-                # Burn (Dawn Breaker)
-                burn_applied = False
-                burn_tick = 0
-                if skill['name'] == "Dawn's Wrath":
-                    burn_chance = 25
-                    burn_damage_percent = 20
-                    if random.random() < burn_chance / 100:
-                        burn_tick = int(damage * burn_damage_percent / 100) + a_stats.get('burn_flat_bonus', 0)
-                        if burn_tick > 0:
-                            burn_applied = True
-                            async with bot.db_pool.acquire() as conn:
-                                await conn.execute("""
-                                    INSERT INTO active_effects (target_id, effect_type, value, remaining_ticks)
-                                    VALUES ($1, 'burn', $2, 3)
-                                """, current_defender_id, burn_tick)
+                # --- Equipped weapon (loaded with the session) ---
+                weapon = session.weapons.get(current_attacker_id)
+                if not weapon:
+                    await interaction.followup.send("You don't have a weapon equipped!", ephemeral=True)
+                    return
 
-                # Buffs/Debuffs
-                buff_applied = None
-                if skill['name'] == "Zenith Slash" and random.random() < 0.20:
-                    async with bot.db_pool.acquire() as conn:
-                        await conn.execute("""
-                            INSERT INTO active_buffs (target_id, effect_type, value, remaining_turns)
-                            VALUES ($1, 'atk_mult', 1.5, 2)
-                        """, current_attacker_id)
-                    buff_applied = f"{attacker_user.display_name} gains 50% ATK boost for 2 turns!"
+                skill = skill_profile(weapon['name'], weapon['skill_level'])
+                if not skill['has_skill']:
+                    await interaction.followup.send("Your weapon has no skill!", ephemeral=True)
+                    return
 
-                if skill['name'] == "Abyssal Strike" and random.random() < 0.30:
-                    async with bot.db_pool.acquire() as conn:
-                        await conn.execute("""
-                            INSERT INTO active_buffs (target_id, effect_type, value, remaining_turns)
-                            VALUES ($1, 'def_mult', 0.85, 3)
-                        """, current_defender_id)
-                    buff_applied = f"{defender_user.display_name}'s DEF reduced by 15% for 3 turns!"
-
-            else:  # dodged
-                damage = 0
-                is_crit = False
-                reflect_damage = 0
-                bleed_applied = False
-                burn_applied = False
+                turn = DuelTurn()
+                out = resolve_duel_attack(a_stats, d_stats, skill, random)
+                dodged = out['dodged']
+                damage = out['damage']
+                is_crit = out['is_crit']
+                reflect_damage = out['reflect']
+                bleed_tick = out['bleed_tick']
+                burn_tick = out['burn_tick']
+                bleed_applied = bleed_tick > 0
+                burn_applied = burn_tick > 0
                 buff_applied = None
 
-            # Deduct energy from attacker (always)
-            new_energy = a_stats['energy'] - 1
-            await update_player_energy(current_attacker_id, new_energy)
-
-            # --- Decrement buff turns for both participants ---
-            async with bot.db_pool.acquire() as conn:
-                await conn.execute("""
-                    UPDATE active_buffs SET remaining_turns = remaining_turns - 1
-                    WHERE target_id IN ($1, $2) AND remaining_turns > 0
-                """, current_attacker_id, current_defender_id)
-                await conn.execute("DELETE FROM active_buffs WHERE remaining_turns <= 0")
+                if not dodged:
+                    # HP is clamped at 0 in the checkpoint
+                    turn.hit(current_defender_id, damage)
+                    if reflect_damage > 0:
+                        turn.hit(current_attacker_id, reflect_damage)
+                    if bleed_applied:
+                        turn.effect(current_defender_id, 'bleed', bleed_tick)
+                    if burn_applied:
+                        turn.effect(current_defender_id, 'burn', burn_tick)
+                    if out['buff']:
+                        target, effect_type, value, turns = out['buff']
+                        if target == 'self':
+                            turn.buff(current_attacker_id, effect_type, value, turns)
+                            buff_applied = f"{attacker_user.display_name} gains 50% ATK boost for 2 turns!"
+                        else:
+                            turn.buff(current_defender_id, effect_type, value, turns)
+                            buff_applied = f"{defender_user.display_name}'s DEF reduced by 15% for 3 turns!"
+
+                # Deduct energy from attacker (always); buff turns tick in the checkpoint
+                turn.spend(current_attacker_id)
+                if not await session.checkpoint(turn):
+                    await interaction.followup.send(
+                        "❌ Turn cancelled: HP or energy changed outside this duel. Try again.", ephemeral=True
+                    )
+                    return
 
             # --- Build action text ---
             attacker_name = attacker_user.display_name
@@ -10469,15 +11457,7 @@ class AttackView(discord.ui.View):
             action_text = "\n".join(action_lines)
 
             # --- Update the message ---
-            channel = bot.get_channel(self.channel_id)
-            try:
-                msg = await channel.fetch_message(self.message_id)
-            except:
-                await interaction.followup.send("Message not found.", ephemeral=True)
-                return
-
-            new_embed = await self.build_duel_embed(action_text)
-            await msg.edit(embed=new_embed, view=self)
+            await self.refresh_message(action_text)
 
         except Exception as e:
             import traceback
@@ -10530,9 +11510,8 @@ class AttackView(discord.ui.View):
         max_energy = stats['max_energy']
 
         # Fetch potion item IDs
-        async with bot.db_pool.acquire() as conn:
-            hp_id = await conn.fetchval("SELECT item_id FROM shop_items WHERE name = 'HP Potion'")
-            energy_id = await conn.fetchval("SELECT item_id FROM shop_items WHERE name = 'Energy Potion'")
+        hp_id = await catalog.item_id('HP Potion')
+        energy_id = await catalog.item_id('Energy Potion')
 
         if potion_type == 'hp':
             potion_id = hp_id
@@ -10583,27 +11562,27 @@ class AttackView(discord.ui.View):
             else:
                 await conn.execute("UPDATE player_stats SET energy = $1 WHERE user_id = $2", new_energy, user_id)
 
+        # Keep the duel session in step with the potion
+        session = await self.get_session()
+        if potion_type == 'hp':
+            session.set_vitals(user_id, hp=new_hp)
+        else:
+            session.set_vitals(user_id, energy=new_energy)
+
         # Build action message for main duel embed
         action_message = f"{interaction.user.display_name} used {emoji} **{potion_name}** and {effect}!"
 
         # Update main duel embed
-        channel = bot.get_channel(self.channel_id)
-        try:
-            msg = await channel.fetch_message(self.message_id)
-        except:
-            await interaction.followup.send("Main duel message not found.", ephemeral=True)
-            return
-
-        new_embed = await self.build_duel_embed(action_message)
-        await msg.edit(embed=new_embed, view=self)
+        await self.refresh_message(action_message)
 
         # Confirm to user
         await interaction.followup.send(f"You used {emoji} **{potion_name}**.", ephemeral=True)
 
     async def build_duel_embed(self, action_text: str = None):
         """Build the duel embed with vertical stats, gear grids, and action result."""
-        a_stats = await get_player_stats(self.attacker_id)
-        d_stats = await get_player_stats(self.defender_id)
+        session = await self.get_session()
+        a_stats = session.stats(self.attacker_id)
+        d_stats = session.stats(self.defender_id)
         a_user = bot.get_user(int(self.attacker_id))
         d_user = bot.get_user(int(self.defender_id))
 
@@ -10644,8 +11623,8 @@ class AttackView(discord.ui.View):
         d_energy = energy_bar(d_stats['energy'], d_stats['max_energy'])
         d_stats_text = f"{d_hp}\n{d_def}\n{d_energy}"
 
-        a_gear = await format_gear_grid(self.attacker_id)
-        d_gear = await format_gear_grid(self.defender_id)
+        a_gear = session.gear[self.attacker_id]
+        d_gear = session.gear[self.defender_id]
 
         embed.add_field(
             name=f"{a_user.display_name}'s Stats{a_title_emoji}",
@@ -10669,106 +11648,253 @@ class AttackView(discord.ui.View):
         return embed
 #  END 
 
-async def get_player_stats(user_id: str):
-    """Return dict of player stats including dynamically recalculated max HP and pet bonuses."""
-    BASE_HP = 1000
-    BASE_DEF = 500
+# ========== STAT ENGINE ==========
+# Gear, pet and title stats only change on equip/unequip/upgrade/title changes,
+# so they are computed once and cached per user.  HP, energy and active buffs
+# change every turn and are always read live in the same round trip.
 
-    async with bot.db_pool.acquire() as conn:
-        row = await conn.fetchrow("""
-            SELECT hp, max_hp, energy, max_energy, respawn_at
-            FROM player_stats WHERE user_id = $1
-        """, user_id)
-        if not row:
-            await conn.execute("""
-                INSERT INTO player_stats (user_id, hp, max_hp, energy, max_energy)
-                VALUES ($1, $2, $2, 3, 3)
-            """, user_id, BASE_HP)
-            row = {'hp': BASE_HP, 'max_hp': BASE_HP, 'energy': 3, 'max_energy': 3, 'respawn_at': None}
+STAT_CACHE_TTL = 300  # seconds; safety net for admin edits that skip invalidation
 
-        weapon = await conn.fetchrow("""
-            SELECT attack, bleeding_chance, crit_chance, crit_damage
-            FROM user_weapons
-            WHERE user_id = $1 AND equipped = TRUE
-            LIMIT 1
-        """, user_id)
+def energy_regen_sql(user_filter: str = "TRUE") -> str:
+    """UPDATE applying whole hours of energy regen, capped at max_energy + pet energy_bonus.
 
-        armor = await conn.fetch("""
-            SELECT defense, reflect_damage, hp_bonus, set_name
-            FROM user_armor
-            WHERE user_id = $1 AND equipped = TRUE
-        """, user_id)
+    Leftover minutes are kept by advancing last_energy_regen by the hours used.
+    Rows with no whole hour due are not touched; spend sites restart the clock
+    for players spending from the cap (see energy_spend_clock_sql).
+    """
+    return f"""
+        UPDATE player_stats ps
+        SET energy = GREATEST(ps.energy, LEAST(ps.energy + d.ticks, d.cap)),
+            last_energy_regen = CASE
+                WHEN ps.last_energy_regen IS NULL OR ps.energy + d.ticks >= d.cap THEN d.now_utc
+                ELSE ps.last_energy_regen + d.ticks * INTERVAL '1 hour'
+            END
+        FROM (
+            SELECT p.user_id, n.now_utc,
+                   COALESCE(FLOOR(EXTRACT(EPOCH FROM (n.now_utc - p.last_energy_regen)) / 3600), 0)::int AS ticks,
+                   {energy_cap_sql("p")} AS cap
+            FROM player_stats p
+            CROSS JOIN (SELECT NOW() AT TIME ZONE 'UTC' AS now_utc) n
+            WHERE p.hp > 0 AND {user_filter}
+        ) d
+        WHERE ps.user_id = d.user_id
+          AND (d.ticks > 0 OR ps.last_energy_regen IS NULL)
+        RETURNING ps.user_id, ps.energy
+    """
 
-        accessories = await conn.fetch("""
-            SELECT at.bonus_stat, ua.bonus_value, at.set_name
-            FROM user_accessories ua
-            JOIN accessory_types at ON ua.accessory_id = at.accessory_id
-            WHERE ua.user_id = $1 AND ua.equipped = TRUE
-        """, user_id)
 
-    # --- Base stats from gear (flat) ---
-    atk = 0
-    defense = BASE_DEF
-    crit_chance = 0.0
-    crit_damage = 0.0
-    bleed_chance = 0.0
-    bleed_damage = 0.0
-    reflect = 0
-    hp_from_gear = BASE_HP  # start with base HP, then add flat bonuses
-
-    if weapon:
-        atk += weapon['attack']
-        bleed_chance += weapon['bleeding_chance'] or 0
-        crit_chance += weapon['crit_chance'] or 0
-        crit_damage += weapon['crit_damage'] or 0
+# Reads regenerate lazily: the UPDATE runs as a CTE and its result wins over
+# the (pre-update) snapshot of player_stats in the same statement.
+_STAT_LIVE_SELECT = """
+    ps.hp, ps.max_hp, COALESCE(rg.energy, ps.energy) AS energy, ps.max_energy, ps.respawn_at,
+    b.buff_types, b.buff_values
+"""
+
+_STAT_LIVE_JOINS = """
+    LEFT JOIN player_stats ps ON ps.user_id = u.user_id
+    LEFT JOIN rg ON rg.user_id = u.user_id
+    LEFT JOIN LATERAL (
+        SELECT array_agg(effect_type ORDER BY buff_id) AS buff_types,
+               array_agg(value ORDER BY buff_id) AS buff_values
+        FROM active_buffs WHERE target_id = u.user_id
+    ) b ON TRUE
+"""
+
+_STAT_LOADOUT_SELECT = """
+    w.attack AS w_attack, w.bleeding_chance AS w_bleed_chance,
+    w.crit_chance AS w_crit_chance, w.crit_damage AS w_crit_damage,
+    ar.defense AS ar_defense, ar.reflect AS ar_reflect, ar.hp_bonus AS ar_hp_bonus, ar.sets AS ar_sets,
+    ac.atk AS ac_atk, ac.def AS ac_def, ac.hp AS ac_hp, ac.crit AS ac_crit, ac.bleed AS ac_bleed, ac.sets AS ac_sets,
+    p.atk_percent AS pet_atk_percent, p.def_percent AS pet_def_percent, p.hp_percent AS pet_hp_percent,
+    p.dodge_percent AS pet_dodge_percent, p.bleed_flat AS pet_bleed_flat, p.burn_flat AS pet_burn_flat,
+    p.energy_bonus AS pet_energy_bonus,
+    t.name AS t_name, t.emoji AS t_emoji,
+    t.hp_percent AS t_hp_percent, t.def_percent AS t_def_percent, t.atk_percent AS t_atk_percent,
+    t.crit_chance AS t_crit_chance, t.dodge_percent AS t_dodge_percent,
+    t.dmg_reduction_percent AS t_dmg_reduction_percent,
+    t.bleed_flat AS t_bleed_flat, t.burn_flat AS t_burn_flat,
+    t.crit_dmg_res_percent AS t_crit_dmg_res_percent, t.mining_bonus_percent AS t_mining_bonus_percent,
+    t.boss_damage_percent AS t_boss_damage_percent, t.extra_boss_attempts AS t_extra_boss_attempts,
+    t.extra_plunder_attempts AS t_extra_plunder_attempts, t.crit_resist_percent AS t_crit_resist_percent
+"""
+
+_STAT_LOADOUT_JOINS = """
+    LEFT JOIN LATERAL (
+        SELECT attack, bleeding_chance, crit_chance, crit_damage
+        FROM user_weapons
+        WHERE user_id = u.user_id AND equipped = TRUE
+        LIMIT 1
+    ) w ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT COALESCE(SUM(defense), 0) AS defense,
+               COALESCE(SUM(reflect_damage), 0) AS reflect,
+               COALESCE(SUM(hp_bonus), 0) AS hp_bonus,
+               array_agg(set_name) FILTER (WHERE set_name IS NOT NULL) AS sets
+        FROM user_armor
+        WHERE user_id = u.user_id AND equipped = TRUE
+    ) ar ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT COALESCE(SUM(ua.bonus_value) FILTER (WHERE at.bonus_stat = 'atk'), 0) AS atk,
+               COALESCE(SUM(ua.bonus_value) FILTER (WHERE at.bonus_stat = 'def'), 0) AS def,
+               COALESCE(SUM(ua.bonus_value) FILTER (WHERE at.bonus_stat = 'hp'), 0) AS hp,
+               COALESCE(SUM(ua.bonus_value) FILTER (WHERE at.bonus_stat = 'crit'), 0) AS crit,
+               COALESCE(SUM(ua.bonus_value) FILTER (WHERE at.bonus_stat = 'bleed'), 0) AS bleed,
+               array_agg(at.set_name) FILTER (WHERE at.set_name IS NOT NULL) AS sets
+        FROM user_accessories ua
+        JOIN accessory_types at ON ua.accessory_id = at.accessory_id
+        WHERE ua.user_id = u.user_id AND ua.equipped = TRUE
+    ) ac ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT pt.atk_percent, pt.def_percent, pt.hp_percent,
+               pt.dodge_percent, pt.bleed_flat, pt.burn_flat, pt.energy_bonus
+        FROM user_pets up
+        JOIN pet_types pt ON up.pet_id = pt.pet_id
+        WHERE up.user_id = u.user_id AND up.equipped = TRUE
+        LIMIT 1
+    ) p ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT t.*
+        FROM titles t
+        JOIN user_titles ut ON t.title_id = ut.title_id
+        WHERE ut.user_id = u.user_id AND ut.equipped = TRUE
+        LIMIT 1
+    ) t ON TRUE
+"""
+
+PLAYER_STATS_LIVE_SQL = f"""
+    WITH rg AS ({energy_regen_sql("p.user_id = $1::text")})
+    SELECT {_STAT_LIVE_SELECT}
+    FROM (SELECT $1::text AS user_id) u
+    {_STAT_LIVE_JOINS}
+"""
+
+PLAYER_STATS_FULL_SQL = f"""
+    WITH rg AS ({energy_regen_sql("p.user_id = $1::text")})
+    SELECT {_STAT_LIVE_SELECT}, {_STAT_LOADOUT_SELECT}
+    FROM (SELECT $1::text AS user_id) u
+    {_STAT_LIVE_JOINS}
+    {_STAT_LOADOUT_JOINS}
+"""
+
+# Batch variants: same joins driven by an array of user ids
+PLAYER_STATS_MANY_LIVE_SQL = f"""
+    WITH rg AS ({energy_regen_sql("p.user_id = ANY($1::text[])")})
+    SELECT u.user_id, {_STAT_LIVE_SELECT}
+    FROM unnest($1::text[]) AS u(user_id)
+    {_STAT_LIVE_JOINS}
+    WHERE ps.user_id IS NOT NULL
+"""
+
+PLAYER_STATS_MANY_FULL_SQL = f"""
+    WITH rg AS ({energy_regen_sql("p.user_id = ANY($1::text[])")})
+    SELECT u.user_id, {_STAT_LIVE_SELECT}, {_STAT_LOADOUT_SELECT}
+    FROM unnest($1::text[]) AS u(user_id)
+    {_STAT_LIVE_JOINS}
+    {_STAT_LOADOUT_JOINS}
+    WHERE ps.user_id IS NOT NULL
+"""
+
+STATS_BATCH_SIZE = 500
+
+
+class LoadoutVersions:
+    """Per-user loadout version counters shared by the loadout caches.
+
+    A version is bumped whenever a user's gear, pet or title changes;
+    bump_all() covers sweeps that touch many users at once.
+    """
 
-    for a in armor:
-        defense += a['defense']
-        reflect += a['reflect_damage'] or 0
-        hp_from_gear += a['hp_bonus'] or 0
-
-    for acc in accessories:
-        stat = acc['bonus_stat']
-        val = acc['bonus_value']
-        if stat == 'atk':
-            atk += val
-        elif stat == 'def':
-            defense += val
-        elif stat == 'hp':
-            hp_from_gear += val
-        elif stat == 'crit':
-            crit_chance += val
-        elif stat == 'bleed':
-            bleed_damage += val
+    def __init__(self):
+        self._epoch = 0
+        self._versions: Dict[str, int] = {}
+
+    def get(self, user_id: str) -> Tuple[int, int]:
+        return (self._epoch, self._versions.get(user_id, 0))
+
+    def bump(self, user_id: str):
+        self._versions[user_id] = self._versions.get(user_id, 0) + 1
+
+    def bump_all(self):
+        self._epoch += 1
+
+
+class PlayerStatCache:
+    """Per-user cache of loadout-derived data, valid while the loadout version is unchanged."""
+
+    def __init__(self, versions: LoadoutVersions, ttl: float = STAT_CACHE_TTL):
+        self.versions = versions
+        self.ttl = ttl
+        self._entries: Dict[str, Tuple[float, Tuple[int, int], Any]] = {}
+
+    def generation(self, user_id: str) -> Tuple[int, int]:
+        return self.versions.get(user_id)
+
+    def get(self, user_id: str) -> Optional[Any]:
+        entry = self._entries.get(user_id)
+        if not entry:
+            return None
+        expires, generation, value = entry
+        if expires < time.monotonic() or generation != self.generation(user_id):
+            self._entries.pop(user_id, None)
+            return None
+        return value
+
+    def put(self, user_id: str, value: Any, generation: Tuple[int, int]):
+        # Drop the result if the loadout changed while the query was in flight
+        if self.generation(user_id) != generation:
+            return
+        self._entries[user_id] = (time.monotonic() + self.ttl, generation, value)
+
+    def invalidate(self, user_id: str):
+        """Bump the user's loadout version; every cache sharing it drops the entry."""
+        user_id = str(user_id)
+        self.versions.bump(user_id)
+        self._entries.pop(user_id, None)
+
+    def clear(self):
+        self.versions.bump_all()
+        self._entries.clear()
+
+
+loadout_versions = LoadoutVersions()
+stat_cache = PlayerStatCache(loadout_versions)
+profile_cache = PlayerStatCache(loadout_versions)
+
+
+def compute_loadout_stats(row) -> dict:
+    """Derive gear, set, pet and title stats from a PLAYER_STATS_FULL_SQL row."""
+    BASE_HP = 1000
+    BASE_DEF = 500
+
+    # --- Base stats from gear (flat) ---
+    atk = (row['w_attack'] or 0) + row['ac_atk']
+    defense = BASE_DEF + row['ar_defense'] + row['ac_def']
+    crit_chance = (row['w_crit_chance'] or 0) + row['ac_crit']
+    crit_damage = row['w_crit_damage'] or 0
+    bleed_chance = row['w_bleed_chance'] or 0
+    bleed_damage = row['ac_bleed']
+    reflect = row['ar_reflect']
+    hp_from_gear = BASE_HP + row['ar_hp_bonus'] + row['ac_hp']
 
     # --- Multipliers from sets ---
     atk_mult = 1.0
     def_mult = 1.0
     hp_mult = 1.0
-    reflect_add = 0
-    crit_chance_add = 0
-    crit_damage_add = 0
 
-    # Armor set bonuses
     armor_sets = {}
-    for a in armor:
-        if a['set_name']:
-            armor_sets[a['set_name']] = armor_sets.get(a['set_name'], 0) + 1
+    for set_name in row['ar_sets'] or []:
+        armor_sets[set_name] = armor_sets.get(set_name, 0) + 1
     for set_name, count in armor_sets.items():
-        if count >= 4:
-            sname = set_name.lower()
-            if sname in ('bilari', 'cryo', 'bane'):
-                crit_chance_add += 10
-                crit_damage_add += 25
-                def_mult *= 1.15
-                reflect_add += 20
-                hp_mult *= 1.20   # 20% HP multiplier
+        if count >= 4 and set_name.lower() in ('bilari', 'cryo', 'bane'):
+            crit_chance += 10
+            crit_damage += 25
+            def_mult *= 1.15
+            reflect += 20
+            hp_mult *= 1.20
 
-    # Accessory set bonuses
     accessory_sets = {}
-    for acc in accessories:
-        if acc['set_name']:
-            accessory_sets[acc['set_name']] = accessory_sets.get(acc['set_name'], 0) + 1
+    for set_name in row['ac_sets'] or []:
+        accessory_sets[set_name] = accessory_sets.get(set_name, 0) + 1
     for set_name, count in accessory_sets.items():
         if count >= 5:
             sname = set_name.lower()
@@ -10778,115 +11904,41 @@ async def get_player_stats(user_id: str):
                 hp_mult *= 1.15
             elif sname == 'defender':
                 def_mult *= 1.20
-                reflect_add += 10
+                reflect += 10
                 hp_mult *= 1.15
             elif sname == 'angel':
-                crit_chance_add += 15
+                crit_chance += 15
                 bleed_damage += 20
                 hp_mult *= 1.15
 
-    # Apply multipliers to flat stats
     atk = int(atk * atk_mult)
     defense = int(defense * def_mult)
-    # HP multiplier applies to the total gear HP (including base)
-    max_hp_after_sets = int(hp_from_gear * hp_mult)   # HP after sets
-    reflect += reflect_add
-    crit_chance += crit_chance_add
-    crit_damage += crit_damage_add
-
-    # ========== PET BONUSES ==========
-    energy_bonus = 0
-    dodge = 0
-    bleed_flat_bonus = 0
-    burn_flat_bonus = 0
-    pet_atk_mult = 1.0
-    pet_def_mult = 1.0
-    pet_hp_mult = 1.0
+    max_hp = int(hp_from_gear * hp_mult)
 
-    async with bot.db_pool.acquire() as conn:
-        pet = await conn.fetchrow("""
-            SELECT pt.atk_percent, pt.def_percent, pt.hp_percent,
-                   pt.dodge_percent, pt.bleed_flat, pt.burn_flat, pt.energy_bonus
-            FROM user_pets up
-            JOIN pet_types pt ON up.pet_id = pt.pet_id
-            WHERE up.user_id = $1 AND up.equipped = TRUE
-        """, user_id)
-    if pet:
-        pet_atk_mult = 1 + pet['atk_percent'] / 100
-        pet_def_mult = 1 + pet['def_percent'] / 100
-        pet_hp_mult = 1 + pet['hp_percent'] / 100
-        energy_bonus = pet['energy_bonus']
-        dodge = pet['dodge_percent']
-        bleed_flat_bonus = pet['bleed_flat']
-        burn_flat_bonus = pet['burn_flat']
-
-    # Apply pet multipliers
-    atk = int(atk * pet_atk_mult)
-    defense = int(defense * pet_def_mult)
-    max_hp_after_pet = int(max_hp_after_sets * pet_hp_mult)   # HP after sets and pet
-
-    # ========== TITLE BONUSES ==========
-    # Initialize title variables with defaults
-    title_atk_mult = 1.0
-    title_def_mult = 1.0
-    title_hp_mult = 1.0
-    crit_dmg_res = 0
-    mining_bonus_percent = 0
-    boss_damage_percent = 0
-    extra_boss_attempts = 0
-    extra_plunder_attempts = 0
+    # --- Pet bonuses ---
+    atk = int(atk * (1 + (row['pet_atk_percent'] or 0) / 100))
+    defense = int(defense * (1 + (row['pet_def_percent'] or 0) / 100))
+    max_hp = int(max_hp * (1 + (row['pet_hp_percent'] or 0) / 100))
+    energy_bonus = row['pet_energy_bonus'] or 0
+    dodge = row['pet_dodge_percent'] or 0
+    bleed_flat_bonus = row['pet_bleed_flat'] or 0
+    burn_flat_bonus = row['pet_burn_flat'] or 0
+
+    # --- Title bonuses ---
     equipped_title = None
-    title_dmg_reduction = 0          
-    title_crit_resist = 0 
-
-    title_bonuses = await get_equipped_title_bonuses(user_id)
-    if title_bonuses:
-        title_atk_mult = 1 + title_bonuses['atk_percent'] / 100
-        title_def_mult = 1 + title_bonuses['def_percent'] / 100
-        title_hp_mult = 1 + title_bonuses['hp_percent'] / 100
-        crit_chance += title_bonuses['crit_chance']
-        dodge += title_bonuses['dodge_percent']
-        bleed_flat_bonus += title_bonuses['bleed_flat']
-        burn_flat_bonus += title_bonuses['burn_flat']
-        crit_dmg_res = title_bonuses['crit_dmg_res_percent']
-        mining_bonus_percent = title_bonuses['mining_bonus_percent']
-        boss_damage_percent = title_bonuses['boss_damage_percent']
-        extra_boss_attempts = title_bonuses['extra_boss_attempts']
-        extra_plunder_attempts = title_bonuses['extra_plunder_attempts']
-        equipped_title = (title_bonuses['name'], title_bonuses['emoji'])
-        title_dmg_reduction = title_bonuses['dmg_reduction_percent']
-        title_crit_resist = title_bonuses['crit_resist_percent']
-
-    # Apply title multipliers
-    atk = int(atk * title_atk_mult)
-    defense = int(defense * title_def_mult)
-    max_hp = int(max_hp_after_pet * title_hp_mult)   # Final HP after all multipliers
-
-    current_hp = row['hp']
-    if current_hp > max_hp:
-        current_hp = max_hp
-
-    # --- Adjust max energy with pet bonus ---
-    max_energy = row['max_energy'] + energy_bonus
-    current_energy = row['energy']
-    if current_energy > max_energy:
-        current_energy = max_energy
-
-    # --- Active buffs ---
-    async with bot.db_pool.acquire() as conn:
-        buffs = await conn.fetch("SELECT * FROM active_buffs WHERE target_id = $1", user_id)
-    for buff in buffs:
-        if buff['effect_type'] == 'atk_mult':
-            atk = int(atk * buff['value'])
-        elif buff['effect_type'] == 'def_mult':
-            defense = int(defense * buff['value'])
+    if row['t_name'] is not None:
+        atk = int(atk * (1 + (row['t_atk_percent'] or 0) / 100))
+        defense = int(defense * (1 + (row['t_def_percent'] or 0) / 100))
+        max_hp = int(max_hp * (1 + (row['t_hp_percent'] or 0) / 100))
+        crit_chance += row['t_crit_chance'] or 0
+        dodge += row['t_dodge_percent'] or 0
+        bleed_flat_bonus += row['t_bleed_flat'] or 0
+        burn_flat_bonus += row['t_burn_flat'] or 0
+        equipped_title = (row['t_name'], row['t_emoji'] or '🏷️')
 
     return {
-        'hp': current_hp,
         'max_hp': max_hp,
-        'energy': current_energy,
-        'max_energy': max_energy,
-        'respawn_at': row['respawn_at'],
+        'energy_bonus': energy_bonus,
         'atk': atk,
         'def': defense,
         'crit_chance': crit_chance,
@@ -10897,23 +11949,108 @@ async def get_player_stats(user_id: str):
         'dodge': dodge,
         'bleed_flat_bonus': bleed_flat_bonus,
         'burn_flat_bonus': burn_flat_bonus,
-        'crit_dmg_res': crit_dmg_res,
-        'mining_bonus_percent': mining_bonus_percent,
-        'boss_damage_percent': boss_damage_percent,
-        'extra_boss_attempts': extra_boss_attempts,
-        'extra_plunder_attempts': extra_plunder_attempts,
+        'crit_dmg_res': row['t_crit_dmg_res_percent'] or 0,
+        'mining_bonus_percent': row['t_mining_bonus_percent'] or 0,
+        'boss_damage_percent': row['t_boss_damage_percent'] or 0,
+        'extra_boss_attempts': row['t_extra_boss_attempts'] or 0,
+        'extra_plunder_attempts': row['t_extra_plunder_attempts'] or 0,
         'equipped_title': equipped_title,
-        'dmg_reduction': title_dmg_reduction,      
-        'crit_resist': title_crit_resist,
+        'dmg_reduction': row['t_dmg_reduction_percent'] or 0,
+        'crit_resist': row['t_crit_resist_percent'] or 0,
     }
 
+
+def compute_player_stats(live, loadout: dict) -> dict:
+    """Combine cached loadout stats with live HP, energy and buffs."""
+    stats = dict(loadout)
+    energy_bonus = stats.pop('energy_bonus')
+
+    stats['hp'] = min(live['hp'], stats['max_hp'])
+    stats['max_energy'] = live['max_energy'] + energy_bonus
+    stats['energy'] = min(live['energy'], stats['max_energy'])
+    stats['respawn_at'] = live['respawn_at']
+
+    for effect_type, value in zip(live['buff_types'] or [], live['buff_values'] or []):
+        if effect_type == 'atk_mult':
+            stats['atk'] = int(stats['atk'] * value)
+        elif effect_type == 'def_mult':
+            stats['def'] = int(stats['def'] * value)
+    return stats
+
+
+async def get_player_stats(user_id: str):
+    """Return dict of player stats including dynamically recalculated max HP and pet bonuses."""
+    BASE_HP = 1000
+
+    loadout = stat_cache.get(user_id)
+    generation = stat_cache.generation(user_id)
+    async with bot.db_pool.acquire() as conn:
+        if loadout is None:
+            row = await conn.fetchrow(PLAYER_STATS_FULL_SQL, user_id)
+            loadout = compute_loadout_stats(row)
+            stat_cache.put(user_id, loadout, generation)
+        else:
+            row = await conn.fetchrow(PLAYER_STATS_LIVE_SQL, user_id)
+
+        live = dict(row)
+        if live['hp'] is None:
+            await conn.execute("""
+                INSERT INTO player_stats (user_id, hp, max_hp, energy, max_energy)
+                VALUES ($1, $2, $2, 3, 3)
+            """, user_id, BASE_HP)
+            live.update(hp=BASE_HP, max_hp=BASE_HP, energy=3, max_energy=3, respawn_at=None)
+
+    return compute_player_stats(live, loadout)
+
+
+async def get_player_stats_many(user_ids) -> Dict[str, dict]:
+    """Return {user_id: stats} for many players using set-based queries.
+
+    Users without a player_stats row are skipped (unlike get_player_stats,
+    rows are not created here).
+    """
+    user_ids = list(dict.fromkeys(str(uid) for uid in user_ids))
+    results = {}
+    for start in range(0, len(user_ids), STATS_BATCH_SIZE):
+        chunk = user_ids[start:start + STATS_BATCH_SIZE]
+        cached = {}
+        missing = []
+        generations = {}
+        for uid in chunk:
+            loadout = stat_cache.get(uid)
+            if loadout is None:
+                missing.append(uid)
+                generations[uid] = stat_cache.generation(uid)
+            else:
+                cached[uid] = loadout
+
+        async with bot.db_pool.acquire() as conn:
+            if missing:
+                for row in await conn.fetch(PLAYER_STATS_MANY_FULL_SQL, missing):
+                    uid = row['user_id']
+                    loadout = compute_loadout_stats(row)
+                    stat_cache.put(uid, loadout, generations[uid])
+                    results[uid] = compute_player_stats(row, loadout)
+            if cached:
+                for row in await conn.fetch(PLAYER_STATS_MANY_LIVE_SQL, list(cached)):
+                    uid = row['user_id']
+                    results[uid] = compute_player_stats(row, cached[uid])
+
+        # Let other tasks run between chunks
+        await asyncio.sleep(0)
+    return results
+
 async def update_player_hp(user_id: str, new_hp: int):
     async with bot.db_pool.acquire() as conn:
         await conn.execute("UPDATE player_stats SET hp = $1 WHERE user_id = $2", new_hp, user_id)
 
 async def update_player_energy(user_id: str, new_energy: int):
     async with bot.db_pool.acquire() as conn:
-        await conn.execute("UPDATE player_stats SET energy = $1 WHERE user_id = $2", new_energy, user_id)
+        await conn.execute(f"""
+            UPDATE player_stats p
+            SET energy = $1, last_energy_regen = {energy_spend_clock_sql("p", "p.energy - $1")}
+            WHERE p.user_id = $2
+        """, new_energy, user_id)
 
 async def get_equipped_emojis(user_id: str) -> str:
     """Return a string of custom emojis representing the user's equipped gear."""
@@ -11016,27 +12153,9 @@ class MiningMainView(discord.ui.View):
                 await interaction.followup.send("No one is currently mining.", ephemeral=True)
                 return
 
-            miner_list = []
-            for m in miners:
-                user_id = m['user_id']
-                # First try cache
-                member = interaction.guild.get_member(int(user_id))
-                if member:
-                    name = member.display_name
-                else:
-                    # 🔹 KEY CHANGE: Attempt to fetch from API
-                    try:
-                        member = await interaction.guild.fetch_member(int(user_id))
-                        name = member.display_name
-                    except:
-                        # 🔹 Fallback to global username or truncated ID
-                        user = self.bot.get_user(int(user_id))
-                        if user:
-                            name = user.name
-                        else:
-                            name = f"User {user_id[:6]}"
-                miner_list.append((user_id, name))
-                print(f"DEBUG: Miner {user_id} -> {name}")
+            # Members first (one gateway query for the uncached ones), then global users
+            names = await name_resolver.names([m['user_id'] for m in miners], interaction.guild)
+            miner_list = [(m['user_id'], names[int(m['user_id'])]) for m in miners]
 
             embed = discord.Embed(
                 title="Current Miners",
@@ -11116,10 +12235,157 @@ class PlunderButton(discord.ui.Button):
 
 # ========== BOSS SYSTEM ==========
 
+BOSS_DAILY_ATTEMPTS = 5
+
+# One statement per guild flush: attempts, leaderboard damage and boss HP
+BOSS_FLUSH_SQL = """
+    WITH hits AS (
+        SELECT * FROM unnest($2::text[], $3::bigint[], $4::int[]) AS h(user_id, damage, attempts)
+    ), attempts AS (
+        INSERT INTO boss_attempts (user_id, reset_date, attempts_used)
+        SELECT user_id, $5, attempts FROM hits
+        ON CONFLICT (user_id, reset_date) DO UPDATE
+        SET attempts_used = boss_attempts.attempts_used + EXCLUDED.attempts_used
+    ), damage AS (
+        INSERT INTO boss_damage (user_id, reset_date, total_damage)
+        SELECT user_id, $5, damage FROM hits
+        ON CONFLICT (user_id, reset_date) DO UPDATE
+        SET total_damage = boss_damage.total_damage + EXCLUDED.total_damage
+    )
+    UPDATE boss_config
+    SET boss_hp = GREATEST(boss_hp - (SELECT COALESCE(SUM(damage), 0) FROM hits), 0)
+    WHERE guild_id = $1
+    RETURNING boss_hp
+"""
+
+
+class BossRaidLedger:
+    """In-process boss HP and attempt counters, written back in batches.
+
+    The bot runs as a single replica, so between resets this process is the
+    only writer of boss HP. Hits are checked and applied here without a row
+    lock (the kill is whichever hit takes HP to 0), and every BOSS_FLUSH_SECONDS
+    each guild's pending hits go out as one BOSS_FLUSH_SQL statement.
+    """
+
+    def __init__(self, flush_seconds: float):
+        self.flush_seconds = flush_seconds
+        self._bosses: Dict[int, list] = {}                 # guild_id -> [hp, max_hp]
+        self._display: Dict[int, dict] = {}                # guild_id -> {message_id, image_url}
+        self._attempts: Dict[Tuple[str, date], int] = {}   # (user_id, reset_date) -> used
+        self._pending: Dict[Tuple[int, date], Dict[str, list]] = {}  # -> user_id -> [damage, attempts]
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+
+    async def boss(self, guild_id: int) -> Optional[list]:
+        """[hp, max_hp] for the guild, loaded from boss_config on first use."""
+        if guild_id not in self._bosses:
+            async with bot.db_pool.acquire() as conn:
+                row = await conn.fetchrow(
+                    "SELECT boss_hp, max_hp, message_id, boss_image_url FROM boss_config WHERE guild_id = $1",
+                    guild_id
+                )
+            if not row:
+                return None
+            if guild_id not in self._bosses:
+                self._bosses[guild_id] = [row['boss_hp'], row['max_hp']]
+                self._display[guild_id] = {'message_id': row['message_id'], 'image_url': row['boss_image_url']}
+        return self._bosses[guild_id]
+
+    async def display(self, guild_id: int) -> dict:
+        """Message id and image URL of the guild's boss embed, loaded with the boss."""
+        await self.boss(guild_id)
+        return self._display.get(guild_id, {})
+
+    def set_display(self, guild_id: int, **values):
+        """Mirror a boss_config message_id/image_url write; unloaded guilds read it on first use."""
+        if guild_id in self._display:
+            self._display[guild_id].update(values)
+
+    async def attempts_used(self, user_id: str, reset_date: date) -> int:
+        key = (user_id, reset_date)
+        if key not in self._attempts:
+            async with bot.db_pool.acquire() as conn:
+                used = await conn.fetchval(
+                    "SELECT attempts_used FROM boss_attempts WHERE user_id = $1 AND reset_date = $2",
+                    user_id, reset_date
+                )
+            self._attempts.setdefault(key, used or 0)
+        return self._attempts[key]
+
+    def hit(self, guild_id: int, user_id: str, reset_date: date, damage: int) -> Optional[dict]:
+        """Apply one attack; None if the boss died or the attempts ran out meanwhile."""
+        boss = self._bosses.get(guild_id)
+        key = (user_id, reset_date)
+        if boss is None or boss[0] <= 0 or self._attempts.get(key, 0) >= BOSS_DAILY_ATTEMPTS:
+            return None
+        boss[0] = max(0, boss[0] - damage)
+        self._attempts[key] = self._attempts.get(key, 0) + 1
+
+        pending = self._pending.setdefault((guild_id, reset_date), {}).setdefault(user_id, [0, 0])
+        pending[0] += damage
+        pending[1] += 1
+        leaderboards.boss(reset_date).add(user_id, damage)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return {'hp': boss[0], 'max_hp': boss[1], 'attempts_used': self._attempts[key], 'killed': boss[0] == 0}
+
+    async def flush(self, guild_id: Optional[int] = None):
+        async with self._flush_lock:
+            for key in [k for k in self._pending if guild_id is None or k[0] == guild_id]:
+                hits = self._pending.pop(key, None)
+                if not hits:
+                    continue
+                users = list(hits)
+                try:
+                    async with bot.db_pool.acquire() as conn:
+                        await conn.fetchval(
+                            BOSS_FLUSH_SQL, key[0], users,
+                            [hits[u][0] for u in users], [hits[u][1] for u in users], key[1]
+                        )
+                except Exception as e:
+                    print(f"❌ Boss damage flush failed for guild {key[0]}: {e}")
+                    # Put the hits back so the next flush retries them
+                    retry = self._pending.setdefault(key, {})
+                    for u, (dmg, n) in hits.items():
+                        entry = retry.setdefault(u, [0, 0])
+                        entry[0] += dmg
+                        entry[1] += n
+
+    async def damage_totals(self, reset_date: date) -> List[Tuple[str, int, None]]:
+        """Stored plus still-pending damage per user for a cycle (the boss leaderboard's loader)."""
+        # Holding the flush lock means every hit is either in the table or in _pending, not in transit
+        async with self._flush_lock:
+            async with bot.db_pool.acquire() as conn:
+                rows = await conn.fetch(
+                    "SELECT user_id, total_damage FROM boss_damage WHERE reset_date = $1", reset_date
+                )
+            totals = {row['user_id']: row['total_damage'] for row in rows}
+            for (_, day), hits in self._pending.items():
+                if day == reset_date:
+                    for user_id, (dmg, _) in hits.items():
+                        totals[user_id] = totals.get(user_id, 0) + dmg
+        return [(user_id, dmg, None) for user_id, dmg in totals.items()]
+
+    async def forget(self, guild_id: int):
+        """Flush and drop a guild's cached boss after HP was changed in the database."""
+        await self.flush(guild_id)
+        self._bosses.pop(guild_id, None)
+        self._display.pop(guild_id, None)
+
+    def prune_attempts(self, before: date):
+        self._attempts = {k: v for k, v in self._attempts.items() if k[1] >= before}
+
+    async def _run(self):
+        while self._pending:
+            await asyncio.sleep(self.flush_seconds)
+            await self.flush()
+
+
+boss_ledger = BossRaidLedger(BOSS_FLUSH_SECONDS)
 
 
 class BossAttackView(discord.ui.View):
-    _last_update = {}
     def __init__(self, guild_id: int):
         super().__init__(timeout=None)  # persistent view
         self.guild_id = guild_id
@@ -11128,13 +12394,12 @@ class BossAttackView(discord.ui.View):
     async def attack_button(self, interaction: discord.Interaction, button: discord.ui.Button):
         await interaction.response.defer(ephemeral=True)
 
-        # 1. Fetch boss config
-        async with bot.db_pool.acquire() as conn:
-            config = await conn.fetchrow("SELECT boss_hp, max_hp FROM boss_config WHERE guild_id = $1", self.guild_id)
-        if not config:
+        # 1. Boss state (kept in memory by boss_ledger)
+        boss = await boss_ledger.boss(self.guild_id)
+        if not boss:
             await interaction.followup.send("❌ Boss not configured.", ephemeral=True)
             return
-        if config['boss_hp'] <= 0:
+        if boss[0] <= 0:
             await interaction.followup.send("❌ The boss is already dead! Wait for the daily reset.", ephemeral=True)
             return
 
@@ -11142,12 +12407,9 @@ class BossAttackView(discord.ui.View):
         reset_date = self.get_reset_date()
 
         # 2. Check daily attempts
-        async with bot.db_pool.acquire() as conn:
-            attempt_row = await conn.fetchrow("SELECT attempts_used FROM boss_attempts WHERE user_id = $1 AND reset_date = $2", user_id, reset_date)
-            attempts_used = attempt_row['attempts_used'] if attempt_row else 0
-            if attempts_used >= 5:
-                await interaction.followup.send("❌ You have used all 5 attempts for today. Come back tomorrow!", ephemeral=True)
-                return
+        if await boss_ledger.attempts_used(user_id, reset_date) >= BOSS_DAILY_ATTEMPTS:
+            await interaction.followup.send("❌ You have used all 5 attempts for today. Come back tomorrow!", ephemeral=True)
+            return
 
         # 3. Get player stats (includes ATK, crit, and active buffs)
         a_stats = await get_player_stats(user_id)
@@ -11165,75 +12427,33 @@ class BossAttackView(discord.ui.View):
                 LIMIT 1
             """, user_id)
 
-        if not weapon:
-            # No weapon equipped – use a basic attack
-            skill_mult = 1.0
-            skill_name = "Basic Attack"
-            crit_mult = 1.0
-            crit_damage_bonus = 0
+        # No weapon equipped – basic attack; a weapon without a registered skill hits at x1
+        if weapon:
+            skill = skill_profile(weapon['name'], weapon['skill_level'])
         else:
-            wname = weapon['name']
-            if wname in SWORD_SKILLS:
-                skill_data = SWORD_SKILLS[wname]
-                level = weapon['skill_level']
-                skill_mult = skill_data['base'] + (level - 1) * skill_data['increment']
-                skill_name = skill_data['name']
-
-                # Skill‑specific modifiers (only those that affect damage/crit)
-                crit_mult = 1.0
-                crit_damage_bonus = 0
-                if skill_data['name'] == "Shadowbane":
-                    crit_mult = 2.0
-                    crit_damage_bonus = 50
-                # Bloodmoon Rend affects bleed, which we ignore for boss, so no change.
+            skill = skill_profile(None, fallback="Basic Attack")
+        skill_name = skill['name']
+
+        # 5-7. Skill damage with ±5% variance and crit (no defense; bleed/burn ignored for boss)
+        strike = resolve_strike(a_stats, skill, random)
+        damage = strike['damage']
+        is_crit = strike['is_crit']
+
+        # 8-10. Apply the hit; attempts, damage and HP are flushed together later.
+        # Re-read the boss first: an admin command may have reloaded it meanwhile.
+        boss = await boss_ledger.boss(self.guild_id)
+        result = boss_ledger.hit(self.guild_id, user_id, reset_date, damage)
+        if result is None:
+            if not boss or boss[0] <= 0:
+                await interaction.followup.send("❌ The boss is already dead! Wait for the daily reset.", ephemeral=True)
             else:
-                # Weapon has no registered skill – treat as basic
-                skill_mult = 1.0
-                skill_name = "Attack"
-                crit_mult = 1.0
-                crit_damage_bonus = 0
-
-        # 5. Effective crit stats for this attack
-        effective_crit_chance = a_stats['crit_chance'] * crit_mult
-        effective_crit_damage = a_stats['crit_damage'] + crit_damage_bonus
-
-        # 6. Base damage (no defense subtraction)
-        base_damage = a_stats['atk'] * skill_mult
-        # Add a small random variance (±5%) for fun – remove if you want deterministic damage
-        variance = random.uniform(0.95, 1.05)
-        damage = int(base_damage * variance)
-
-        # 7. Critical hit
-        is_crit = random.random() < effective_crit_chance / 100
-        if is_crit:
-            damage = int(damage * (1 + effective_crit_damage / 100))
-
-        # 8. Update boss HP (with row lock to prevent race conditions)
-        async with bot.db_pool.acquire() as conn:
-            async with conn.transaction():
-                current_hp = await conn.fetchval("SELECT boss_hp FROM boss_config WHERE guild_id = $1 FOR UPDATE", self.guild_id)
-                new_hp = max(0, current_hp - damage)
-                await conn.execute("UPDATE boss_config SET boss_hp = $1 WHERE guild_id = $2", new_hp, self.guild_id)
-
-        # 9. Update attempts
-        async with bot.db_pool.acquire() as conn:
-            if attempt_row:
-                await conn.execute("UPDATE boss_attempts SET attempts_used = attempts_used + 1 WHERE user_id = $1 AND reset_date = $2", user_id, reset_date)
-            else:
-                await conn.execute("INSERT INTO boss_attempts (user_id, reset_date, attempts_used) VALUES ($1, $2, 1)", user_id, reset_date)
-
-        # 10. Update total damage for leaderboard
-        async with bot.db_pool.acquire() as conn:
-            await conn.execute("""
-                INSERT INTO boss_damage (user_id, reset_date, total_damage)
-                VALUES ($1, $2, $3)
-                ON CONFLICT (user_id, reset_date) DO UPDATE
-                SET total_damage = boss_damage.total_damage + $3
-            """, user_id, reset_date, damage)
-       
+                await interaction.followup.send("❌ You have used all 5 attempts for today. Come back tomorrow!", ephemeral=True)
+            return
+        if result['killed']:
+            await boss_ledger.flush(self.guild_id)
 
         # 11. Update the public boss message with new HP
-        await self.update_boss_message(interaction, new_hp, config['max_hp'])
+        await self.update_boss_message(interaction, result['hp'], result['max_hp'])
 
         # 12. Stone drop chance (20% for 2-5 random stones)
         stone_dropped = False
@@ -11245,8 +12465,8 @@ class BossAttackView(discord.ui.View):
             ])
             stone_qty = random.randint(2, 15)
 
+            stone_id = await catalog.item_id(stone_name)
             async with bot.db_pool.acquire() as conn:
-                stone_id = await conn.fetchval("SELECT item_id FROM shop_items WHERE name = $1", stone_name)
                 if stone_id:
                     await conn.execute("""
                         INSERT INTO user_materials (user_id, material_id, quantity)
@@ -11258,19 +12478,9 @@ class BossAttackView(discord.ui.View):
 
         # 13. Send feedback to the user
         crit_text = " 💥 CRITICAL!" if is_crit else ""
-        message = f"✅ You used **{skill_name}** and dealt **{damage}** damage to the boss{crit_text}!\nAttempts left: {4 - attempts_used}."
+        message = f"✅ You used **{skill_name}** and dealt **{damage}** damage to the boss{crit_text}!\nAttempts left: {BOSS_DAILY_ATTEMPTS - result['attempts_used']}."
         if stone_dropped:
-            # Get the stone emoji from CUSTOM_EMOJIS using the stone name
-            # Determine stone emoji based on stone name
-            name_lower = stone_name.lower()
-            if 'sword' in name_lower:
-                stone_emoji = CUSTOM_EMOJIS.get('sword_enhancement_stone', '⚔️')
-            elif 'armor' in name_lower:
-                stone_emoji = CUSTOM_EMOJIS.get('armors_enhancement_stone', '🛡️')
-            elif 'accessories' in name_lower:
-                stone_emoji = CUSTOM_EMOJIS.get('acc_enhancement_stone', '💍')
-            else:
-                stone_emoji = '💎'
+            stone_emoji = get_material_emoji(stone_name, '💎')
 
             message += f"\nYou also found **{stone_qty}** {stone_emoji} **{stone_name}**!"
 
@@ -11278,15 +12488,8 @@ class BossAttackView(discord.ui.View):
 
     @discord.ui.button(label="🏆 Rankings", style=discord.ButtonStyle.secondary, custom_id="boss_rankings")
     async def rankings_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        reset_date = self.get_reset_date()
-        async with bot.db_pool.acquire() as conn:
-            rows = await conn.fetch("""
-                SELECT user_id, total_damage
-                FROM boss_damage
-                WHERE reset_date = $1
-                ORDER BY total_damage DESC
-                LIMIT 10
-            """, reset_date)
+        board = leaderboards.boss(self.get_reset_date())
+        rows = await board.top(10)
 
         if not rows:
             await interaction.response.send_message("No damage recorded yet. Attack the boss!", ephemeral=True)
@@ -11294,48 +12497,37 @@ class BossAttackView(discord.ui.View):
 
         embed = discord.Embed(title="🏆 Boss Damage Leaderboard", color=discord.Color.gold())
         lines = []
-        for idx, row in enumerate(rows, start=1):
-            user = bot.get_user(int(row['user_id']))
-            name = user.display_name if user else f"User {row['user_id'][:6]}"
-            lines.append(f"{idx}. **{name}** {row['total_damage']} Damage")
+        names = await name_resolver.names([user_id for user_id, _, _ in rows], interaction.guild)
+        for idx, (user_id, total_damage, _) in enumerate(rows, start=1):
+            lines.append(f"{idx}. **{names[int(user_id)]}** {total_damage} Damage")
 
         embed.description = "\n".join(lines)
+        mine = await board.rank(str(interaction.user.id))
+        if mine and mine[0] > len(rows):
+            embed.set_footer(text=f"Your rank: #{mine[0]} with {mine[1]} Damage")
         await interaction.response.send_message(embed=embed, ephemeral=True)
 
 
     async def update_boss_message(self, interaction: discord.Interaction, current_hp: int, max_hp: int):
-        """Edit the main boss embed with updated HP, with a per‑guild cooldown."""
-        now = time.time()
-        guild_id = self.guild_id
-        # Cooldown: at least 2 seconds between updates for this guild
-        if guild_id in self.__class__._last_update and now - self.__class__._last_update[guild_id] < 2:
-            return
-        self.__class__._last_update[guild_id] = now
-
-        async with bot.db_pool.acquire() as conn:
-            msg_id = await conn.fetchval("SELECT message_id FROM boss_config WHERE guild_id = $1", self.guild_id)
+        """Queue the main boss embed with updated HP; bursts of attacks collapse into one edit."""
+        msg_id = (await boss_ledger.display(self.guild_id)).get('message_id')
         if not msg_id:
             return
-        channel = interaction.channel
-        try:
-            msg = await channel.fetch_message(msg_id)
-            embed = await self.build_boss_embed(current_hp, max_hp)
-            await msg.edit(embed=embed)
-        except discord.NotFound:
-            # Message deleted – clear from DB
+
+        async def clear_message_id():
+            # Message deleted – clear from DB and the cached copy
             async with bot.db_pool.acquire() as conn2:
                 await conn2.execute("UPDATE boss_config SET message_id = NULL WHERE guild_id = $1", self.guild_id)
-        except discord.HTTPException as e:
-            if e.status == 429:
-                print(f"⚠️ Rate limit hit for guild {guild_id}, skipping this update.")
-            else:
-                print(f"❌ Failed to edit boss message: {e}")
+            boss_ledger.set_display(self.guild_id, message_id=None)
+
+        msg = edit_scheduler.message(interaction.channel, msg_id)
+        embed = await self.build_boss_embed(current_hp, max_hp)
+        edit_scheduler.submit(msg, on_missing=clear_message_id, embed=embed)
 
 
     async def build_boss_embed(self, current_hp: int, max_hp: int) -> discord.Embed:
-        """Fetch current boss image URL from DB and build embed."""
-        async with bot.db_pool.acquire() as conn:
-            image_url = await conn.fetchval("SELECT boss_image_url FROM boss_config WHERE guild_id = $1", self.guild_id)
+        """Build the boss embed with the current image URL (cached by boss_ledger)."""
+        image_url = (await boss_ledger.display(self.guild_id)).get('image_url')
         if not image_url:
             # fallback if none set
             image_url = "https://example.com/boss_image.png"
@@ -11387,6 +12579,7 @@ async def set_boss(ctx, channel: discord.TextChannel, hp: int = 100000):
             ON CONFLICT (guild_id) DO UPDATE
             SET channel_id = $2, boss_hp = $3, max_hp = $3
         """, ctx.guild.id, channel.id, hp)
+    await boss_ledger.forget(ctx.guild.id)
     await ctx.send(f"✅ Boss channel set to {channel.mention}. Now use `!!spawnboss` to create the attack message.")
 
 
@@ -11399,6 +12592,7 @@ async def boss_max_hp(ctx, new_max_hp: int):
         return await ctx.send("❌ HP must be positive.")
     async with bot.db_pool.acquire() as conn:
         await conn.execute("UPDATE boss_config SET max_hp = $1 WHERE guild_id = $2", new_max_hp, ctx.guild.id)
+    await boss_ledger.forget(ctx.guild.id)
     await ctx.send(f"✅ Boss max HP set to {new_max_hp}. It will respawn with this HP at the next reset.")
 
 
@@ -11407,6 +12601,7 @@ async def boss_max_hp(ctx, new_max_hp: int):
 @commands.has_permissions(administrator=True)
 async def spawn_boss(ctx):
     """Create the persistent boss attack message in the configured channel."""
+    await boss_ledger.flush(ctx.guild.id)
     async with bot.db_pool.acquire() as conn:
         config = await conn.fetchrow("SELECT channel_id, boss_hp, max_hp FROM boss_config WHERE guild_id = $1", ctx.guild.id)
     if not config:
@@ -11422,6 +12617,7 @@ async def spawn_boss(ctx):
     # Store the image in the database
     async with bot.db_pool.acquire() as conn2:
         await conn2.execute("UPDATE boss_config SET boss_image_url = $1 WHERE guild_id = $2", initial_image, ctx.guild.id)
+    boss_ledger.set_display(ctx.guild.id, image_url=initial_image)
 
     # Build embed with the new image
     temp_view = BossAttackView(ctx.guild.id)
@@ -11431,6 +12627,7 @@ async def spawn_boss(ctx):
 
     async with bot.db_pool.acquire() as conn3:
         await conn3.execute("UPDATE boss_config SET message_id = $1 WHERE guild_id = $2", msg.id, ctx.guild.id)
+    boss_ledger.set_display(ctx.guild.id, message_id=msg.id)
 
     await ctx.send(f"✅ Boss spawned in {channel.mention}!")
 
@@ -11446,6 +12643,8 @@ async def boss_reset_task():
 
 async def perform_boss_reset():
     """Compute rankings, send rewards, reset boss HP, pick new image, and clear daily data."""
+    # Rankings must include hits still waiting in memory
+    await boss_ledger.flush()
     async with bot.db_pool.acquire() as conn:
         rows = await conn.fetch("SELECT guild_id, channel_id, message_id, max_hp FROM boss_config")
     for row in rows:
@@ -11465,22 +12664,25 @@ async def perform_boss_reset():
             """, reset_date)
 
         if rankings:
-            for idx, r in enumerate(rankings, start=1):
-                user_id = r['user_id']
-                damage = r['total_damage']
+            payouts = []
+            for idx, r in enumerate(rankings[:10], start=1):
                 if idx == 1:
                     gems = 1000
                 elif idx == 2:
                     gems = 500
                 elif idx == 3:
                     gems = 250
-                elif idx <= 10:
-                    gems = 100
                 else:
-                    continue
-                await currency_system.add_gems(user_id, gems, f"Boss damage rank #{idx}")
+                    gems = 100
+                payouts.append((idx, r['user_id'], r['total_damage'], gems))
+            await currency_system.add_gems_bulk(
+                [(user_id, gems, f"Boss damage rank #{idx}") for idx, user_id, _, gems in payouts]
+            )
+
+            users = await name_resolver.resolve([user_id for _, user_id, _, _ in payouts])
+            for idx, user_id, damage, gems in payouts:
                 try:
-                    user = await bot.fetch_user(int(user_id))
+                    user = users.get(int(user_id))
                     if user:
                         embed = discord.Embed(title="🏆 Boss Rewards", color=discord.Color.gold())
                         embed.description = f"You ranked **#{idx}** with **{damage}** Damage!"
@@ -11492,7 +12694,7 @@ async def perform_boss_reset():
             # --- Award Boss Reaper title to top 1 (with 24h expiration) ---
             top_user_id = rankings[0]['user_id']
             async with bot.db_pool.acquire() as conn_title:
-                title_row = await conn_title.fetchrow("SELECT title_id, emoji FROM titles WHERE name = 'Boss Reaper'")
+                title_row = await catalog.by_name('titles', 'Boss Reaper')
                 if title_row:
                     title_id = title_row['title_id']
                     emoji = title_row['emoji'] or '🏷️'
@@ -11504,7 +12706,7 @@ async def perform_boss_reset():
                         SET expires_at = $3
                     """, top_user_id, title_id, expires_at)
                     try:
-                        user = await bot.fetch_user(int(top_user_id))
+                        user = users.get(int(top_user_id))
                         if user:
                             await user.send(
                                 f"🏆 Congratulations! You were the top damage dealer in the Server Boss "
@@ -11526,6 +12728,9 @@ async def perform_boss_reset():
             # Clear old attempts/damage
             await conn3.execute("DELETE FROM boss_attempts WHERE reset_date = $1", reset_date)
             await conn3.execute("DELETE FROM boss_damage WHERE reset_date = $1", reset_date)
+        await boss_ledger.forget(guild_id)
+        leaderboards.drop_boss(reset_date)
+        boss_ledger.prune_attempts(reset_date + timedelta(days=1))
 
         # --- Update the boss message if it exists ---
         if channel_id and message_id:
@@ -11534,10 +12739,10 @@ async def perform_boss_reset():
                 channel = guild.get_channel(channel_id)
                 if channel:
                     try:
-                        msg = await channel.fetch_message(message_id)
+                        msg = edit_scheduler.message(channel, message_id)
                         temp_view = BossAttackView(guild_id)
                         embed = await temp_view.build_boss_embed(max_hp, max_hp)
-                        await msg.edit(embed=embed)
+                        await edit_scheduler.submit(msg, embed=embed)
                     except Exception as e:
                         print(f"Failed to update boss message: {e}")
 
@@ -11560,6 +12765,20 @@ async def perform_boss_reset():
 
 # ========== ARENA SYSTEM  ==========
 
+# Match results return the new totals so the arena leaderboard updates in place
+ARENA_WIN_SQL = """
+    UPDATE arena_stats
+    SET points = points + $1, wins = wins + 1, last_match = NOW()
+    WHERE user_id = $2
+    RETURNING points, wins, losses
+"""
+ARENA_LOSS_SQL = """
+    UPDATE arena_stats
+    SET points = GREATEST(points - $1, 0), losses = losses + 1, last_match = NOW()
+    WHERE user_id = $2
+    RETURNING points, wins, losses
+"""
+
 
 class ArenaMainView(discord.ui.View):
     def __init__(self):
@@ -11613,9 +12832,10 @@ class ArenaDuelView(AttackView):
             await asyncio.sleep(0.5)
 
             try:
-                async with bot.db_pool.acquire() as conn:
-                    a_hp = await conn.fetchval("SELECT hp FROM player_stats WHERE user_id = $1", self.attacker_id)
-                    d_hp = await conn.fetchval("SELECT hp FROM player_stats WHERE user_id = $1", self.defender_id)
+                # The turn's checkpoint already refreshed both players' HP
+                session = await self.get_session()
+                a_hp = session.vitals[self.attacker_id]['hp']
+                d_hp = session.vitals[self.defender_id]['hp']
                 print(f"[ARENA] Post‑attack HP: Attacker={a_hp}, Defender={d_hp}")
             except Exception as e:
                 print(f"[ARENA] ERROR fetching HP: {e}")
@@ -11640,16 +12860,10 @@ class ArenaDuelView(AttackView):
 
         try:
             async with bot.db_pool.acquire() as conn:
-                await conn.execute("""
-                    UPDATE arena_stats
-                    SET points = points + $1, wins = wins + 1, last_match = NOW()
-                    WHERE user_id = $2
-                """, self.points_stake, winner_id)
-                await conn.execute("""
-                    UPDATE arena_stats
-                    SET points = GREATEST(points - $1, 0), losses = losses + 1, last_match = NOW()
-                    WHERE user_id = $2
-                """, self.points_stake, loser_id)
+                for sql, uid in ((ARENA_WIN_SQL, winner_id), (ARENA_LOSS_SQL, loser_id)):
+                    row = await conn.fetchrow(sql, self.points_stake, uid)
+                    if row:
+                        leaderboards.arena.set(uid, row['points'], wins=row['wins'], losses=row['losses'])
                 print("[ARENA] Arena stats updated")
 
                 for uid in (winner_id, loser_id):
@@ -11661,8 +12875,8 @@ class ArenaDuelView(AttackView):
                     """, stats['max_hp'], stats['max_energy'], uid)
                     print(f"[ARENA] Respawned {uid} to {stats['max_hp']} HP")
 
-            winner = bot.get_user(int(winner_id)) or await bot.fetch_user(int(winner_id))
-            loser = bot.get_user(int(loser_id)) or await bot.fetch_user(int(loser_id))
+            users = await name_resolver.resolve([winner_id, loser_id])
+            winner, loser = users[int(winner_id)], users[int(loser_id)]
             global_channel = discord.utils.get(bot.get_all_channels(), name="🌍global-chat")
             if global_channel:
                 await global_channel.send(
@@ -11699,10 +12913,13 @@ async def handle_arena_start(interaction: discord.Interaction):
     user_id = str(interaction.user.id)
     async with bot.db_pool.acquire() as conn:
         # Ensure player has stats entry
-        await conn.execute("""
+        created = await conn.fetchrow("""
             INSERT INTO arena_stats (user_id) VALUES ($1)
             ON CONFLICT (user_id) DO NOTHING
+            RETURNING points, wins, losses
         """, user_id)
+        if created:
+            leaderboards.arena.set(user_id, created['points'], wins=created['wins'], losses=created['losses'])
 
         # Check if already in queue
         in_queue = await conn.fetchval("SELECT 1 FROM arena_queue WHERE user_id = $1", user_id)
@@ -11767,8 +12984,8 @@ async def create_arena_thread(player1_id: str, player2_id: str):
         print("❌ Arena channel not found.")
         return
 
-    player1 = bot.get_user(int(player1_id)) or await bot.fetch_user(int(player1_id))
-    player2 = bot.get_user(int(player2_id)) or await bot.fetch_user(int(player2_id))
+    users = await name_resolver.resolve([player1_id, player2_id])
+    player1, player2 = users[int(player1_id)], users[int(player2_id)]
     if not player1 or not player2:
         return
 
@@ -11820,24 +13037,20 @@ async def create_arena_thread(player1_id: str, player2_id: str):
 
 
 async def show_arena_rankings(interaction: discord.Interaction):
-    async with bot.db_pool.acquire() as conn:
-        rows = await conn.fetch("""
-            SELECT user_id, points, wins, losses
-            FROM arena_stats
-            ORDER BY points DESC
-            LIMIT 10
-        """)
+    rows = await leaderboards.arena.top(10)
 
     embed = discord.Embed(title="🏆 Arena Leaderboard", color=discord.Color.gold())
     if not rows:
         embed.description = "No arena stats yet."
     else:
         lines = []
-        for idx, row in enumerate(rows, 1):
-            user = bot.get_user(int(row['user_id'])) or await bot.fetch_user(int(row['user_id']))
-            name = user.display_name if user else f"User {row['user_id'][:6]}"
-            lines.append(f"{idx}. **{name}** – {row['points']} pts | W:{row['wins']} L:{row['losses']}")
+        names = await name_resolver.names([user_id for user_id, _, _ in rows], interaction.guild)
+        for idx, (user_id, points, info) in enumerate(rows, 1):
+            lines.append(f"{idx}. **{names[int(user_id)]}** – {points} pts | W:{info.get('wins', 0)} L:{info.get('losses', 0)}")
         embed.description = "\n".join(lines)
+        mine = await leaderboards.arena.rank(str(interaction.user.id))
+        if mine and mine[0] > len(rows):
+            embed.set_footer(text=f"Your rank: #{mine[0]} with {mine[1]} pts")
 
     await interaction.response.send_message(embed=embed, ephemeral=True)
 
@@ -11891,6 +13104,7 @@ async def perform_arena_reset(reset_time_utc: datetime):
         """)
 
         # Award gems and titles
+        payouts = []
         for idx, row in enumerate(top, 1):
             gems = 0
             title_name = None
@@ -11907,10 +13121,10 @@ async def perform_arena_reset(reset_time_utc: datetime):
                 gems = 300
 
             if gems > 0:
-                await currency_system.add_gems(row['user_id'], gems, f"Arena weekly rank #{idx}")
+                payouts.append((row['user_id'], gems, f"Arena weekly rank #{idx}"))
 
             if title_name:
-                title_id = await conn.fetchval("SELECT title_id FROM titles WHERE name = $1", title_name)
+                title_id = await catalog.title_id(title_name)
                 if title_id:
                     expires_at = reset_time_utc + timedelta(days=7)
                     await conn.execute("""
@@ -11919,9 +13133,13 @@ async def perform_arena_reset(reset_time_utc: datetime):
                         ON CONFLICT (user_id, title_id) DO UPDATE
                         SET expires_at = EXCLUDED.expires_at, equipped = FALSE
                     """, row['user_id'], title_id, expires_at)
+                    stat_cache.invalidate(row['user_id'])
+
+        await currency_system.add_gems_bulk(payouts)
 
         # Reset all points to 1000
         await conn.execute("UPDATE arena_stats SET points = 1000")
+        leaderboards.arena.invalidate()
         # Update last reset time
         await conn.execute("UPDATE arena_reset_log SET last_reset = $1 WHERE id = 1", reset_time_utc)
 
@@ -12154,44 +13372,12 @@ class BotDuelView(AttackView):
                 LIMIT 1
             """, self.player_id)
 
-        # Skill multipliers and modifiers
-        skill_name = "Attack"
-        skill_mult = 1.0
-        crit_mult = 1.0
-        crit_damage_bonus = 0
-        bleed_chance_bonus = 0
-        bleed_damage_mult = 1.0
-        burn_chance = 0
-        burn_damage_percent = 0
-
-        if weapon and weapon['name'] in SWORD_SKILLS:
-            skill_data = SWORD_SKILLS[weapon['name']]
-            level = weapon['skill_level']
-            skill_mult = skill_data['base'] + (level - 1) * skill_data['increment']
-            skill_name = skill_data['name']
-
-            if skill_data['name'] == "Shadowbane":
-                crit_mult = 2.0
-                crit_damage_bonus = 50
-            elif skill_data['name'] == "Bloodmoon Rend":
-                bleed_chance_bonus = 15
-                bleed_damage_mult = 1.25
-            elif skill_data['name'] == "Dawn's Wrath":
-                burn_chance = 25
-                burn_damage_percent = 20
-
-        effective_crit_chance = p_stats['crit_chance'] * crit_mult
-        effective_crit_damage = p_stats['crit_damage'] + crit_damage_bonus
-
-        base_damage = p_stats['atk'] * skill_mult
-        variance = random.uniform(0.95, 1.05)
-        damage = int(base_damage * variance)
-
-        is_crit = random.random() < effective_crit_chance / 100
-        if is_crit:
-            damage = int(damage * (1 + effective_crit_damage / 100))
-
-        final_damage = max(1, damage - self.bot_data['def'] // 2)
+        skill = skill_profile(weapon['name'], weapon['skill_level']) if weapon else skill_profile(None)
+        skill_name = skill['name']
+
+        strike = resolve_strike(p_stats, skill, random, defense=self.bot_data['def'])
+        final_damage = strike['damage']
+        is_crit = strike['is_crit']
 
         self.bot_hp -= final_damage
         if self.bot_hp < 0:
@@ -12204,24 +13390,19 @@ class BotDuelView(AttackView):
         crit_text = " 💥 CRITICAL!" if is_crit else ""
         action_msg = f"You use **{skill_name}** and dealt **{final_damage}** damage to **{self.bot_data['name']}**{crit_text}!"
 
-        # Bleed chance
+        # Bleed / burn chance
+        bleed_value, burn_value = roll_damage_over_time(p_stats, skill, final_damage, random)
         bleed_msg = ""
-        bleed_chance = p_stats['bleed_chance'] + bleed_chance_bonus
-        if random.random() < bleed_chance / 100:
-            bleed_value = int(p_stats['atk'] * (p_stats['bleed_damage'] * bleed_damage_mult / 100)) + p_stats.get('bleed_flat_bonus', 0)
-            if bleed_value > 0:
-                self.bot_bleed_ticks = 3
-                self.bot_bleed_value = bleed_value
-                bleed_msg = f"\n{self.bot_data['name']} is bleeding, taking {bleed_value} damage per second for 3 seconds!"
-
-        # Burn chance
+        if bleed_value > 0:
+            self.bot_bleed_ticks = 3
+            self.bot_bleed_value = bleed_value
+            bleed_msg = f"\n{self.bot_data['name']} is bleeding, taking {bleed_value} damage per second for 3 seconds!"
+
         burn_msg = ""
-        if burn_chance > 0 and random.random() < burn_chance / 100:
-            burn_value = int(final_damage * burn_damage_percent / 100) + p_stats.get('burn_flat_bonus', 0)
-            if burn_value > 0:
-                self.bot_burn_ticks = 3
-                self.bot_burn_value = burn_value
-                burn_msg = f"\n{self.bot_data['name']} is burning, taking {burn_value} damage per second for 3 seconds!"
+        if burn_value > 0:
+            self.bot_burn_ticks = 3
+            self.bot_burn_value = burn_value
+            burn_msg = f"\n{self.bot_data['name']} is burning, taking {burn_value} damage per second for 3 seconds!"
 
         if bleed_msg or burn_msg:
             action_msg += bleed_msg + burn_msg
@@ -12239,37 +13420,26 @@ class BotDuelView(AttackView):
             await self.end_bot_match(interaction, winner="0")
             return
 
-        # Dodge check
-        player_dodge = p_stats.get('dodge', 0)
-        dodged = random.random() < player_dodge / 100
-        if dodged:
+        # Hellfire Eruption (dodge, skill roll, variance, crit, armour, reflect)
+        out = resolve_monster_attack(self.bot_data, p_stats, random)
+        if out['dodged']:
             action_msg = f"You dodged {self.bot_data['name']}'s attack!"
             await self.update_embed(action_msg)
             return
 
-        # Hellfire Eruption
-        skill_mult = random.uniform(3.0, 6.0)
-        base_damage = self.bot_data['atk'] * skill_mult
-        variance = random.uniform(0.95, 1.05)
-        damage = int(base_damage * variance)
-        is_crit = random.random() < self.bot_data['crit_chance'] / 100
-        if is_crit:
-            damage = int(damage * (1 + self.bot_data['crit_damage'] / 100))
-
-        final_damage = max(1, damage - p_stats['def'] // 2)
+        final_damage = out['damage']
+        is_crit = out['is_crit']
 
         # Reflect damage
-        reflect_damage = 0
-        if p_stats.get('reflect', 0) > 0:
-            reflect_damage = int(final_damage * p_stats['reflect'] / 100)
-            if reflect_damage > 0:
-                self.bot_hp -= reflect_damage
-                if self.bot_hp < 0:
-                    self.bot_hp = 0
-                await self.update_embed(f"You reflected **{reflect_damage}** damage back to {self.bot_data['name']}!")
-                if self.bot_hp <= 0:
-                    await self.end_bot_match(interaction, winner=self.player_id)
-                    return
+        reflect_damage = out['reflect']
+        if reflect_damage > 0:
+            self.bot_hp -= reflect_damage
+            if self.bot_hp < 0:
+                self.bot_hp = 0
+            await self.update_embed(f"You reflected **{reflect_damage}** damage back to {self.bot_data['name']}!")
+            if self.bot_hp <= 0:
+                await self.end_bot_match(interaction, winner=self.player_id)
+                return
 
         # Apply damage to player
         new_hp = max(0, p_stats['hp'] - final_damage)
@@ -12300,26 +13470,22 @@ class BotDuelView(AttackView):
                 INSERT INTO active_effects (target_id, effect_type, value, remaining_ticks)
                 VALUES ($1, 'burn', $2, 4)
             """, self.player_id, burn_value)
+        effect_scheduler.schedule(4)
 
     async def end_bot_match(self, interaction: discord.Interaction, winner: str):
         self.duel_ended = True
         async with bot.db_pool.acquire() as conn:
+            row = await conn.fetchrow(
+                ARENA_WIN_SQL if winner == self.player_id else ARENA_LOSS_SQL, self.points_stake, self.player_id
+            )
+            if row:
+                leaderboards.arena.set(self.player_id, row['points'], wins=row['wins'], losses=row['losses'])
             if winner == self.player_id:
-                await conn.execute("""
-                    UPDATE arena_stats
-                    SET points = points + $1, wins = wins + 1, last_match = NOW()
-                    WHERE user_id = $2
-                """, self.points_stake, self.player_id)
                 await interaction.followup.send(f"You defeated the Bot and gained **{self.points_stake}** points!", ephemeral=True)
                 global_channel = discord.utils.get(bot.get_all_channels(), name="🌍global-chat")
                 if global_channel:
                     await global_channel.send(f"**Arena Result** – {interaction.user.mention} defeated the {self.bot_data['name']} and gained **{self.points_stake}** points!")
             else:
-                await conn.execute("""
-                    UPDATE arena_stats
-                    SET points = GREATEST(points - $1, 0), losses = losses + 1, last_match = NOW()
-                    WHERE user_id = $2
-                """, self.points_stake, self.player_id)
                 await interaction.followup.send(f"You have been defeated by the Bot and lost **{self.points_stake}** points.", ephemeral=True)
                 global_channel = discord.utils.get(bot.get_all_channels(), name="🌍global-chat")
                 if global_channel:
@@ -12354,7 +13520,7 @@ async def create_bot_thread(player_id: str):
         print("❌ Arena channel not found.")
         return
 
-    player = bot.get_user(int(player_id)) or await bot.fetch_user(int(player_id))
+    player = await name_resolver.user(player_id)
     if not player:
         return
 
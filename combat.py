@@ -0,0 +1,300 @@
+# combat.py
+"""Side-effect-free combat math shared by every fight in bot.py.
+
+Stat records are the dicts returned by get_player_stats (atk, def, hp,
+crit_chance, crit_damage, bleed_chance, bleed_damage, dodge, reflect, ...).
+Every roll goes through the `rng` argument (the random module or a
+random.Random), so outcomes can be replayed with a seeded generator.
+Nothing here touches Discord or the database, so it can be imported on its
+own for balance work (see combat_bench.py).
+"""
+import random
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # only the batched simulator needs it
+    np = None
+
+SWORD_SKILLS = {
+    "Zenith Sword": {
+        "name": "Zenith Slash",
+        "desc": "A radiant slash that channels celestial energy to empower your next strikes.",
+        "effect": "20% chance to increase your ATK by 50% for 2 turns after attacking.",
+        "base": 3.0,
+        "increment": 0.25,
+        "max_level": 20
+    },
+    "Abyssal Blade": {
+        "name": "Abyssal Strike",
+        "desc": "A shadowy thrust that weakens armor and leaves a lingering darkness.",
+        "effect": "30% chance to reduce target's DEF by 15% for 3 turns.",
+        "base": 3.0,
+        "increment": 0.28,
+        "max_level": 20
+    },
+    "Dawn Breaker": {
+        "name": "Dawn's Wrath",
+        "desc": "A fiery overhead smash that ignites the target, dealing burn damage over time.",
+        "effect": "25% chance to burn target for 20% of damage dealt over 3 turns.",
+        "base": 3.0,
+        "increment": 0.22,
+        "max_level": 20
+    },
+    "Bloodmoon Edge": {
+        "name": "Bloodmoon Rend",
+        "desc": "A ferocious rending slash that causes deep, bleeding wounds.",
+        "effect": "Increases bleed chance by 15% and bleed damage by 25% for this attack.",
+        "base": 3.0,
+        "increment": 0.30,
+        "max_level": 20
+    },
+    "Shadowbane": {
+        "name": "Shadowbane",
+        "desc": "A precision strike that targets vital points, greatly increasing critical potential.",
+        "effect": "Doubles crit chance and adds 50% crit damage for this attack.",
+        "base": 3.0,
+        "increment": 0.26,
+        "max_level": 20
+    }
+}
+
+# Per-skill modifiers on top of the level multiplier (keyed by skill name)
+SKILL_MODIFIERS = {
+    "Shadowbane": {"crit_mult": 2.0, "crit_damage_bonus": 50},
+    "Bloodmoon Rend": {"bleed_chance_bonus": 15, "bleed_damage_mult": 1.25},
+    "Dawn's Wrath": {"burn_chance": 25, "burn_damage_percent": 20},
+}
+
+# Skills that may leave a buff: (chance, who gets it, effect_type, value, turns)
+SKILL_BUFFS = {
+    "Zenith Slash": (0.20, "self", "atk_mult", 1.5, 2),
+    "Abyssal Strike": (0.30, "target", "def_mult", 0.85, 3),
+}
+
+DOT_TICKS = 3
+MONSTER_SKILL_RANGE = (3.0, 6.0)   # Hellfire Eruption multiplier roll
+STRIKE_VARIANCE = (0.95, 1.05)
+
+
+@lru_cache(maxsize=None)
+def skill_profile(weapon_name: Optional[str], skill_level: int = 1, fallback: str = "Attack") -> dict:
+    """Multiplier and modifiers for an equipped weapon; unknown weapons hit at x1.
+
+    The returned dict is shared between callers and must not be mutated.
+    """
+    profile = {
+        "name": fallback, "mult": 1.0, "has_skill": False,
+        "crit_mult": 1.0, "crit_damage_bonus": 0,
+        "bleed_chance_bonus": 0, "bleed_damage_mult": 1.0,
+        "burn_chance": 0, "burn_damage_percent": 0,
+        "buff": None,
+    }
+    skill = SWORD_SKILLS.get(weapon_name)
+    if skill:
+        profile.update(
+            name=skill["name"],
+            mult=skill["base"] + (skill_level - 1) * skill["increment"],
+            has_skill=True,
+            buff=SKILL_BUFFS.get(skill["name"]),
+        )
+        profile.update(SKILL_MODIFIERS.get(skill["name"], {}))
+    return profile
+
+
+def roll_crit(damage: int, crit_chance: float, crit_damage: float, rng=random) -> Tuple[int, bool]:
+    is_crit = rng.random() < crit_chance / 100
+    if is_crit:
+        damage = int(damage * (1 + crit_damage / 100))
+    return damage, is_crit
+
+
+def roll_damage_over_time(attacker: dict, skill: dict, damage: int, rng=random) -> Tuple[int, int]:
+    """(bleed_tick, burn_tick) applied by a landed hit; 0 means no effect."""
+    bleed_tick = 0
+    if rng.random() < (attacker["bleed_chance"] + skill["bleed_chance_bonus"]) / 100:
+        bleed_tick = max(0, int(attacker["atk"] * (attacker["bleed_damage"] * skill["bleed_damage_mult"] / 100))
+                         + attacker.get("bleed_flat_bonus", 0))
+    burn_tick = 0
+    if skill["burn_chance"] > 0 and rng.random() < skill["burn_chance"] / 100:
+        burn_tick = max(0, int(damage * skill["burn_damage_percent"] / 100) + attacker.get("burn_flat_bonus", 0))
+    return bleed_tick, burn_tick
+
+
+def resolve_duel_attack(attacker: dict, defender: dict, skill: dict, rng=random) -> dict:
+    """One PvP swing: dodge, armour, crit, reflect, bleed/burn and skill buffs.
+
+    `buff` is None or (target, effect_type, value, turns) with target
+    'self' (the attacker) or 'target' (the defender).
+    """
+    outcome = {"dodged": False, "damage": 0, "is_crit": False, "reflect": 0,
+               "bleed_tick": 0, "burn_tick": 0, "buff": None}
+    if rng.random() < defender["dodge"] / 100:
+        outcome["dodged"] = True
+        return outcome
+
+    damage = int(max(attacker["atk"] * skill["mult"] - defender["def"] * 0.5, attacker["atk"] * 0.2))
+    damage, is_crit = roll_crit(
+        damage,
+        attacker["crit_chance"] * skill["crit_mult"],
+        attacker["crit_damage"] + skill["crit_damage_bonus"],
+        rng,
+    )
+    outcome.update(damage=damage, is_crit=is_crit)
+    if defender["reflect"] > 0:
+        outcome["reflect"] = int(damage * defender["reflect"] / 100)
+    outcome["bleed_tick"], outcome["burn_tick"] = roll_damage_over_time(attacker, skill, damage, rng)
+
+    buff = skill["buff"]
+    if buff and rng.random() < buff[0]:
+        outcome["buff"] = buff[1:]
+    return outcome
+
+
+def resolve_strike(attacker: dict, skill: dict, rng=random, defense: Optional[int] = None) -> dict:
+    """Skill hit with ±5% variance, used against the server boss and arena bots.
+
+    With `defense` the hit loses half of it (minimum 1 damage).
+    """
+    damage = int(attacker["atk"] * skill["mult"] * rng.uniform(*STRIKE_VARIANCE))
+    damage, is_crit = roll_crit(
+        damage,
+        attacker["crit_chance"] * skill["crit_mult"],
+        attacker["crit_damage"] + skill["crit_damage_bonus"],
+        rng,
+    )
+    if defense is not None:
+        damage = max(1, damage - defense // 2)
+    return {"damage": damage, "is_crit": is_crit}
+
+
+def resolve_monster_attack(monster: dict, defender: dict, rng=random) -> dict:
+    """An arena bot's Hellfire Eruption against a player."""
+    outcome = {"dodged": False, "damage": 0, "is_crit": False, "reflect": 0}
+    if rng.random() < defender.get("dodge", 0) / 100:
+        outcome["dodged"] = True
+        return outcome
+    mult = rng.uniform(*MONSTER_SKILL_RANGE)
+    damage = int(monster["atk"] * mult * rng.uniform(*STRIKE_VARIANCE))
+    damage, is_crit = roll_crit(damage, monster["crit_chance"], monster["crit_damage"], rng)
+    damage = max(1, damage - defender["def"] // 2)
+    outcome.update(damage=damage, is_crit=is_crit)
+    if defender.get("reflect", 0) > 0:
+        outcome["reflect"] = int(damage * defender["reflect"] / 100)
+    return outcome
+
+
+# ========== OFFLINE SIMULATION ==========
+# Duel model used for balance work: players alternate swings (a first),
+# bleed/burn land all DOT_TICKS before the next swing, energy is ignored.
+# Buffs tick once on the turn they are applied, as in the live duel.
+
+def _buffed(stats: dict, atk_turns: int, def_turns: int) -> dict:
+    if not atk_turns and not def_turns:
+        return stats
+    stats = dict(stats)
+    if atk_turns:
+        stats["atk"] = int(stats["atk"] * SKILL_BUFFS["Zenith Slash"][3])
+    if def_turns:
+        stats["def"] = int(stats["def"] * SKILL_BUFFS["Abyssal Strike"][3])
+    return stats
+
+
+def simulate_duel(a: dict, d: dict, skill_a: dict, skill_d: dict, rng=random, max_turns: int = 100) -> Tuple[int, int]:
+    """Play one duel with the scalar kernel; returns (winner, turns), winner 0/1 or -1 for a draw."""
+    stats, skills = (a, d), (skill_a, skill_d)
+    hp = [a["hp"], d["hp"]]
+    buffs = [{"atk_mult": 0, "def_mult": 0}, {"atk_mult": 0, "def_mult": 0}]
+    for turn in range(max_turns):
+        i, j = turn % 2, 1 - turn % 2
+        attacker = _buffed(stats[i], buffs[i]["atk_mult"], buffs[i]["def_mult"])
+        defender = _buffed(stats[j], buffs[j]["atk_mult"], buffs[j]["def_mult"])
+        out = resolve_duel_attack(attacker, defender, skills[i], rng)
+        hp[j] -= out["damage"] + DOT_TICKS * (out["bleed_tick"] + out["burn_tick"])
+        hp[i] -= out["reflect"]
+
+        for side in buffs:
+            for effect in side:
+                side[effect] = max(0, side[effect] - 1)
+        if out["buff"]:
+            target, effect_type, _, turns = out["buff"]
+            side = buffs[i] if target == "self" else buffs[j]
+            side[effect_type] = max(side[effect_type], turns - 1)
+
+        if hp[j] <= 0:
+            return i, turn + 1
+        if hp[i] <= 0:
+            return j, turn + 1
+    return -1, max_turns
+
+
+def simulate_duels_batch(a: dict, d: dict, skill_a: dict, skill_d: dict, duels: int,
+                         max_turns: int = 100, seed: Optional[int] = None) -> Dict[str, float]:
+    """Vectorised simulate_duel over `duels` independent fights (needs numpy).
+
+    Returns win rates for each side, the draw rate and the mean duel length.
+    """
+    if np is None:
+        raise RuntimeError("simulate_duels_batch needs numpy (pip install numpy)")
+    gen = np.random.default_rng(seed)
+    stats, skills = (a, d), (skill_a, skill_d)
+    zenith = SKILL_BUFFS["Zenith Slash"]
+    abyssal = SKILL_BUFFS["Abyssal Strike"]
+
+    hp = np.array([[a["hp"]], [d["hp"]]], dtype=np.int64).repeat(duels, axis=1)
+    atk_turns = np.zeros((2, duels), dtype=np.int8)
+    def_turns = np.zeros((2, duels), dtype=np.int8)
+    winner = np.full(duels, -1, dtype=np.int8)
+    length = np.full(duels, max_turns, dtype=np.int32)
+    alive = np.ones(duels, dtype=bool)
+
+    for turn in range(max_turns):
+        if not alive.any():
+            break
+        i, j = turn % 2, 1 - turn % 2
+        A, D, S = stats[i], stats[j], skills[i]
+
+        atk = np.where(atk_turns[i] > 0, int(A["atk"] * zenith[3]), A["atk"])
+        dfn = np.where(def_turns[j] > 0, int(D["def"] * abyssal[3]), D["def"])
+        hit = gen.random(duels) >= D["dodge"] / 100
+
+        damage = np.floor(np.maximum(atk * S["mult"] - dfn * 0.5, atk * 0.2))
+        crit = gen.random(duels) < A["crit_chance"] * S["crit_mult"] / 100
+        damage = np.where(crit, np.floor(damage * (1 + (A["crit_damage"] + S["crit_damage_bonus"]) / 100)), damage)
+        damage = np.where(hit, damage, 0).astype(np.int64)
+
+        reflect = np.floor(damage * D["reflect"] / 100).astype(np.int64) if D["reflect"] > 0 else 0
+
+        bleed_roll = gen.random(duels) < (A["bleed_chance"] + S["bleed_chance_bonus"]) / 100
+        bleed = np.floor(atk * (A["bleed_damage"] * S["bleed_damage_mult"] / 100)) + A.get("bleed_flat_bonus", 0)
+        dot = np.where(hit & bleed_roll, np.maximum(bleed, 0), 0)
+        if S["burn_chance"] > 0:
+            burn_roll = gen.random(duels) < S["burn_chance"] / 100
+            burn = np.floor(damage * S["burn_damage_percent"] / 100) + A.get("burn_flat_bonus", 0)
+            dot = dot + np.where(hit & burn_roll, np.maximum(burn, 0), 0)
+
+        hp[j] -= np.where(alive, damage + DOT_TICKS * dot.astype(np.int64), 0)
+        hp[i] -= np.where(alive, reflect, 0)
+
+        np.maximum(atk_turns - 1, 0, out=atk_turns)
+        np.maximum(def_turns - 1, 0, out=def_turns)
+        if S["buff"]:
+            buffed = alive & hit & (gen.random(duels) < S["buff"][0])
+            side = i if S["buff"][1] == "self" else j
+            counters = atk_turns if S["buff"][2] == "atk_mult" else def_turns
+            counters[side] = np.where(buffed, np.maximum(counters[side], S["buff"][4] - 1), counters[side])
+
+        j_dead = alive & (hp[j] <= 0)
+        i_dead = alive & ~j_dead & (hp[i] <= 0)
+        winner[j_dead] = i
+        winner[i_dead] = j
+        length[j_dead | i_dead] = turn + 1
+        alive &= ~(j_dead | i_dead)
+
+    return {
+        "a_win_rate": float(np.mean(winner == 0)),
+        "d_win_rate": float(np.mean(winner == 1)),
+        "draw_rate": float(np.mean(winner == -1)),
+        "mean_turns": float(length.mean()),
+    }
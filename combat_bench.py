@@ -0,0 +1,97 @@
+# combat_bench.py
+"""Offline combat benchmarks and skill balance table.
+
+    python combat_bench.py                 # kernel timings + 1,000,000-duel matchup table
+    python combat_bench.py --duels 100000 --level 10
+
+Runs without Discord or the database. The batched simulator and the
+matchup table need numpy; everything else uses only the stdlib.
+"""
+import argparse
+import random
+import time
+
+import combat
+from combat import (
+    SWORD_SKILLS, skill_profile, resolve_duel_attack, resolve_strike,
+    simulate_duel, simulate_duels_batch,
+)
+
+# A mid-game player: full armour set, a couple of accessories, a pet
+SAMPLE_STATS = {
+    "atk": 180, "def": 120, "hp": 2400, "max_hp": 2400,
+    "crit_chance": 15, "crit_damage": 60,
+    "bleed_chance": 10, "bleed_damage": 30,
+    "dodge": 8, "reflect": 5,
+    "bleed_flat_bonus": 0, "burn_flat_bonus": 0,
+}
+
+
+def bench(label: str, fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<38} {repeat / elapsed:>14,.0f} /s")
+    return elapsed
+
+
+def run_kernel_benchmarks(level: int, repeat: int):
+    rng = random.Random(0)
+    skill = skill_profile("Shadowbane", level)
+    print("== scalar kernel ==")
+    bench("resolve_duel_attack", lambda: resolve_duel_attack(SAMPLE_STATS, SAMPLE_STATS, skill, rng), repeat)
+    bench("resolve_strike (boss)", lambda: resolve_strike(SAMPLE_STATS, skill, rng), repeat)
+    bench("simulate_duel (scalar)", lambda: simulate_duel(SAMPLE_STATS, SAMPLE_STATS, skill, skill, rng), max(repeat // 50, 1))
+
+
+def run_batched(level: int, duels: int, turns: int, seed: int):
+    if combat.np is None:
+        print("\nnumpy is not installed; skipping the batched simulator and matchup table.")
+        return
+
+    names = list(SWORD_SKILLS)
+    profiles = {name: skill_profile(name, level) for name in names}
+
+    print(f"\n== batched simulator ({duels:,} duels) ==")
+    start = time.perf_counter()
+    simulate_duels_batch(SAMPLE_STATS, SAMPLE_STATS, profiles[names[0]], profiles[names[1]], duels, turns, seed)
+    elapsed = time.perf_counter() - start
+    print(f"{'simulate_duels_batch':<38} {duels / elapsed:>14,.0f} duels/s")
+
+    # Cross-check the batch against the scalar model on a small sample
+    rng = random.Random(seed)
+    sample = 5000
+    wins = sum(
+        simulate_duel(SAMPLE_STATS, SAMPLE_STATS, profiles[names[0]], profiles[names[1]], rng, turns)[0] == 0
+        for _ in range(sample)
+    )
+    batch = simulate_duels_batch(SAMPLE_STATS, SAMPLE_STATS, profiles[names[0]], profiles[names[1]], sample * 20, turns, seed)
+    print(f"{'scalar vs batch win rate':<38} {wins / sample:>7.3f} vs {batch['a_win_rate']:.3f}")
+
+    print(f"\n== first-mover win rate at skill level {level} (rows attack first) ==")
+    short = [SWORD_SKILLS[n]["name"][:14] for n in names]
+    print(" " * 16 + "".join(f"{s:>16}" for s in short))
+    for row, row_name in zip(names, short):
+        cells = []
+        for col in names:
+            result = simulate_duels_batch(SAMPLE_STATS, SAMPLE_STATS, profiles[row], profiles[col], duels, turns, seed)
+            cells.append(f"{result['a_win_rate']:>16.3f}")
+        print(f"{row_name:<16}" + "".join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duels", type=int, default=1_000_000, help="duels per batched matchup")
+    parser.add_argument("--turns", type=int, default=100, help="turn cap before a duel counts as a draw")
+    parser.add_argument("--level", type=int, default=1, help="weapon skill level for every side")
+    parser.add_argument("--repeat", type=int, default=200_000, help="iterations for the scalar timings")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    run_kernel_benchmarks(args.level, args.repeat)
+    run_batched(args.level, args.duels, args.turns, args.seed)
+
+
+if __name__ == "__main__":
+    main()